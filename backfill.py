@@ -0,0 +1,80 @@
+"""Offline history backfill for EmojiStats.
+
+Imports past messages into emoji_stats.db without running the bot. Progress is checkpointed per
+channel, so re-running the same command resumes where the last run stopped.
+
+Examples:
+    python backfill.py --guild 123 --source discord                # all readable text channels
+    python backfill.py --guild 123 --source discord --channel 456  # a single channel
+    python backfill.py --guild 123 --source jsonl --file history.jsonl
+"""
+import os
+import sys
+import asyncio
+import argparse
+import logging
+# Import from project
+from config import config
+from utils import db_utils
+from utils import backfill as backfill_utils
+
+log = logging.getLogger(__name__)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill emoji/sticker stats from message history.")
+    parser.add_argument("--guild", required=True, help="Guild ID to backfill.")
+    parser.add_argument("--channel", action="append", dest="channels", help="Channel ID to backfill (repeatable). Default: all channels.")
+    parser.add_argument("--source", choices=["discord", "jsonl"], default="discord", help="Where to read history from.")
+    parser.add_argument("--file", help="JSON Lines history file (required for --source jsonl).")
+    parser.add_argument("--db", default=config.DATABASE_NAME, help=f"Database file (default: {config.DATABASE_NAME}).")
+    parser.add_argument("--shards", type=int, default=config.DATABASE_SHARDS, help="Number of guild-hash shard files (see DATABASE_SHARDS).")
+    parser.add_argument("--concurrency", type=int, default=config.BACKFILL_MAX_CONCURRENCY, help="Channels read in parallel.")
+    parser.add_argument("--batch-size", type=int, default=config.BACKFILL_BATCH_SIZE, help="Messages per write transaction.")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved checkpoints and start over.")
+    args = parser.parse_args(argv)
+    if args.source == "jsonl" and not args.file:
+        parser.error("--file is required with --source jsonl")
+    return args
+
+async def main(argv=None):
+    args = parse_args(argv)
+    conn = db_utils.open_database(args.db, args.shards)
+    client = None
+    try:
+        if args.source == "jsonl":
+            source = backfill_utils.MemoryHistorySource.from_jsonl(args.file)
+        else:
+            import discord
+            from dotenv import load_dotenv
+            load_dotenv()
+            token = os.getenv("DISCORD_TOKEN")
+            if not token:
+                log.critical("DISCORD_TOKEN not found in environment variables or .env file.")
+                return 1
+            # HTTP-only client: login() is enough to read history, no gateway connection needed
+            client = discord.Client(intents=config.intents)
+            await client.login(token)
+            source = backfill_utils.DiscordHistorySource(client)
+
+        stats = await backfill_utils.run_backfill(
+            conn,
+            source,
+            args.guild,
+            channel_ids=args.channels,
+            max_concurrency=args.concurrency,
+            batch_size=args.batch_size,
+            reset=args.restart,
+        )
+        print(stats.summary())
+        return 0 if stats.channels_failed == 0 else 2
+    finally:
+        if client is not None:
+            await client.close()
+        db_utils.close_db_connection(conn)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(name)s: %(message)s")
+    try:
+        sys.exit(asyncio.run(main()))
+    except KeyboardInterrupt:
+        print("\nBackfill interrupted; re-run the same command to resume.")
@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Import from project (no discord import needed)
+from utils import db_utils
+from utils.count_batch import CountBatch
+from utils.channel_stats import ChannelTracker
+
+# --- Per-Channel Usage Write Cost ---
+# Replays a synthetic message stream three ways and reports the cost per message:
+#   per-item upserts - one upsert per emoji occurrence, one transaction per chunk (what integer-keyed
+#                      (channel, emoji) rows would cost, and the unit cost of a counter write)
+#   counter batch    - the existing counter path (CountBatch merges a chunk, then one transaction)
+#   channel tracking - ChannelTracker, flushed every --flush-every messages (the periodic flush; at 100
+#                      messages/s and PERIODIC_FLUSH_SECONDS = 60 that is 6000 messages)
+# Exits with status 1 if channel tracking costs more than --max-fraction of the per-item upserts.
+#
+#   python -m benchmarks.channel_usage --messages 50000 --channels 200
+
+def _stream(messages, channels, emojis, seed):
+    rng = random.Random(seed)
+    pool = [chr(0x1F600 + index) for index in range(emojis)]
+    weights = [1.0 / (rank + 1) for rank in range(emojis)] # Zipf-like: a few emojis dominate
+    channel_weights = [1.0 / (rank + 1) for rank in range(channels)] # ...and a few channels
+    for message_id in range(messages):
+        channel_id = 1000 + rng.choices(range(channels), channel_weights)[0]
+        yield channel_id, rng.choices(pool, weights, k=rng.randint(1, 4))
+
+def _time_upserts(conn, guild_id, stream, chunk):
+    table_name = f"guild_{db_utils.sanitize_table_name(guild_id)}_emojis"
+    query = (
+        f"INSERT INTO {table_name} (name, count, last_used) VALUES (?, 1, ?) "
+        f"ON CONFLICT(name) DO UPDATE SET count = count + 1, last_used = excluded.last_used;"
+    )
+    now = time.time()
+    started = time.perf_counter()
+    for start in range(0, len(stream), chunk):
+        rows = [(emoji, now) for _, emojis in stream[start:start + chunk] for emoji in emojis]
+        db_utils.execute_many_in_transaction(conn, query, rows)
+    return time.perf_counter() - started
+
+def _time_counters(conn, guild_id, stream, chunk):
+    batch = CountBatch()
+    started = time.perf_counter()
+    for index, (_, emojis) in enumerate(stream, start=1):
+        for emoji in emojis:
+            batch.add(guild_id, "emojis", emoji)
+        if index % chunk == 0:
+            batch.flush(conn)
+    batch.flush(conn)
+    return time.perf_counter() - started
+
+def _time_channels(conn, guild_id, stream, flush_every, capacity):
+    tracker = ChannelTracker(capacity=capacity)
+    started = time.perf_counter()
+    for index, (channel_id, emojis) in enumerate(stream, start=1):
+        tracker.record(conn, guild_id, channel_id, emojis)
+        if index % flush_every == 0:
+            tracker.flush(conn)
+    tracker.flush(conn)
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the per-message write cost of per-channel usage tracking.")
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--channels", type=int, default=200)
+    parser.add_argument("--emojis", type=int, default=300, help="Distinct emojis in the stream")
+    parser.add_argument("--chunk", type=int, default=500, help="Messages per transaction (INGEST_QUEUE_CHUNK_EVENTS)")
+    parser.add_argument("--flush-every", type=int, default=5000, help="Messages between channel summary flushes")
+    parser.add_argument("--capacity", type=int, default=20, help="Top emojis kept per channel (CHANNEL_TOP_ITEMS)")
+    parser.add_argument("--max-fraction", type=float, default=0.5, help="Allowed cost relative to the per-item upserts")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as directory:
+        conn = db_utils.open_database(os.path.join(directory, "bench.db"))
+        guild_id = "1"
+        db_utils.ensure_guild_tables(conn, guild_id)
+        stream = list(_stream(args.messages, args.channels, args.emojis, args.seed))
+
+        upserts = _time_upserts(conn, guild_id, stream, args.chunk)
+        counters = _time_counters(conn, guild_id, stream, args.chunk)
+        channels = _time_channels(conn, guild_id, stream, args.flush_every, args.capacity)
+        rows = conn.execute("SELECT COUNT(*) FROM channel_usage;").fetchone()[0]
+        pairs = len({(channel_id, emoji) for channel_id, emojis in stream for emoji in emojis})
+        db_utils.close_db_connection(conn)
+
+    fraction = channels / upserts
+    print(f"Messages: {args.messages:,} over {args.channels} channels, {args.emojis} distinct emojis")
+    print(f"Per-item upserts: {upserts / args.messages * 1e6:8.2f} us/message")
+    print(f"Counter batch:    {counters / args.messages * 1e6:8.2f} us/message")
+    print(f"Channel tracking: {channels / args.messages * 1e6:8.2f} us/message ({fraction:.1%} of per-item upserts)")
+    print(f"Rows stored: {rows:,} channel rows (one row per (channel, emoji) would need {pairs:,})")
+    if fraction > args.max_fraction:
+        print(f"FAIL: channel tracking exceeds {args.max_fraction:.0%} of the per-item upsert cost")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
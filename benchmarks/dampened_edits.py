@@ -0,0 +1,66 @@
+import os
+import sys
+import argparse
+import tempfile
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Import from project (no discord import needed)
+from utils import db_utils
+from utils import ingest
+from utils.count_batch import CountBatch
+from utils.dampener import FloodDampener
+from utils.fingerprint_cache import FingerprintCache
+
+# --- Dampened Edits Regression Check ---
+# One user floods a guild with the same emoji, then edits every message: the dampener absorbs all but
+# the first --burst uses, and the edits must not credit the absorbed uses afterwards (nor subtract
+# them on delete). Checks the stored count after each phase and exits with status 1 on a mismatch.
+#
+#   python -m benchmarks.dampened_edits --messages 50 --burst 1
+
+def _count(conn, guild_id, emoji):
+    return next((row["count"] for row in db_utils.get_top_items(conn, guild_id, "emojis", 10) if row["name"] == emoji), 0)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that edits and deletes of dampened messages keep the counts right.")
+    parser.add_argument("--messages", type=int, default=50, help="Messages in the flood")
+    parser.add_argument("--burst", type=int, default=1, help="Dampener burst (uses credited before absorbing)")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    guild_id, user_id, emoji, other = "1", 42, "😀", "🎉"
+    with tempfile.TemporaryDirectory() as directory:
+        conn = db_utils.open_database(os.path.join(directory, "check.db"))
+        db_utils.ensure_guild_tables(conn, guild_id)
+        cache = FingerprintCache()
+        dampener = FloodDampener(enabled=True, burst=args.burst, per_minute=1)
+        batch = CountBatch()
+
+        def apply(event):
+            ingest.apply_event(conn, event, batch, cache, dampener=dampener)
+            batch.flush(conn)
+
+        for message_id in range(args.messages):
+            apply(ingest.message_event(guild_id, 10, message_id, user_id, emoji))
+        counts = [("flood", _count(conn, guild_id, emoji), args.burst)]
+        for message_id in range(args.messages):
+            apply(ingest.edit_event(guild_id, message_id, f"{emoji} edited {other}"))
+        counts.append(("edits", _count(conn, guild_id, emoji), args.burst))
+        counts.append(("new in edits", _count(conn, guild_id, other), args.messages))
+        for message_id in range(args.messages):
+            apply(ingest.delete_event(guild_id, message_id))
+        counts.append(("deletes", _count(conn, guild_id, emoji), 0))
+        db_utils.close_db_connection(conn)
+
+    failed = False
+    for phase, actual, expected in counts:
+        print(f"After {phase + ':':14s} {actual:5d} (expected {expected})")
+        failed = failed or actual != expected
+    if failed:
+        print("FAIL: edits or deletes of dampened messages changed the counts of absorbed uses")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import os
+import sys
+import math
+import time
+import random
+import argparse
+import tempfile
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Import from project (no discord import needed)
+from utils import db_utils
+from utils import distribution
+from utils.count_batch import CountBatch
+
+# --- Usage Distribution Cost ---
+# Fills one guild table with Zipf-like counts and computes the /stats distribution statistics two ways:
+#   pure Python - get_all_items (one sqlite3.Row per item), then sorting and summing in Python
+#   NumPy       - distribution.usage_distribution (one group_concat read parsed into an array, vectorized)
+# Checks that both agree and exits with status 1 if NumPy costs more than --max-fraction of the baseline.
+#
+#   python -m benchmarks.distribution --items 100000
+
+def _python_distribution(conn, guild_id, table_type):
+    """The row-by-row baseline: same statistics as distribution.describe()."""
+    counts = sorted(row["count"] for row in db_utils.get_all_items(conn, guild_id, table_type))
+    items = len(counts)
+    total = sum(counts)
+    gini = 2.0 * sum(rank * count for rank, count in enumerate(counts, start=1)) / (items * total) - (items + 1.0) / items
+    def percentile(p):
+        position = (items - 1) * p / 100.0
+        low = math.floor(position)
+        high = min(low + 1, items - 1)
+        return counts[low] + (counts[high] - counts[low]) * (position - low)
+    descending = counts[::-1]
+    top_items = max(1, math.ceil(items * distribution.TOP_FRACTION))
+    head_items = max(1, math.ceil(items * distribution.HEAD_FRACTION))
+    running, items_for_half = 0, items
+    for index, count in enumerate(descending, start=1):
+        running += count
+        if running >= total * 0.5:
+            items_for_half = index
+            break
+    return {
+        "items": items,
+        "total": total,
+        "mean": total / items,
+        "gini": max(0.0, gini),
+        "percentiles": {p: float(percentile(p)) for p in distribution.PERCENTILES},
+        "top_share": sum(descending[:top_items]) / total,
+        "long_tail_share": 1.0 - sum(descending[:head_items]) / total,
+        "items_for_half": items_for_half,
+    }
+
+def _best_of(repeats, func, *args):
+    best, result = None, None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def _agree(first, second):
+    for key, value in first.items():
+        other = second[key]
+        if isinstance(value, dict):
+            if any(not math.isclose(value[p], other[p], rel_tol=1e-9, abs_tol=1e-9) for p in value):
+                return False
+        elif not math.isclose(value, other, rel_tol=1e-9, abs_tol=1e-9):
+            return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the NumPy usage distribution with a pure-Python baseline.")
+    parser.add_argument("--items", type=int, default=100000, help="Distinct items in the guild table")
+    parser.add_argument("--max-count", type=int, default=100000, help="Count of the most used item")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-fraction", type=float, default=0.5, help="Allowed NumPy cost relative to the baseline")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        conn = db_utils.open_database(os.path.join(directory, "bench.db"))
+        guild_id = "1"
+        db_utils.ensure_guild_tables(conn, guild_id)
+        batch = CountBatch()
+        for rank in range(args.items):
+            count = max(1, int(args.max_count / (rank + 1) * rng.uniform(0.8, 1.2))) # Zipf-like
+            batch.add(guild_id, "emojis", f"<:e{rank}:{rank}>", delta=count)
+        batch.flush(conn)
+
+        python_time, python_stats = _best_of(args.repeats, _python_distribution, conn, guild_id, "emojis")
+        numpy_time, numpy_stats = _best_of(args.repeats, distribution.usage_distribution, conn, guild_id, "emojis")
+        db_utils.close_db_connection(conn)
+
+    fraction = numpy_time / python_time
+    print(f"Items: {args.items:,}, uses: {numpy_stats['total']:,}, Gini {numpy_stats['gini']:.3f}, "
+          f"top 1% share {numpy_stats['top_share']:.1%}, long tail share {numpy_stats['long_tail_share']:.1%}")
+    print(f"Pure Python: {python_time * 1000:8.1f} ms")
+    print(f"NumPy:       {numpy_time * 1000:8.1f} ms ({fraction:.1%} of pure Python)")
+    if not _agree(python_stats, numpy_stats):
+        print(f"FAIL: results differ\n  python: {python_stats}\n  numpy:  {numpy_stats}")
+        return 1
+    if fraction > args.max_fraction:
+        print(f"FAIL: NumPy path exceeds {args.max_fraction:.0%} of the pure-Python cost")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Cluster launcher for EmojiStats.
+
+Runs the bot as several shard-group processes (each an AutoShardedBot over a slice of the shards) that
+share one database through a single writer. The launcher process itself hosts that writer (see
+utils/counter_store.py) and acts as the coordinator:
+
+    1. the counter store opens the database, runs the shared migrations and starts listening;
+    2. shard groups are started one at a time, each only after the previous one reported ready
+       (this also keeps gateway IDENTIFYs spaced out);
+    3. a group that exits is restarted; on Ctrl+C the groups are stopped first so they can ship
+       their last deltas, then the writer commits what is left and closes the database.
+
+Examples:
+    python cluster.py --shards 4 --per-process 2
+    python cluster.py --shards 8 --per-process 1
+"""
+import os
+import sys
+import time
+import signal
+import secrets
+import argparse
+import logging
+import subprocess
+# Import from project
+from config import config
+from utils.counter_store import CounterStoreServer
+
+log = logging.getLogger(__name__)
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "my_bot.py")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run EmojiStats as a multi-process sharded cluster.")
+    parser.add_argument("--shards", type=int, default=config.CLUSTER_SHARD_COUNT, help="Total number of Discord shards.")
+    parser.add_argument("--per-process", type=int, default=config.CLUSTER_SHARDS_PER_PROCESS, help="Shards run by each process.")
+    parser.add_argument("--ready-timeout", type=float, default=config.CLUSTER_READY_TIMEOUT, help="Seconds to wait for a shard group before starting the next one anyway.")
+    args = parser.parse_args(argv)
+    if args.shards < 1 or args.per_process < 1:
+        parser.error("--shards and --per-process must be at least 1")
+    return args
+
+def shard_groups(shard_count, per_process):
+    """Split shard ids 0..shard_count-1 into consecutive groups of `per_process`."""
+    return [list(range(start, min(start + per_process, shard_count))) for start in range(0, shard_count, per_process)]
+
+def start_group(group_index, shard_ids, shard_count, address, authkey):
+    env = dict(os.environ)
+    env.update({
+        "EMOJISTATS_SHARD_IDS": ",".join(str(shard_id) for shard_id in shard_ids),
+        "EMOJISTATS_SHARD_COUNT": str(shard_count),
+        "EMOJISTATS_CLUSTER_GROUP": str(group_index),
+        "EMOJISTATS_COUNTER_STORE": f"{address[0]}:{address[1]}",
+        "EMOJISTATS_COUNTER_STORE_KEY": authkey.hex(),
+    })
+    log.info(f"Starting shard group {group_index} (shards {shard_ids} of {shard_count})...")
+    return subprocess.Popen([sys.executable, BOT_SCRIPT], env=env)
+
+def stop_group(process, timeout=30.0):
+    if process.poll() is not None:
+        return
+    process.send_signal(signal.SIGINT) # discord.py closes cleanly on KeyboardInterrupt; SIGTERM would skip the final flush
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        log.warning(f"Shard process {process.pid} did not exit in time; killing it.")
+        process.kill()
+
+def main(argv=None):
+    args = parse_args(argv)
+    groups = shard_groups(args.shards, args.per_process)
+    authkey = secrets.token_bytes(32) # Only processes started by this launcher can ship deltas
+    store = CounterStoreServer(config.DATABASE_NAME, config.COUNTER_STORE_ADDRESS, authkey, shards=config.DATABASE_SHARDS)
+    store.start()
+
+    processes = {}
+    try:
+        # Startup ordering: one group at a time, each waits for the previous one to be ready
+        for group_index, shard_ids in enumerate(groups):
+            processes[group_index] = start_group(group_index, shard_ids, args.shards, config.COUNTER_STORE_ADDRESS, authkey)
+            if not store.wait_ready(group_index, timeout=args.ready_timeout):
+                log.warning(f"Shard group {group_index} not ready after {args.ready_timeout:.0f}s; continuing.")
+        log.info(f"All {len(groups)} shard groups started.")
+
+        # Supervise: restart groups that exit
+        while True:
+            time.sleep(5)
+            for group_index, process in processes.items():
+                if process.poll() is None:
+                    continue
+                log.error(f"Shard group {group_index} exited with code {process.returncode}; restarting.")
+                store.mark_not_ready(group_index)
+                processes[group_index] = start_group(group_index, groups[group_index], args.shards, config.COUNTER_STORE_ADDRESS, authkey)
+                store.wait_ready(group_index, timeout=args.ready_timeout)
+    except KeyboardInterrupt:
+        log.info("Stopping cluster...")
+    finally:
+        for process in processes.values():
+            stop_group(process)
+        store.stop() # Commit whatever the groups shipped last
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - cluster: %(message)s")
+    sys.exit(main())
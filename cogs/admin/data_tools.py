@@ -1,6 +1,10 @@
 import discord
 from discord import app_commands
 import sqlite3
+import os
+import asyncio
+import time
+import tempfile
 import logging
 
 # Use relative imports within the same package
@@ -9,9 +13,21 @@ from config import config
 from utils import db_utils
 from utils import embed_utils
 from utils import ui_components
+from utils import backfill as backfill_utils
+from utils import dampener as dampener_utils
+from utils import approx_count
+from utils import export as export_utils
+from utils import digest as digest_utils
+from cogs.events import flush_tasks
+from cogs.events import ingest_dispatch
+from cogs.events import retention_tasks
+from cogs.events import digest_tasks
 
 log = logging.getLogger(__name__)
 
+# Guild IDs with a backfill in progress (one at a time per guild)
+_running_backfills = set()
+
 # Define an admin command group
 admin_group = app_commands.Group(name="admin", description="Administrative commands for the bot.")
 
@@ -57,7 +73,7 @@ async def wipe_data(interaction: discord.Interaction):
             # Fallback: create a temporary connection (less ideal)
             log.warning("Could not access bot.db_conn, creating temporary connection for wipe_data.")
             try:
-                db_conn = db_utils.get_db_connection(config.DATABASE_NAME)
+                db_conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
             except Exception as e:
                 log.error(f"Failed to get DB connection for wipe_data: {e}")
                 await interaction.followup.send(embed=embed_utils.create_error_embed("Database connection error."), ephemeral=True)
@@ -68,7 +84,14 @@ async def wipe_data(interaction: discord.Interaction):
              return
 
         guild_id = str(interaction.guild.id)
-        success = db_utils.wipe_guild_data(db_conn, guild_id)
+        await flush_tasks.settle_guild(interaction.client, guild_id) # Cluster mode: no in-flight deltas
+        ingest_pool = getattr(interaction.client, "ingest_pool", None)
+        if ingest_pool is not None:
+            # The worker owning the guild wipes it between two events, so its buffered state cannot write the counts back
+            success = await asyncio.to_thread(ingest_pool.rewrite_guild, guild_id, "wipe")
+        else:
+            success = db_utils.wipe_guild_data(db_conn, guild_id)
+        flush_tasks.forget_guild(interaction.client, guild_id, include_workers=ingest_pool is None)
 
         # Close temporary connection if created
         if not hasattr(interaction.client, 'db_conn') and db_conn:
@@ -127,7 +150,7 @@ async def reset_data(interaction: discord.Interaction):
         else:
             log.warning("Could not access bot.db_conn, creating temporary connection for reset_data.")
             try:
-                db_conn = db_utils.get_db_connection(config.DATABASE_NAME)
+                db_conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
             except Exception as e:
                 log.error(f"Failed to get DB connection for reset_data: {e}")
                 await interaction.followup.send(embed=embed_utils.create_error_embed("Database connection error."), ephemeral=True)
@@ -138,7 +161,14 @@ async def reset_data(interaction: discord.Interaction):
              return
 
         guild_id = str(interaction.guild.id)
-        success = db_utils.reset_guild_counts(db_conn, guild_id)
+        await flush_tasks.settle_guild(interaction.client, guild_id) # Cluster mode: no in-flight deltas
+        ingest_pool = getattr(interaction.client, "ingest_pool", None)
+        if ingest_pool is not None:
+            # See wipe_data: the owning worker resets the guild between two events
+            success = await asyncio.to_thread(ingest_pool.rewrite_guild, guild_id, "reset")
+        else:
+            success = db_utils.reset_guild_counts(db_conn, guild_id)
+        flush_tasks.forget_guild(interaction.client, guild_id, include_workers=ingest_pool is None)
 
         # Close temporary connection if created
         if not hasattr(interaction.client, 'db_conn') and db_conn:
@@ -156,6 +186,446 @@ async def reset_data(interaction: discord.Interaction):
     else: # Timeout
         await interaction.followup.send(embed=embed_utils.create_info_embed("Data reset confirmation timed out."), ephemeral=True)
 
+@admin_group.command(name="backfill", description=config.COMMAND_DESCRIPTIONS.get("backfill", "[Admin] Import past messages into the stats."))
+@permissions.is_emoji_police() # Apply permission check
+@app_commands.describe(
+    channel="Only backfill this channel (default: every readable text channel)",
+    restart="Ignore saved progress and start over (may double count already imported messages)"
+)
+async def backfill(interaction: discord.Interaction, channel: discord.TextChannel = None, restart: bool = False):
+    """Streams the server's message history through the emoji scanner, resuming from saved checkpoints."""
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+
+    guild_id = str(interaction.guild.id)
+    if guild_id in _running_backfills:
+        await interaction.response.send_message(embed=embed_utils.create_info_embed("A backfill is already running for this server."), ephemeral=True)
+        return
+
+    db_conn = getattr(interaction.client, "db_conn", None)
+    if not db_conn:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Database connection unavailable."), ephemeral=True)
+        return
+
+    await interaction.response.send_message(
+        embed=embed_utils.create_info_embed("Backfill started. Progress is saved as it goes, so it will resume after a restart.", title="Backfill"),
+        ephemeral=True
+    )
+
+    _running_backfills.add(guild_id)
+    try:
+        source = backfill_utils.DiscordHistorySource(interaction.client)
+        stats = await backfill_utils.run_backfill(
+            db_conn,
+            source,
+            guild_id,
+            channel_ids=[str(channel.id)] if channel else None,
+            max_concurrency=config.BACKFILL_MAX_CONCURRENCY,
+            batch_size=config.BACKFILL_BATCH_SIZE,
+            reset=restart,
+        )
+    except Exception as e:
+        log.error(f"Backfill failed for guild {guild_id}: {e}", exc_info=True)
+        await interaction.followup.send(embed=embed_utils.create_error_embed("The backfill failed. Progress up to the last checkpoint was kept."), ephemeral=True)
+        return
+    finally:
+        _running_backfills.discard(guild_id)
+
+    log.info(f"Backfill for guild {guild_id} started by {interaction.user} finished: {stats.summary()}")
+    try:
+        await interaction.followup.send(embed=embed_utils.create_success_embed(stats.summary(), title="Backfill Complete"), ephemeral=True)
+    except discord.HTTPException as e:
+        # Interaction tokens expire after 15 minutes; long backfills only get logged
+        log.warning(f"Could not report backfill completion for guild {guild_id}: {e}")
+
+@admin_group.command(name="ingest_stats", description=config.COMMAND_DESCRIPTIONS.get("ingest_stats", "[Admin] Show ingest worker stats."))
+@permissions.is_emoji_police() # Apply permission check
+async def ingest_stats(interaction: discord.Interaction):
+    """Shows queue depth, drops and commit lag of the ingest queue / worker processes / cluster counter store."""
+    ingest_pool = getattr(interaction.client, "ingest_pool", None)
+    ingest_queue = getattr(interaction.client, "ingest_queue", None)
+    counter_store = getattr(interaction.client, "counter_store", None)
+    if ingest_pool is None and ingest_queue is None and counter_store is None:
+        await interaction.response.send_message(embed=embed_utils.create_info_embed("Events are applied directly; no ingest queue is running."), ephemeral=True)
+        return
+
+    embed = discord.Embed(
+        title=f"{config.EMOJI_MAP.get('stats', '📊')} Ingest Stats",
+        color=discord.Color.blurple()
+    )
+    if ingest_queue is not None:
+        queue_stats = ingest_queue.stats()
+        drops = ", ".join(f"{kind}: {count:,}" for kind, count in queue_stats["dropped_by_kind"].items()) or "none"
+        embed.add_field(
+            name=f"Ingest Queue (policy: {queue_stats['policy']})",
+            value=(
+                f"Depth: **{queue_stats['depth']:,}** / {queue_stats['max_events']:,} (peak {queue_stats['max_depth']:,})\n"
+                f"Lag: {queue_stats['last_lag']:.2f}s (max {queue_stats['max_lag']:.2f}s)\n"
+                f"Processed: {queue_stats['processed']:,} of {queue_stats['offered']:,} offered\n"
+                f"Merged: {queue_stats['merged']:,} | Sampled: {queue_stats['sampled']:,} | Left uncounted: {queue_stats['uncounted']:,} messages\n"
+                f"Dropped: **{queue_stats['dropped']:,}** ({drops})"
+            ),
+            inline=False
+        )
+    if counter_store is not None:
+        store_stats = await asyncio.to_thread(counter_store.stats)
+        if store_stats is None:
+            embed.add_field(name=f"{config.EMOJI_MAP.get('error', '❌')} Counter Store", value="Unreachable; deltas are kept and retried.", inline=False)
+        else:
+            count_batch = getattr(interaction.client, "count_batch", None)
+            embed.add_field(
+                name=f"{config.EMOJI_MAP.get('success', '✔️')} Counter Store (shard group {counter_store.group_index})",
+                value=(
+                    f"Writer queue: **{store_stats['queue_depth']:,}** batches, {len(count_batch or ()):,} deltas unshipped here\n"
+                    f"Lag: {store_stats['last_lag']:.2f}s (max {store_stats['max_lag']:.2f}s)\n"
+                    f"Commits: {store_stats['commits']:,} ({store_stats['failed_commits']:,} failed)\n"
+                    f"Ready shard groups: {', '.join(str(group) for group in store_stats['ready_groups']) or 'none'}"
+                ),
+                inline=False
+            )
+    for worker in (ingest_pool.stats() if ingest_pool is not None else []):
+        status = config.EMOJI_MAP.get("success", "✔️") if worker["alive"] else config.EMOJI_MAP.get("error", "❌")
+        heartbeat = f"{worker['heartbeat_age']:.1f}s ago" if worker["heartbeat_age"] is not None else "never"
+        embed.add_field(
+            name=f"{status} Worker {worker['worker']}",
+            value=(
+                f"Queue depth: **{worker['queue_depth']:,}**\n"
+                f"Lag: {worker['last_lag']:.2f}s (max {worker['max_lag']:.2f}s)\n"
+                f"Processed: {worker['processed']:,} in {worker['flushes']:,} batches\n"
+                f"Absorbed by dampening: {worker['absorbed']:,}\n"
+                f"Heartbeat: {heartbeat}"
+            ),
+            inline=True
+        )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@admin_group.command(name="cache_stats", description=config.COMMAND_DESCRIPTIONS.get("cache_stats", "[Admin] Show fingerprint cache stats."))
+@permissions.is_emoji_police() # Apply permission check
+async def cache_stats(interaction: discord.Interaction):
+    """Shows the size and hit rate of the message fingerprint cache used for edit/delete reconciliation."""
+    cache = getattr(interaction.client, "fingerprint_cache", None)
+    if cache is None:
+        await interaction.response.send_message(embed=embed_utils.create_info_embed("The fingerprint cache is not enabled."), ephemeral=True)
+        return
+
+    stats = cache.stats()
+    embed = discord.Embed(
+        title=f"{config.EMOJI_MAP.get('stats', '📊')} Fingerprint Cache",
+        color=discord.Color.blurple()
+    )
+    embed.add_field(name="Entries", value=f"{stats['entries']:,} / {stats['max_entries']:,}", inline=True)
+    embed.add_field(name="Memory", value=f"{stats['bytes'] / 1024:,.0f} KiB / {stats['max_bytes'] / 1024:,.0f} KiB", inline=True)
+    embed.add_field(name="Hit Rate", value=f"{stats['hit_rate']:.1%} ({stats['hits']:,} hits, {stats['misses']:,} misses)", inline=False)
+    embed.add_field(name="Evictions", value=f"{stats['evictions']:,}", inline=True)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@admin_group.command(name="dampening", description=config.COMMAND_DESCRIPTIONS.get("dampening", "[Admin] Configure flood dampening."))
+@app_commands.describe(
+    enabled="Turn dampening on or off for this server",
+    burst="Uses of the same item a user is credited for at once",
+    per_minute="Credits each user regains per item and minute",
+)
+@permissions.is_emoji_police() # Apply permission check
+async def dampening(interaction: discord.Interaction, enabled: bool = None,
+                    burst: app_commands.Range[int, 1, 1000] = None, per_minute: app_commands.Range[int, 1, 6000] = None):
+    """Shows (and optionally changes) this server's per-user flood dampening and how many increments it absorbed."""
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    bot = interaction.client
+    db_conn = getattr(bot, "db_conn", None)
+    if not db_conn:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Database connection is not available."), ephemeral=True)
+        return
+    guild_id = str(interaction.guild.id)
+
+    changes = {
+        dampener_utils.SETTING_ENABLED: None if enabled is None else int(enabled),
+        dampener_utils.SETTING_BURST: burst,
+        dampener_utils.SETTING_PER_MINUTE: per_minute,
+    }
+    changes = {key: value for key, value in changes.items() if value is not None}
+    if changes:
+        if not db_utils.set_guild_settings(db_conn, guild_id, changes):
+            await interaction.response.send_message(embed=embed_utils.create_error_embed("Failed to save the dampening settings."), ephemeral=True)
+            return
+        ingest_dispatch.reload_guild_settings(bot, guild_id)
+        log.info(f"Dampening settings for guild {guild_id} changed by {interaction.user}: {changes}")
+
+    stored = db_utils.get_guild_settings(db_conn, guild_id)
+    is_enabled = stored.get(dampener_utils.SETTING_ENABLED, "1" if config.DAMPENER_ENABLED_DEFAULT else "0") == "1"
+    current_burst = stored.get(dampener_utils.SETTING_BURST, config.DAMPENER_BURST)
+    current_rate = stored.get(dampener_utils.SETTING_PER_MINUTE, config.DAMPENER_PER_MINUTE)
+
+    embed = discord.Embed(
+        title=f"{config.EMOJI_MAP.get('stats', '📊')} Flood Dampening",
+        color=discord.Color.blurple()
+    )
+    embed.add_field(name="Status", value="Enabled" if is_enabled else "Disabled", inline=True)
+    embed.add_field(name="Burst", value=f"{current_burst} uses per item", inline=True)
+    embed.add_field(name="Refill", value=f"{current_rate} per minute", inline=True)
+    ingest_pool = getattr(bot, "ingest_pool", None)
+    if ingest_pool is not None:
+        absorbed = sum(worker["absorbed"] for worker in ingest_pool.stats())
+        embed.add_field(name="Absorbed", value=f"{absorbed:,} increments (all servers, since the workers started)", inline=False)
+    elif getattr(bot, "dampener", None) is not None:
+        dampener = bot.dampener
+        embed.add_field(
+            name="Absorbed",
+            value=f"{dampener.absorbed.get(guild_id, 0):,} increments here since startup ({dampener.stats()['buckets']:,} active buckets)",
+            inline=False
+        )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@admin_group.command(name="approximate_counting", description=config.COMMAND_DESCRIPTIONS.get("approximate_counting", "[Admin] Configure approximate counting."))
+@app_commands.describe(
+    enabled="Count probabilistically (fewer writes) or exactly",
+    error_percent="Target typical error of approximate counts, in percent",
+)
+@permissions.is_emoji_police() # Apply permission check
+async def approximate_counting(interaction: discord.Interaction, enabled: bool = None,
+                               error_percent: app_commands.Range[float, 0.5, 25.0] = None):
+    """Shows (and optionally switches) whether this server's counts are stored as Morris registers."""
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    db_conn = getattr(interaction.client, "db_conn", None)
+    if not db_conn:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Database connection is not available."), ephemeral=True)
+        return
+    guild_id = str(interaction.guild.id)
+
+    base = db_utils.get_count_base(db_conn, guild_id)
+    if enabled is not None or error_percent is not None:
+        if enabled is False:
+            new_base = None
+        else:
+            error = (error_percent / 100) if error_percent is not None else (
+                approx_count.relative_error(base) if base else config.APPROX_COUNT_DEFAULT_ERROR)
+            new_base = approx_count.base_for_error(error)
+        await interaction.response.defer(ephemeral=True) # Converting every stored count can take a moment
+        # Pending deltas are plain event counts either way; they are converted when they are committed.
+        # Run on the loop, which owns db_conn's writes, so the conversion never interleaves with an ingest commit
+        if not db_utils.set_count_base(db_conn, guild_id, new_base):
+            await interaction.followup.send(embed=embed_utils.create_error_embed("Failed to switch the counting mode."), ephemeral=True)
+            return
+        log.info(f"Counting mode for guild {guild_id} changed by {interaction.user}: base {base} -> {new_base}")
+        base = new_base
+    else:
+        await interaction.response.defer(ephemeral=True)
+
+    if base:
+        message = (
+            f"Counts are **approximate** (Morris counters, base {base:.5f}).\n"
+            f"Typical error: ±{approx_count.relative_error(base):.1%} per item. Increments of popular items "
+            f"rarely need a database write; leaderboards show estimates with their margin."
+        )
+    else:
+        message = "Counts are **exact**: every increment is written."
+    await interaction.followup.send(embed=embed_utils.create_info_embed(message, title="Counting Mode"), ephemeral=True)
+
+@admin_group.command(name="retention", description=config.COMMAND_DESCRIPTIONS.get("retention", "[Admin] Configure item retention."))
+@app_commands.describe(
+    idle_days="Archive items unused for this many days (0 turns retention off)",
+    max_uses="Only archive items with at most this many uses",
+    run_now="Apply the policy right away instead of at the next scheduled run",
+)
+@permissions.is_emoji_police() # Apply permission check
+async def retention(interaction: discord.Interaction, idle_days: app_commands.Range[int, 0, 36500] = None,
+                    max_uses: app_commands.Range[int, 0, 1000000] = None, run_now: bool = False):
+    """Shows (and optionally changes or applies) this server's retention policy and what it archived so far."""
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    db_conn = getattr(interaction.client, "db_conn", None)
+    if not db_conn:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Database connection is not available."), ephemeral=True)
+        return
+    guild_id = str(interaction.guild.id)
+
+    stored = db_utils.get_guild_settings(db_conn, guild_id)
+    changes = {}
+    if idle_days == 0:
+        changes = {db_utils.RETENTION_DAYS_SETTING: None, db_utils.RETENTION_MAX_USES_SETTING: None}
+    elif idle_days is not None or max_uses is not None:
+        if idle_days is None and db_utils.RETENTION_DAYS_SETTING not in stored:
+            await interaction.response.send_message(embed=embed_utils.create_error_embed("Set `idle_days` to enable retention first."), ephemeral=True)
+            return
+        if idle_days is not None:
+            changes[db_utils.RETENTION_DAYS_SETTING] = idle_days
+        if max_uses is not None:
+            changes[db_utils.RETENTION_MAX_USES_SETTING] = max_uses
+        elif db_utils.RETENTION_MAX_USES_SETTING not in stored:
+            changes[db_utils.RETENTION_MAX_USES_SETTING] = config.RETENTION_DEFAULT_MAX_USES
+    if changes:
+        if not db_utils.set_guild_settings(db_conn, guild_id, changes):
+            await interaction.response.send_message(embed=embed_utils.create_error_embed("Failed to save the retention policy."), ephemeral=True)
+            return
+        log.info(f"Retention policy for guild {guild_id} changed by {interaction.user}: {changes}")
+        stored = db_utils.get_guild_settings(db_conn, guild_id)
+
+    await interaction.response.defer(ephemeral=True)
+    days = stored.get(db_utils.RETENTION_DAYS_SETTING)
+    archived_now = None
+    if run_now and days:
+        results = await asyncio.to_thread(retention_tasks.apply_retention, {guild_id})
+        archived_now = results.get(guild_id)
+
+    embed = discord.Embed(
+        title=f"{config.EMOJI_MAP.get('history', '📜')} Item Retention",
+        color=discord.Color.blurple()
+    )
+    if days:
+        embed.description = (
+            f"Items unused for **{days}** days with at most **{stored.get(db_utils.RETENTION_MAX_USES_SETTING, '?')}** uses "
+            f"are moved to a compressed archive every {config.RETENTION_CHECK_HOURS}h. "
+            f"They still appear in `history` with `include_archived`."
+        )
+    else:
+        embed.description = "Retention is **off**: every item stays in the live tables."
+    if archived_now is not None:
+        embed.add_field(name="Archived now", value=", ".join(f"{count:,} {table_type}" for table_type, count in archived_now.items()), inline=False)
+    elif run_now and days:
+        embed.add_field(name="Archived now", value="The retention run failed; see the logs.", inline=False)
+    for table_type, (items, uses, size) in sorted(db_utils.get_archive_stats(db_conn, guild_id).items()):
+        embed.add_field(name=f"Archived {table_type}", value=f"{items:,} items, {uses:,} uses ({size / 1024:,.1f} KiB)", inline=True)
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+@admin_group.command(name="digest", description=config.COMMAND_DESCRIPTIONS.get("digest", "[Admin] Configure the weekly digest."))
+@app_commands.describe(
+    channel="Post the digest in this channel (turns digests on)",
+    enabled="Set to false to stop posting digests",
+)
+@permissions.is_emoji_police() # Apply permission check
+async def digest(interaction: discord.Interaction, channel: discord.TextChannel = None, enabled: bool = None):
+    """Shows (and optionally changes) where this server's periodic usage digest is posted and when the next one is due."""
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    db_conn = getattr(interaction.client, "db_conn", None)
+    if not db_conn:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Database connection is not available."), ephemeral=True)
+        return
+    guild_id = str(interaction.guild.id)
+
+    stored = db_utils.get_guild_settings(db_conn, guild_id)
+    if enabled is False:
+        changes = {db_utils.DIGEST_CHANNEL_SETTING: None, db_utils.DIGEST_SENT_SETTING: None, db_utils.DIGEST_PENDING_SETTING: None}
+        if not db_utils.set_guild_settings(db_conn, guild_id, changes):
+            await interaction.response.send_message(embed=embed_utils.create_error_embed("Failed to save the digest setting."), ephemeral=True)
+            return
+        log.info(f"Digests for guild {guild_id} turned off by {interaction.user}")
+        stored = {}
+    elif channel is not None:
+        permissions_here = channel.permissions_for(interaction.guild.me)
+        if not (permissions_here.send_messages and permissions_here.embed_links):
+            await interaction.response.send_message(
+                embed=embed_utils.create_error_embed(f"I need permission to send messages and embed links in {channel.mention}."), ephemeral=True
+            )
+            return
+        await interaction.response.defer(ephemeral=True)
+        if not db_utils.set_guild_settings(db_conn, guild_id, {db_utils.DIGEST_CHANNEL_SETTING: channel.id}):
+            await interaction.followup.send(embed=embed_utils.create_error_embed("Failed to save the digest setting."), ephemeral=True)
+            return
+        if db_utils.DIGEST_CHANNEL_SETTING not in stored:
+            # Start counting now: the first digest comes at the next slot and covers the uses from here on
+            current = digest_utils.due_period(guild_id, time.time(), digest_tasks.PERIOD_SECONDS)
+            await asyncio.to_thread(db_utils.record_digest_sent, db_conn, guild_id, current)
+        log.info(f"Digests for guild {guild_id} set to channel {channel.id} by {interaction.user}")
+        stored = db_utils.get_guild_settings(db_conn, guild_id)
+
+    channel_id = stored.get(db_utils.DIGEST_CHANNEL_SETTING)
+    embed = discord.Embed(title=f"{config.EMOJI_MAP.get('stats', '📊')} Usage Digest", color=discord.Color.blurple())
+    if channel_id:
+        now = time.time()
+        if int(stored.get(db_utils.DIGEST_SENT_SETTING) or -1) < digest_utils.due_period(guild_id, now, digest_tasks.PERIOD_SECONDS):
+            next_text = "due now"
+        else:
+            next_run = int(digest_utils.next_run(guild_id, now, digest_tasks.PERIOD_SECONDS))
+            next_text = f"<t:{next_run}:F> (<t:{next_run}:R>)"
+        embed.description = (
+            f"A digest of the top movers and new or never-used emojis is posted in <#{channel_id}> "
+            f"every {config.DIGEST_PERIOD_HOURS / 24:g} days. Next one: {next_text}."
+        )
+    else:
+        embed.description = "Digests are **off**. Pick a channel to turn them on."
+    if interaction.response.is_done():
+        await interaction.followup.send(embed=embed, ephemeral=True)
+    else:
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+def _attachment_batches(paths, size_limit, max_files=10):
+    """Group files into messages of at most `max_files` attachments and `size_limit` bytes."""
+    batches, current, current_size = [], [], 0
+    for path in paths:
+        size = os.path.getsize(path)
+        if current and (len(current) >= max_files or current_size + size > size_limit):
+            batches.append(current)
+            current, current_size = [], 0
+        current.append(path)
+        current_size += size
+    if current:
+        batches.append(current)
+    return batches
+
+@admin_group.command(name="export", description=config.COMMAND_DESCRIPTIONS.get("export", "[Admin] Export this server's stats."))
+@app_commands.describe(
+    file_format="File format of the export",
+    compressed="Gzip-compress CSV / JSON Lines files (default on)",
+)
+@app_commands.choices(file_format=[
+    app_commands.Choice(name="CSV", value="csv"),
+    app_commands.Choice(name="JSON Lines", value="jsonl"),
+    app_commands.Choice(name="Parquet", value="parquet"),
+])
+@permissions.is_emoji_police() # Apply permission check
+async def export(interaction: discord.Interaction, file_format: str = "csv", compressed: bool = True):
+    """Streams this server's datasets into files and sends them as attachments, split to fit the upload limit."""
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    bot = interaction.client
+    conn = getattr(bot, "read_conn", None) or getattr(bot, "db_conn", None)
+    if not conn:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Database connection is not available."), ephemeral=True)
+        return
+    guild_id = str(interaction.guild.id)
+    await interaction.response.defer(ephemeral=True)
+
+    # Leave room for the multipart envelope around each upload
+    size_limit = int(interaction.guild.filesize_limit * config.EXPORT_UPLOAD_FRACTION)
+    with tempfile.TemporaryDirectory(prefix=f"emojistats-export-{guild_id}-") as directory:
+        try:
+            paths, counts = await asyncio.to_thread(
+                export_utils.export_guild, conn, guild_id, directory, fmt=file_format,
+                compression="gzip" if compressed else "none", chunk_rows=config.EXPORT_CHUNK_ROWS, max_part_bytes=size_limit,
+            )
+        except RuntimeError as e:
+            await interaction.followup.send(embed=embed_utils.create_error_embed(str(e)), ephemeral=True)
+            return
+        except Exception as e:
+            log.error(f"Export failed for guild {guild_id}: {e}", exc_info=True)
+            await interaction.followup.send(embed=embed_utils.create_error_embed("The export failed."), ephemeral=True)
+            return
+        if not paths:
+            await interaction.followup.send(embed=embed_utils.create_info_embed("There is no data to export yet.", title="Export"), ephemeral=True)
+            return
+        batches = _attachment_batches(paths, size_limit)
+        if len(batches) > config.EXPORT_MAX_MESSAGES:
+            await interaction.followup.send(embed=embed_utils.create_error_embed(
+                f"This export needs {len(paths)} files ({len(batches)} messages). Please ask the bot owner to run "
+                f"`python export.py --guild {guild_id}` instead."
+            ), ephemeral=True)
+            return
+        summary = ", ".join(f"{rows:,} {dataset}" for dataset, rows in counts.items() if rows)
+        for index, batch in enumerate(batches, start=1):
+            content = f"Export of {interaction.guild.name}: {summary}" if index == 1 else None
+            if len(batches) > 1:
+                content = f"{content or ''}\nPart {index}/{len(batches)}".strip()
+            await interaction.followup.send(content=content, files=[discord.File(path) for path in batch], ephemeral=True)
+    log.info(f"Guild {guild_id} exported as {file_format} by {interaction.user}: {counts}")
+
 # Function to register this group with the bot
 async def setup(bot: discord.ext.commands.Bot):
     bot.tree.add_command(admin_group)
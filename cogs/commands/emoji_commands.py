@@ -1,12 +1,15 @@
 import discord
 from discord import app_commands
+import asyncio
 import sqlite3
 import logging
 # Import from project
 from config import config
 from utils import db_utils
 from utils import embed_utils
+from utils import heatmap as heatmap_utils
 from cogs.admin import permissions # Import permissions check
+from cogs.commands import item_lookup
 
 log = logging.getLogger(__name__)
 
@@ -31,7 +34,7 @@ async def emoji_top(interaction: discord.Interaction, limit: app_commands.Range[
     else:
         log.warning("Could not access bot.db_conn, creating temporary connection for emoji_top.")
         try:
-            db_conn = db_utils.get_db_connection(config.DATABASE_NAME)
+            db_conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
         except Exception as e:
             log.error(f"Failed to get DB connection for emoji_top: {e}")
             await interaction.followup.send(embed=embed_utils.create_error_embed("Database connection error."), ephemeral=True)
@@ -44,6 +47,7 @@ async def emoji_top(interaction: discord.Interaction, limit: app_commands.Range[
     guild_id = str(interaction.guild.id)
     try:
         top_emojis = db_utils.get_top_items(db_conn, guild_id, "emojis", limit=limit)
+        count_error = db_utils.get_count_error(db_conn, guild_id)
     except Exception as e:
         log.error(f"Error fetching top emojis for guild {guild_id}: {e}")
         await interaction.followup.send(embed=embed_utils.create_error_embed("Failed to fetch emoji data."), ephemeral=True)
@@ -62,13 +66,13 @@ async def emoji_top(interaction: discord.Interaction, limit: app_commands.Range[
 
     # Use pagination even for top/rare in case limit is large or for consistency
     title = f"{config.EMOJI_MAP.get('top', '👑')} Top {limit} Emojis in {interaction.guild.name}"
-    await embed_utils.paginate_and_send(interaction, title, top_emojis, "emoji")
+    await embed_utils.paginate_and_send(interaction, title, top_emojis, "emoji", count_error=count_error)
 
 @emoji_group.command(name="rare", description=config.COMMAND_DESCRIPTIONS.get("emoji_rare", "Show least used emojis."))
 @permissions.is_emoji_police() # Apply permission check
 @app_commands.describe(limit="How many rare emojis to show (1-25, default 10)")
 async def emoji_rare(interaction: discord.Interaction, limit: app_commands.Range[int, 1, 25] = 10):
-    """Displays the N least used emojis in the server (must have been used at least once)."""
+    """Displays the N least used emojis in the server, led by the server's custom emojis nobody has used yet."""
     if not interaction.guild:
         await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
         return
@@ -81,7 +85,7 @@ async def emoji_rare(interaction: discord.Interaction, limit: app_commands.Range
     else:
         log.warning("Could not access bot.db_conn, creating temporary connection for emoji_rare.")
         try:
-            db_conn = db_utils.get_db_connection(config.DATABASE_NAME)
+            db_conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
         except Exception as e:
             log.error(f"Failed to get DB connection for emoji_rare: {e}")
             await interaction.followup.send(embed=embed_utils.create_error_embed("Database connection error."), ephemeral=True)
@@ -93,7 +97,11 @@ async def emoji_rare(interaction: discord.Interaction, limit: app_commands.Range
 
     guild_id = str(interaction.guild.id)
     try:
-        rare_emojis = db_utils.get_rare_items(db_conn, guild_id, "emojis", limit=limit)
+        inventory = getattr(interaction.client, "item_inventory", None)
+        rare_emojis = db_utils.get_rare_items(
+            db_conn, guild_id, "emojis", limit=limit, inventory=inventory.get(guild_id, "emojis") if inventory is not None else None
+        )
+        count_error = db_utils.get_count_error(db_conn, guild_id)
     except Exception as e:
         log.error(f"Error fetching rare emojis for guild {guild_id}: {e}")
         await interaction.followup.send(embed=embed_utils.create_error_embed("Failed to fetch emoji data."), ephemeral=True)
@@ -107,15 +115,16 @@ async def emoji_rare(interaction: discord.Interaction, limit: app_commands.Range
         db_utils.close_db_connection(db_conn)
 
     if not rare_emojis:
-        await interaction.followup.send(embed=embed_utils.create_info_embed("No emoji usage data found yet (or none with count > 0).", title="Rare Emojis"), ephemeral=True)
+        await interaction.followup.send(embed=embed_utils.create_info_embed("No emoji usage data found yet.", title="Rare Emojis"), ephemeral=True)
         return
 
     title = f"{config.EMOJI_MAP.get('rare', '💀')} Rarest {limit} Emojis in {interaction.guild.name}"
-    await embed_utils.paginate_and_send(interaction, title, rare_emojis, "emoji")
+    await embed_utils.paginate_and_send(interaction, title, rare_emojis, "emoji", count_error=count_error)
 
 @emoji_group.command(name="history", description=config.COMMAND_DESCRIPTIONS.get("emoji_history", "View full emoji usage history."))
 @permissions.is_emoji_police() # Apply permission check
-async def emoji_history(interaction: discord.Interaction):
+@app_commands.describe(include_archived="Also include emojis retired to the archive by the retention policy")
+async def emoji_history(interaction: discord.Interaction, include_archived: bool = False):
     """Displays the full history of emoji usage, paginated."""
     if not interaction.guild:
         await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
@@ -129,7 +138,7 @@ async def emoji_history(interaction: discord.Interaction):
     else:
         log.warning("Could not access bot.db_conn, creating temporary connection for emoji_history.")
         try:
-            db_conn = db_utils.get_db_connection(config.DATABASE_NAME)
+            db_conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
         except Exception as e:
             log.error(f"Failed to get DB connection for emoji_history: {e}")
             await interaction.followup.send(embed=embed_utils.create_error_embed("Database connection error."), ephemeral=True)
@@ -142,7 +151,8 @@ async def emoji_history(interaction: discord.Interaction):
     guild_id = str(interaction.guild.id)
     try:
         # Fetch all items, ordered by count descending by default in get_all_items
-        all_emojis = db_utils.get_all_items(db_conn, guild_id, "emojis")
+        all_emojis = db_utils.get_all_items(db_conn, guild_id, "emojis", include_archived=include_archived)
+        count_error = db_utils.get_count_error(db_conn, guild_id)
     except Exception as e:
         log.error(f"Error fetching emoji history for guild {guild_id}: {e}")
         await interaction.followup.send(embed=embed_utils.create_error_embed("Failed to fetch emoji data."), ephemeral=True)
@@ -160,7 +170,273 @@ async def emoji_history(interaction: discord.Interaction):
         return
 
     title = f"{config.EMOJI_MAP.get('history', '📜')} Emoji Usage History in {interaction.guild.name}"
-    await embed_utils.paginate_and_send(interaction, title, all_emojis, "emoji")
+    await embed_utils.paginate_and_send(interaction, title, all_emojis, "emoji", count_error=count_error)
+
+@emoji_group.command(name="global", description=config.COMMAND_DESCRIPTIONS.get("emoji_global", "Show the most used emojis across all servers."))
+@permissions.is_emoji_police() # Apply permission check
+@app_commands.describe(limit="How many top emojis to show (1-25, default 10)")
+async def emoji_global(interaction: discord.Interaction, limit: app_commands.Range[int, 1, 25] = 10):
+    """Displays the top N most used emojis across every server the bot tracks."""
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+
+    db_conn = getattr(interaction.client, "db_conn", None)
+    if not db_conn:
+         await interaction.followup.send(embed=embed_utils.create_error_embed("Database connection unavailable."), ephemeral=True)
+         return
+
+    try:
+        # Served from the materialized global aggregate, not by scanning every guild table
+        global_emojis = db_utils.get_global_top_items(db_conn, "emojis", limit=limit)
+    except Exception as e:
+        log.error(f"Error fetching global top emojis: {e}")
+        await interaction.followup.send(embed=embed_utils.create_error_embed("Failed to fetch emoji data."), ephemeral=True)
+        return
+
+    if not global_emojis:
+        await interaction.followup.send(embed=embed_utils.create_info_embed("No emoji usage data found yet."), ephemeral=True)
+        return
+
+    title = f"{config.EMOJI_MAP.get('leaderboard', '🏆')} Top {limit} Emojis Across All Servers"
+    await embed_utils.paginate_and_send(interaction, title, global_emojis, "emoji")
+
+@emoji_group.command(name="info", description=config.COMMAND_DESCRIPTIONS.get("emoji_info", "Show one emoji's stats."))
+@permissions.is_emoji_police() # Apply permission check
+@app_commands.describe(emoji="The emoji to look up (start typing its name, or paste it)")
+async def emoji_info(interaction: discord.Interaction, emoji: str):
+    """Shows one emoji's uses, rank and last use; the name autocompletes from an in-memory index."""
+    await item_lookup.send_item_info(interaction, "emojis", emoji)
+
+@emoji_info.autocomplete("emoji")
+async def emoji_info_autocomplete(interaction: discord.Interaction, current: str):
+    return await item_lookup.autocomplete_items(interaction, "emojis", current)
+
+def _get_user_sketches(interaction: discord.Interaction):
+    """Return (db_conn, user_sketches) from the bot, or (None, None) if per-user stats are unavailable."""
+    db_conn = getattr(interaction.client, "db_conn", None)
+    user_sketches = getattr(interaction.client, "user_sketches", None)
+    if not db_conn or user_sketches is None:
+        return None, None
+    return db_conn, user_sketches
+
+@emoji_group.command(name="users", description=config.COMMAND_DESCRIPTIONS.get("emoji_users", "Estimate distinct users of an emoji."))
+@permissions.is_emoji_police() # Apply permission check
+@app_commands.describe(emoji="The emoji to look up (paste it as you would in a message)")
+async def emoji_users(interaction: discord.Interaction, emoji: str):
+    """Estimates how many distinct members have used an emoji (HyperLogLog)."""
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+
+    db_conn, user_sketches = _get_user_sketches(interaction)
+    if not db_conn:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Per-user stats are unavailable."), ephemeral=True)
+        return
+
+    emoji = emoji.strip()
+    distinct, relative_error = user_sketches.distinct_users(db_conn, str(interaction.guild.id), "emojis", emoji)
+    if not distinct:
+        await interaction.response.send_message(embed=embed_utils.create_info_embed(f"No recorded users of {emoji} yet.", title="Emoji Users"), ephemeral=True)
+        return
+
+    await interaction.response.send_message(
+        embed=embed_utils.create_info_embed(
+            f"{emoji} has been used by about **{distinct:,}** distinct members (±{relative_error:.1%}).",
+            title="Emoji Users"
+        ),
+        ephemeral=True
+    )
+
+@emoji_group.command(name="usage", description=config.COMMAND_DESCRIPTIONS.get("emoji_usage", "Estimate a member's uses of an emoji."))
+@permissions.is_emoji_police() # Apply permission check
+@app_commands.describe(member="The member to look up", emoji="The emoji to look up (paste it as you would in a message)")
+async def emoji_usage(interaction: discord.Interaction, member: discord.Member, emoji: str):
+    """Estimates how often a member has used an emoji (Count-Min Sketch, never undercounts)."""
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+
+    db_conn, user_sketches = _get_user_sketches(interaction)
+    if not db_conn:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Per-user stats are unavailable."), ephemeral=True)
+        return
+
+    emoji = emoji.strip()
+    estimate, error_bound = user_sketches.user_count(db_conn, str(interaction.guild.id), "emojis", member.id, emoji)
+    await interaction.response.send_message(
+        embed=embed_utils.create_info_embed(
+            f"{member.mention} has used {emoji} about **{estimate:,}** times (may overcount by up to {error_bound:,}).",
+            title="Emoji Usage"
+        ),
+        ephemeral=True
+    )
+
+@emoji_group.command(name="top_users", description=config.COMMAND_DESCRIPTIONS.get("emoji_top_users", "Estimate who uses an emoji most."))
+@permissions.is_emoji_police() # Apply permission check
+@app_commands.describe(emoji="The emoji to look up (paste it as you would in a message)")
+async def emoji_top_users(interaction: discord.Interaction, emoji: str):
+    """Ranks the server's members by their estimated uses of an emoji."""
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+
+    db_conn, user_sketches = _get_user_sketches(interaction)
+    if not db_conn:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Per-user stats are unavailable."), ephemeral=True)
+        return
+
+    await interaction.response.defer(ephemeral=True)
+
+    emoji = emoji.strip()
+    # The sketch cannot enumerate users, so every cached (non-bot) member is scored as a candidate
+    candidates = [member.id for member in interaction.guild.members if not member.bot]
+    ranked, error_bound = user_sketches.top_users(db_conn, str(interaction.guild.id), "emojis", emoji, candidates, limit=10)
+    if not ranked:
+        await interaction.followup.send(embed=embed_utils.create_info_embed(f"No recorded users of {emoji} yet.", title="Top Users"), ephemeral=True)
+        return
+
+    lines = [f"`{rank}.` <@{user_id}> - **~{estimate:,}** uses" for rank, (user_id, estimate) in enumerate(ranked, start=1)]
+    embed = discord.Embed(
+        title=f"{config.EMOJI_MAP.get('leaderboard', '🏆')} Top Users of {emoji}",
+        description="\n".join(lines),
+        color=discord.Color.blurple()
+    )
+    embed.set_footer(text=f"Approximate counts; each may overcount by up to {error_bound:,}.")
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+@emoji_group.command(name="pairs", description=config.COMMAND_DESCRIPTIONS.get("emoji_pairs", "Show emojis most often used together."))
+@permissions.is_emoji_police() # Apply permission check
+@app_commands.describe(limit="How many pairs to show (1-25, default 10)")
+async def emoji_pairs(interaction: discord.Interaction, limit: app_commands.Range[int, 1, 25] = 10):
+    """Displays the emoji pairs that most often appear in the same message."""
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+
+    db_conn = getattr(interaction.client, "db_conn", None)
+    pair_tracker = getattr(interaction.client, "pair_tracker", None)
+    if not db_conn or pair_tracker is None:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Pair tracking is unavailable."), ephemeral=True)
+        return
+
+    pairs = pair_tracker.top_pairs(db_conn, str(interaction.guild.id), limit=limit)
+    if not pairs:
+        await interaction.response.send_message(embed=embed_utils.create_info_embed("No emoji pairs recorded yet.", title="Emoji Pairs"), ephemeral=True)
+        return
+
+    lines = []
+    for rank, ((emoji_a, emoji_b), count, error) in enumerate(pairs, start=1):
+        # Space-Saving counts can overestimate by `error`; show the guaranteed range when it matters
+        count_text = f"**{count:,}**" if not error else f"**{count - error:,}-{count:,}**"
+        lines.append(f"`{rank}.` {emoji_a} + {emoji_b} - {count_text} messages")
+    embed = discord.Embed(
+        title=f"{config.EMOJI_MAP.get('stats', '📊')} Emojis Used Together in {interaction.guild.name}",
+        description="\n".join(lines),
+        color=discord.Color.blurple()
+    )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@emoji_group.command(name="channels", description=config.COMMAND_DESCRIPTIONS.get("emoji_channels", "Show which channels use the most emojis."))
+@permissions.is_emoji_police() # Apply permission check
+@app_commands.describe(limit="How many channels to show (1-25, default 10)")
+async def emoji_channels(interaction: discord.Interaction, limit: app_commands.Range[int, 1, 25] = 10):
+    """Displays the channels with the most emoji usage and each channel's favourite emojis."""
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+
+    db_conn = getattr(interaction.client, "db_conn", None)
+    channel_tracker = getattr(interaction.client, "channel_tracker", None)
+    if not db_conn or channel_tracker is None:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Channel tracking is unavailable."), ephemeral=True)
+        return
+
+    channels = channel_tracker.top_channels(db_conn, str(interaction.guild.id), limit=limit)
+    if not channels:
+        await interaction.response.send_message(embed=embed_utils.create_info_embed("No channel usage recorded yet.", title="Emoji Channels"), ephemeral=True)
+        return
+
+    lines = []
+    for rank, channel in enumerate(channels, start=1):
+        favourites = ", ".join(f"{emoji} ×{count:,}" for emoji, count in channel["top_items"][:3])
+        lines.append(
+            f"`{rank}.` <#{channel['channel_id']}> - **{channel['total']:,}** emojis in {channel['messages']:,} messages"
+            + (f"\n    {favourites}" if favourites else "")
+        )
+    embed = discord.Embed(
+        title=f"{config.EMOJI_MAP.get('stats', '📊')} Emoji Usage by Channel in {interaction.guild.name}",
+        description="\n".join(lines),
+        color=discord.Color.blurple()
+    )
+    embed.set_footer(text="Per-channel favourites are approximate (top emojis per channel).")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+_WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+_SHADES = " ·░▒▓█"
+
+def _heatmap_text(grid):
+    """Render a 7 x 24 count grid as shaded text rows (darker = busier, relative to the busiest hour)."""
+    peak = int(grid.max())
+    levels = (grid * (len(_SHADES) - 1) + peak - 1) // peak if peak else grid * 0 # Ceiling: any use shows
+    lines = ["    0     6     12    18    "]
+    for day, row in zip(_WEEKDAYS, levels):
+        lines.append(f"{day} " + "".join(_SHADES[int(level)] for level in row))
+    return "\n".join(lines)
+
+@emoji_group.command(name="heatmap", description=config.COMMAND_DESCRIPTIONS.get("emoji_heatmap", "Show when emojis get used."))
+@permissions.is_emoji_police() # Apply permission check
+@app_commands.describe(
+    emoji="Only this emoji (start typing its name); default: all emojis",
+    utc_offset="Shift the hours to this UTC offset (-12 to 14, default 0)"
+)
+async def emoji_heatmap(interaction: discord.Interaction, emoji: str = None, utc_offset: app_commands.Range[int, -12, 14] = 0):
+    """Displays emoji usage by hour of the week, summed over all emojis or for a single one."""
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+
+    db_conn = getattr(interaction.client, "db_conn", None)
+    heatmap_tracker = getattr(interaction.client, "heatmap_tracker", None)
+    if not db_conn or heatmap_tracker is None:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Heatmaps are unavailable."), ephemeral=True)
+        return
+
+    guild_id = str(interaction.guild.id)
+    item_key = None
+    if emoji:
+        item_index = getattr(interaction.client, "item_index", None)
+        item_key = item_index.resolve(guild_id, "emojis", emoji) if item_index is not None else emoji.strip()
+    await interaction.response.defer(ephemeral=True)
+    # Unflushed deltas are read on the loop, which records them; the stored rows off it, on the read-only connection
+    pending = heatmap_tracker.pending(guild_id, "emojis", item_key)
+    reader = getattr(interaction.client, "read_conn", None) or db_conn
+    slots = await asyncio.to_thread(heatmap_tracker.stored, reader, guild_id, "emojis", item_key) + pending
+    total = int(slots.sum())
+    if not total:
+        message = f"No uses of {item_key} recorded yet." if item_key else "No emoji usage recorded yet."
+        await interaction.followup.send(embed=embed_utils.create_info_embed(message, title="Emoji Heatmap"), ephemeral=True)
+        return
+
+    grid = heatmap_utils.by_day(slots, utc_offset)
+    day, hour = divmod(int(grid.argmax()), 24)
+    offset = f"UTC{utc_offset:+d}" if utc_offset else "UTC"
+    embed = discord.Embed(
+        title=f"{config.EMOJI_MAP.get('stats', '📊')} {'Usage of ' + item_key if item_key else 'Emoji Usage'} by Hour in {interaction.guild.name}",
+        description=f"```\n{_heatmap_text(grid)}\n```",
+        color=discord.Color.blurple()
+    )
+    embed.add_field(name="Uses", value=f"{total:,}", inline=True)
+    embed.add_field(name="Busiest hour", value=f"{_WEEKDAYS[day]} {hour:02d}:00 ({int(grid[day, hour]):,} uses)", inline=True)
+    embed.add_field(name="Busiest day", value=_WEEKDAYS[int(grid.sum(axis=1).argmax())], inline=True)
+    embed.set_footer(text=f"Hours in {offset}. Shading is relative to the busiest hour; edits and deletes are not reflected.")
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+@emoji_heatmap.autocomplete("emoji")
+async def emoji_heatmap_autocomplete(interaction: discord.Interaction, current: str):
+    return await item_lookup.autocomplete_items(interaction, "emojis", current)
 
 # Function to register this group with the bot
 async def setup(bot: discord.ext.commands.Bot):
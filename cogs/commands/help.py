@@ -27,21 +27,44 @@ async def help_command(interaction: discord.Interaction):
         f"{config.EMOJI_MAP.get('emoji_section', '😀')} Emoji Stats": [
             ("`/emoji top [limit:1-25]`", config.COMMAND_DESCRIPTIONS.get("emoji_top", "Show most used emojis.")),
             ("`/emoji rare [limit:1-25]`", config.COMMAND_DESCRIPTIONS.get("emoji_rare", "Show least used emojis.")),
-            ("`/emoji history`", config.COMMAND_DESCRIPTIONS.get("emoji_history", "View full emoji usage history.")),
+            ("`/emoji history [include_archived]`", config.COMMAND_DESCRIPTIONS.get("emoji_history", "View full emoji usage history.")),
+            ("`/emoji info <emoji>`", config.COMMAND_DESCRIPTIONS.get("emoji_info", "Show one emoji's stats.")),
+            ("`/emoji users <emoji>`", config.COMMAND_DESCRIPTIONS.get("emoji_users", "Estimate distinct users of an emoji.")),
+            ("`/emoji usage <member> <emoji>`", config.COMMAND_DESCRIPTIONS.get("emoji_usage", "Estimate a member's uses of an emoji.")),
+            ("`/emoji top_users <emoji>`", config.COMMAND_DESCRIPTIONS.get("emoji_top_users", "Estimate who uses an emoji most.")),
+            ("`/emoji pairs [limit:1-25]`", config.COMMAND_DESCRIPTIONS.get("emoji_pairs", "Show emojis most often used together.")),
+            ("`/emoji channels [limit:1-25]`", config.COMMAND_DESCRIPTIONS.get("emoji_channels", "Show which channels use the most emojis.")),
+            ("`/emoji heatmap [emoji] [utc_offset]`", config.COMMAND_DESCRIPTIONS.get("emoji_heatmap", "Show when emojis get used.")),
+            ("`/emoji global [limit:1-25]`", config.COMMAND_DESCRIPTIONS.get("emoji_global", "Show most used emojis across all servers.")),
         ],
         f"{config.EMOJI_MAP.get('reaction_section', '👍')} Reaction Stats": [
             ("`/reaction top [limit:1-25]`", config.COMMAND_DESCRIPTIONS.get("reaction_top", "Show most used reactions.")),
             ("`/reaction rare [limit:1-25]`", config.COMMAND_DESCRIPTIONS.get("reaction_rare", "Show least used reactions.")),
-            ("`/reaction history`", config.COMMAND_DESCRIPTIONS.get("reaction_history", "View full reaction usage history.")),
+            ("`/reaction history [include_archived]`", config.COMMAND_DESCRIPTIONS.get("reaction_history", "View full reaction usage history.")),
+            ("`/reaction info <reaction>`", config.COMMAND_DESCRIPTIONS.get("reaction_info", "Show one reaction's stats.")),
         ],
         f"{config.EMOJI_MAP.get('sticker_section', '🧩')} Sticker Stats": [
             ("`/sticker top [limit:1-25]`", config.COMMAND_DESCRIPTIONS.get("sticker_top", "Show most used stickers.")),
             ("`/sticker rare [limit:1-25]`", config.COMMAND_DESCRIPTIONS.get("sticker_rare", "Show least used stickers.")),
-            ("`/sticker history`", config.COMMAND_DESCRIPTIONS.get("sticker_history", "View full sticker usage history.")),
+            ("`/sticker history [include_archived]`", config.COMMAND_DESCRIPTIONS.get("sticker_history", "View full sticker usage history.")),
+            ("`/sticker info <sticker>`", config.COMMAND_DESCRIPTIONS.get("sticker_info", "Show one sticker's stats.")),
+        ],
+        f"{config.EMOJI_MAP.get('stats', '📊')} Server Stats": [
+            ("`/stats overview`", config.COMMAND_DESCRIPTIONS.get("stats_overview", "Show usage totals for this server.")),
+            ("`/stats distribution [item_type]`", config.COMMAND_DESCRIPTIONS.get("stats_distribution", "Show how concentrated usage is.")),
+            ("`/stats chart <chart> [item_type] [limit] [utc_offset]`", config.COMMAND_DESCRIPTIONS.get("stats_chart", "Show usage as a chart image.")),
         ],
         f"{config.EMOJI_MAP.get('admin', '🛠️')} Admin Tools": [
             ("`/admin wipe_data`", config.COMMAND_DESCRIPTIONS.get("wipe_data", "[Admin] Wipe all tracked data.")),
             ("`/admin reset_data`", config.COMMAND_DESCRIPTIONS.get("reset_data", "[Admin] Reset all counts to zero.")),
+            ("`/admin backfill [channel] [restart]`", config.COMMAND_DESCRIPTIONS.get("backfill", "[Admin] Import past messages.")),
+            ("`/admin ingest_stats`", config.COMMAND_DESCRIPTIONS.get("ingest_stats", "[Admin] Show ingest worker stats.")),
+            ("`/admin dampening`", config.COMMAND_DESCRIPTIONS.get("dampening", "[Admin] Configure flood dampening.")),
+            ("`/admin approximate_counting`", config.COMMAND_DESCRIPTIONS.get("approximate_counting", "[Admin] Configure approximate counting.")),
+            ("`/admin retention [idle_days] [max_uses] [run_now]`", config.COMMAND_DESCRIPTIONS.get("retention", "[Admin] Configure item retention.")),
+            ("`/admin digest [channel] [enabled]`", config.COMMAND_DESCRIPTIONS.get("digest", "[Admin] Configure the weekly digest.")),
+            ("`/admin export [file_format] [compressed]`", config.COMMAND_DESCRIPTIONS.get("export", "[Admin] Export this server's stats.")),
+            ("`/admin cache_stats`", config.COMMAND_DESCRIPTIONS.get("cache_stats", "[Admin] Show fingerprint cache stats.")),
         ],
         f"{config.EMOJI_MAP.get('info', 'ℹ️')} General": [
             ("`/help`", config.COMMAND_DESCRIPTIONS.get("help", "Show this help message.")),
@@ -0,0 +1,97 @@
+import discord
+from discord import app_commands
+import asyncio
+import logging
+# Import from project
+from config import config
+from utils import db_utils
+from utils import embed_utils
+
+log = logging.getLogger(__name__)
+
+# --- Single Item Lookup ---
+# Shared by /emoji info, /reaction info and /sticker info: name autocomplete from the bot's in-memory
+# ItemIndex (utils/item_index.py) and the info embed (uses, rank, last use) from one database read.
+
+_LABELS = {"emojis": "Emoji", "reactions": "Reaction", "stickers": "Sticker"}
+
+def _reader(bot):
+    return getattr(bot, "read_conn", None) or getattr(bot, "db_conn", None)
+
+def _log_build_error(task):
+    if not task.cancelled() and task.exception() is not None:
+        log.error(f"Building the item index failed: {task.exception()}")
+
+async def autocomplete_items(interaction: discord.Interaction, table_type: str, current: str) -> list:
+    """Return up to 25 choices whose names start with `current`.
+
+    A guild's index is read from the database on first use. If that takes longer than
+    ITEM_INDEX_BUILD_SECONDS no choices are returned, so Discord's 3 second deadline is never missed;
+    the build carries on and the next keystroke is answered from memory.
+    """
+    bot = interaction.client
+    item_index = getattr(bot, "item_index", None)
+    conn = _reader(bot)
+    if not interaction.guild or item_index is None or not conn:
+        return []
+    guild_id = str(interaction.guild.id)
+    if not item_index.is_loaded(guild_id, table_type):
+        build = asyncio.ensure_future(asyncio.to_thread(
+            item_index.ensure, guild_id, table_type, lambda: db_utils.get_item_keys(conn, guild_id, table_type)
+        ))
+        await asyncio.wait({build}, timeout=config.ITEM_INDEX_BUILD_SECONDS)
+        if not build.done():
+            build.add_done_callback(_log_build_error)
+            return []
+        if build.exception() is not None:
+            log.error(f"Building the {table_type} index for guild {guild_id} failed: {build.exception()}")
+            return []
+    matches = item_index.search(guild_id, table_type, current) or []
+    return [app_commands.Choice(name=label[:100], value=key[:100]) for key, label in matches]
+
+def _info_embed(guild, table_type, info, count_error):
+    label = _LABELS[table_type]
+    display = (info["name"] or info["item_key"]) if table_type == "stickers" else info["item_key"]
+    embed = discord.Embed(
+        title=f"{config.EMOJI_MAP.get('info', 'ℹ️')} {label} Info",
+        description=f"**{display}**",
+        color=discord.Color.blurple()
+    )
+    count = info["count"] or 0
+    if count_error:
+        uses = f"~{count:,} (±{count * count_error:,.0f})"
+    else:
+        uses = f"{count:,}"
+    embed.add_field(name="Uses", value=uses, inline=True)
+    embed.add_field(name="Rank", value=f"#{info['rank']:,} of {info['ranked']:,}" if count > 0 else "Unranked", inline=True)
+    embed.add_field(name="Last used", value=embed_utils.format_time(info["last_used"]), inline=True)
+    embed.set_footer(text=f"{guild.name} - ties share a rank")
+    return embed
+
+async def send_item_info(interaction: discord.Interaction, table_type: str, item: str):
+    """Answer an info command: the item's uses, rank among the guild's items and last use."""
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    conn = _reader(interaction.client)
+    if not conn:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Database connection unavailable."), ephemeral=True)
+        return
+    guild_id = str(interaction.guild.id)
+    item_index = getattr(interaction.client, "item_index", None)
+    # Typed (not picked) text is matched against the names in the index
+    key = item_index.resolve(guild_id, table_type, item) if item_index is not None else item.strip()
+    try:
+        info = await asyncio.to_thread(db_utils.get_item_info, conn, guild_id, table_type, key)
+        count_error = db_utils.get_count_error(conn, guild_id)
+    except Exception as e:
+        log.error(f"Error fetching {table_type} info for guild {guild_id}: {e}")
+        await interaction.response.send_message(embed=embed_utils.create_error_embed(f"Failed to fetch {table_type[:-1]} data."), ephemeral=True)
+        return
+    if info is None:
+        await interaction.response.send_message(
+            embed=embed_utils.create_info_embed(f"No usage of {item.strip()} has been recorded here.", title=f"{_LABELS[table_type]} Info"),
+            ephemeral=True
+        )
+        return
+    await interaction.response.send_message(embed=_info_embed(interaction.guild, table_type, info, count_error), ephemeral=True)
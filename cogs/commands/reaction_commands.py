@@ -7,6 +7,7 @@ from config import config
 from utils import db_utils
 from utils import embed_utils
 from cogs.admin import permissions # Import permissions check
+from cogs.commands import item_lookup
 
 log = logging.getLogger(__name__)
 
@@ -30,7 +31,7 @@ async def reaction_top(interaction: discord.Interaction, limit: app_commands.Ran
     else:
         log.warning("Could not access bot.db_conn, creating temporary connection for reaction_top.")
         try:
-            db_conn = db_utils.get_db_connection(config.DATABASE_NAME)
+            db_conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
         except Exception as e:
             log.error(f"Failed to get DB connection for reaction_top: {e}")
             await interaction.followup.send(embed=embed_utils.create_error_embed("Database connection error."), ephemeral=True)
@@ -43,6 +44,7 @@ async def reaction_top(interaction: discord.Interaction, limit: app_commands.Ran
     guild_id = str(interaction.guild.id)
     try:
         top_reactions = db_utils.get_top_items(db_conn, guild_id, "reactions", limit=limit)
+        count_error = db_utils.get_count_error(db_conn, guild_id)
     except Exception as e:
         log.error(f"Error fetching top reactions for guild {guild_id}: {e}")
         await interaction.followup.send(embed=embed_utils.create_error_embed("Failed to fetch reaction data."), ephemeral=True)
@@ -60,13 +62,13 @@ async def reaction_top(interaction: discord.Interaction, limit: app_commands.Ran
         return
 
     title = f"{config.EMOJI_MAP.get('leaderboard', '🏆')} Top {limit} Reactions in {interaction.guild.name}"
-    await embed_utils.paginate_and_send(interaction, title, top_reactions, "reaction")
+    await embed_utils.paginate_and_send(interaction, title, top_reactions, "reaction", count_error=count_error)
 
 @reaction_group.command(name="rare", description=config.COMMAND_DESCRIPTIONS.get("reaction_rare", "Show least used reactions."))
 @permissions.is_emoji_police() # Apply permission check
 @app_commands.describe(limit="How many rare reactions to show (1-25, default 10)")
 async def reaction_rare(interaction: discord.Interaction, limit: app_commands.Range[int, 1, 25] = 10):
-    """Displays the N least used reactions in the server (must have been used at least once)."""
+    """Displays the N least used reactions in the server, led by the server's custom emojis nobody has used yet."""
     if not interaction.guild:
         await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
         return
@@ -79,7 +81,7 @@ async def reaction_rare(interaction: discord.Interaction, limit: app_commands.Ra
     else:
         log.warning("Could not access bot.db_conn, creating temporary connection for reaction_rare.")
         try:
-            db_conn = db_utils.get_db_connection(config.DATABASE_NAME)
+            db_conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
         except Exception as e:
             log.error(f"Failed to get DB connection for reaction_rare: {e}")
             await interaction.followup.send(embed=embed_utils.create_error_embed("Database connection error."), ephemeral=True)
@@ -91,7 +93,11 @@ async def reaction_rare(interaction: discord.Interaction, limit: app_commands.Ra
 
     guild_id = str(interaction.guild.id)
     try:
-        rare_reactions = db_utils.get_rare_items(db_conn, guild_id, "reactions", limit=limit)
+        inventory = getattr(interaction.client, "item_inventory", None)
+        rare_reactions = db_utils.get_rare_items(
+            db_conn, guild_id, "reactions", limit=limit, inventory=inventory.get(guild_id, "reactions") if inventory is not None else None
+        )
+        count_error = db_utils.get_count_error(db_conn, guild_id)
     except Exception as e:
         log.error(f"Error fetching rare reactions for guild {guild_id}: {e}")
         await interaction.followup.send(embed=embed_utils.create_error_embed("Failed to fetch reaction data."), ephemeral=True)
@@ -105,15 +111,16 @@ async def reaction_rare(interaction: discord.Interaction, limit: app_commands.Ra
         db_utils.close_db_connection(db_conn)
 
     if not rare_reactions:
-        await interaction.followup.send(embed=embed_utils.create_info_embed("No reaction usage data found yet (or none with count > 0).", title="Rare Reactions"), ephemeral=True)
+        await interaction.followup.send(embed=embed_utils.create_info_embed("No reaction usage data found yet.", title="Rare Reactions"), ephemeral=True)
         return
 
     title = f"{config.EMOJI_MAP.get('rare', '💀')} Rarest {limit} Reactions in {interaction.guild.name}"
-    await embed_utils.paginate_and_send(interaction, title, rare_reactions, "reaction")
+    await embed_utils.paginate_and_send(interaction, title, rare_reactions, "reaction", count_error=count_error)
 
 @reaction_group.command(name="history", description=config.COMMAND_DESCRIPTIONS.get("reaction_history", "View full reaction usage history."))
 @permissions.is_emoji_police() # Apply permission check
-async def reaction_history(interaction: discord.Interaction):
+@app_commands.describe(include_archived="Also include reactions retired to the archive by the retention policy")
+async def reaction_history(interaction: discord.Interaction, include_archived: bool = False):
     """Displays the full history of reaction usage, paginated."""
     if not interaction.guild:
         await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
@@ -127,7 +134,7 @@ async def reaction_history(interaction: discord.Interaction):
     else:
         log.warning("Could not access bot.db_conn, creating temporary connection for reaction_history.")
         try:
-            db_conn = db_utils.get_db_connection(config.DATABASE_NAME)
+            db_conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
         except Exception as e:
             log.error(f"Failed to get DB connection for reaction_history: {e}")
             await interaction.followup.send(embed=embed_utils.create_error_embed("Database connection error."), ephemeral=True)
@@ -140,7 +147,8 @@ async def reaction_history(interaction: discord.Interaction):
     guild_id = str(interaction.guild.id)
     try:
         # Fetch all items, ordered by count descending
-        all_reactions = db_utils.get_all_items(db_conn, guild_id, "reactions")
+        all_reactions = db_utils.get_all_items(db_conn, guild_id, "reactions", include_archived=include_archived)
+        count_error = db_utils.get_count_error(db_conn, guild_id)
     except Exception as e:
         log.error(f"Error fetching reaction history for guild {guild_id}: {e}")
         await interaction.followup.send(embed=embed_utils.create_error_embed("Failed to fetch reaction data."), ephemeral=True)
@@ -158,7 +166,18 @@ async def reaction_history(interaction: discord.Interaction):
         return
 
     title = f"{config.EMOJI_MAP.get('history', '📜')} Reaction Usage History in {interaction.guild.name}"
-    await embed_utils.paginate_and_send(interaction, title, all_reactions, "reaction")
+    await embed_utils.paginate_and_send(interaction, title, all_reactions, "reaction", count_error=count_error)
+
+@reaction_group.command(name="info", description=config.COMMAND_DESCRIPTIONS.get("reaction_info", "Show one reaction's stats."))
+@permissions.is_emoji_police() # Apply permission check
+@app_commands.describe(reaction="The reaction to look up (start typing its name, or paste it)")
+async def reaction_info(interaction: discord.Interaction, reaction: str):
+    """Shows one reaction's uses, rank and last use; the name autocompletes from an in-memory index."""
+    await item_lookup.send_item_info(interaction, "reactions", reaction)
+
+@reaction_info.autocomplete("reaction")
+async def reaction_info_autocomplete(interaction: discord.Interaction, current: str):
+    return await item_lookup.autocomplete_items(interaction, "reactions", current)
 
 # Function to register this group with the bot
 async def setup(bot: discord.ext.commands.Bot):
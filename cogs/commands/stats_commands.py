@@ -0,0 +1,297 @@
+import discord
+from discord import app_commands
+import io
+import asyncio
+import logging
+# Import from project
+from config import config
+from utils import db_utils
+from utils import embed_utils
+from utils import distribution
+from utils.result_cache import GenerationCache
+from cogs.admin import permissions # Import permissions check
+
+log = logging.getLogger(__name__)
+
+# Define a stats command group
+stats_group = app_commands.Group(name="stats", description="Server-wide usage statistics.")
+
+_TYPE_LABELS = (
+    ("emojis", "emoji_section", "😀", "Emojis"),
+    ("reactions", "reaction_section", "👍", "Reactions"),
+    ("stickers", "sticker_section", "🧩", "Stickers"),
+)
+
+def _overview_embed(guild, overview):
+    """Build the overview embed from one get_guild_overview snapshot."""
+    summary, top = overview["summary"], overview["top"]
+    approximate = "~" if overview["count_base"] else ""
+    embed = discord.Embed(
+        title=f"{config.EMOJI_MAP.get('stats', '📊')} Usage Overview for {guild.name}",
+        color=discord.Color.blurple()
+    )
+    for table_type, emoji_key, default_emoji, label in _TYPE_LABELS:
+        name = f"{config.EMOJI_MAP.get(emoji_key, default_emoji)} {label}"
+        row = summary.get(table_type)
+        if row is None or not row["total_uses"]:
+            embed.add_field(name=name, value="Nothing tracked yet.", inline=True)
+            continue
+        lines = [
+            f"**{approximate}{row['total_uses']:,}** uses",
+            f"{row['distinct_items']:,} distinct",
+            f"Since {embed_utils.format_time(row['first_seen'])}",
+            f"Last used {embed_utils.format_time(row['last_activity'])}",
+        ]
+        if top.get(table_type):
+            lines.append("")
+            lines.extend(
+                f"`{rank}.` {item['name']} - {approximate}{item['count']:,}"
+                for rank, item in enumerate(top[table_type], start=1)
+            )
+        embed.add_field(name=name, value="\n".join(lines)[:1024], inline=True)
+    if overview["count_base"]:
+        embed.set_footer(text="Totals are estimates (approximate counting is enabled).")
+    return embed
+
+@stats_group.command(name="overview", description=config.COMMAND_DESCRIPTIONS.get("stats_overview", "Show usage totals for this server."))
+@permissions.is_emoji_police() # Apply permission check
+async def stats_overview(interaction: discord.Interaction):
+    """Shows totals, tracking start, last activity and the top items for every item type.
+
+    Everything comes from one snapshot read (db_utils.get_guild_overview) on the read-only connection.
+    Snapshots are cached per guild and write generation, so a cached overview is answered right away;
+    only a fresh read defers the response.
+    """
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    bot = interaction.client
+    db_conn = getattr(bot, "db_conn", None)
+    if not db_conn:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Database connection unavailable."), ephemeral=True)
+        return
+    guild_id = str(interaction.guild.id)
+    cache = getattr(bot, "stats_cache", None)
+    key = ("overview", guild_id)
+
+    overview = None
+    if cache is not None:
+        overview = cache.get(key, generation_of=lambda: db_utils.get_write_generation(db_conn, guild_id))
+    if overview is None:
+        await interaction.response.defer(ephemeral=True)
+        reader = getattr(bot, "read_conn", None) or db_conn
+        try:
+            overview = await asyncio.to_thread(db_utils.get_guild_overview, reader, guild_id, config.STATS_OVERVIEW_TOP_ITEMS)
+        except Exception as e:
+            log.error(f"Error reading overview for guild {guild_id}: {e}")
+            overview = None
+        if overview is None:
+            await interaction.followup.send(embed=embed_utils.create_error_embed("Failed to fetch usage data."), ephemeral=True)
+            return
+        if cache is not None:
+            cache.put(key, overview["generation"], overview)
+
+    if not any(row["total_uses"] for row in overview["summary"].values()):
+        embed = embed_utils.create_info_embed("No usage data found yet.", title="Overview")
+    else:
+        embed = _overview_embed(interaction.guild, overview)
+    if interaction.response.is_done():
+        await interaction.followup.send(embed=embed, ephemeral=True)
+    else:
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+def _distribution_embed(guild, table_type, stats, approximate):
+    """Build the concentration embed from one distribution.describe() result."""
+    label = next(label for type_name, _, _, label in _TYPE_LABELS if type_name == table_type)
+    prefix = "~" if approximate else ""
+    embed = discord.Embed(
+        title=f"{config.EMOJI_MAP.get('stats', '📊')} {label[:-1]} Usage Distribution in {guild.name}",
+        description=(
+            f"**{stats['items']:,}** {label.lower()} used **{prefix}{stats['total']:,}** times "
+            f"({prefix}{stats['mean']:,.1f} per item on average)."
+        ),
+        color=discord.Color.blurple()
+    )
+    embed.add_field(name="Gini coefficient", value=f"**{stats['gini']:.3f}**\n0 = even, 1 = one item takes all", inline=True)
+    embed.add_field(
+        name="Top 1% share",
+        value=f"**{stats['top_share']:.1%}** of uses\nfrom the top {max(1, -(-stats['items'] // 100)):,} item(s)",
+        inline=True
+    )
+    embed.add_field(name="Long tail share", value=f"**{stats['long_tail_share']:.1%}** of uses\nfrom items outside the top 20%", inline=True)
+    embed.add_field(
+        name="Percentiles (uses per item)",
+        value="\n".join(f"p{percentile}: {prefix}{value:,.0f}" for percentile, value in stats["percentiles"].items()),
+        inline=True
+    )
+    embed.add_field(name="Half of all uses", value=f"come from the top **{stats['items_for_half']:,}** item(s)", inline=True)
+    if approximate:
+        embed.set_footer(text="Counts are estimates (approximate counting is enabled).")
+    return embed
+
+@stats_group.command(name="distribution", description=config.COMMAND_DESCRIPTIONS.get("stats_distribution", "Show how concentrated usage is."))
+@permissions.is_emoji_police() # Apply permission check
+@app_commands.describe(item_type="Which counts to analyse (default: emojis)")
+@app_commands.choices(item_type=[
+    app_commands.Choice(name="Emojis", value="emojis"),
+    app_commands.Choice(name="Reactions", value="reactions"),
+    app_commands.Choice(name="Stickers", value="stickers"),
+])
+async def stats_distribution(interaction: discord.Interaction, item_type: app_commands.Choice[str] = None):
+    """Shows the Gini coefficient, percentiles, top 1% share and long-tail share of the server's usage.
+
+    The counts are loaded into a NumPy array in one query and the statistics computed vectorized
+    (utils/distribution.py); results are cached per guild, type and write generation.
+    """
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    bot = interaction.client
+    db_conn = getattr(bot, "db_conn", None)
+    if not db_conn:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Database connection unavailable."), ephemeral=True)
+        return
+    guild_id = str(interaction.guild.id)
+    table_type = item_type.value if item_type else "emojis"
+    cache = getattr(bot, "stats_cache", None)
+    key = ("distribution", guild_id, table_type)
+
+    result = None
+    if cache is not None:
+        result = cache.get(key, generation_of=lambda: db_utils.get_write_generation(db_conn, guild_id))
+    if result is None:
+        await interaction.response.defer(ephemeral=True)
+        reader = getattr(bot, "read_conn", None) or db_conn
+        try:
+            # The generation is read first: a write landing in between only makes the entry expire early
+            generation = db_utils.get_write_generation(reader, guild_id)
+            stats = await asyncio.to_thread(distribution.usage_distribution, reader, guild_id, table_type)
+            result = (stats, db_utils.get_count_base(reader, guild_id) is not None)
+        except Exception as e:
+            log.error(f"Error computing the {table_type} distribution for guild {guild_id}: {e}")
+            await interaction.followup.send(embed=embed_utils.create_error_embed("Failed to fetch usage data."), ephemeral=True)
+            return
+        if cache is not None:
+            cache.put(key, generation, result)
+
+    stats, approximate = result
+    if stats is None:
+        embed = embed_utils.create_info_embed(f"No {table_type[:-1]} usage data found yet.", title="Usage Distribution")
+    else:
+        embed = _distribution_embed(interaction.guild, table_type, stats, approximate)
+    if interaction.response.is_done():
+        await interaction.followup.send(embed=embed, ephemeral=True)
+    else:
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+def _stored_series(conn, heatmap_tracker, guild_id, table_type, keys):
+    """Stored heatmaps of several items, read in one go (blocking; run it in a thread)."""
+    return [heatmap_tracker.stored(conn, guild_id, table_type, key) for key in keys]
+
+async def _load_chart_data(bot, guild, kind, table_type, limit, utc_offset):
+    """Plain-value input of a chart (see utils/charts.py), or None if there is nothing to draw."""
+    guild_id = str(guild.id)
+    label = next(label for type_name, _, _, label in _TYPE_LABELS if type_name == table_type)
+    heatmap_tracker = getattr(bot, "heatmap_tracker", None)
+    reader = getattr(bot, "read_conn", None) or bot.db_conn
+    # Like /emoji heatmap: unflushed heatmap deltas are taken on the loop, stored rows are read in a thread
+    if kind == "heatmap":
+        if heatmap_tracker is None:
+            return None
+        pending = heatmap_tracker.pending(guild_id, table_type)
+        slots = await asyncio.to_thread(heatmap_tracker.stored, reader, guild_id, table_type) + pending
+        if not slots.sum():
+            return None
+        return {"title": f"{label} Usage by Hour in {guild.name}", "utc_offset": utc_offset, "slots": slots.tolist()}
+
+    rows = await asyncio.to_thread(db_utils.get_top_items, reader, guild_id, table_type, limit)
+    if table_type == "stickers":
+        items = [(str(row["sticker_id"]), row["name"], row["count"]) for row in rows]
+    else:
+        items = [(row["name"], None, row["count"]) for row in rows]
+    if not items:
+        return None
+    if kind == "leaderboard":
+        return {"title": f"Top {label} in {guild.name}", "table_type": table_type, "items": items, "glyph_dir": config.CHART_GLYPH_DIR}
+    if heatmap_tracker is None:
+        return None
+    items = items[:config.CHART_TREND_MAX_SERIES]
+    pending = [heatmap_tracker.pending(guild_id, table_type, key) for key, _, _ in items]
+    stored = await asyncio.to_thread(_stored_series, reader, heatmap_tracker, guild_id, table_type, [key for key, _, _ in items])
+    series = [(key, name, (slots + extra).tolist()) for (key, name, _), slots, extra in zip(items, stored, pending)]
+    return {"title": f"Hourly Use of the Top {label} in {guild.name}", "table_type": table_type, "utc_offset": utc_offset, "series": series}
+
+@stats_group.command(name="chart", description=config.COMMAND_DESCRIPTIONS.get("stats_chart", "Show usage as a chart image."))
+@permissions.is_emoji_police() # Apply permission check
+@app_commands.describe(
+    chart="Leaderboard (top items), trend (hourly use of the top items) or heatmap (use by weekday and hour)",
+    item_type="Which counts to chart (default: emojis)",
+    limit="Items to include (3-25, default 10; the trend draws at most 8)",
+    utc_offset="Shift the hours of trend and heatmap charts to this UTC offset (-12 to 14, default 0)"
+)
+@app_commands.choices(
+    chart=[
+        app_commands.Choice(name="Leaderboard", value="leaderboard"),
+        app_commands.Choice(name="Trend", value="trend"),
+        app_commands.Choice(name="Heatmap", value="heatmap"),
+    ],
+    item_type=[
+        app_commands.Choice(name="Emojis", value="emojis"),
+        app_commands.Choice(name="Reactions", value="reactions"),
+        app_commands.Choice(name="Stickers", value="stickers"),
+    ]
+)
+async def stats_chart(interaction: discord.Interaction, chart: app_commands.Choice[str], item_type: app_commands.Choice[str] = None,
+                      limit: app_commands.Range[int, 3, 25] = 10, utc_offset: app_commands.Range[int, -12, 14] = 0):
+    """Attaches a PNG chart of the server's usage.
+
+    Charts are drawn in bot.chart_renderer's process pool (utils/chart_renderer.py), never on the event loop,
+    and stored per guild, chart, parameters and write generation, so repeating a request before the guild
+    writes again returns the stored image.
+    """
+    if not interaction.guild:
+        await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
+        return
+    bot = interaction.client
+    db_conn = getattr(bot, "db_conn", None)
+    renderer = getattr(bot, "chart_renderer", None)
+    if not db_conn or renderer is None:
+        await interaction.response.send_message(embed=embed_utils.create_error_embed("Charts are unavailable."), ephemeral=True)
+        return
+    guild_id = str(interaction.guild.id)
+    kind = chart.value
+    table_type = item_type.value if item_type else "emojis"
+    # Normalize the parameters a chart ignores so they do not split its cache entries
+    params = (table_type, 0 if kind == "heatmap" else limit, 0 if kind == "leaderboard" else utc_offset)
+    # The generation is read first: a write landing in between only makes the entry expire early
+    key = (guild_id, kind, params, db_utils.get_write_generation(db_conn, guild_id))
+
+    await interaction.response.defer(ephemeral=True)
+    try:
+        png = await renderer.cached(key)
+        if png is None:
+            data = await _load_chart_data(bot, interaction.guild, kind, table_type, limit, utc_offset)
+            if data is None:
+                await interaction.followup.send(embed=embed_utils.create_info_embed(f"No {table_type[:-1]} usage data found yet.", title="Chart"), ephemeral=True)
+                return
+            png = await renderer.render(key, kind, data)
+    except asyncio.TimeoutError:
+        await interaction.followup.send(embed=embed_utils.create_error_embed("Rendering the chart took too long, please try again."), ephemeral=True)
+        return
+    except Exception as e:
+        log.error(f"Error charting {kind} ({table_type}) for guild {guild_id}: {e}")
+        await interaction.followup.send(embed=embed_utils.create_error_embed("Failed to render the chart."), ephemeral=True)
+        return
+
+    embed = discord.Embed(title=f"{config.EMOJI_MAP.get('stats', '📊')} {chart.name}: {table_type.capitalize()}", color=discord.Color.blurple())
+    embed.set_image(url="attachment://chart.png")
+    if kind != "leaderboard":
+        embed.set_footer(text=f"Hours in {f'UTC{utc_offset:+d}' if utc_offset else 'UTC'}. Edits and deletes are not reflected.")
+    await interaction.followup.send(embed=embed, file=discord.File(io.BytesIO(png), filename="chart.png"), ephemeral=True)
+
+# Function to register this group with the bot
+async def setup(bot: discord.ext.commands.Bot):
+    # Shared by every /stats view that derives results from the counts
+    bot.stats_cache = GenerationCache(max_entries=config.STATS_CACHE_MAX_ENTRIES, max_age=config.STATS_CACHE_SECONDS)
+    bot.tree.add_command(stats_group)
+    log.info("Stats command group added to bot tree.")
@@ -7,6 +7,7 @@ from config import config
 from utils import db_utils
 from utils import embed_utils
 from cogs.admin import permissions # Import permissions check
+from cogs.commands import item_lookup
 
 log = logging.getLogger(__name__)
 
@@ -30,7 +31,7 @@ async def sticker_top(interaction: discord.Interaction, limit: app_commands.Rang
     else:
         log.warning("Could not access bot.db_conn, creating temporary connection for sticker_top.")
         try:
-            db_conn = db_utils.get_db_connection(config.DATABASE_NAME)
+            db_conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
         except Exception as e:
             log.error(f"Failed to get DB connection for sticker_top: {e}")
             await interaction.followup.send(embed=embed_utils.create_error_embed("Database connection error."), ephemeral=True)
@@ -43,6 +44,7 @@ async def sticker_top(interaction: discord.Interaction, limit: app_commands.Rang
     guild_id = str(interaction.guild.id)
     try:
         top_stickers = db_utils.get_top_items(db_conn, guild_id, "stickers", limit=limit)
+        count_error = db_utils.get_count_error(db_conn, guild_id)
     except Exception as e:
         log.error(f"Error fetching top stickers for guild {guild_id}: {e}")
         await interaction.followup.send(embed=embed_utils.create_error_embed("Failed to fetch sticker data."), ephemeral=True)
@@ -63,13 +65,13 @@ async def sticker_top(interaction: discord.Interaction, limit: app_commands.Rang
     # Note: embed_utils expects name and count. get_items for stickers returns name, sticker_id, count.
     # We need to adjust how data is passed or how embed_utils handles it if sticker_id is needed.
     # For now, assuming embed_utils only uses name and count.
-    await embed_utils.paginate_and_send(interaction, title, top_stickers, "sticker")
+    await embed_utils.paginate_and_send(interaction, title, top_stickers, "sticker", count_error=count_error)
 
 @sticker_group.command(name="rare", description=config.COMMAND_DESCRIPTIONS.get("sticker_rare", "Show least used stickers."))
 @permissions.is_emoji_police() # Apply permission check
 @app_commands.describe(limit="How many rare stickers to show (1-25, default 10)")
 async def sticker_rare(interaction: discord.Interaction, limit: app_commands.Range[int, 1, 25] = 10):
-    """Displays the N least used stickers in the server (must have been used at least once)."""
+    """Displays the N least used stickers in the server, led by the server's stickers nobody has used yet."""
     if not interaction.guild:
         await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
         return
@@ -82,7 +84,7 @@ async def sticker_rare(interaction: discord.Interaction, limit: app_commands.Ran
     else:
         log.warning("Could not access bot.db_conn, creating temporary connection for sticker_rare.")
         try:
-            db_conn = db_utils.get_db_connection(config.DATABASE_NAME)
+            db_conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
         except Exception as e:
             log.error(f"Failed to get DB connection for sticker_rare: {e}")
             await interaction.followup.send(embed=embed_utils.create_error_embed("Database connection error."), ephemeral=True)
@@ -94,7 +96,11 @@ async def sticker_rare(interaction: discord.Interaction, limit: app_commands.Ran
 
     guild_id = str(interaction.guild.id)
     try:
-        rare_stickers = db_utils.get_rare_items(db_conn, guild_id, "stickers", limit=limit)
+        inventory = getattr(interaction.client, "item_inventory", None)
+        rare_stickers = db_utils.get_rare_items(
+            db_conn, guild_id, "stickers", limit=limit, inventory=inventory.get(guild_id, "stickers") if inventory is not None else None
+        )
+        count_error = db_utils.get_count_error(db_conn, guild_id)
     except Exception as e:
         log.error(f"Error fetching rare stickers for guild {guild_id}: {e}")
         await interaction.followup.send(embed=embed_utils.create_error_embed("Failed to fetch sticker data."), ephemeral=True)
@@ -108,15 +114,16 @@ async def sticker_rare(interaction: discord.Interaction, limit: app_commands.Ran
         db_utils.close_db_connection(db_conn)
 
     if not rare_stickers:
-        await interaction.followup.send(embed=embed_utils.create_info_embed("No sticker usage data found yet (or none with count > 0).", title="Rare Stickers"), ephemeral=True)
+        await interaction.followup.send(embed=embed_utils.create_info_embed("No sticker usage data found yet.", title="Rare Stickers"), ephemeral=True)
         return
 
     title = f"{config.EMOJI_MAP.get('rare', '💀')} Rarest {limit} Stickers in {interaction.guild.name}"
-    await embed_utils.paginate_and_send(interaction, title, rare_stickers, "sticker")
+    await embed_utils.paginate_and_send(interaction, title, rare_stickers, "sticker", count_error=count_error)
 
 @sticker_group.command(name="history", description=config.COMMAND_DESCRIPTIONS.get("sticker_history", "View full sticker usage history."))
 @permissions.is_emoji_police() # Apply permission check
-async def sticker_history(interaction: discord.Interaction):
+@app_commands.describe(include_archived="Also include stickers retired to the archive by the retention policy")
+async def sticker_history(interaction: discord.Interaction, include_archived: bool = False):
     """Displays the full history of sticker usage, paginated."""
     if not interaction.guild:
         await interaction.response.send_message("This command can only be used in a server.", ephemeral=True)
@@ -130,7 +137,7 @@ async def sticker_history(interaction: discord.Interaction):
     else:
         log.warning("Could not access bot.db_conn, creating temporary connection for sticker_history.")
         try:
-            db_conn = db_utils.get_db_connection(config.DATABASE_NAME)
+            db_conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
         except Exception as e:
             log.error(f"Failed to get DB connection for sticker_history: {e}")
             await interaction.followup.send(embed=embed_utils.create_error_embed("Database connection error."), ephemeral=True)
@@ -143,7 +150,8 @@ async def sticker_history(interaction: discord.Interaction):
     guild_id = str(interaction.guild.id)
     try:
         # Fetch all items, ordered by count descending
-        all_stickers = db_utils.get_all_items(db_conn, guild_id, "stickers")
+        all_stickers = db_utils.get_all_items(db_conn, guild_id, "stickers", include_archived=include_archived)
+        count_error = db_utils.get_count_error(db_conn, guild_id)
     except Exception as e:
         log.error(f"Error fetching sticker history for guild {guild_id}: {e}")
         await interaction.followup.send(embed=embed_utils.create_error_embed("Failed to fetch sticker data."), ephemeral=True)
@@ -161,7 +169,18 @@ async def sticker_history(interaction: discord.Interaction):
         return
 
     title = f"{config.EMOJI_MAP.get('history', '📜')} Sticker Usage History in {interaction.guild.name}"
-    await embed_utils.paginate_and_send(interaction, title, all_stickers, "sticker")
+    await embed_utils.paginate_and_send(interaction, title, all_stickers, "sticker", count_error=count_error)
+
+@sticker_group.command(name="info", description=config.COMMAND_DESCRIPTIONS.get("sticker_info", "Show one sticker's stats."))
+@permissions.is_emoji_police() # Apply permission check
+@app_commands.describe(sticker="The sticker to look up (start typing its name)")
+async def sticker_info(interaction: discord.Interaction, sticker: str):
+    """Shows one sticker's uses, rank and last use; the name autocompletes from an in-memory index."""
+    await item_lookup.send_item_info(interaction, "stickers", sticker)
+
+@sticker_info.autocomplete("sticker")
+async def sticker_info_autocomplete(interaction: discord.Interaction, current: str):
+    return await item_lookup.autocomplete_items(interaction, "stickers", current)
 
 # Function to register this group with the bot
 async def setup(bot: discord.ext.commands.Bot):
@@ -0,0 +1,179 @@
+import time
+import asyncio
+import discord
+import discord.ext.commands as commands
+from discord.ext import tasks
+import logging
+# Import from project
+from config import config
+from utils import db_utils
+from utils import digest
+
+log = logging.getLogger(__name__)
+
+# --- Weekly Digests ---
+# Every DIGEST_CHECK_MINUTES the loop looks up which opted-in guilds have reached their slot (utils/digest.py
+# spreads the slots over the period by guild id), reads each digest in one query on the read-only connection
+# and posts it, at most DIGEST_MAX_CONCURRENT_SENDS at a time. Before sending, the period is stored as
+# pending; the send is confirmed together with the new baseline (db_utils.record_digest_sent). A guild still
+# pending after a restart is only posted again if the channel does not already show that digest.
+
+PERIOD_SECONDS = config.DIGEST_PERIOD_HOURS * 3600
+
+def _setting_int(value, default=None):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def due_guilds(conn, present_guild_ids, now=None):
+    """Return (guild_id, channel_id, period, resuming) for every opted-in guild present whose digest is due.
+
+    `resuming` is set when the period was marked pending but never confirmed. Blocking; run it in a thread.
+    """
+    now = time.time() if now is None else now
+    channels = db_utils.get_guilds_with_setting(conn, db_utils.DIGEST_CHANNEL_SETTING)
+    if not channels:
+        return []
+    sent = db_utils.get_guilds_with_setting(conn, db_utils.DIGEST_SENT_SETTING)
+    pending = db_utils.get_guilds_with_setting(conn, db_utils.DIGEST_PENDING_SETTING)
+    due = []
+    for guild_id, channel_id in channels.items():
+        channel_id = _setting_int(channel_id)
+        if guild_id not in present_guild_ids or channel_id is None:
+            continue
+        period = digest.due_period(guild_id, now, PERIOD_SECONDS)
+        if _setting_int(sent.get(guild_id), -1) >= period:
+            continue
+        due.append((guild_id, channel_id, period, _setting_int(pending.get(guild_id)) == period))
+    return due
+
+def _item_text(table_type, item_key, name):
+    return (name or item_key) if table_type == "stickers" else item_key
+
+def digest_embed(guild, summary, period):
+    """Build the digest embed from one digest.build_digest() result."""
+    days = config.DIGEST_PERIOD_HOURS / 24
+    since = "since tracking started" if summary["first"] else f"in the last {days:g} days"
+    embed = discord.Embed(
+        title=f"{config.EMOJI_MAP.get('stats', '📊')} Usage Digest for {guild.name}",
+        description=f"The most used items {since}.",
+        color=discord.Color.blurple()
+    )
+    for table_type in db_utils.GUILD_TABLE_TYPES:
+        movers = summary["movers"].get(table_type)
+        if movers:
+            embed.add_field(
+                name=f"Top {table_type}",
+                value="\n".join(f"{_item_text(table_type, key, name)} **+{gained:,}** ({count:,} total)" for key, name, count, gained in movers),
+                inline=True
+            )
+    new = summary["new"].get("emojis")
+    if new:
+        embed.add_field(name="First used", value="\n".join(f"{key} ({count:,})" for key, _, count in new), inline=True)
+    if summary["unused"]:
+        more = summary["unused_total"] - len(summary["unused"])
+        embed.add_field(
+            name=f"Never used ({summary['unused_total']:,})",
+            value=" ".join(summary["unused"]) + (f" and {more:,} more" if more > 0 else ""),
+            inline=False
+        )
+    if not embed.fields:
+        embed.description = f"No emoji, reaction or sticker was used {since}."
+    embed.set_footer(text=digest.marker(period))
+    return embed
+
+async def _already_posted(channel, bot_user, period):
+    """Whether the channel's recent messages contain this digest from the bot (a send cut short by a restart)."""
+    text = digest.marker(period)
+    try:
+        async for message in channel.history(limit=config.DIGEST_HISTORY_CHECK):
+            if message.author.id == bot_user.id and any(embed.footer and embed.footer.text == text for embed in message.embeds):
+                return True
+    except discord.HTTPException as e:
+        log.warning(f"Could not check channel {channel.id} for digest #{period}: {e}")
+    return False
+
+async def send_digest(bot, write, guild_id, channel_id, period, resuming=False):
+    """Compute and post one guild's digest; returns True once the period is recorded as done.
+
+    `write(func, *args)` runs a db_utils writer on the job's connection.
+    """
+    async with bot.digest_sends:
+        guild = bot.get_guild(int(guild_id))
+        channel = guild.get_channel(channel_id) if guild else None
+        if channel is None:
+            log.warning(f"Digest channel {channel_id} of guild {guild_id} is gone; skipping digest #{period}.")
+            return await write(db_utils.record_digest_sent, guild_id, period)
+        if resuming and await _already_posted(channel, bot.user, period):
+            log.info(f"Digest #{period} of guild {guild_id} was posted before the restart; confirming it.")
+            return await write(db_utils.record_digest_sent, guild_id, period)
+
+        inventory = getattr(bot, "item_inventory", None)
+        emojis = (inventory.get(guild_id, "emojis") if inventory is not None else None) or {}
+        reader = getattr(bot, "read_conn", None) or bot.db_conn
+        rows = await asyncio.to_thread(db_utils.get_digest_rows, reader, guild_id, list(emojis))
+        if rows is None:
+            return False # Retried at the next check
+        embed = digest_embed(guild, digest.build_digest(rows, config.DIGEST_TOP_ITEMS), period)
+
+        marked = await write(db_utils.set_guild_settings, guild_id, {db_utils.DIGEST_PENDING_SETTING: period})
+        if not marked:
+            return False
+        try:
+            await channel.send(embed=embed)
+        except discord.Forbidden:
+            log.warning(f"Missing permission to post digest #{period} in channel {channel_id} of guild {guild_id}; skipping it.")
+        except discord.HTTPException as e:
+            log.warning(f"Posting digest #{period} of guild {guild_id} failed, retrying at the next check: {e}")
+            return False
+        return await write(db_utils.record_digest_sent, guild_id, period)
+
+async def run_due_digests(bot, now=None):
+    """Send every digest that is due; returns how many were completed."""
+    reader = getattr(bot, "read_conn", None) or bot.db_conn
+    due = await asyncio.to_thread(due_guilds, reader, {str(guild.id) for guild in bot.guilds}, now)
+    if not due:
+        return 0
+    # Baseline copies are whole-table INSERT ... SELECTs: like the retention job, use a connection of our own
+    writer = await asyncio.to_thread(db_utils.open_database, config.DATABASE_NAME, config.DATABASE_SHARDS)
+    write_lock = asyncio.Lock() # One transaction at a time on the shared connection
+
+    async def write(func, *args):
+        async with write_lock:
+            return await asyncio.to_thread(func, writer, *args)
+
+    try:
+        results = await asyncio.gather(
+            *(send_digest(bot, write, guild_id, channel_id, period, resuming) for guild_id, channel_id, period, resuming in due),
+            return_exceptions=True
+        )
+    finally:
+        await asyncio.to_thread(db_utils.close_db_connection, writer)
+    for (guild_id, _, period, _), result in zip(due, results):
+        if isinstance(result, Exception):
+            log.error(f"Digest #{period} of guild {guild_id} failed: {result}", exc_info=result)
+    return sum(1 for result in results if result is True)
+
+async def setup(bot: commands.Bot):
+    """Starts the digest scheduler loop."""
+    bot.digest_sends = asyncio.Semaphore(config.DIGEST_MAX_CONCURRENT_SENDS)
+
+    @tasks.loop(minutes=config.DIGEST_CHECK_MINUTES)
+    async def periodic_digests():
+        if not getattr(bot, "db_conn", None):
+            return
+        try:
+            sent = await run_due_digests(bot)
+            if sent:
+                log.info(f"Posted {sent} digest(s).")
+        except Exception as e:
+            log.error(f"Digest run failed: {e}", exc_info=True)
+
+    @periodic_digests.before_loop
+    async def before_periodic_digests():
+        await bot.wait_until_ready()
+
+    periodic_digests.start()
+    bot.periodic_digests = periodic_digests
+    log.info("Digest task started.")
@@ -0,0 +1,133 @@
+import asyncio
+import discord.ext.commands as commands
+from discord.ext import tasks
+import logging
+# Import from project
+from config import config
+from utils.count_batch import CountBatch
+
+log = logging.getLogger(__name__)
+
+# --- Periodic Flushes ---
+# In-memory aggregates (per-user sketches, co-occurring pairs, heatmaps) are written back to the database on a timer
+# rather than on every event, and once more at shutdown.
+
+def flush_all(bot, ship=True):
+    """Write every in-memory aggregate attached to the bot to the database (and ship counts, unless `ship` is False)."""
+    if ship:
+        ship_counts(bot)
+    db_conn = getattr(bot, "db_conn", None)
+    if not db_conn:
+        return
+    for store in _stores(bot):
+        store.flush(db_conn)
+
+def ship_counts(bot):
+    """Cluster mode: send pending count deltas to the shared writer (kept for retry if it is unreachable)."""
+    counter_store = getattr(bot, "counter_store", None)
+    count_batch = getattr(bot, "count_batch", None)
+    if counter_store is None or count_batch is None:
+        return True
+    return counter_store.ship(count_batch)
+
+def _ship_lock(bot):
+    lock = getattr(bot, "ship_lock", None)
+    if lock is None:
+        lock = bot.ship_lock = asyncio.Lock()
+    return lock
+
+async def ship_counts_async(bot):
+    """ship_counts for the event loop: the deltas are taken out of the batch on the loop and sent from a thread.
+
+    A failed send folds them back into the batch. Sends and settle_guild take turns on bot.ship_lock.
+    """
+    counter_store = getattr(bot, "counter_store", None)
+    count_batch = getattr(bot, "count_batch", None)
+    if counter_store is None or count_batch is None:
+        return True
+    async with _ship_lock(bot):
+        if not count_batch:
+            return True
+        outgoing = CountBatch()
+        outgoing.merge(count_batch)
+        count_batch.clear()
+        if await asyncio.to_thread(counter_store.ship, outgoing):
+            return True
+        count_batch.merge(outgoing) # Kept for the next attempt
+        return False
+
+async def settle_guild(bot, guild_id):
+    """Cluster mode: drop a guild's unshipped deltas and wait until the writer committed everything already sent.
+
+    Await it before rewriting a guild's stored counts, so no in-flight delta lands after the rewrite. The
+    discards run on the event loop, which owns the batch and the ingest queue; only the wait is in a thread.
+    """
+    async with _ship_lock(bot):
+        count_batch = getattr(bot, "count_batch", None)
+        if count_batch is not None:
+            count_batch.discard_guild(guild_id)
+        ingest_queue = getattr(bot, "ingest_queue", None)
+        if ingest_queue is not None:
+            ingest_queue.discard_guild(guild_id)
+        counter_store = getattr(bot, "counter_store", None)
+        if counter_store is not None:
+            await asyncio.to_thread(counter_store.sync)
+
+def forget_guild(bot, guild_id, include_workers=True):
+    """Drop a guild's unsaved in-memory aggregates (after its stored data was wiped or reset).
+
+    Pass include_workers=False when the rewrite went through IngestWorkerPool.rewrite_guild, which already
+    dropped the worker's state and may hold newer events since.
+    """
+    for store in _stores(bot):
+        store.forget_guild(guild_id)
+    count_batch = getattr(bot, "count_batch", None)
+    if count_batch is not None:
+        count_batch.discard_guild(guild_id)
+    ingest_pool = getattr(bot, "ingest_pool", None)
+    if ingest_pool is not None and include_workers:
+        ingest_pool.forget_guild(guild_id) # Workers hold the live state in process ingest mode
+    item_index = getattr(bot, "item_index", None)
+    if item_index is not None:
+        item_index.forget_guild(guild_id)
+    stats_cache = getattr(bot, "stats_cache", None)
+    if stats_cache is not None:
+        guild_id = str(guild_id)
+        stats_cache.forget(lambda key: key[1] == guild_id) # ("overview", guild_id) and ("distribution", guild_id, type)
+
+def _stores(bot):
+    """Yield every in-memory aggregate store attached to the bot."""
+    for attribute in ("user_sketches", "pair_tracker", "channel_tracker", "heatmap_tracker"):
+        store = getattr(bot, attribute, None)
+        if store is not None:
+            yield store
+
+async def setup(bot: commands.Bot):
+    """Starts the periodic flush loop."""
+    @tasks.loop(seconds=config.PERIODIC_FLUSH_SECONDS)
+    async def periodic_flush():
+        try:
+            await ship_counts_async(bot)
+            flush_all(bot, ship=False)
+        except Exception as e:
+            log.error(f"Periodic flush failed: {e}", exc_info=True)
+
+    @periodic_flush.before_loop
+    async def before_periodic_flush():
+        await bot.wait_until_ready()
+
+    periodic_flush.start()
+    bot.periodic_flush = periodic_flush
+    log.info("Periodic flush task started.")
+
+    if getattr(bot, "counter_store", None) is not None:
+        @tasks.loop(seconds=config.COUNTER_STORE_FLUSH_SECONDS)
+        async def periodic_ship():
+            try:
+                await ship_counts_async(bot)
+            except Exception as e:
+                log.error(f"Shipping counts to the counter store failed: {e}", exc_info=True)
+
+        periodic_ship.start()
+        bot.periodic_ship = periodic_ship
+        log.info("Counter store ship task started.")
@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta
+import discord.ext.commands as commands
+from discord.ext import tasks
+import logging
+# Import from project
+from config import config
+from utils import db_utils
+from utils import guild_archive
+from cogs.events import flush_tasks
+
+log = logging.getLogger(__name__)
+
+# --- Departed Guilds ---
+# on_guild_remove only records the departure. Every GUILD_ARCHIVE_CHECK_HOURS, guilds gone for longer than
+# GUILD_ARCHIVE_GRACE_DAYS are moved into the archive file (utils/guild_archive.py) and their live tables
+# dropped; the job uses a connection of its own, like the retention job. A guild that comes back is restored
+# (or, within the grace period, simply unmarked) before its tables are ensured, also in a thread on a
+# connection of its own.
+
+def mark_departed(bot, guild_id):
+    """Record that the bot left a guild; its data is archived once the grace period has passed."""
+    db_conn = getattr(bot, "db_conn", None)
+    if not db_conn:
+        return False
+    return db_utils.set_guild_settings(db_conn, guild_id, {db_utils.GUILD_DEPARTED_SETTING: datetime.utcnow().isoformat()})
+
+def restore_returning(guild_ids):
+    """Unmark or restore the given guilds if they had departed; returns {guild_id: rows restored}.
+
+    Blocking (it decompresses and bulk-inserts archived payloads); run it in a thread.
+    """
+    guild_ids = {str(guild_id) for guild_id in guild_ids}
+    conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
+    restored = {}
+    try:
+        departed = set(db_utils.get_guilds_with_setting(conn, db_utils.GUILD_DEPARTED_SETTING)) & guild_ids
+        archived = set(db_utils.get_guilds_with_setting(conn, db_utils.GUILD_ARCHIVED_SETTING)) & guild_ids
+        for guild_id in departed - archived:
+            db_utils.set_guild_settings(conn, guild_id, {db_utils.GUILD_DEPARTED_SETTING: None})
+            log.info(f"Guild {guild_id} returned within the grace period; keeping its data live.")
+        if archived:
+            archive_conn = guild_archive.open_archive(config.GUILD_ARCHIVE_DATABASE)
+            try:
+                for guild_id in archived:
+                    restored[guild_id] = guild_archive.restore_guild(conn, archive_conn, guild_id)
+            finally:
+                archive_conn.close()
+    finally:
+        db_utils.close_db_connection(conn)
+    return restored
+
+def archive_departed(present_guild_ids, now=None):
+    """Archive every guild that departed more than the grace period ago and is not in `present_guild_ids`.
+
+    Blocking; run it in a thread. Returns the archive entries written.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=config.GUILD_ARCHIVE_GRACE_DAYS)
+    conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
+    archive_conn = guild_archive.open_archive(config.GUILD_ARCHIVE_DATABASE)
+    entries = []
+    try:
+        for guild_id, departed_at in db_utils.get_guilds_with_setting(conn, db_utils.GUILD_DEPARTED_SETTING).items():
+            if guild_id in present_guild_ids:
+                continue
+            try:
+                if datetime.fromisoformat(departed_at) > cutoff:
+                    continue
+            except ValueError:
+                log.warning(f"Ignoring unreadable departure time of guild {guild_id}: {departed_at!r}")
+                continue
+            entry = guild_archive.archive_guild(conn, archive_conn, guild_id, now=now)
+            if entry is not None:
+                entries.append(entry)
+    finally:
+        archive_conn.close()
+        db_utils.close_db_connection(conn)
+    return entries
+
+async def setup(bot: commands.Bot):
+    """Starts the periodic departed-guild archive loop."""
+    @tasks.loop(hours=config.GUILD_ARCHIVE_CHECK_HOURS)
+    async def periodic_guild_archive():
+        try:
+            present = {str(guild.id) for guild in bot.guilds}
+            entries = await asyncio.to_thread(archive_departed, present)
+            for entry in entries:
+                flush_tasks.forget_guild(bot, entry["guild_id"]) # Nothing cached may recreate the dropped rows
+        except Exception as e:
+            log.error(f"Departed guild archive run failed: {e}", exc_info=True)
+
+    @periodic_guild_archive.before_loop
+    async def before_periodic_guild_archive():
+        await bot.wait_until_ready()
+
+    periodic_guild_archive.start()
+    bot.periodic_guild_archive = periodic_guild_archive
+    log.info("Departed guild archive task started.")
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import discord.ext.commands as commands
+# Import from project
+from config import config
+from utils import ingest
+from utils.ingest_queue import IngestQueue
+
+log = logging.getLogger(__name__)
+
+# --- Ingest Dispatch ---
+# Event handlers build event tuples (utils/ingest.py) and call dispatch(). Depending on the mode they go to
+# the ingest worker processes, to the bounded in-process queue (drained by the consumer task below), or are
+# applied right away if neither is set up.
+
+def dispatch(bot, event):
+    """Hand one ingest event to the worker processes, the bounded queue, or apply it immediately."""
+    item_index = getattr(bot, "item_index", None)
+    if item_index is not None:
+        item_index.note_event(event) # Every ingest mode passes through here, unlike the write itself
+    ingest_pool = getattr(bot, "ingest_pool", None)
+    if ingest_pool is not None:
+        ingest_pool.submit(event)
+        return
+    ingest_queue = getattr(bot, "ingest_queue", None)
+    if ingest_queue is not None:
+        ingest_queue.offer(event, getattr(bot, "db_conn", None))
+        return
+    db_conn = getattr(bot, "db_conn", None)
+    if db_conn:
+        _apply(bot, db_conn, event, getattr(bot, "count_batch", None))
+
+def _apply(bot, db_conn, event, batch):
+    ingest.apply_event(
+        db_conn,
+        event,
+        batch,
+        cache=getattr(bot, "fingerprint_cache", None),
+        user_sketches=getattr(bot, "user_sketches", None),
+        pair_tracker=getattr(bot, "pair_tracker", None),
+        dampener=getattr(bot, "dampener", None),
+        channel_tracker=getattr(bot, "channel_tracker", None),
+        heatmap_tracker=getattr(bot, "heatmap_tracker", None),
+    )
+
+def reload_guild_settings(bot, guild_id):
+    """Make the ingest path pick up changed guild settings (in order with the events already dispatched)."""
+    dispatch(bot, ingest.settings_event(guild_id))
+
+def _apply_chunk(bot, ingest_queue, events):
+    """Apply a chunk of queued events and commit them (plus any merged overflow) in one transaction."""
+    db_conn = bot.db_conn
+    for event in events:
+        try:
+            _apply(bot, db_conn, event, ingest_queue.pending)
+        except Exception as e:
+            log.error(f"Failed to ingest {event[0]} event for guild {event[2]}: {e}", exc_info=True)
+    count_batch = getattr(bot, "count_batch", None)
+    if count_batch is not None:
+        # Cluster mode: the shard group's batch is shipped to the shared writer by flush_tasks
+        count_batch.merge(ingest_queue.pending)
+        ingest_queue.pending.clear()
+        return True
+    return ingest_queue.pending.flush(db_conn) # Kept for the next chunk if the commit fails
+
+def drain(bot):
+    """Apply everything still queued (at shutdown)."""
+    ingest_queue = getattr(bot, "ingest_queue", None)
+    if ingest_queue is None or not getattr(bot, "db_conn", None):
+        return
+    while len(ingest_queue) or ingest_queue.pending:
+        events = ingest_queue.pop_chunk(config.INGEST_QUEUE_CHUNK_EVENTS)
+        if not _apply_chunk(bot, ingest_queue, events):
+            log.error(f"Could not commit {len(ingest_queue.pending)} pending increments at shutdown.")
+            return
+
+async def _consume(bot, ingest_queue):
+    await bot.wait_until_ready()
+    while True:
+        events = await ingest_queue.next_chunk(config.INGEST_QUEUE_CHUNK_EVENTS)
+        if not events and not ingest_queue.pending:
+            continue
+        if not getattr(bot, "db_conn", None):
+            log.error(f"Database connection unavailable; dropping {len(events)} queued ingest events.")
+            for event in events:
+                ingest_queue.dropped[event[0]] += 1
+            await asyncio.sleep(1)
+            continue
+        oldest = [events[0][1]] if events else [] # FIFO: the first event is the oldest
+        overflow_oldest = ingest_queue.take_overflow_oldest()
+        if overflow_oldest is not None:
+            oldest.append(overflow_oldest)
+        committed = _apply_chunk(bot, ingest_queue, events)
+        ingest_queue.record_commit(len(events), min(oldest) if committed and oldest else None)
+        await asyncio.sleep(0 if committed else 1) # Let command handlers run between chunks; back off on errors
+
+async def setup(bot: commands.Bot):
+    """Creates the bounded ingest queue and starts its consumer (inline ingest mode only)."""
+    if getattr(bot, "ingest_pool", None) is not None:
+        log.info("Ingest worker processes active; in-process ingest queue not started.")
+        return
+    bot.ingest_queue = IngestQueue(
+        max_events=config.INGEST_QUEUE_MAX_EVENTS,
+        policy=config.INGEST_OVERLOAD_POLICY,
+        sample_every=config.INGEST_SAMPLE_EVERY,
+        dampener=getattr(bot, "dampener", None),
+        cache=getattr(bot, "fingerprint_cache", None),
+    )
+    bot.ingest_consumer = asyncio.create_task(_consume(bot, bot.ingest_queue))
+    log.info(f"Ingest queue started (max {config.INGEST_QUEUE_MAX_EVENTS} events, overload policy: {config.INGEST_OVERLOAD_POLICY}).")
@@ -0,0 +1,90 @@
+import os
+import asyncio
+import discord
+import discord.ext.commands as commands
+import logging
+# Import from project
+from config import config
+from utils.inventory import GuildInventory
+
+log = logging.getLogger(__name__)
+
+# --- Guild Inventory Sync ---
+# Keeps bot.item_inventory (utils/inventory.py) equal to the guilds' current custom emojis and stickers:
+# loaded for every guild when the bot is ready or joins, replaced on every emoji/sticker update event.
+# The same events prefetch the images of new custom emojis into CHART_GLYPH_DIR for the chart renderer,
+# which only reads local files; /stats chart never downloads anything itself.
+
+_fetching = set() # Emoji ids being downloaded
+_tasks = set() # Running prefetches
+
+def _write_glyph(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path) # A chart worker never reads a partial image
+
+async def prefetch_glyphs(emojis):
+    """Download the images of static custom emojis that have no glyph in CHART_GLYPH_DIR yet.
+
+    An emoji's image never changes, so each is fetched at most once. Animated emojis are GIFs and keep
+    their text label.
+    """
+    glyph_dir = config.CHART_GLYPH_DIR
+    if not glyph_dir or not config.CHART_CACHE_CUSTOM_GLYPHS:
+        return
+    for emoji in emojis:
+        path = os.path.join(glyph_dir, "custom", f"{emoji.id}.png")
+        if emoji.animated or emoji.id in _fetching or os.path.isfile(path):
+            continue
+        _fetching.add(emoji.id)
+        try:
+            data = await emoji.read()
+            await asyncio.to_thread(_write_glyph, path, data)
+        except (discord.HTTPException, OSError) as e:
+            log.warning(f"Could not cache the glyph of emoji {emoji.id}: {e}")
+        finally:
+            _fetching.discard(emoji.id)
+
+def _start_prefetch(bot, emojis):
+    emojis = list(emojis)
+    if emojis and config.CHART_GLYPH_DIR and config.CHART_CACHE_CUSTOM_GLYPHS:
+        task = asyncio.create_task(prefetch_glyphs(emojis))
+        _tasks.add(task) # Keep a reference until it finishes
+        task.add_done_callback(_tasks.discard)
+
+def load_guild(bot, guild: discord.Guild):
+    inventory = getattr(bot, "item_inventory", None)
+    if inventory is None:
+        return
+    inventory.set_emojis(guild.id, [(emoji.id, emoji.name, emoji.animated) for emoji in guild.emojis])
+    inventory.set_stickers(guild.id, [(sticker.id, sticker.name) for sticker in guild.stickers])
+
+async def setup(bot: commands.Bot):
+    """Creates the inventory and registers the listeners that keep it in sync."""
+    bot.item_inventory = GuildInventory()
+
+    async def on_ready():
+        for guild in bot.guilds:
+            load_guild(bot, guild)
+        _start_prefetch(bot, [emoji for guild in bot.guilds for emoji in guild.emojis])
+        log.info(f"Loaded the emoji/sticker inventory of {len(bot.guilds)} guild(s).")
+
+    async def on_guild_join(guild: discord.Guild):
+        load_guild(bot, guild)
+        _start_prefetch(bot, guild.emojis)
+
+    async def on_guild_remove(guild: discord.Guild):
+        bot.item_inventory.forget_guild(guild.id)
+
+    async def on_guild_emojis_update(guild: discord.Guild, before, after):
+        bot.item_inventory.set_emojis(guild.id, [(emoji.id, emoji.name, emoji.animated) for emoji in after])
+        _start_prefetch(bot, after)
+
+    async def on_guild_stickers_update(guild: discord.Guild, before, after):
+        bot.item_inventory.set_stickers(guild.id, [(sticker.id, sticker.name) for sticker in after])
+
+    for listener in (on_ready, on_guild_join, on_guild_remove, on_guild_emojis_update, on_guild_stickers_update):
+        bot.add_listener(listener) # Listeners, not bot.event: my_bot.py handles ready/join/remove itself
+    log.info("Guild inventory listeners registered.")
@@ -0,0 +1,82 @@
+import discord
+import discord.ext.commands as commands
+import logging
+# Import from project
+from utils import ingest
+from cogs.events import ingest_dispatch
+
+log = logging.getLogger(__name__)
+
+# --- Raw Edit/Delete Reconciliation ---
+# Raw events fire even for messages that are no longer in discord.py's message cache.
+# Counts are reconciled against the fingerprint recorded by on_message; when that has been
+# evicted we fall back to the cached message (if any), otherwise the event is ignored. An edit
+# re-fingerprints the message with the sticker ids of the payload, so a later delete still
+# removes its stickers.
+
+def _can_handle(bot, guild_id):
+    """Return False if the event can't be handled (DM, or no database connection)."""
+    if not guild_id:
+        return False # DMs are not tracked
+    if not getattr(bot, "db_conn", None):
+        log.error(f"Database connection not found on bot instance for message reconciliation in guild {guild_id}")
+        return False
+    return True
+
+def _cached_counted(message):
+    """Return the cached message if it is one on_message would have counted, else None."""
+    if message is None or message.author.bot:
+        return None
+    return message
+
+def _dispatch_delete(bot, guild_id, message_id, cached):
+    cached = _cached_counted(cached)
+    old_content = cached.content if cached else None
+    old_sticker_ids = [sticker.id for sticker in cached.stickers] if cached else ()
+    ingest_dispatch.dispatch(bot, ingest.delete_event(guild_id, message_id, old_content, old_sticker_ids))
+
+async def handle_raw_message_edit(bot, payload: discord.RawMessageUpdateEvent):
+    if not _can_handle(bot, payload.guild_id):
+        return
+
+    new_content = payload.data.get("content")
+    if new_content is None:
+        return # Edit did not touch the content (e.g. embed resolution)
+
+    cached = _cached_counted(payload.cached_message)
+    old_content = cached.content if cached else None
+    # Stickers cannot be edited: the update payload still lists the message's stickers
+    if cached:
+        sticker_ids = [sticker.id for sticker in cached.stickers]
+    else:
+        sticker_ids = [item["id"] for item in payload.data.get("sticker_items") or ()]
+    ingest_dispatch.dispatch(bot, ingest.edit_event(payload.guild_id, payload.message_id, new_content, old_content, sticker_ids))
+
+async def handle_raw_message_delete(bot, payload: discord.RawMessageDeleteEvent):
+    if not _can_handle(bot, payload.guild_id):
+        return
+    _dispatch_delete(bot, payload.guild_id, payload.message_id, payload.cached_message)
+
+async def handle_raw_bulk_message_delete(bot, payload: discord.RawBulkMessageDeleteEvent):
+    if not _can_handle(bot, payload.guild_id):
+        return
+
+    cached_by_id = {message.id: message for message in payload.cached_messages}
+    for message_id in payload.message_ids:
+        _dispatch_delete(bot, payload.guild_id, message_id, cached_by_id.get(message_id))
+
+async def setup(bot: commands.Bot):
+    """Registers the raw message edit/delete listeners."""
+    async def on_raw_message_edit(payload: discord.RawMessageUpdateEvent):
+        await handle_raw_message_edit(bot, payload)
+
+    async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+        await handle_raw_message_delete(bot, payload)
+
+    async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+        await handle_raw_bulk_message_delete(bot, payload)
+
+    bot.add_listener(on_raw_message_edit)
+    bot.add_listener(on_raw_message_delete)
+    bot.add_listener(on_raw_bulk_message_delete)
+    log.info("Message edit/delete event handlers registered.")
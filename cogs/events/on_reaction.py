@@ -1,18 +1,17 @@
 import discord
 import discord.ext.commands as commands
-import sqlite3
 import logging
 # Import from project
-from utils import db_utils
-from config import config
+from utils import ingest
+from cogs.events import ingest_dispatch
 
 log = logging.getLogger(__name__)
 
 # Define the on_reaction_add event listener
 async def on_reaction_add(reaction: discord.Reaction, user: discord.User | discord.Member):
     log.info("in reaction")
-    # Ignore reactions added by the bot itself
-    if user == user.bot:
+    # Ignore reactions added by bots (including this one)
+    if user.bot:
         return
 
     # Ignore reactions in DMs if the bot is guild-focused
@@ -42,7 +41,7 @@ async def on_reaction_add(reaction: discord.Reaction, user: discord.User | disco
     if emoji_identifier:
         log.debug(f"Found reaction: {emoji_identifier} added by {user} in guild {guild_id}")
         # Update the count in the reactions table
-        db_utils.update_count(db_conn, guild_id, "reactions", emoji_identifier)
+        ingest_dispatch.dispatch(bot, ingest.reaction_event(guild_id, user.id, emoji_identifier))
     else:
         log.error("no emoji identifier")
 
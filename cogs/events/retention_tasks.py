@@ -0,0 +1,55 @@
+import asyncio
+import discord.ext.commands as commands
+from discord.ext import tasks
+import logging
+# Import from project
+from config import config
+from utils import db_utils
+
+log = logging.getLogger(__name__)
+
+# --- Retention ---
+# Every RETENTION_CHECK_HOURS the stale items of guilds with a retention policy are moved to the cold archive
+# (db_utils.archive_stale_items). The job opens a connection of its own, so its transaction never interleaves
+# with statements the event loop runs on bot.db_conn; SQLite's write lock orders it against the writers.
+
+def apply_retention(guild_ids=None, now=None):
+    """Apply every guild's retention policy (only those in `guild_ids`, if given).
+
+    Blocking; run it in a thread. Returns {guild_id: {table_type: items archived}}.
+    """
+    conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
+    results = {}
+    try:
+        policies = db_utils.get_guilds_with_setting(conn, db_utils.RETENTION_DAYS_SETTING)
+        for guild_id, days in policies.items():
+            if guild_ids is not None and guild_id not in guild_ids:
+                continue
+            max_uses = db_utils.get_guild_settings(conn, guild_id).get(db_utils.RETENTION_MAX_USES_SETTING)
+            archived = db_utils.archive_stale_items(conn, guild_id, float(days), int(max_uses) if max_uses else None, now=now)
+            if archived is None:
+                log.warning(f"Retention run failed for guild {guild_id}")
+                continue
+            results[guild_id] = archived
+            if any(archived.values()):
+                log.info(f"Archived stale items of guild {guild_id}: {archived}")
+    finally:
+        db_utils.close_db_connection(conn)
+    return results
+
+async def setup(bot: commands.Bot):
+    """Starts the periodic retention loop."""
+    @tasks.loop(hours=config.RETENTION_CHECK_HOURS)
+    async def periodic_retention():
+        try:
+            await asyncio.to_thread(apply_retention)
+        except Exception as e:
+            log.error(f"Retention run failed: {e}", exc_info=True)
+
+    @periodic_retention.before_loop
+    async def before_periodic_retention():
+        await bot.wait_until_ready()
+
+    periodic_retention.start()
+    bot.periodic_retention = periodic_retention
+    log.info("Retention task started.")
@@ -3,6 +3,9 @@ import discord
 # --- Bot Settings ---
 BOT_PREFIX = "!" # Or None if only using slash commands
 DATABASE_NAME = "emoji_stats.db"
+# Split guilds across N database files by guild-ID hash (1 = everything in DATABASE_NAME).
+# Change it with `python rebalance_shards.py --to N`, which moves the data, not by editing this alone.
+DATABASE_SHARDS = 1
 
 # --- Role Names (Case-sensitive) ---
 # Used for permission checks. Ensure these match the roles in the target Discord server.
@@ -42,14 +45,35 @@ COMMAND_DESCRIPTIONS = {
     "emoji_history": "View full emoji usage history (paginated).",
     "emoji_top": "Show the most used emojis (default 10).",
     "emoji_rare": "Show the least used emojis (default 10).",
+    "emoji_users": "Estimate how many distinct members have used an emoji.",
+    "emoji_usage": "Estimate how often a member has used an emoji.",
+    "emoji_top_users": "Estimate which members use an emoji the most.",
+    "emoji_pairs": "Show the emojis most often used together.",
+    "emoji_channels": "Show which channels use the most emojis.",
+    "emoji_heatmap": "Show when emojis get used, by hour of the week.",
+    "emoji_global": "Show the most used emojis across all servers (default 10).",
+    "emoji_info": "Show one emoji's uses, last use and rank.",
+    "stats_overview": "Show totals, activity and the top emojis, reactions and stickers for this server.",
+    "stats_distribution": "Show how concentrated usage is: Gini coefficient, percentiles, top 1% and long-tail share.",
+    "stats_chart": "Show a leaderboard, trend or heatmap chart as an image.",
     "reaction_history": "View full reaction usage history (paginated).",
     "reaction_top": "Show the most used reactions (default 10).",
     "reaction_rare": "Show the least used reactions (default 10).",
+    "reaction_info": "Show one reaction's uses, last use and rank.",
     "sticker_history": "View full sticker usage history (paginated).",
     "sticker_top": "Show the most used stickers (default 10).",
     "sticker_rare": "Show the least used stickers (default 10).",
+    "sticker_info": "Show one sticker's uses, last use and rank.",
     "wipe_data": "[Admin] Permanently delete ALL tracked data for this server.",
     "reset_data": "[Admin] Reset all usage counts to zero (keeps items tracked).",
+    "backfill": "[Admin] Import past message history into the stats (resumable).",
+    "ingest_stats": "[Admin] Show ingest queue depth, drops and lag.",
+    "dampening": "[Admin] Show or change per-user flood dampening for this server.",
+    "approximate_counting": "[Admin] Switch this server between exact and approximate (Morris) counting.",
+    "retention": "[Admin] Show or change how long rarely used items stay in the live tables.",
+    "digest": "[Admin] Show or change the weekly usage digest posted to a channel.",
+    "export": "[Admin] Download this server's stats as CSV, JSON Lines or Parquet files.",
+    "cache_stats": "[Admin] Show message fingerprint cache size and hit rate.",
     "help": "List all available commands and their functions.",
 }
 
@@ -73,3 +97,120 @@ TEST_MODE_GUILD_NAMES = { # Optional: Map IDs to names for clearer logs
 # --- Pagination Settings ---
 PAGINATION_DEFAULT_LIMIT = 10 # Items per page
 
+
+# --- Message Fingerprint Cache (edit/delete reconciliation) ---
+# Bounded LRU of per-message emoji fingerprints; whichever limit is hit first triggers eviction.
+FINGERPRINT_CACHE_MAX_ENTRIES = 50000
+FINGERPRINT_CACHE_MAX_BYTES = 8 * 1024 * 1024 # ~8MB
+
+# --- History Backfill ---
+BACKFILL_MAX_CONCURRENCY = 4 # Channels read in parallel
+BACKFILL_BATCH_SIZE = 5000 # Messages per write transaction / checkpoint
+
+# --- Periodic Flushes ---
+PERIODIC_FLUSH_SECONDS = 60 # How often in-memory aggregates are written to the database
+
+# --- Per-User Usage Sketches ---
+# Count-Min Sketch: estimates exceed the true count by at most EPSILON * (guild total) with probability 1 - DELTA.
+USER_SKETCH_EPSILON = 0.001
+USER_SKETCH_DELTA = 0.01
+# HyperLogLog precision p: 2**p one-byte registers per item, relative error ~1.04 / sqrt(2**p).
+USER_SKETCH_HLL_PRECISION = 10
+USER_SKETCH_MAX_BYTES = 32 * 1024 * 1024 # In-memory budget for loaded sketches
+
+# --- Emoji Co-occurrence Pairs ---
+PAIR_TRACKER_CAPACITY = 500 # Pairs kept per guild (Space-Saving summary size; bounds memory per guild)
+PAIR_MAX_EMOJIS_PER_MESSAGE = 10 # Only the first N unique emojis of a message form pairs
+
+# --- Per-Channel Usage ---
+CHANNEL_TOP_ITEMS = 20 # Emojis kept per channel (exact counts trimmed to the top K at each flush and stored in the channel's row; trimmed emojis that come back are lower bounds)
+CHANNEL_MAX_CACHED = 20000 # Channel summaries kept in memory (least recently used written out and evicted)
+
+# --- Hour-of-Week Heatmaps ---
+HEATMAP_MAX_PENDING = 50000 # Items with unflushed heatmap increments before an early flush
+
+# --- Ingest Mode ---
+# "inline": events are scanned and written on the bot's event loop.
+# "process": on_message/edits/deletes/reactions are handed to worker processes (see utils/ingest_workers.py),
+#            which scan and batch the writes; slash commands read what the workers flushed.
+INGEST_MODE = "inline"
+INGEST_WORKERS = 2
+INGEST_BATCH_MAX_MESSAGES = 500 # Events per write transaction in a worker
+INGEST_BATCH_MAX_SECONDS = 1.0 # Max time an event waits before its batch is committed
+
+# --- Inline Ingest Queue (backpressure) ---
+# In inline mode events go through a bounded queue drained by a background task, one transaction per chunk.
+INGEST_QUEUE_MAX_EVENTS = 10000 # Queue capacity before the overload policy kicks in
+INGEST_QUEUE_CHUNK_EVENTS = 500 # Events applied per transaction before yielding to command handlers
+# "merge": keep counting overflowing messages/reactions but skip per-message state (edit tracking, user stats, pairs)
+# "sample": count 1 in INGEST_SAMPLE_EVERY overflowing events, weighted by INGEST_SAMPLE_EVERY
+# "drop": discard overflowing events (they are still counted in /admin ingest_stats)
+INGEST_OVERLOAD_POLICY = "merge"
+INGEST_SAMPLE_EVERY = 10
+
+# --- Flood Dampening ---
+# Token bucket per (guild, user, emoji/sticker/reaction): a user is credited at most DAMPENER_BURST
+# uses of the same item at once, refilled at DAMPENER_PER_MINUTE per minute. Admins can enable and
+# tune it per guild with /admin dampening; this is the default for guilds that never did.
+DAMPENER_ENABLED_DEFAULT = False
+DAMPENER_BURST = 5
+DAMPENER_PER_MINUTE = 10
+DAMPENER_MAX_ENTRIES = 200000 # Buckets kept in memory (least recently used evicted first)
+
+# --- Approximate Counting ---
+# Opt-in per guild with /admin approximate_counting: counts are kept as Morris registers, so a hot item
+# costs O(log n) writes instead of n. This is the typical relative error used unless one is given.
+APPROX_COUNT_DEFAULT_ERROR = 0.05
+
+# --- Retention ---
+# Opt-in per guild with /admin retention: items idle for N days with few uses move to a compressed archive.
+RETENTION_CHECK_HOURS = 24 # How often retention policies are applied
+RETENTION_DEFAULT_MAX_USES = 5 # Use threshold when an admin sets only the idle days
+
+# --- Departed Guilds ---
+# Data of guilds the bot left is moved into a compressed archive file after a grace period; rejoining restores it.
+GUILD_ARCHIVE_DATABASE = "emoji_stats_archive.db"
+GUILD_ARCHIVE_GRACE_DAYS = 7
+GUILD_ARCHIVE_CHECK_HOURS = 6
+
+# --- Export ---
+EXPORT_CHUNK_ROWS = 5000 # Rows read per query while streaming an export
+EXPORT_UPLOAD_FRACTION = 0.95 # Share of the server's upload limit each exported file may use
+EXPORT_MAX_MESSAGES = 10 # Larger exports must be run with export.py
+
+# --- Import ---
+IMPORT_CHUNK_ROWS = 50000 # Rows per executemany / transaction in import_stats.py
+
+# --- Stats Overview ---
+STATS_OVERVIEW_TOP_ITEMS = 5 # Top items listed per type in /stats overview
+STATS_CACHE_SECONDS = 30 # Cached results are served this long even if the guild kept writing
+STATS_CACHE_MAX_ENTRIES = 1000
+
+# --- Item Lookup (/emoji info autocomplete) ---
+ITEM_INDEX_MAX_TABLES = 2000 # Guild tables whose name index is kept in memory (least recently used evicted)
+ITEM_INDEX_BUILD_SECONDS = 2.0 # Autocomplete waits this long for a cold index, within Discord's 3s deadline
+
+# --- Charts (/stats chart) ---
+CHART_RENDER_WORKERS = 2 # Processes drawing charts off the event loop (started on the first chart)
+CHART_RENDER_TIMEOUT = 30 # Seconds before a chart request gives up
+CHART_CACHE_DIR = "chart_cache" # Rendered PNGs, keyed by guild, chart, parameters and write generation
+CHART_CACHE_MAX_BYTES = 64 * 1024 * 1024 # Least recently used charts are deleted beyond this
+CHART_TREND_MAX_SERIES = 8 # Items drawn in a trend chart
+CHART_GLYPH_DIR = "assets/emoji" # Local emoji images: Twemoji-style <codepoints>.png, custom/<emoji id>.png
+CHART_CACHE_CUSTOM_GLYPHS = True # Prefetch guilds' custom emoji images into CHART_GLYPH_DIR on ready, join and emoji updates
+CHART_FONT_PATH = None # Optional local .ttf/.otf used for chart labels (e.g. an emoji-capable font)
+
+# --- Weekly Digests (/admin digest) ---
+DIGEST_PERIOD_HOURS = 168 # One digest per opted-in guild per period, at a slot spread by guild id
+DIGEST_CHECK_MINUTES = 5 # How often the scheduler looks for guilds whose slot has passed
+DIGEST_MAX_CONCURRENT_SENDS = 4 # Digests computed and posted at the same time
+DIGEST_TOP_ITEMS = 5 # Items listed per section
+DIGEST_HISTORY_CHECK = 25 # Recent channel messages searched for a digest whose send a restart interrupted
+
+# --- Cluster Mode (python cluster.py) ---
+# Shard groups run as separate processes; count deltas are shipped to one writer hosted by the launcher.
+CLUSTER_SHARD_COUNT = 2 # Total Discord shards
+CLUSTER_SHARDS_PER_PROCESS = 1 # Shards per AutoShardedBot process
+CLUSTER_READY_TIMEOUT = 120 # Seconds to wait for a shard group before starting the next
+COUNTER_STORE_ADDRESS = ("127.0.0.1", 47631) # Local socket of the shared writer
+COUNTER_STORE_FLUSH_SECONDS = 1.0 # How often a shard group ships its pending deltas
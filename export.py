@@ -0,0 +1,64 @@
+"""Export a guild's EmojiStats data to CSV, JSON Lines or Parquet.
+
+Streams every dataset (emojis, reactions, stickers, channels, archived items) from a read-only connection
+in chunks, so it can run next to the bot. One file per dataset; with --split-mb larger datasets are split
+into several standalone parts. Parquet needs the optional pyarrow package.
+
+Examples:
+    python export.py --guild 123                                # gzip-compressed CSV in ./exports
+    python export.py --guild 123 --format jsonl --compression none
+    python export.py --guild 123 --format parquet --split-mb 8 --dataset emojis --dataset stickers
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+# Import from project
+from config import config
+from utils import db_utils
+from utils import export as export_utils
+
+log = logging.getLogger(__name__)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export a guild's emoji/reaction/sticker stats.")
+    parser.add_argument("--guild", required=True, help="Guild ID to export.")
+    parser.add_argument("--format", choices=export_utils.EXPORT_FORMATS, default="csv")
+    parser.add_argument("--compression", choices=export_utils.EXPORT_COMPRESSIONS, default="gzip")
+    parser.add_argument("--dataset", action="append", dest="datasets", choices=db_utils.EXPORT_DATASETS, help="Dataset to export (repeatable). Default: all.")
+    parser.add_argument("--out", default="exports", help="Output directory (default: ./exports).")
+    parser.add_argument("--split-mb", type=float, help="Split datasets into parts of at most this many MiB.")
+    parser.add_argument("--chunk-rows", type=int, default=config.EXPORT_CHUNK_ROWS, help="Rows read per query.")
+    parser.add_argument("--db", default=config.DATABASE_NAME, help=f"Database file (default: {config.DATABASE_NAME}).")
+    parser.add_argument("--shards", type=int, default=config.DATABASE_SHARDS, help="Number of guild-hash shard files (see DATABASE_SHARDS).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = [args.db] if args.shards <= 1 else [db_utils.shard_path(args.db, index, args.shards) for index in range(args.shards)]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        log.critical(f"Database file(s) not found: {', '.join(missing)}")
+        return 1
+    conn = db_utils.open_database(args.db, args.shards, read_only=True)
+    started = time.monotonic()
+    try:
+        paths, counts = export_utils.export_guild(
+            conn, args.guild, args.out, fmt=args.format, compression=args.compression, datasets=args.datasets,
+            chunk_rows=args.chunk_rows, max_part_bytes=int(args.split_mb * 1024 * 1024) if args.split_mb else None,
+        )
+    except RuntimeError as e:
+        log.critical(str(e))
+        return 1
+    finally:
+        db_utils.close_db_connection(conn)
+    elapsed = time.monotonic() - started
+    print(f"Exported {sum(counts.values()):,} rows in {elapsed:.1f}s: " + ", ".join(f"{dataset} {rows:,}" for dataset, rows in counts.items()))
+    for path in paths:
+        print(f"  {path}")
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - [%(levelname)s] - %(name)s: %(message)s")
+    sys.exit(main())
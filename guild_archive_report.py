@@ -0,0 +1,86 @@
+"""Report how much space archiving departed guilds reclaimed.
+
+Lists every guild in the archive file (GUILD_ARCHIVE_DATABASE) with the size its tables had in the live
+database, the size of its uncompressed export and of the compressed blob, then the totals. Dropped tables
+leave free pages behind; the report shows how many each database file has, and --vacuum (bot stopped)
+returns them to the file system.
+
+Examples:
+    python guild_archive_report.py
+    python guild_archive_report.py --vacuum
+"""
+import os
+import sys
+import argparse
+import logging
+# Import from project
+from config import config
+from utils import db_utils
+from utils import guild_archive
+
+log = logging.getLogger(__name__)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Report space reclaimed by archiving departed guilds.")
+    parser.add_argument("--db", default=config.DATABASE_NAME, help=f"Base database file name (default: {config.DATABASE_NAME}).")
+    parser.add_argument("--shards", type=int, default=config.DATABASE_SHARDS, help="Shard count (default: DATABASE_SHARDS).")
+    parser.add_argument("--archive", default=config.GUILD_ARCHIVE_DATABASE, help=f"Archive file (default: {config.GUILD_ARCHIVE_DATABASE}).")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the database files afterwards (run with the bot stopped).")
+    return parser.parse_args(argv)
+
+def _size(value):
+    if value is None:
+        return "?"
+    for unit in ("B", "KiB", "MiB"):
+        if value < 1024:
+            return f"{value:,.0f} {unit}" if unit == "B" else f"{value:,.1f} {unit}"
+        value /= 1024
+    return f"{value:,.1f} GiB"
+
+def _free_bytes(path):
+    conn = db_utils.get_db_connection(path)
+    try:
+        return conn.execute("PRAGMA freelist_count;").fetchone()[0] * conn.execute("PRAGMA page_size;").fetchone()[0]
+    finally:
+        db_utils.close_db_connection(conn)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.exists(args.archive):
+        print(f"No archive file at {args.archive}: no guild has been archived yet.")
+        return 0
+    archive_conn = guild_archive.open_archive(args.archive)
+    try:
+        entries = guild_archive.archive_report(archive_conn)
+    finally:
+        archive_conn.close()
+
+    print(f"{'Guild':<20} {'Archived at':<26} {'Rows':>9} {'Live tables':>12} {'Export':>11} {'Compressed':>11}")
+    for entry in entries:
+        print(
+            f"{entry['guild_id']:<20} {entry['archived_at'][:26]:<26} {entry['rows']:>9,} {_size(entry['live_bytes']):>12} "
+            f"{_size(entry['raw_bytes']):>11} {_size(entry['payload_bytes']):>11}"
+        )
+    live = sum(entry["live_bytes"] or 0 for entry in entries)
+    stored = sum(entry["payload_bytes"] for entry in entries)
+    print(f"\n{len(entries)} archived guild(s): {_size(live)} of live tables now held in {_size(stored)} "
+          f"({_size(max(live - stored, 0))} reclaimed; live sizes need SQLite's dbstat table).")
+    print(f"Archive file size: {_size(os.path.getsize(args.archive))}")
+
+    paths = [args.db] if args.shards <= 1 else [db_utils.shard_path(args.db, index, args.shards) for index in range(args.shards)]
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        print(f"{path}: {_size(os.path.getsize(path))}, {_size(_free_bytes(path))} in free pages")
+        if args.vacuum:
+            conn = db_utils.get_db_connection(path)
+            try:
+                conn.execute("VACUUM;")
+            finally:
+                db_utils.close_db_connection(conn)
+            print(f"  vacuumed: now {_size(os.path.getsize(path))}")
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - [%(levelname)s] - %(name)s: %(message)s")
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Import emoji/reaction/sticker counts into EmojiStats.
+
+Reads files written by export.py (CSV / JSON Lines, optionally gzip-compressed, or Parquet; guild and dataset
+come from the file name) and/or the legacy unified `emoji_stats` table of an old database, and merges the
+counts into the current tables. Counts are added to what is stored (--mode add) or overwrite it per item
+(--mode replace). Rows are written in large chunked transactions; the global aggregate, guild summaries
+and their index are rebuilt once at the end. Run it with the bot stopped.
+
+Examples:
+    python import_stats.py exports/guild_123_emojis.csv.gz exports/guild_123_stickers.csv.gz
+    python import_stats.py --mode replace --guild 456 exports/guild_123_*.jsonl
+    python import_stats.py --legacy-db old_emoji_stats.db
+"""
+import sys
+import argparse
+import itertools
+import logging
+# Import from project
+from config import config
+from utils import db_utils
+from utils import importer
+
+log = logging.getLogger(__name__)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Import usage counts from exports or a legacy database.")
+    parser.add_argument("files", nargs="*", help="Export files (guild_<id>_<dataset>.<csv|jsonl|parquet>[.gz]).")
+    parser.add_argument("--legacy-db", action="append", default=[], help="Old database with a unified emoji_stats table (repeatable).")
+    parser.add_argument("--mode", choices=["add", "replace"], default="add", help="Add to the stored counts, or overwrite them per item.")
+    parser.add_argument("--guild", help="Import the export files into this guild instead of the one in their names.")
+    parser.add_argument("--chunk-rows", type=int, default=config.IMPORT_CHUNK_ROWS, help="Rows per transaction.")
+    parser.add_argument("--db", default=config.DATABASE_NAME, help=f"Database file (default: {config.DATABASE_NAME}).")
+    parser.add_argument("--shards", type=int, default=config.DATABASE_SHARDS, help="Number of guild-hash shard files (see DATABASE_SHARDS).")
+    args = parser.parse_args(argv)
+    if not args.files and not args.legacy_db:
+        parser.error("give export files and/or --legacy-db")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    sources = [importer.read_export_file(path, args.chunk_rows, guild_id=args.guild) for path in args.files]
+    sources += [importer.read_legacy_table(path, args.chunk_rows) for path in args.legacy_db]
+    conn = db_utils.open_database(args.db, args.shards)
+    try:
+        stats = importer.run_import(
+            conn, itertools.chain.from_iterable(sources), replace=args.mode == "replace",
+            progress=lambda rows: print(f"\r{rows:,} rows imported...", end="", flush=True),
+        )
+    except (ValueError, RuntimeError) as e:
+        print()
+        log.critical(str(e))
+        return 1
+    finally:
+        db_utils.close_db_connection(conn)
+    print(f"\rImported {stats['rows']:,} rows into {stats['guilds']} guild(s) in {stats['seconds']:.1f}s "
+          f"({stats['rows_per_second']:,.0f} rows/s, including the aggregate rebuild).")
+    if stats["failed_chunks"]:
+        print(f"{stats['failed_chunks']} chunk(s) failed; see the log.")
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - [%(levelname)s] - %(name)s: %(message)s")
+    sys.exit(main())
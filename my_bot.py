@@ -11,6 +11,20 @@ from config import config
 from cogs.admin import permissions
 from utils import db_utils
 from utils import embed_utils
+from utils.fingerprint_cache import FingerprintCache
+from utils.user_stats import UserSketchStore
+from utils.heavy_hitters import PairTracker
+from utils.channel_stats import ChannelTracker
+from utils.heatmap import HeatmapTracker
+from utils.dampener import FloodDampener
+from utils.item_index import ItemIndex
+from utils.chart_renderer import ChartRenderer
+from utils.ingest_workers import IngestWorkerPool
+from utils.count_batch import CountBatch
+from utils.counter_store import CounterStoreClient, parse_address
+from cogs.events import flush_tasks
+from cogs.events import guild_archive_tasks
+from cogs.events import ingest_dispatch
 from cogs.events import on_message as message_event
 from cogs.events import on_reaction as reaction_event
 from cogs.admin import data_tools as admin_data_tools
@@ -36,21 +50,129 @@ if not BOT_TOKEN:
 # --- Bot Intents Setup ---
 intents = config.intents
 
+# --- Cluster Mode ---
+# Set by cluster.py when this process runs one shard group of a multi-process cluster
+SHARD_IDS = os.getenv("EMOJISTATS_SHARD_IDS")
+CLUSTER_GROUP = int(os.getenv("EMOJISTATS_CLUSTER_GROUP", "0"))
+COUNTER_STORE = os.getenv("EMOJISTATS_COUNTER_STORE")
+
 # --- Bot Instance Setup ---
-bot = commands.Bot(command_prefix=config.BOT_PREFIX, intents=intents)
+if SHARD_IDS:
+    bot = commands.AutoShardedBot(
+        command_prefix=config.BOT_PREFIX,
+        intents=intents,
+        shard_ids=[int(shard_id) for shard_id in SHARD_IDS.split(",")],
+        shard_count=int(os.getenv("EMOJISTATS_SHARD_COUNT")),
+    )
+else:
+    bot = commands.Bot(command_prefix=config.BOT_PREFIX, intents=intents)
 bot.db_conn = None # Initialize db_conn attribute
+bot.read_conn = None # Read-only connection for snapshot reads (falls back to db_conn)
+# In cluster mode count deltas are batched here and shipped to the launcher's single writer
+bot.counter_store = None
+bot.count_batch = None
+if COUNTER_STORE:
+    bot.counter_store = CounterStoreClient(
+        parse_address(COUNTER_STORE),
+        bytes.fromhex(os.environ["EMOJISTATS_COUNTER_STORE_KEY"]),
+        group_index=CLUSTER_GROUP,
+    )
+    bot.count_batch = CountBatch()
+# Bounded cache of per-message emoji fingerprints, used to reconcile edits/deletes
+bot.fingerprint_cache = FingerprintCache(
+    max_entries=config.FINGERPRINT_CACHE_MAX_ENTRIES,
+    max_bytes=config.FINGERPRINT_CACHE_MAX_BYTES,
+)
+# In "process" ingest mode the workers own these aggregates; this process only reads what they flushed
+# (cluster shard groups always ingest inline and ship their deltas to the shared writer instead)
+PROCESS_INGEST = config.INGEST_MODE == "process" and not COUNTER_STORE
+# Approximate per-user stats (Count-Min Sketch / HyperLogLog), flushed periodically
+bot.user_sketches = UserSketchStore(
+    epsilon=config.USER_SKETCH_EPSILON,
+    delta=config.USER_SKETCH_DELTA,
+    hll_precision=config.USER_SKETCH_HLL_PRECISION,
+    max_bytes=config.USER_SKETCH_MAX_BYTES,
+    read_through=PROCESS_INGEST,
+)
+# Top-K co-occurring emoji pairs per guild (Space-Saving), flushed periodically
+bot.pair_tracker = PairTracker(
+    capacity=config.PAIR_TRACKER_CAPACITY,
+    max_emojis_per_message=config.PAIR_MAX_EMOJIS_PER_MESSAGE,
+    read_through=PROCESS_INGEST,
+)
+# Per-channel emoji totals with a top-K of each channel's emojis, flushed periodically
+bot.channel_tracker = ChannelTracker(
+    capacity=config.CHANNEL_TOP_ITEMS,
+    max_channels=config.CHANNEL_MAX_CACHED,
+    read_through=PROCESS_INGEST,
+)
+# Hour-of-week usage counters per item, buffered and flushed periodically
+bot.heatmap_tracker = HeatmapTracker(max_pending=config.HEATMAP_MAX_PENDING, read_through=PROCESS_INGEST)
+# Per-(guild, user, item) token buckets absorbing spam before it is counted (inline ingest; workers own their own)
+bot.dampener = FloodDampener(
+    enabled=config.DAMPENER_ENABLED_DEFAULT,
+    burst=config.DAMPENER_BURST,
+    per_minute=config.DAMPENER_PER_MINUTE,
+    max_entries=config.DAMPENER_MAX_ENTRIES,
+)
+# Sorted per-guild item names for /emoji info autocomplete; built on first use, fed by ingest_dispatch
+bot.item_index = ItemIndex(max_tables=config.ITEM_INDEX_MAX_TABLES)
+# Process pool drawing /stats chart images, with a size-bounded disk cache of the results
+bot.chart_renderer = ChartRenderer(
+    workers=config.CHART_RENDER_WORKERS,
+    cache_dir=config.CHART_CACHE_DIR,
+    cache_max_bytes=config.CHART_CACHE_MAX_BYTES,
+    timeout=config.CHART_RENDER_TIMEOUT,
+    font_path=config.CHART_FONT_PATH,
+)
+bot.ingest_pool = None # Started in the main guard when INGEST_MODE == "process"
+
+def start_ingest_workers():
+    """Starts the ingest worker processes (process ingest mode only)."""
+    bot.ingest_pool = IngestWorkerPool(
+        config.DATABASE_NAME,
+        workers=config.INGEST_WORKERS,
+        settings={
+            "database_shards": config.DATABASE_SHARDS,
+            "batch_max_messages": config.INGEST_BATCH_MAX_MESSAGES,
+            "batch_max_seconds": config.INGEST_BATCH_MAX_SECONDS,
+            "aggregate_flush_seconds": config.PERIODIC_FLUSH_SECONDS,
+            "fingerprint_max_entries": config.FINGERPRINT_CACHE_MAX_ENTRIES,
+            "fingerprint_max_bytes": config.FINGERPRINT_CACHE_MAX_BYTES,
+            "sketch_epsilon": config.USER_SKETCH_EPSILON,
+            "sketch_delta": config.USER_SKETCH_DELTA,
+            "sketch_hll_precision": config.USER_SKETCH_HLL_PRECISION,
+            "sketch_max_bytes": config.USER_SKETCH_MAX_BYTES,
+            "pair_capacity": config.PAIR_TRACKER_CAPACITY,
+            "pair_max_emojis": config.PAIR_MAX_EMOJIS_PER_MESSAGE,
+            "channel_top_items": config.CHANNEL_TOP_ITEMS,
+            "channel_max_cached": config.CHANNEL_MAX_CACHED,
+            "heatmap_max_pending": config.HEATMAP_MAX_PENDING,
+            "dampener_enabled": config.DAMPENER_ENABLED_DEFAULT,
+            "dampener_burst": config.DAMPENER_BURST,
+            "dampener_per_minute": config.DAMPENER_PER_MINUTE,
+            "dampener_max_entries": config.DAMPENER_MAX_ENTRIES,
+        },
+    )
+    bot.ingest_pool.start()
 
 # --- Database Connection ---
 def setup_database():
     """Sets up the database connection and attaches it to the bot."""
     try:
-        bot.db_conn = db_utils.get_db_connection(config.DATABASE_NAME)
+        bot.db_conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
         atexit.register(db_utils.close_db_connection, bot.db_conn)
         log.info("Database connection established and cleanup registered.")
     except Exception as e:
         log.critical(f"Failed to establish initial database connection: {e}")
         # Exit if DB is critical for startup
         exit(1)
+    try:
+        bot.read_conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS, read_only=True)
+        atexit.register(db_utils.close_db_connection, bot.read_conn)
+    except Exception as e:
+        log.warning(f"Could not open a read-only connection, snapshot reads will use the main one: {e}")
+        bot.read_conn = None
 
 # --- Event: on_ready (Production Mode) ---
 @bot.event
@@ -65,6 +187,8 @@ async def on_ready():
     success_count = 0
     fail_count = 0
     if bot.db_conn:
+        # Guilds that came back while the bot was offline: restore archived data before ensuring tables
+        await asyncio.to_thread(guild_archive_tasks.restore_returning, [guild.id for guild in bot.guilds])
         for guild in bot.guilds:
             log.info(f"Ensuring tables for guild: {guild.name} (ID: {guild.id})")
             try:
@@ -97,17 +221,20 @@ async def on_ready():
 
         log.info("Command and event handler registration complete.")
         log.info("Use the `!sync` command (admin only) to sync slash commands if needed.")
-        
-        response = await bot.tree.sync()
 
-        if not response:
-            raise Exception("Failed to sync commands with bot.")
-        else:
-            log.info("Successfully synced commands.")
+        if CLUSTER_GROUP == 0: # Commands are global; one shard group syncing them is enough
+            response = await bot.tree.sync()
+
+            if not response:
+                raise Exception("Failed to sync commands with bot.")
+            else:
+                log.info("Successfully synced commands.")
 
     except Exception as e:
         log.critical(f"Error during setup of commands/events: {e}", exc_info=True)
 
+    if bot.counter_store:
+        bot.counter_store.report_ready(bot.shard_ids or []) # Lets cluster.py start the next shard group
     log.info("Bot is ready and online!")
 
 # --- Manual Sync Command (Admin Only - Production Mode) ---
@@ -157,6 +284,42 @@ async def sync_error(ctx, error):
         log.error(f"Error in sync command: {error}")
         await ctx.send(f"❌ An error occurred during sync command: {error}")
 
+# --- Global Aggregate Check Command (Bot Owner Only) ---
+def _check_global_aggregate(repair):
+    """Run the aggregate check on a connection of its own, like the retention job (blocking; run it in a thread)."""
+    conn = db_utils.open_database(config.DATABASE_NAME, config.DATABASE_SHARDS)
+    try:
+        return db_utils.check_global_aggregate(conn, repair=repair)
+    finally:
+        db_utils.close_db_connection(conn)
+
+@bot.command(name="global_check", hidden=True)
+@commands.is_owner()
+async def global_check(ctx: commands.Context, repair: bool = False):
+    """Compares the cross-guild aggregate with the per-guild tables (optionally repairing it)."""
+    if not bot.db_conn:
+        await ctx.send("❌ Database connection is not available.")
+        return
+    # Streams every guild table (and rewrites the aggregate on repair): keep it off the gateway loop
+    async with ctx.typing():
+        mismatches = await asyncio.to_thread(_check_global_aggregate, repair)
+    if mismatches is None:
+        await ctx.send("❌ Global aggregate check failed; see logs.")
+    elif mismatches == 0:
+        await ctx.send("✔️ Global aggregate is consistent with the guild tables.")
+    elif repair:
+        await ctx.send(f"♻️ Repaired {mismatches} mismatched global aggregate rows.")
+    else:
+        await ctx.send(f"⚠️ Found {mismatches} mismatched global aggregate rows. Run `{config.BOT_PREFIX}global_check true` to repair.")
+
+@global_check.error
+async def global_check_error(ctx, error):
+    if isinstance(error, commands.CheckFailure):
+        await ctx.send("❌ Only the bot owner can run this command.")
+    else:
+        log.error(f"Error in global_check command: {error}")
+        await ctx.send(f"❌ An error occurred during global_check: {error}")
+
 # --- Global Error Handler for App Commands ---
 @bot.tree.error
 async def on_app_command_error(interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
@@ -202,6 +365,7 @@ async def on_guild_join(guild: discord.Guild):
 
     log.info(f"Ensuring database tables for new guild {guild.name}...")
     try:
+        await asyncio.to_thread(guild_archive_tasks.restore_returning, [guild.id]) # A returning guild gets its archived data back
         success = db_utils.ensure_guild_tables(bot.db_conn, str(guild.id))
         if success:
             log.info(f"Successfully ensured tables for guild {guild.name}.")
@@ -220,17 +384,33 @@ async def on_guild_join(guild: discord.Guild):
     except Exception as e:
         log.error(f"Exception during table setup for new guild {guild.name}: {e}")
 
+# --- Event: On Guild Remove ---
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    """Records the departure; the guild's data is archived after the grace period (see guild_archive_tasks)."""
+    log.info(f"Removed from guild: {guild.name} (ID: {guild.id})")
+    if not guild_archive_tasks.mark_departed(bot, str(guild.id)):
+        log.error(f"Failed to record the departure of guild {guild.id}.")
+
 async def register_commands():
     log.info("Loading commands...")
     try:
         # Load extensions (commands and events)
         await bot.load_extension("cogs.events.on_message")
         await bot.load_extension("cogs.events.on_reaction")
+        await bot.load_extension("cogs.events.on_message_edit")
+        await bot.load_extension("cogs.events.flush_tasks")
+        await bot.load_extension("cogs.events.ingest_dispatch")
+        await bot.load_extension("cogs.events.retention_tasks")
+        await bot.load_extension("cogs.events.guild_archive_tasks")
+        await bot.load_extension("cogs.events.inventory_events")
+        await bot.load_extension("cogs.events.digest_tasks")
         await bot.load_extension("cogs.admin.data_tools")
         await bot.load_extension("cogs.commands.help")
         await bot.load_extension("cogs.commands.emoji_commands")
         await bot.load_extension("cogs.commands.reaction_commands")
         await bot.load_extension("cogs.commands.sticker_commands")
+        await bot.load_extension("cogs.commands.stats_commands")
         log.info("All commands loaded successfully.")
     except Exception as e:
         log.critical(f"Error during loading of commands: {e}", exc_info=True)
@@ -241,6 +421,8 @@ async def register_commands():
 if __name__ == "__main__":
     log.info("Starting bot in PRODUCTION MODE...")
     try:
+        if PROCESS_INGEST:
+            start_ingest_workers()
         asyncio.run(register_commands())
         bot.run(BOT_TOKEN)
     except discord.errors.LoginFailure:
@@ -249,7 +431,18 @@ if __name__ == "__main__":
         log.critical(f"An unexpected error occurred while running the bot: {e}", exc_info=True)
     finally:
         # Ensure DB connection is closed on exit
+        bot.chart_renderer.close()
+        if bot.ingest_pool:
+            bot.ingest_pool.stop() # Workers flush their pending batches before exiting
+        ingest_dispatch.drain(bot) # Apply whatever is still in the in-process ingest queue
+        if bot.counter_store:
+            flush_tasks.ship_counts(bot)
+            bot.counter_store.sync() # Make sure the writer committed our last deltas
+            bot.counter_store.close()
         if bot.db_conn:
+            flush_tasks.flush_all(bot) # Persist in-memory aggregates first
             db_utils.close_db_connection(bot.db_conn)
             log.info("Database connection closed during shutdown.")
+        if bot.read_conn:
+            db_utils.close_db_connection(bot.read_conn)
 
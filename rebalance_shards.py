@@ -0,0 +1,158 @@
+"""Move EmojiStats data to a different number of guild-hash shard files.
+
+Copies every guild's tables and guild-keyed rows from the current layout into a new one, rebuilds each
+new shard's global aggregate and checks that the per-type totals match. Run it with the bot stopped;
+the source files are left untouched. Afterwards set DATABASE_SHARDS in config/config.py to the new count.
+
+Examples:
+    python rebalance_shards.py --to 4                      # from DATABASE_SHARDS (1 = emoji_stats.db) to 4 files
+    python rebalance_shards.py --from 4 --to 8
+    python rebalance_shards.py --from 4 --to 1 --output emoji_stats_merged.db
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+# Import from project
+from config import config
+from utils import db_utils
+
+log = logging.getLogger(__name__)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rebalance guild data across database shard files.")
+    parser.add_argument("--db", default=config.DATABASE_NAME, help=f"Base database file name (default: {config.DATABASE_NAME}).")
+    parser.add_argument("--from", dest="from_shards", type=int, default=config.DATABASE_SHARDS, help="Current shard count (default: DATABASE_SHARDS).")
+    parser.add_argument("--to", dest="to_shards", type=int, required=True, help="New shard count.")
+    parser.add_argument("--output", help="Base file name of the new layout (default: same as --db).")
+    args = parser.parse_args(argv)
+    if args.from_shards < 1 or args.to_shards < 1:
+        parser.error("shard counts must be at least 1")
+    args.output = args.output or args.db
+    return args
+
+def layout_paths(db_path, shards):
+    """Files making up a layout: the database itself, or its shard files."""
+    if shards <= 1:
+        return [db_path]
+    return [db_utils.shard_path(db_path, index, shards) for index in range(shards)]
+
+def _table_exists(conn, table_name, schema="main"):
+    return conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?;", (table_name,)).fetchone() is not None
+
+def _columns(conn, table_name):
+    return ", ".join(row[1] for row in conn.execute(f"PRAGMA main.table_info({table_name});"))
+
+def _table_totals(conn):
+    """{table_type: sum of counts} over every guild table of one database file."""
+    totals = {}
+    for table_type in db_utils.GUILD_TABLE_TYPES:
+        totals[table_type] = sum(
+            conn.execute(f"SELECT COALESCE(SUM(count), 0) FROM {table_name};").fetchone()[0]
+            for table_name in list(db_utils.list_guild_tables(conn, table_type))
+        )
+    return totals
+
+def _add_totals(into, totals):
+    for table_type, total in totals.items():
+        into[table_type] = into.get(table_type, 0) + total
+
+def copy_source(source, target_paths, stats):
+    """Copy one source file's guilds into the target files, one ATTACHed target at a time."""
+    guild_tables = {} # guild_id -> [table_name, ...]
+    for table_type in db_utils.GUILD_TABLE_TYPES:
+        for table_name in list(db_utils.list_guild_tables(source, table_type)):
+            guild_tables.setdefault(db_utils.guild_id_from_table(table_name, table_type), []).append(table_name)
+    keyed_tables = [table for table in db_utils.GUILD_KEYED_TABLES if _table_exists(source, table)]
+    for table in keyed_tables:
+        for row in source.execute(f"SELECT DISTINCT guild_id FROM {table};"):
+            guild_tables.setdefault(row[0], [])
+
+    for index, target_path in enumerate(target_paths):
+        guilds = [guild_id for guild_id in guild_tables if len(target_paths) == 1 or db_utils.shard_index(guild_id, len(target_paths)) == index]
+        if not guilds:
+            continue
+        source.execute("ATTACH DATABASE ? AS dst;", (target_path,))
+        try:
+            for guild_id in guilds:
+                for table_name in guild_tables[guild_id]:
+                    columns = _columns(source, table_name)
+                    cursor = source.execute(f"INSERT INTO dst.{table_name} ({columns}) SELECT {columns} FROM main.{table_name};")
+                    stats["rows"] += cursor.rowcount
+                for table in keyed_tables:
+                    if _table_exists(source, table, "dst"):
+                        cursor = source.execute(f"INSERT INTO dst.{table} SELECT * FROM main.{table} WHERE guild_id = ?;", (guild_id,))
+                        stats["rows"] += cursor.rowcount
+            source.commit()
+        finally:
+            source.execute("DETACH DATABASE dst;")
+        stats["guilds"] += len(guilds)
+
+def main(argv=None):
+    args = parse_args(argv)
+    source_paths = layout_paths(args.db, args.from_shards)
+    target_paths = layout_paths(args.output, args.to_shards)
+    missing = [path for path in source_paths if not os.path.exists(path)]
+    if missing:
+        log.critical(f"Source layout incomplete; missing: {', '.join(missing)}")
+        return 1
+    existing = [path for path in target_paths if os.path.exists(path)]
+    if existing:
+        log.critical(f"Target files already exist (remove them or choose --output): {', '.join(existing)}")
+        return 1
+
+    started = time.monotonic()
+    sources = [db_utils.get_db_connection(path) for path in source_paths]
+    try:
+        # 1. Create the schema in the new layout; the router decides which file each guild's tables go to
+        guild_ids = set()
+        for source in sources:
+            for table_type in db_utils.GUILD_TABLE_TYPES:
+                guild_ids.update(db_utils.guild_id_from_table(name, table_type) for name in db_utils.list_guild_tables(source, table_type))
+        target = db_utils.open_database(args.output, args.to_shards)
+        try:
+            for guild_id in guild_ids:
+                db_utils.ensure_guild_tables(target, guild_id)
+            # Shared tables exist in every file, even one that receives no guild tables
+            for ensure in (db_utils.ensure_global_tables, db_utils.ensure_user_sketch_tables, db_utils.ensure_emoji_pair_tables,
+                           db_utils.ensure_guild_settings_tables, db_utils.ensure_channel_usage_tables, db_utils.ensure_guild_summary_tables,
+                           db_utils.ensure_item_archive_tables, db_utils.ensure_heatmap_tables, db_utils.ensure_digest_tables,
+                           db_utils.ensure_backfill_tables):
+                ensure(target)
+        finally:
+            db_utils.close_db_connection(target)
+
+        # 2. Copy the rows with ATTACH, entirely inside SQLite
+        stats = {"guilds": 0, "rows": 0}
+        source_totals = {}
+        for source in sources:
+            copy_source(source, target_paths, stats)
+            _add_totals(source_totals, _table_totals(source))
+    finally:
+        for source in sources:
+            db_utils.close_db_connection(source)
+
+    # 3. Each file's global aggregate covers its own guilds: rebuild, then verify the totals
+    target = db_utils.open_database(args.output, args.to_shards)
+    try:
+        db_utils.rebuild_global_aggregate(target)
+        target_totals = {}
+        for totals in (target.fan_out(_table_totals) if isinstance(target, db_utils.ShardRouter) else [_table_totals(target)]):
+            _add_totals(target_totals, totals)
+    finally:
+        db_utils.close_db_connection(target)
+
+    elapsed = time.monotonic() - started
+    print(f"Moved {stats['guilds']} guilds ({stats['rows']:,} rows) from {len(source_paths)} to {len(target_paths)} file(s) in {elapsed:.1f}s.")
+    if source_totals != target_totals:
+        print(f"Totals differ! source={source_totals} target={target_totals}")
+        return 2
+    print(f"Totals match: {target_totals}")
+    if args.to_shards != config.DATABASE_SHARDS or args.output != config.DATABASE_NAME:
+        print(f"Set DATABASE_SHARDS = {args.to_shards} (and DATABASE_NAME = \"{args.output}\") in config/config.py before starting the bot.")
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - [%(levelname)s] - %(name)s: %(message)s")
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""Query EmojiStats data offline, without the bot running.
+
+A quick-starting companion to the slash commands: it never imports discord.py (or config, which does), and
+every other module is imported only once the arguments are parsed. Databases are opened read-only with
+memory-mapped I/O, so it is safe to run next to the bot. Results print as a table, JSON or CSV.
+
+    top / rare   the most / least used items of a guild
+    history      every item of a guild (--archived merges the retention archive)
+    summary      totals, distinct items and first/last activity of a guild
+    global       the top items across all guilds from the global aggregate; --scan recomputes them from the
+                 guild tables instead, in parallel over table slices (or over shard files)
+
+Examples:
+    python stats_cli.py top 123 --type reactions --limit 20
+    python stats_cli.py history 123 --archived --format csv > history.csv
+    python stats_cli.py global --scan --workers 8 --format json
+"""
+import sys
+import argparse
+
+DEFAULT_DATABASE = "emoji_stats.db" # config.DATABASE_NAME (config itself imports discord)
+TABLE_TYPES = ("emojis", "reactions", "stickers")
+FORMATS = ("table", "json", "csv")
+
+def parse_args(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db", default=DEFAULT_DATABASE, help=f"Database file (default: {DEFAULT_DATABASE}).")
+    common.add_argument("--shards", type=int, default=1, help="Number of guild-hash shard files (see DATABASE_SHARDS).")
+    common.add_argument("--format", choices=FORMATS, default="table", help="Output format (default: table).")
+    common.add_argument("--mmap-mb", type=int, default=256, help="Memory-map up to this many MiB of each file (0 disables).")
+
+    parser = argparse.ArgumentParser(description="Offline queries over the EmojiStats database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, text in (("top", "Most used items of a guild."), ("rare", "Least used items of a guild.")):
+        command = commands.add_parser(name, parents=[common], help=text, description=text)
+        command.add_argument("guild", help="Guild ID.")
+        command.add_argument("--type", choices=TABLE_TYPES, default="emojis")
+        command.add_argument("--limit", type=int, default=10)
+    command = commands.add_parser("history", parents=[common], help="Every item of a guild.")
+    command.add_argument("guild", help="Guild ID.")
+    command.add_argument("--type", choices=TABLE_TYPES, default="emojis")
+    command.add_argument("--archived", action="store_true", help="Include items moved to the retention archive.")
+    command = commands.add_parser("summary", parents=[common], help="Totals of a guild.")
+    command.add_argument("guild", help="Guild ID.")
+    command = commands.add_parser("global", parents=[common], help="Top items across all guilds.")
+    command.add_argument("--type", choices=TABLE_TYPES, default="emojis")
+    command.add_argument("--limit", type=int, default=10)
+    command.add_argument("--scan", action="store_true", help="Recompute from the guild tables instead of the global aggregate.")
+    command.add_argument("--workers", type=int, default=4, help="Parallel readers for --scan (default: 4).")
+    return parser.parse_args(argv)
+
+def _database_paths(args, db_utils):
+    if args.shards <= 1:
+        return [args.db]
+    return [db_utils.shard_path(args.db, index, args.shards) for index in range(args.shards)]
+
+def _connect(path, args, db_utils):
+    """One read-only connection with memory-mapped reads."""
+    conn = db_utils.get_db_connection(path, read_only=True)
+    conn.execute(f"PRAGMA mmap_size = {max(args.mmap_mb, 0) * 1024 * 1024};")
+    return conn
+
+def _item_rows(items, table_type):
+    columns = ["sticker_id", "name", "count"] if table_type == "stickers" else ["item", "count"]
+    rows = []
+    for rank, item in enumerate(items, start=1):
+        if table_type == "stickers":
+            rows.append([rank, item["sticker_id"], item["name"], item["count"]])
+        else:
+            rows.append([rank, item["name"], item["count"]])
+    return ["rank"] + columns, rows
+
+def _guild_items(args, db_utils):
+    conn = db_utils.open_database(args.db, args.shards, read_only=True)
+    try:
+        _set_mmap(conn, args, db_utils)
+        if args.command == "top":
+            items = db_utils.get_top_items(conn, args.guild, args.type, args.limit)
+        elif args.command == "rare":
+            items = db_utils.get_rare_items(conn, args.guild, args.type, args.limit)
+        else:
+            items = db_utils.get_all_items(conn, args.guild, args.type, include_archived=args.archived)
+        return _item_rows(items, args.type)
+    finally:
+        db_utils.close_db_connection(conn)
+
+def _set_mmap(conn, args, db_utils):
+    statement = f"PRAGMA mmap_size = {max(args.mmap_mb, 0) * 1024 * 1024};"
+    if isinstance(conn, db_utils.ShardRouter):
+        conn.fan_out(lambda shard_conn: shard_conn.execute(statement))
+    else:
+        conn.execute(statement)
+
+def _summary(args, db_utils):
+    conn = db_utils.open_database(args.db, args.shards, read_only=True)
+    try:
+        _set_mmap(conn, args, db_utils)
+        summary = db_utils.get_guild_summary(conn, args.guild)
+        base = db_utils.get_count_base(conn, args.guild)
+    finally:
+        db_utils.close_db_connection(conn)
+    rows = []
+    for table_type in TABLE_TYPES:
+        row = summary.get(table_type)
+        if row is None:
+            continue
+        rows.append([table_type, row["total_uses"] or 0, row["distinct_items"] or 0, row["first_seen"], row["last_activity"]])
+    if base and args.format == "table":
+        print("Approximate counting: totals are estimates.", file=sys.stderr)
+    return ["type", "total_uses", "distinct_items", "first_seen", "last_activity"], rows
+
+def _scan_slice(path, args, table_names, db_utils):
+    """Worker: sum a slice of guild tables over its own connection."""
+    conn = _connect(path, args, db_utils)
+    try:
+        return db_utils.sum_guild_tables(conn, args.type, table_names)
+    finally:
+        db_utils.close_db_connection(conn)
+
+def _scan_global(args, db_utils):
+    """Sum every guild table of one type, split into `--workers` slices per database file."""
+    from concurrent.futures import ThreadPoolExecutor
+    jobs = []
+    for path in _database_paths(args, db_utils):
+        conn = _connect(path, args, db_utils)
+        try:
+            table_names = list(db_utils.list_guild_tables(conn, args.type))
+        finally:
+            db_utils.close_db_connection(conn)
+        slices = max(1, min(args.workers, len(table_names)))
+        jobs.extend((path, table_names[index::slices]) for index in range(slices) if table_names[index::slices])
+    totals = {}
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for partial in pool.map(lambda job: _scan_slice(job[0], args, job[1], db_utils), jobs):
+            for key, (name, count) in partial.items():
+                entry = totals.setdefault(key, [name, 0])
+                entry[1] += count
+                entry[0] = entry[0] or name
+    ranked = sorted(totals.items(), key=lambda entry: entry[1][1], reverse=True)
+    if args.limit > 0:
+        ranked = ranked[:args.limit]
+    return [{"name": name, "item_key": key, "count": count} for key, (name, count) in ranked]
+
+def _global(args, db_utils):
+    if args.scan:
+        items = _scan_global(args, db_utils)
+    else:
+        conn = db_utils.open_database(args.db, args.shards, read_only=True)
+        try:
+            _set_mmap(conn, args, db_utils)
+            items = db_utils.get_global_top_items(conn, args.type, args.limit)
+        finally:
+            db_utils.close_db_connection(conn)
+    if args.type == "stickers":
+        return ["rank", "sticker_id", "name", "count"], [
+            [rank, item["item_key"], item["name"], item["count"]] for rank, item in enumerate(items, start=1)
+        ]
+    return ["rank", "item", "count"], [[rank, item["item_key"], item["count"]] for rank, item in enumerate(items, start=1)]
+
+def _print(columns, rows, fmt):
+    if fmt == "json":
+        import json
+        print(json.dumps([dict(zip(columns, row)) for row in rows], ensure_ascii=False, indent=2))
+    elif fmt == "csv":
+        import csv
+        writer = csv.writer(sys.stdout)
+        writer.writerow(columns)
+        writer.writerows(rows)
+    else:
+        cells = [[("" if value is None else f"{value:,}" if isinstance(value, int) else str(value)) for value in row] for row in rows]
+        widths = [max([len(column)] + [len(row[index]) for row in cells]) for index, column in enumerate(columns)]
+        numeric = [all(isinstance(row[index], (int, float)) for row in rows) for index in range(len(columns))]
+        print("  ".join(column.rjust(width) if right else column.ljust(width) for column, width, right in zip(columns, widths, numeric)).rstrip())
+        for row in cells:
+            print("  ".join(value.rjust(width) if right else value.ljust(width) for value, width, right in zip(row, widths, numeric)).rstrip())
+        if not rows:
+            print("(no rows)")
+
+def main(argv=None):
+    args = parse_args(argv)
+    import os
+    import logging
+    from utils import db_utils
+    logging.getLogger().setLevel(logging.WARNING) # db_utils configures INFO logging on import
+    missing = [path for path in _database_paths(args, db_utils) if not os.path.exists(path)]
+    if missing:
+        print(f"Database file(s) not found: {', '.join(missing)}", file=sys.stderr)
+        return 1
+    if args.command in ("top", "rare", "history"):
+        columns, rows = _guild_items(args, db_utils)
+    elif args.command == "summary":
+        columns, rows = _summary(args, db_utils)
+    else:
+        columns, rows = _global(args, db_utils)
+    _print(columns, rows, args.format)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import math
+import random
+
+# --- Approximate (Morris) Counting ---
+# In approximate mode a guild table's `count` column holds a Morris register c instead of the exact count.
+# Each increment raises the register with probability base**-c, so the register grows logarithmically and
+# most increments of a hot item change nothing. estimate(c) = (base**c - 1) / (base - 1) is an unbiased
+# estimate of the number of increments, with a relative standard error of about sqrt((base - 1) / 2).
+# Registers are monotonic in the estimate, so ORDER BY count still ranks items correctly.
+# No project imports: db_utils registers these as SQLite functions on every connection.
+
+def base_for_error(relative_error):
+    """Return the register base giving roughly `relative_error` (e.g. 0.05) relative standard error."""
+    return 1.0 + 2.0 * relative_error ** 2
+
+def relative_error(base):
+    """Approximate relative standard error of an estimate for registers of this base."""
+    return math.sqrt((base - 1.0) / 2.0)
+
+def estimate(register, base):
+    """Estimated count for a register value, rounded to an integer (SQLite function morris_estimate)."""
+    if register is None or register <= 0:
+        return 0
+    return int(round((base ** register - 1.0) / (base - 1.0)))
+
+def register_for(count, base, rng=random):
+    """Register value for an exact count (SQLite function morris_register).
+
+    Rounds randomly between the two neighbouring registers so the expected estimate equals `count`.
+    """
+    if count is None or count <= 0:
+        return 0
+    lower = int(math.log(1.0 + count * (base - 1.0), base))
+    low_estimate = (base ** lower - 1.0) / (base - 1.0)
+    step = base ** lower # estimate(lower + 1) - estimate(lower)
+    return lower + (1 if rng.random() < (count - low_estimate) / step else 0)
+
+def _trials_until_success(probability, rng):
+    """Number of Bernoulli(probability) trials up to and including the first success (geometric)."""
+    if probability >= 1.0:
+        return 1
+    return int(math.log(1.0 - rng.random()) / math.log(1.0 - probability)) + 1
+
+def apply_delta(register, delta, base, rng=random):
+    """Return the register after `delta` probabilistic increments (or decrements, if negative).
+
+    Costs O(register changes) rather than O(|delta|): the gap to the next change is drawn directly.
+    A decrement lowers c with probability base**-(c - 1), which removes one from the estimate on average.
+    """
+    register = max(0, int(register or 0))
+    remaining = abs(delta)
+    while remaining > 0:
+        if delta < 0 and register == 0:
+            break
+        exponent = register if delta > 0 else register - 1
+        trials = _trials_until_success(base ** -exponent, rng)
+        if trials > remaining:
+            break
+        remaining -= trials
+        register += 1 if delta > 0 else -1
+    return register
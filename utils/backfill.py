@@ -0,0 +1,207 @@
+import asyncio
+import json
+import time
+import logging
+from collections import namedtuple
+from datetime import datetime
+# Import from project
+from utils import db_utils
+from utils.count_batch import CountBatch
+from utils.emoji_scanner import scan_emojis
+
+log = logging.getLogger(__name__)
+
+# A message as seen by the backfill importer. `stickers` is a list of (sticker_id, name) tuples.
+HistoryMessage = namedtuple("HistoryMessage", ["id", "content", "stickers", "author_bot"])
+
+DISCORD_EPOCH_MS = 1420070400000
+
+def snowflake_for_time(timestamp=None):
+    """Return the smallest Discord snowflake for a UNIX timestamp (defaults to now)."""
+    if timestamp is None:
+        timestamp = time.time()
+    return (int(timestamp * 1000) - DISCORD_EPOCH_MS) << 22
+
+def time_for_snowflake(snowflake):
+    """Return the creation time of a Discord snowflake as a naive UTC datetime."""
+    return datetime.utcfromtimestamp(((int(snowflake) >> 22) + DISCORD_EPOCH_MS) / 1000)
+
+# --- History Sources ---
+# A source provides `list_channels(guild_id)` and an async iterator `history(channel_id, after_id, before_id)`
+# yielding HistoryMessage objects oldest first, strictly between after_id and before_id.
+
+class MemoryHistorySource:
+    """Serves message history from memory. Used as the local fake provider for tests and offline imports."""
+    def __init__(self, channels):
+        # channel_id -> list of HistoryMessage
+        self.channels = {str(channel_id): sorted(messages, key=lambda m: m.id) for channel_id, messages in channels.items()}
+
+    @classmethod
+    def from_jsonl(cls, path):
+        """Load history from a JSON Lines file with one message per line.
+
+        Each line needs `channel_id`, `id` and `content`; `stickers` ([[id, name], ...]) and `bot` are optional.
+        """
+        channels = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                    message = HistoryMessage(
+                        int(record["id"]),
+                        record.get("content") or "",
+                        [(str(sticker_id), name) for sticker_id, name in record.get("stickers", [])],
+                        bool(record.get("bot", False)),
+                    )
+                except (ValueError, KeyError, TypeError) as e:
+                    log.warning(f"Skipping malformed history line {line_no} in {path}: {e}")
+                    continue
+                channels.setdefault(str(record["channel_id"]), []).append(message)
+        return cls(channels)
+
+    async def list_channels(self, guild_id):
+        return list(self.channels)
+
+    async def history(self, channel_id, after_id=None, before_id=None):
+        for message in self.channels.get(str(channel_id), []):
+            if after_id is not None and message.id <= after_id:
+                continue
+            if before_id is not None and message.id >= before_id:
+                break
+            yield message
+
+class DiscordHistorySource:
+    """Reads channel history through a discord.py client (a running bot, or a client that only called login())."""
+    def __init__(self, client):
+        self.client = client
+
+    async def list_channels(self, guild_id):
+        guild = self.client.get_guild(int(guild_id))
+        if guild is not None:
+            me = guild.me
+            return [str(c.id) for c in guild.text_channels if me is None or c.permissions_for(me).read_message_history]
+        # Not connected to the gateway (offline CLI): fall back to HTTP
+        import discord
+        guild = await self.client.fetch_guild(int(guild_id))
+        channels = await guild.fetch_channels()
+        return [str(c.id) for c in channels if isinstance(c, discord.TextChannel)]
+
+    async def history(self, channel_id, after_id=None, before_id=None):
+        import discord
+        channel = self.client.get_channel(int(channel_id)) or await self.client.fetch_channel(int(channel_id))
+        after = discord.Object(id=after_id) if after_id else None
+        before = discord.Object(id=before_id) if before_id else None
+        async for message in channel.history(limit=None, after=after, before=before, oldest_first=True):
+            yield HistoryMessage(
+                message.id,
+                message.content or "",
+                [(str(sticker.id), sticker.name) for sticker in message.stickers],
+                message.author.bot,
+            )
+
+# --- Backfill Runner ---
+class BackfillStats:
+    """Progress counters for one backfill run."""
+    def __init__(self):
+        self.started = time.monotonic()
+        self.messages = 0 # Messages read from history
+        self.counted = 0 # Messages that contained at least one emoji/sticker
+        self.channels_done = 0
+        self.channels_skipped = 0 # Already completed by a previous run
+        self.channels_failed = 0
+        self.flushes = 0
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def messages_per_sec(self):
+        elapsed = self.elapsed
+        return self.messages / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        return (
+            f"{self.messages:,} messages ({self.counted:,} with emojis/stickers) in {self.elapsed:.1f}s "
+            f"({self.messages_per_sec:,.0f} msg/s); channels: {self.channels_done} done, "
+            f"{self.channels_skipped} skipped, {self.channels_failed} failed"
+        )
+
+async def run_backfill(conn, source, guild_id, channel_ids=None, max_concurrency=4, batch_size=5000, reset=False):
+    """Stream past messages of a guild's channels through the emoji scanner and count them.
+
+    Channels are processed concurrently (up to `max_concurrency`). Counts are accumulated in memory
+    and written every `batch_size` messages in one transaction together with per-channel checkpoints,
+    so an interrupted run resumes where the last flush left off without double counting. Each channel
+    only imports messages older than the snowflake recorded on its first run, leaving newer messages
+    to the live on_message handler.
+    """
+    guild_id = str(guild_id)
+    stats = BackfillStats()
+    if not db_utils.ensure_backfill_tables(conn) or not db_utils.ensure_guild_tables(conn, guild_id):
+        log.error(f"Cannot backfill guild {guild_id}: failed to prepare tables.")
+        return stats
+    if reset:
+        db_utils.reset_backfill_checkpoints(conn, guild_id)
+
+    checkpoints = db_utils.get_backfill_checkpoints(conn, guild_id)
+    if channel_ids is None:
+        channel_ids = await source.list_channels(guild_id)
+    default_until_id = snowflake_for_time()
+
+    batch = CountBatch()
+    progress = {} # channel_id -> (last_message_id, until_message_id, done) not yet persisted
+    pending_messages = 0
+    semaphore = asyncio.Semaphore(max(1, int(max_concurrency)))
+
+    def flush():
+        nonlocal pending_messages
+        statements = [
+            db_utils.backfill_checkpoint_statement(guild_id, channel_id, last_id, until_id, done)
+            for channel_id, (last_id, until_id, done) in progress.items()
+        ]
+        if batch.flush(conn, extra_statements=statements):
+            progress.clear()
+            pending_messages = 0
+            stats.flushes += 1
+            log.info(f"Backfill guild {guild_id}: {stats.messages:,} messages so far ({stats.messages_per_sec:,.0f} msg/s)")
+
+    async def backfill_channel(channel_id):
+        nonlocal pending_messages
+        channel_id = str(channel_id)
+        checkpoint = checkpoints.get(channel_id)
+        if checkpoint is not None and checkpoint["done"]:
+            stats.channels_skipped += 1
+            return
+        last_id = checkpoint["last_message_id"] if checkpoint is not None else None
+        until_id = checkpoint["until_message_id"] if checkpoint is not None else default_until_id
+
+        async with semaphore:
+            try:
+                async for message in source.history(channel_id, after_id=last_id, before_id=until_id):
+                    stats.messages += 1
+                    last_id = message.id
+                    if not message.author_bot:
+                        emojis = scan_emojis(message.content)
+                        if emojis or message.stickers:
+                            # Date the uses by the message, not the import: last_used and "tracking since" stay historical
+                            batch.add_message(guild_id, emojis, message.stickers, used_at=time_for_snowflake(message.id))
+                            stats.counted += 1
+                    progress[channel_id] = (last_id, until_id, False)
+                    pending_messages += 1
+                    if pending_messages >= batch_size:
+                        flush()
+            except Exception as e:
+                stats.channels_failed += 1
+                log.error(f"Backfill of channel {channel_id} in guild {guild_id} stopped: {e}")
+                return
+            progress[channel_id] = (last_id, until_id, True)
+            stats.channels_done += 1
+
+    await asyncio.gather(*(backfill_channel(channel_id) for channel_id in channel_ids))
+    flush()
+    log.info(f"Backfill of guild {guild_id} complete: {stats.summary()}")
+    return stats
@@ -0,0 +1,130 @@
+import logging
+from operator import itemgetter
+from collections import Counter, OrderedDict
+# Import from project
+from utils import db_utils
+
+log = logging.getLogger(__name__)
+
+def unpack_top_items(packed):
+    """Parse a stored top-K vector into [(emoji, count)], highest first."""
+    items = []
+    for line in packed.splitlines():
+        emoji, _, count = line.rpartition("\t")
+        items.append((emoji, int(count)))
+    return items
+
+class ChannelTracker:
+    """Per-channel emoji usage: an exact total plus a sparse vector of the channel's top-K emojis.
+
+    Each channel is one row (total, messages, error, top-K packed as "emoji<TAB>count" lines) instead of one
+    row per (channel, emoji), so quiet channels cost a single small row. Recording a message only appends
+    its emojis to the channel's pending list; `flush()` counts the pending emojis into the channel's exact
+    dict, trims it back to the `capacity` largest entries and upserts every dirty channel with one
+    executemany, which keeps the per-message cost a fraction of a per-item upsert (measured by
+    benchmarks/channel_usage.py). Counts of emojis that were trimmed and came back later are lower bounds;
+    the stored error is the largest count ever trimmed from the channel. At most `max_channels` channels
+    are cached; evicted ones are written first. Edits and deletes do not adjust channel counters.
+
+    With `read_through=True` nothing is cached and queries read the stored rows; used by a process that
+    only reads what an ingest worker maintains.
+    """
+    def __init__(self, capacity=20, max_channels=20000, read_through=False):
+        self.capacity = max(1, int(capacity))
+        self.max_channels = max(1, int(max_channels))
+        self.read_through = read_through
+        self._channels = OrderedDict() # (guild_id, channel_id) -> [Counter({emoji: count}), total, messages, error, [pending emojis]]
+        self._dirty = set()
+
+    def _load(self, conn, key):
+        counts, total, messages, error = Counter(), 0, 0, 0
+        row = db_utils.load_channel_usage(conn, key[0], key[1])
+        if row is not None:
+            try:
+                counts = Counter(dict(unpack_top_items(row["top_items"])))
+            except ValueError as e:
+                log.error(f"Discarding unreadable usage summary of channel {key[1]} in guild {key[0]}: {e}")
+            total, messages, error = row["total"], row["messages"], row["error"]
+        entry = self._channels[key] = [counts, total, messages, error, []]
+        self._evict(conn)
+        return entry
+
+    def _evict(self, conn):
+        while len(self._channels) > self.max_channels:
+            key = next(iter(self._channels))
+            if key in self._dirty:
+                self._save(conn, [key])
+            self._channels.pop(key, None)
+            self._dirty.discard(key)
+
+    def record(self, conn, guild_id, channel_id, emojis):
+        """Count one message's emojis towards its channel (messages without emojis are not recorded).
+
+        `guild_id` is the str id and `channel_id` the int id, as ingest events carry them.
+        """
+        if not emojis or channel_id is None:
+            return
+        key = (guild_id, channel_id)
+        entry = self._channels.get(key)
+        if entry is None:
+            entry = self._load(conn, key)
+            self._dirty.add(key)
+        elif key not in self._dirty:
+            # Recency is refreshed once per flush interval, when the channel becomes dirty, not on every message
+            self._channels.move_to_end(key)
+            self._dirty.add(key)
+        entry[4].extend(emojis) # Counted at flush
+        entry[2] += 1
+
+    def top_channels(self, conn, guild_id, limit=10):
+        """Return the guild's busiest channels as dicts with channel_id, total, messages, error and top_items [(emoji, count)]."""
+        guild_id = str(guild_id)
+        if not self.read_through:
+            self._save(conn, [key for key in self._dirty if key[0] == guild_id]) # Serve the query from current rows
+        rows = []
+        for row in db_utils.get_top_channels(conn, guild_id, limit=limit):
+            try:
+                top_items = unpack_top_items(row["top_items"])
+            except ValueError:
+                top_items = []
+            rows.append({
+                "channel_id": row["channel_id"], "total": row["total"], "messages": row["messages"],
+                "error": row["error"], "top_items": top_items,
+            })
+        return rows
+
+    def forget_guild(self, guild_id):
+        guild_id = str(guild_id)
+        for key in [key for key in self._channels if key[0] == guild_id]:
+            del self._channels[key]
+            self._dirty.discard(key)
+
+    def _trim(self, entry):
+        """Count the pending emojis, then keep the `capacity` largest counts of a channel; returns them ranked."""
+        pending = entry[4]
+        if pending:
+            entry[0].update(pending)
+            entry[1] += len(pending)
+            entry[4] = []
+        ranked = sorted(entry[0].items(), key=itemgetter(1), reverse=True)[:self.capacity + 1]
+        if len(ranked) > self.capacity:
+            entry[3] = max(entry[3], ranked.pop()[1]) # Largest count dropped so far
+            entry[0] = Counter(dict(ranked))
+        return ranked
+
+    def _save(self, conn, keys):
+        rows = []
+        for key in keys:
+            entry = self._channels.get(key)
+            if entry is None:
+                continue
+            top_items = "\n".join([f"{emoji}\t{count}" for emoji, count in self._trim(entry)])
+            rows.append((key[0], key[1], entry[1], entry[2], entry[3], top_items))
+        if not rows or db_utils.save_channel_usage(conn, rows):
+            self._dirty.difference_update(keys)
+            return True
+        return False
+
+    def flush(self, conn):
+        """Upsert every modified channel summary."""
+        return self._save(conn, list(self._dirty))
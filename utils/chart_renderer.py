@@ -0,0 +1,178 @@
+import os
+import asyncio
+import hashlib
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+# Import from project
+from utils import charts
+
+log = logging.getLogger(__name__)
+
+# --- Off-Loop Chart Rendering ---
+# matplotlib needs tens to hundreds of milliseconds of CPU per chart and holds the GIL while drawing, so
+# charts are rendered in a small process pool and awaited from the event loop. Finished PNGs are stored in
+# a size-bounded directory keyed by (guild, chart kind, params, write generation): a guild that has not
+# written since gets the stored image back without a render, and concurrent requests for the same chart
+# share one render.
+
+class ChartCache:
+    """Directory of rendered PNGs named by a hash of their render key, capped at `max_bytes`.
+
+    The least recently used files are deleted first once the cap is exceeded. Files left by an earlier run
+    are picked up (oldest modification time first), so the cap holds across restarts.
+    """
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max(1, int(max_bytes))
+        self._lock = threading.Lock()
+        self._files = OrderedDict() # file name -> size, least recently used first
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        existing = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name.endswith(".png"):
+                stat = entry.stat()
+                existing.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(existing):
+            self._files[name] = size
+            self._bytes += size
+        self._evict()
+
+    @staticmethod
+    def file_name(key):
+        """Stable file name of a render key (a tuple of strings and numbers)."""
+        return hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:40] + ".png"
+
+    def __len__(self):
+        return len(self._files)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def get(self, key):
+        """Return the cached PNG bytes for `key`, or None."""
+        name = self.file_name(key)
+        with self._lock:
+            if name not in self._files:
+                self.misses += 1
+                return None
+            self._files.move_to_end(name)
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path) # Recency survives restarts
+        except OSError as e:
+            log.warning(f"Dropping unreadable chart cache file {name}: {e}")
+            with self._lock:
+                self._bytes -= self._files.pop(name, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Store PNG bytes for `key` and evict the least recently used files beyond the size cap."""
+        name = self.file_name(key)
+        path = os.path.join(self.directory, name)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path) # Readers never see a partial file
+        except OSError as e:
+            log.warning(f"Could not store chart {name}: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+        with self._lock:
+            self._bytes += len(data) - self._files.pop(name, 0)
+            self._files[name] = len(data)
+            self._evict()
+        return True
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self._bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+class ChartRenderer:
+    """Renders charts (utils/charts.py) in worker processes and caches the PNGs on disk.
+
+    The pool is started on the first render. Callers check cached() before loading the chart data, then
+    pass the data to render() under the same key.
+    """
+    def __init__(self, workers=2, cache_dir=None, cache_max_bytes=64 * 1024 * 1024, timeout=30.0, font_path=None):
+        self.workers = max(1, int(workers))
+        self.timeout = timeout
+        self.font_path = font_path
+        self.cache = ChartCache(cache_dir, cache_max_bytes) if cache_dir else None
+        self._ctx = multiprocessing.get_context("spawn") # No inherited sockets/event loop from the bot
+        self._pool = None
+        self._inflight = {} # key -> asyncio.Task producing the PNG bytes
+        self.renders = 0
+        self.failures = 0
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=self._ctx,
+                initializer=charts.init_worker, initargs=(self.font_path,)
+            )
+        return self._pool
+
+    async def cached(self, key):
+        """The stored PNG of `key`, or None (the file is read off the event loop)."""
+        if self.cache is None:
+            return None
+        return await asyncio.to_thread(self.cache.get, key)
+
+    async def render(self, key, kind, data):
+        """Render `kind` from `data` in the pool, store it under `key` and return the PNG bytes.
+
+        Raises asyncio.TimeoutError after `timeout` seconds and RuntimeError if the render failed.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render(key, kind, data))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+
+    async def _render(self, key, kind, data):
+        loop = asyncio.get_running_loop()
+        try:
+            png = await loop.run_in_executor(self._executor(), charts.render_chart, kind, data)
+        except BrokenProcessPool as e:
+            self.failures += 1
+            log.error(f"Chart worker pool broke, restarting it on the next render: {e}")
+            self._pool = None
+            raise RuntimeError("The chart renderer crashed.") from e
+        except Exception as e:
+            self.failures += 1
+            log.error(f"Rendering {kind} chart {key} failed: {e}")
+            raise RuntimeError(str(e)) from e
+        self.renders += 1
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, key, png)
+        return png
+
+    def close(self):
+        """Stop the worker processes, dropping queued renders."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,173 @@
+import io
+import os
+import numpy as np
+# Import from project (no discord import: these functions run in chart worker processes)
+from utils import db_utils
+from utils import heatmap as heatmap_utils
+from utils import item_index
+from utils.emoji_scanner import CUSTOM_EMOJI_REGEX
+
+# --- Chart Rendering ---
+# Leaderboard, trend and heatmap charts drawn with matplotlib (Agg backend) into PNG bytes. Everything here
+# takes plain values and runs inside the worker processes of utils/chart_renderer.py, never on the bot's
+# event loop. Emoji glyphs are read from a local asset directory (see glyph_path); nothing is downloaded
+# while rendering; emojis without a cached glyph get a placeholder square next to their name.
+
+DPI = 100
+BAR_COLOR = "#5865F2" # Discord blurple
+GLYPH_PIXELS = 20 # Height of an emoji glyph next to its bar
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+_font_configured = False
+
+def init_worker(font_path=None):
+    """Process pool initializer: select the Agg backend and register the optional local label font."""
+    global _font_configured
+    try:
+        import matplotlib
+    except ImportError:
+        return # render_chart reports it
+    matplotlib.use("Agg")
+    if font_path and os.path.isfile(font_path):
+        from matplotlib import font_manager
+        font_manager.fontManager.addfont(font_path)
+        # Fall back to the default font for characters the local one lacks
+        matplotlib.rcParams["font.family"] = [font_manager.FontProperties(fname=font_path).get_name(), "DejaVu Sans"]
+        _font_configured = True
+
+def _pyplot():
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError as e:
+        raise RuntimeError("Chart rendering requires matplotlib (pip install -r requirements.txt).") from e
+    return plt
+
+def glyph_path(glyph_dir, table_type, key):
+    """Path of a cached glyph image for an item, or None if there is none.
+
+    Custom emojis are looked up as custom/<emoji id>.png; Unicode emojis by their code points in lowercase
+    hex joined with "-" (the Twemoji file naming, e.g. 1f44d.png or 1f468-200d-1f4bb.png), with and without
+    variation selectors. Stickers have no glyphs.
+    """
+    if not glyph_dir or table_type == "stickers":
+        return None
+    match = CUSTOM_EMOJI_REGEX.fullmatch(key)
+    if match:
+        candidates = [os.path.join(glyph_dir, "custom", f"{match.group(2)}.png")]
+    else:
+        codepoints = [f"{ord(char):x}" for char in key]
+        candidates = [os.path.join(glyph_dir, "-".join(codepoints) + ".png")]
+        if "fe0f" in codepoints:
+            candidates.append(os.path.join(glyph_dir, "-".join(point for point in codepoints if point != "fe0f") + ".png"))
+    return next((path for path in candidates if os.path.isfile(path)), None)
+
+def _placeholder_glyph():
+    """Light grey square with clipped corners, drawn where an emoji has no cached glyph."""
+    image = np.zeros((GLYPH_PIXELS, GLYPH_PIXELS, 4))
+    image[..., :3] = 0.82
+    image[2:-2, :, 3] = 1.0
+    image[:, 2:-2, 3] = 1.0
+    return image
+
+def _label(table_type, key, name=None, with_glyph=False):
+    """Axis/legend text of an item. Without a local emoji font Unicode emojis are shown by their names only."""
+    if table_type == "stickers" or CUSTOM_EMOJI_REGEX.fullmatch(key):
+        return item_index.display_label(table_type, key, name)
+    terms = item_index.search_terms(table_type, key)
+    description = terms[1].lower() if len(terms) > 1 else key
+    if _font_configured and not with_glyph:
+        return f"{key} {description}"
+    return description
+
+def _png(plt, fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=DPI, bbox_inches="tight")
+    plt.close(fig)
+    return buffer.getvalue()
+
+def render_leaderboard(data):
+    """Horizontal bar chart of items and counts, most used at the top.
+
+    data: {"title", "table_type", "items": [(item_key, name, count)], "glyph_dir"}
+    """
+    plt = _pyplot()
+    from matplotlib.offsetbox import AnnotationBbox, OffsetImage
+    items = data["items"]
+    table_type = data["table_type"]
+    rows = np.arange(len(items))[::-1]
+    counts = [count for _, _, count in items]
+    fig, ax = plt.subplots(figsize=(8, 1.2 + 0.42 * len(items)))
+    ax.barh(rows, counts, color=BAR_COLOR)
+    labels, has_glyphs = [], False
+    placeholder = _placeholder_glyph() if data.get("glyph_dir") and table_type != "stickers" else None
+    for row, (key, name, count) in zip(rows, items):
+        glyph = glyph_path(data.get("glyph_dir"), table_type, key)
+        image = plt.imread(glyph) if glyph else placeholder
+        if image is not None:
+            box = AnnotationBbox(
+                OffsetImage(image, zoom=GLYPH_PIXELS / max(1, image.shape[0])), (0, row),
+                xybox=(-GLYPH_PIXELS / 2 - 2, 0), xycoords=("axes fraction", "data"),
+                boxcoords="offset points", frameon=False
+            )
+            ax.add_artist(box)
+            has_glyphs = True
+        labels.append(_label(table_type, key, name, with_glyph=bool(glyph)))
+        ax.text(count, row, f" {count:,}", va="center", fontsize=9)
+    ax.set_yticks(rows, labels)
+    if has_glyphs:
+        ax.tick_params(axis="y", pad=GLYPH_PIXELS + 6) # Leave room for the glyphs between labels and bars
+    ax.set_xlabel("Uses")
+    ax.set_title(data["title"])
+    ax.margins(x=0.12)
+    ax.spines[["top", "right"]].set_visible(False)
+    return _png(plt, fig)
+
+def render_trend(data):
+    """Line chart of the hourly usage of several items across the week.
+
+    data: {"title", "table_type", "utc_offset", "series": [(item_key, name, slots)]}
+    """
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(10, 4.5))
+    hours = np.arange(db_utils.HEATMAP_SLOTS)
+    for key, name, slots in data["series"]:
+        ax.plot(hours, np.roll(np.asarray(slots), int(data.get("utc_offset", 0))), linewidth=1.4,
+                label=_label(data["table_type"], key, name))
+    ax.set_xticks(hours[::24], WEEKDAYS)
+    ax.set_xlim(0, hours[-1])
+    ax.grid(axis="x", alpha=0.3)
+    ax.set_ylabel("Uses per hour")
+    ax.set_title(data["title"])
+    ax.legend(loc="upper left", bbox_to_anchor=(1.01, 1.0), fontsize=9, frameon=False)
+    ax.spines[["top", "right"]].set_visible(False)
+    return _png(plt, fig)
+
+def render_heatmap(data):
+    """Weekday x hour grid of usage counts.
+
+    data: {"title", "utc_offset", "slots"}
+    """
+    plt = _pyplot()
+    grid = heatmap_utils.by_day(data["slots"], data.get("utc_offset", 0))
+    fig, ax = plt.subplots(figsize=(10, 3.6))
+    image = ax.imshow(grid, aspect="auto", cmap="Blues", interpolation="nearest")
+    ax.set_yticks(range(7), WEEKDAYS)
+    ax.set_xticks(range(0, 24, 3), [f"{hour:02d}:00" for hour in range(0, 24, 3)])
+    ax.set_title(data["title"])
+    fig.colorbar(image, ax=ax, label="Uses", pad=0.01)
+    return _png(plt, fig)
+
+RENDERERS = {
+    "leaderboard": render_leaderboard,
+    "trend": render_trend,
+    "heatmap": render_heatmap,
+}
+
+def render_chart(kind, data):
+    """Render one chart kind (see RENDERERS) and return the PNG bytes."""
+    renderer = RENDERERS.get(kind)
+    if renderer is None:
+        raise ValueError(f"Unknown chart kind: {kind}")
+    return renderer(data)
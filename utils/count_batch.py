@@ -0,0 +1,83 @@
+import logging
+from collections import defaultdict
+# Import from project
+from utils import db_utils
+
+log = logging.getLogger(__name__)
+
+class CountBatch:
+    """Accumulates count deltas in memory so they can be written in one large transaction.
+
+    Repeated increments of the same item are merged, so a batch of N messages costs one
+    upsert per distinct (guild, type, item) instead of one per occurrence.
+    """
+    def __init__(self):
+        self._deltas = defaultdict(lambda: defaultdict(int)) # (guild_id, table_type) -> {key: delta}
+        self._names = defaultdict(dict) # (guild_id, table_type) -> {sticker_id: name}
+        self._use_times = defaultdict(dict) # (guild_id, table_type) -> {key: (first use, latest use)}, past messages only
+
+    def __len__(self):
+        """Number of distinct (guild, type, item) entries pending."""
+        return sum(len(deltas) for deltas in self._deltas.values())
+
+    def __bool__(self):
+        return bool(self._deltas)
+
+    def add(self, guild_id, table_type, key, delta=1, name=None, used_at=None):
+        """Queue a count change for one item; `used_at` (a UTC datetime or (first, latest) pair) dates uses from message history."""
+        table_key = (str(guild_id), table_type)
+        self._deltas[table_key][key] += delta
+        if name is not None:
+            self._names[table_key][key] = name
+        if used_at is not None:
+            first, latest = used_at if isinstance(used_at, tuple) else (used_at, used_at)
+            known = self._use_times[table_key].get(key)
+            if known is not None:
+                first, latest = min(first, known[0]), max(latest, known[1])
+            self._use_times[table_key][key] = (first, latest)
+
+    def add_message(self, guild_id, emojis, stickers=(), used_at=None):
+        """Queue the increments for one scanned message (emojis and (sticker_id, name) tuples)."""
+        for emoji in emojis:
+            self.add(guild_id, "emojis", emoji, used_at=used_at)
+        for sticker_id, name in stickers:
+            self.add(guild_id, "stickers", str(sticker_id), name=name, used_at=used_at)
+
+    def merge(self, other):
+        """Fold another batch's pending deltas into this one."""
+        for guild_id, table_type, deltas, names in other.entries():
+            use_times = other._use_times.get((guild_id, table_type), {})
+            for key, delta in deltas.items():
+                self.add(guild_id, table_type, key, delta, names.get(key), use_times.get(key))
+
+    def entries(self):
+        """Yield (guild_id, table_type, deltas, names) tuples, as accepted by db_utils.apply_count_batch."""
+        for (guild_id, table_type), deltas in self._deltas.items():
+            yield guild_id, table_type, deltas, self._names.get((guild_id, table_type), {})
+
+    def discard_guild(self, guild_id):
+        """Drop all pending deltas for one guild."""
+        guild_id = str(guild_id)
+        for table_key in [table_key for table_key in self._deltas if table_key[0] == guild_id]:
+            del self._deltas[table_key]
+            self._names.pop(table_key, None)
+            self._use_times.pop(table_key, None)
+
+    def clear(self):
+        self._deltas.clear()
+        self._names.clear()
+        self._use_times.clear()
+
+    def flush(self, conn, extra_statements=()):
+        """Write all pending deltas (plus any extra statements) in one transaction.
+
+        The batch is only cleared if the transaction committed, so a failed flush can be retried.
+        """
+        if not self and not extra_statements:
+            return True
+        success = db_utils.apply_count_batch(conn, self.entries(), extra_statements=extra_statements, use_times=self._use_times or None)
+        if success:
+            self.clear()
+        else:
+            log.error("Failed to flush count batch; keeping pending deltas for retry.")
+        return success
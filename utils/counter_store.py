@@ -0,0 +1,246 @@
+import time
+import queue
+import logging
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+# Import from project (no discord import: the server runs inside the cluster launcher)
+from utils import db_utils
+from utils.count_batch import CountBatch
+
+log = logging.getLogger(__name__)
+
+# --- Shared Counter Store ---
+# In cluster mode (see cluster.py) every shard-group process accumulates count deltas in a CountBatch and
+# ships it to a single writer over a local authenticated socket. The writer merges whatever has queued up
+# and commits it in one transaction, so the shared SQLite file only ever has one hot-path writer.
+#
+# Messages (client -> server):
+#   ("counts", sent_at, [(guild_id, table_type, deltas, names), ...])
+#   ("ready", group_index, shard_ids)   -> startup ordering, see CounterStoreServer.wait_ready
+#   ("sync",)                            -> reply True once everything received before it is committed
+#   ("stats",)                           -> reply with CounterStoreServer.stats()
+
+class CounterStoreServer:
+    """Single writer for count deltas shipped by the shard-group processes."""
+    def __init__(self, db_path, address, authkey, shards=1, max_merge=200, retry_seconds=1.0):
+        self.db_path = db_path
+        self.shards = shards
+        self.address = address
+        self.authkey = authkey
+        self.max_merge = max_merge # Shipped batches merged into one transaction at most
+        self.retry_seconds = retry_seconds
+        self._queue = queue.Queue()
+        self._listener = None
+        self._threads = []
+        self._running = False
+        self._ready = {} # group_index -> shard_ids
+        self._ready_changed = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._stats = {"received": 0, "commits": 0, "failed_commits": 0, "last_lag": 0.0, "max_lag": 0.0, "clients": 0}
+
+    def start(self):
+        """Open the database and the socket, then start the accept and writer threads."""
+        conn = db_utils.open_database(self.db_path, self.shards) # A ShardRouter commits each shard in parallel
+        db_utils.ensure_global_tables(conn) # Run shared migrations once, before any shard connects
+        self._listener = Listener(self.address, authkey=self.authkey)
+        self._running = True
+        for target, name, args in ((self._accept_loop, "counter-store-accept", ()), (self._writer_loop, "counter-store-writer", (conn,))):
+            thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        log.info(f"Counter store listening on {self.address}, writing to {self.db_path}.")
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                break # Listener closed by stop()
+            except Exception as e: # Bad authkey, client hung up during the handshake, ...
+                log.warning(f"Rejected counter store connection: {e}")
+                continue
+            threading.Thread(target=self._client_loop, args=(conn,), name="counter-store-client", daemon=True).start()
+
+    def _client_loop(self, conn):
+        with self._stats_lock:
+            self._stats["clients"] += 1
+        try:
+            while True:
+                message = conn.recv()
+                kind = message[0]
+                if kind == "counts":
+                    self._queue.put(message)
+                elif kind == "ready":
+                    _, group_index, shard_ids = message
+                    with self._ready_changed:
+                        self._ready[group_index] = list(shard_ids)
+                        self._ready_changed.notify_all()
+                    log.info(f"Shard group {group_index} (shards {shard_ids}) is ready.")
+                elif kind == "sync":
+                    done = threading.Event()
+                    self._queue.put(("sync", done))
+                    conn.send(done.wait(timeout=60))
+                elif kind == "stats":
+                    conn.send(self.stats())
+                else:
+                    log.warning(f"Unknown counter store message: {kind}")
+        except (EOFError, OSError):
+            pass # Client disconnected
+        finally:
+            conn.close()
+            with self._stats_lock:
+                self._stats["clients"] -= 1
+
+    def _writer_loop(self, conn):
+        batch = CountBatch()
+        known_guilds = set()
+        oldest_sent = None
+        waiters = []
+        running = True
+        while running:
+            try:
+                message = self._queue.get(timeout=self.retry_seconds)
+            except queue.Empty:
+                message = False
+            # Merge everything that is already queued into one transaction
+            merged = 0
+            while message is not False:
+                if message is None:
+                    running = False
+                elif message[0] == "sync":
+                    waiters.append(message[1])
+                else:
+                    _, sent_at, entries = message
+                    for guild_id, table_type, deltas, names in entries:
+                        for key, delta in deltas.items():
+                            batch.add(guild_id, table_type, key, delta, names.get(key))
+                    oldest_sent = sent_at if oldest_sent is None else min(oldest_sent, sent_at)
+                    merged += 1
+                if not running or merged >= self.max_merge:
+                    break
+                try:
+                    message = self._queue.get_nowait()
+                except queue.Empty:
+                    message = False
+
+            with self._stats_lock:
+                self._stats["received"] += merged
+            if batch:
+                for guild_id in {entry[0] for entry in batch.entries()} - known_guilds:
+                    if db_utils.ensure_guild_tables(conn, guild_id): # Shards normally did this already
+                        known_guilds.add(guild_id)
+                if batch.flush(conn):
+                    lag = time.time() - oldest_sent
+                    oldest_sent = None
+                    with self._stats_lock:
+                        self._stats["commits"] += 1
+                        self._stats["last_lag"] = lag
+                        self._stats["max_lag"] = max(self._stats["max_lag"], lag)
+                else:
+                    with self._stats_lock:
+                        self._stats["failed_commits"] += 1
+                    time.sleep(self.retry_seconds) # Deltas stay in the batch for the next attempt
+            if not batch:
+                for waiter in waiters:
+                    waiter.set()
+                waiters = []
+
+        if batch:
+            log.error(f"Counter store stopped with {len(batch)} uncommitted deltas.")
+        for waiter in waiters:
+            waiter.set()
+        db_utils.close_db_connection(conn)
+
+    def wait_ready(self, group_index, timeout=None):
+        """Block until a shard group reports ready; returns False on timeout."""
+        with self._ready_changed:
+            return self._ready_changed.wait_for(lambda: group_index in self._ready, timeout=timeout)
+
+    def mark_not_ready(self, group_index):
+        """Forget a group's ready report (before restarting it)."""
+        with self._ready_changed:
+            self._ready.pop(group_index, None)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        with self._ready_changed:
+            stats["ready_groups"] = sorted(self._ready)
+        return stats
+
+    def stop(self, timeout=30.0):
+        """Stop accepting connections, commit everything still queued and close the database."""
+        self._running = False
+        if self._listener is not None:
+            self._listener.close()
+        self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        log.info("Counter store stopped.")
+
+class CounterStoreClient:
+    """Connection from a shard-group process to the CounterStoreServer.
+
+    Safe to share between the event loop and worker threads. If the writer is unreachable, `ship()` keeps
+    the deltas in the caller's batch and reconnects on the next attempt.
+    """
+    def __init__(self, address, authkey, group_index=0):
+        self.address = address
+        self.authkey = authkey
+        self.group_index = group_index
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = Client(self.address, authkey=self.authkey)
+        return self._conn
+
+    def _send(self, message, expect_reply=False):
+        with self._lock:
+            try:
+                conn = self._connection()
+                conn.send(message)
+                return conn.recv() if expect_reply else True
+            except (OSError, EOFError, AuthenticationError) as e:
+                log.warning(f"Counter store unreachable at {self.address}: {e}")
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                return None
+
+    def ship(self, batch):
+        """Send a CountBatch's pending deltas to the writer; the batch is cleared only if the send succeeded."""
+        if not batch:
+            return True
+        entries = [(guild_id, table_type, dict(deltas), dict(names)) for guild_id, table_type, deltas, names in batch.entries()]
+        if self._send(("counts", time.time(), entries)):
+            batch.clear()
+            return True
+        return False
+
+    def report_ready(self, shard_ids):
+        return bool(self._send(("ready", self.group_index, list(shard_ids))))
+
+    def sync(self):
+        """Wait until the writer has committed everything this client shipped so far."""
+        return bool(self._send(("sync",), expect_reply=True))
+
+    def stats(self):
+        return self._send(("stats",), expect_reply=True)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+def parse_address(value):
+    """Parse "host:port" into a (host, port) tuple; anything else is used as a socket path."""
+    host, sep, port = value.rpartition(":")
+    if sep and port.isdigit():
+        return host, int(port)
+    return value
@@ -0,0 +1,110 @@
+import time
+import logging
+from collections import OrderedDict, Counter
+# Import from project
+from utils import db_utils
+
+log = logging.getLogger(__name__)
+
+# Per-guild settings keys (stored in the guild_settings table)
+SETTING_ENABLED = "dampener_enabled"
+SETTING_BURST = "dampener_burst"
+SETTING_PER_MINUTE = "dampener_per_minute"
+
+class FloodDampener:
+    """Token buckets per (guild, user, item) that absorb spam before it reaches the counters.
+
+    Each bucket holds up to `burst` tokens and refills at `per_minute` tokens per minute; an increment
+    is counted only if a token is available. Buckets live in an LRU capped at `max_entries`. A bucket
+    idle long enough to be full again carries no state and expires. Guild settings are read lazily
+    from the guild_settings table; guilds without settings use the defaults passed here.
+    """
+    def __init__(self, enabled=False, burst=5, per_minute=10, max_entries=200000):
+        self.defaults = (enabled, burst, per_minute)
+        self.max_entries = max(1, int(max_entries))
+        self._buckets = OrderedDict() # (guild_id, user_id, table_type, item) -> [tokens, last_refill]
+        self._settings = {} # guild_id -> (enabled, burst, refill per second) or None when disabled
+        self._calls = 0
+        self.absorbed = Counter() # guild_id -> increments absorbed
+        self.expired = 0
+        self.evicted = 0
+
+    def _guild_settings(self, conn, guild_id):
+        settings = self._settings.get(guild_id, False)
+        if settings is not False:
+            return settings
+        enabled, burst, per_minute = self.defaults
+        stored = db_utils.get_guild_settings(conn, guild_id) if conn else {}
+        try:
+            enabled = stored.get(SETTING_ENABLED, "1" if enabled else "0") == "1"
+            burst = max(1, int(stored.get(SETTING_BURST, burst)))
+            per_minute = max(1, int(stored.get(SETTING_PER_MINUTE, per_minute)))
+        except ValueError as e:
+            log.error(f"Invalid dampener settings for guild {guild_id}: {e}; using defaults.")
+            enabled, burst, per_minute = self.defaults
+        settings = (burst, per_minute / 60.0) if enabled else None
+        self._settings[guild_id] = settings
+        return settings
+
+    def forget_settings(self, guild_id):
+        """Re-read a guild's settings on next use (after they were changed)."""
+        guild_id = str(guild_id)
+        self._settings.pop(guild_id, None)
+        for key in [key for key in self._buckets if key[0] == guild_id]:
+            del self._buckets[key]
+
+    def filter(self, conn, guild_id, user_id, table_type, items, now=None):
+        """Return the subset of `items` this user may be credited for right now (all of them if disabled)."""
+        guild_id = str(guild_id)
+        settings = self._guild_settings(conn, guild_id)
+        if settings is None or not items:
+            return list(items)
+        burst, refill = settings
+        now = now if now is not None else time.monotonic()
+        allowed = []
+        for item in items:
+            key = (guild_id, user_id, table_type, item)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(burst), now]
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * refill)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                allowed.append(item)
+            else:
+                self.absorbed[guild_id] += 1
+        self._bound(now)
+        return allowed
+
+    def _bound(self, now):
+        while len(self._buckets) > self.max_entries:
+            self._buckets.popitem(last=False)
+            self.evicted += 1
+        self._calls += 1
+        if self._calls % 1024 == 0:
+            self.expire(now)
+
+    def expire(self, now=None):
+        """Drop buckets idle long enough to have refilled completely (least recently used first)."""
+        now = now if now is not None else time.monotonic()
+        while self._buckets:
+            key, (tokens, last_refill) = next(iter(self._buckets.items()))
+            settings = self._settings.get(key[0])
+            if settings:
+                burst, refill = settings
+                if now - last_refill < (burst - tokens) / refill:
+                    break # LRU order: everything after this was touched more recently
+            del self._buckets[key]
+            self.expired += 1
+
+    def stats(self):
+        return {
+            "buckets": len(self._buckets),
+            "max_entries": self.max_entries,
+            "absorbed": sum(self.absorbed.values()),
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
@@ -1,27 +1,51 @@
+import os
+import sys
+import json
+import zlib
+import array
+import queue
 import sqlite3
 import time
-from datetime import datetime
+import functools
+import threading
+import urllib.parse
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
 import logging
+# Import from project
+from utils import approx_count
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 log = logging.getLogger(__name__)
 
 # --- Database Connection ---
-def get_db_connection(db_path="emoji_stats.db"):
-    """Establish a connection to the SQLite database with retry logic."""
+def get_db_connection(db_path="emoji_stats.db", read_only=False):
+    """Establish a connection to the SQLite database with retry logic.
+
+    With `read_only=True` the file is opened in SQLite's read-only mode (it must already exist): under WAL
+    such a reader never blocks, and is never blocked by, the writer connection.
+    """
     max_retries = 3
     for attempt in range(max_retries):
         try:
             # Increased timeout, added check_same_thread=False for potential async use cases
             # though direct async operations on the connection itself are not recommended.
-            conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+            if read_only:
+                uri = f"file:{urllib.parse.quote(os.path.abspath(db_path))}?mode=ro"
+                conn = sqlite3.connect(uri, timeout=10, check_same_thread=False, uri=True)
+            else:
+                conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
             conn.row_factory = sqlite3.Row # Return rows as dictionary-like objects
             # Execute PRAGMA settings for performance and safety
             conn.execute("PRAGMA foreign_keys = ON;")
-            conn.execute("PRAGMA journal_mode=WAL;")  # Write-Ahead Logging for concurrency
-            conn.execute("PRAGMA synchronous = NORMAL;") # Balance performance and safety
+            if not read_only:
+                conn.execute("PRAGMA journal_mode=WAL;")  # Write-Ahead Logging for concurrency (persists in the file)
+                conn.execute("PRAGMA synchronous = NORMAL;") # Balance performance and safety
             conn.execute("PRAGMA cache_size=-4000;")  # Increase cache size (e.g., 4MB)
+            # Morris register scaling for guilds in approximate counting mode (see utils/approx_count.py)
+            conn.create_function("morris_estimate", 2, approx_count.estimate, deterministic=True)
+            conn.create_function("morris_register", 2, approx_count.register_for)
             log.info(f"Database connection successful to {db_path}")
             return conn
         except sqlite3.Error as e:
@@ -32,6 +56,134 @@ def get_db_connection(db_path="emoji_stats.db"):
             time.sleep(1) # Wait before retrying
     return None # Should not be reached if raise works
 
+# --- Guild-Hash Sharding ---
+# With more than one shard, guilds are spread over N database files by a stable hash of the guild ID and
+# open_database() returns a ShardRouter instead of a sqlite3 connection. The router can be passed anywhere
+# a connection is expected: guild-scoped functions in this module run on the owning shard's writer thread,
+# cross-guild ones run on every shard in parallel and combine the results. Each shard file has its own
+# connection and thread, so commits to different shards no longer serialize on one file lock.
+
+def shard_path(db_path, index, shard_count):
+    """File name of one shard, e.g. emoji_stats-shard0-of-4.db."""
+    root, ext = os.path.splitext(db_path)
+    return f"{root}-shard{index}-of-{shard_count}{ext or '.db'}"
+
+def shard_index(guild_id, shard_count):
+    """Stable shard number for a guild (crc32, unlike hash(), is the same in every process)."""
+    return zlib.crc32(str(guild_id).encode("utf-8")) % shard_count
+
+class _ShardWriter(threading.Thread):
+    """Owns one shard's connection; every statement for that file runs on this thread."""
+    def __init__(self, path, read_only=False):
+        super().__init__(name=f"db-shard:{os.path.basename(path)}", daemon=True)
+        self.path = path
+        self.read_only = read_only
+        self._jobs = queue.Queue()
+        self._connected = Future()
+        self.start()
+        self._connected.result() # Re-raise connection errors in the caller
+
+    def run(self):
+        try:
+            conn = get_db_connection(self.path, read_only=self.read_only)
+        except Exception as e:
+            self._connected.set_exception(e)
+            return
+        self._connected.set_result(True)
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            future, func, args, kwargs = job
+            try:
+                future.set_result(func(conn, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+        close_db_connection(conn)
+
+    def submit(self, func, *args, **kwargs):
+        """Queue `func(conn, *args, **kwargs)` on this shard's thread; returns a Future."""
+        future = Future()
+        self._jobs.put((future, func, args, kwargs))
+        return future
+
+    def stop(self):
+        self._jobs.put(None)
+        self.join()
+
+class ShardRouter:
+    """Stands in for a connection when the database is split into several guild-hash shards."""
+    def __init__(self, db_path, shard_count, read_only=False):
+        if shard_count < 2:
+            raise ValueError("A ShardRouter needs at least two shards; use get_db_connection() otherwise.")
+        self.db_path = db_path
+        self.shard_count = shard_count
+        self.paths = [shard_path(db_path, index, shard_count) for index in range(shard_count)]
+        self._writers = [_ShardWriter(path, read_only=read_only) for path in self.paths]
+        if not read_only:
+            log.info(f"Database split across {shard_count} shard files ({self.paths[0]}, ...).")
+
+    def shard_for(self, guild_id):
+        return shard_index(guild_id, self.shard_count)
+
+    def run(self, guild_id, func, *args, **kwargs):
+        """Run `func(shard_conn, *args, **kwargs)` on the shard owning `guild_id` and return its result."""
+        return self._writers[self.shard_for(guild_id)].submit(func, *args, **kwargs).result()
+
+    def fan_out(self, func, *args, **kwargs):
+        """Run `func(shard_conn, *args, **kwargs)` on every shard in parallel; returns the results in shard order."""
+        futures = [writer.submit(func, *args, **kwargs) for writer in self._writers]
+        return [future.result() for future in futures]
+
+    def partition(self, items, guild_of):
+        """Group `items` by owning shard: {shard_index: [item, ...]}."""
+        parts = {}
+        for item in items:
+            parts.setdefault(self.shard_for(guild_of(item)), []).append(item)
+        return parts
+
+    def run_partitioned(self, parts, func, *args, **kwargs):
+        """Run `func(shard_conn, part, *args, **kwargs)` for each {shard_index: part} in parallel; returns the results."""
+        futures = [self._writers[index].submit(func, part, *args, **kwargs) for index, part in parts.items()]
+        return [future.result() for future in futures]
+
+    def close(self):
+        for writer in self._writers:
+            writer.stop()
+        self._writers = []
+
+def open_database(db_path="emoji_stats.db", shards=1, read_only=False):
+    """Open the database: a plain connection, or a ShardRouter over `shards` guild-hash shard files.
+
+    `read_only=True` opens reader connections for snapshot reads next to the writer (see get_guild_overview).
+    """
+    if shards and shards > 1:
+        return ShardRouter(db_path, shards, read_only=read_only)
+    return get_db_connection(db_path, read_only=read_only)
+
+def _guild_routed(func):
+    """Decorator for `func(conn, guild_id, ...)`: with a ShardRouter, run it on the guild's shard."""
+    @functools.wraps(func)
+    def wrapper(conn, guild_id, *args, **kwargs):
+        if isinstance(conn, ShardRouter):
+            return conn.run(guild_id, func, guild_id, *args, **kwargs)
+        return func(conn, guild_id, *args, **kwargs)
+    return wrapper
+
+def _fanned_out(combine):
+    """Decorator for cross-guild `func(conn, ...)`: with a ShardRouter, run it on every shard and `combine` the results."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(conn, *args, **kwargs):
+            if isinstance(conn, ShardRouter):
+                return combine(conn.fan_out(func, *args, **kwargs))
+            return func(conn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def _sum_or_none(results):
+    return None if any(result is None for result in results) else sum(results)
+
 # --- Database Execution Wrapper ---
 def safe_db_execute(conn, query, params=()):
     """Execute a database query safely with error handling and rollback."""
@@ -56,6 +208,52 @@ def safe_db_execute(conn, query, params=()):
         return False, None # Indicate failure
     # No finally block needed to close cursor if we return it
 
+def execute_in_transaction(conn, statements):
+    """Execute several (query, params) statements atomically; rolls back all of them on error."""
+    if not conn:
+        log.error("Cannot execute transaction: No database connection.")
+        return False
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        for query, params in statements:
+            cursor.execute(query, params)
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        log.error(f"Database error during transaction: {e}")
+        try:
+            conn.rollback()
+            log.info("Database rollback successful.")
+        except sqlite3.Error as rb_e:
+            log.error(f"Error during rollback: {rb_e}")
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+
+def execute_many_in_transaction(conn, query, rows):
+    """Run `executemany` for one statement over many parameter rows, committing once."""
+    if not conn:
+        log.error("Cannot execute transaction: No database connection.")
+        return False
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(query, rows)
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        log.error(f"Database error during executemany: {e} (Query: {query})")
+        try:
+            conn.rollback()
+        except sqlite3.Error as rb_e:
+            log.error(f"Error during rollback: {rb_e}")
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+
 # --- Table Name Sanitization ---
 def sanitize_table_name(name):
     """Sanitize table names to prevent SQL injection by allowing only alphanumeric and underscore."""
@@ -71,7 +269,20 @@ def sanitize_table_name(name):
         raise ValueError(f"Invalid name for table sanitization: {name}")
     return sanitized
 
+def parse_timestamp(value):
+    """Parse a stored TIMESTAMP (naive UTC, as written by datetime.utcnow()) into an aware datetime."""
+    timestamp = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    return timestamp.replace(tzinfo=timezone.utc) if timestamp.tzinfo is None else timestamp
+
+def guild_id_from_table(table_name, table_type):
+    """Recover the guild ID from a table name such as guild__123_emojis (see sanitize_table_name)."""
+    sanitized = table_name[len("guild_"):-len(f"_{table_type}")]
+    if sanitized.startswith("_") and sanitized[1:].isdigit():
+        return sanitized[1:]
+    return sanitized
+
 # --- Guild Table Management ---
+@_guild_routed
 def ensure_guild_tables(conn, guild_id):
     """Create required tables for a specific guild if they don't exist."""
     try:
@@ -87,7 +298,11 @@ def ensure_guild_tables(conn, guild_id):
         "reactions": "name TEXT PRIMARY KEY, count INTEGER DEFAULT 0 NOT NULL, last_used TIMESTAMP",
         "stickers": "sticker_id TEXT PRIMARY KEY, name TEXT, count INTEGER DEFAULT 0 NOT NULL, last_used TIMESTAMP"
     }
-    success = True
+    # Count writes also maintain the cross-guild aggregate, so it must exist first
+    success = (ensure_global_tables(conn) and ensure_user_sketch_tables(conn) and ensure_emoji_pair_tables(conn)
+               and ensure_guild_settings_tables(conn) and ensure_channel_usage_tables(conn)
+               and ensure_guild_summary_tables(conn) and ensure_item_archive_tables(conn)
+               and ensure_heatmap_tables(conn) and ensure_digest_tables(conn))
     for table_type, schema in tables.items():
         # Use f-string correctly for table name construction
         safe_table_name = f"guild_{sanitized_id}_{table_type}"
@@ -100,7 +315,871 @@ def ensure_guild_tables(conn, guild_id):
             # log.debug(f"Ensured table {safe_table_name} exists.")
     return success
 
+# --- Global (Cross-Guild) Aggregate ---
+GUILD_TABLE_TYPES = ("emojis", "reactions", "stickers")
+
+@_fanned_out(all)
+def ensure_global_tables(conn):
+    """Create the cross-guild aggregate table; populate it from existing guild tables on first creation."""
+    executed, cursor = safe_db_execute(conn, "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'global_items';")
+    if not executed:
+        return False
+    exists = cursor.fetchone() is not None
+    cursor.close()
+    if exists:
+        return True
+
+    statements = [
+        (
+            "CREATE TABLE IF NOT EXISTS global_items ("
+            "table_type TEXT NOT NULL, item_key TEXT NOT NULL, name TEXT, "
+            "count INTEGER DEFAULT 0 NOT NULL, last_used TIMESTAMP, "
+            "PRIMARY KEY (table_type, item_key));",
+            ()
+        ),
+        ("CREATE INDEX IF NOT EXISTS idx_global_items_count ON global_items (table_type, count DESC);", ()),
+    ]
+    if not execute_in_transaction(conn, statements):
+        log.error("Failed to create global aggregate table.")
+        return False
+    log.info("Created global aggregate table; populating it from existing guild tables...")
+    return rebuild_global_aggregate(conn) is not None
+
+def list_guild_tables(conn, table_type):
+    """Yield the names of all per-guild tables of one type (e.g. guild__123_emojis)."""
+    if isinstance(conn, ShardRouter):
+        for names in conn.fan_out(lambda shard_conn: list(list_guild_tables(shard_conn, table_type))):
+            yield from names
+        return
+    executed, cursor = safe_db_execute(
+        conn,
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'guild\\_%\\_' || ? ESCAPE '\\' ORDER BY name;",
+        (table_type,)
+    )
+    if not executed or not cursor:
+        return
+    try:
+        for row in cursor:
+            yield row[0]
+    finally:
+        cursor.close()
+
+def _aggregate_guild_tables(conn, target_table):
+    """Sum every guild table into `target_table` one table at a time, entirely inside SQLite."""
+    cursor = conn.cursor()
+    try:
+        bases = _count_bases(cursor)
+        for table_type in GUILD_TABLE_TYPES:
+            key_column = "sticker_id" if table_type == "stickers" else "name"
+            name_column = "name" if table_type == "stickers" else "NULL"
+            # Materialize only the table names; the rows themselves never leave SQLite
+            for table_name in list(list_guild_tables(conn, table_type)):
+                count_column = _count_expression(bases.get(guild_id_from_table(table_name, table_type)))
+                cursor.execute(
+                    f"INSERT INTO {target_table} (table_type, item_key, name, count, last_used) "
+                    f"SELECT ?, {key_column}, {name_column}, {count_column}, last_used FROM {table_name} WHERE count > 0 "
+                    f"ON CONFLICT(table_type, item_key) DO UPDATE SET count = count + excluded.count, "
+                    f"last_used = MAX(COALESCE(last_used, excluded.last_used), COALESCE(excluded.last_used, last_used)), "
+                    f"name = COALESCE(excluded.name, name);",
+                    (table_type,)
+                )
+    finally:
+        cursor.close()
+
+@_fanned_out(_sum_or_none) # Each shard's aggregate covers the guilds stored in it
+def check_global_aggregate(conn, repair=False):
+    """Rebuild the aggregate from the per-guild tables in a streaming pass and compare it with the live one.
+
+    Returns the number of mismatched (table_type, item_key) rows, or None on error.
+    With repair=True the live aggregate is replaced by the rebuilt one in the same transaction.
+    """
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DROP TABLE IF EXISTS temp.global_items_check;")
+        cursor.execute(
+            "CREATE TEMP TABLE global_items_check ("
+            "table_type TEXT NOT NULL, item_key TEXT NOT NULL, name TEXT, "
+            "count INTEGER DEFAULT 0 NOT NULL, last_used TIMESTAMP, "
+            "PRIMARY KEY (table_type, item_key));"
+        )
+        _aggregate_guild_tables(conn, "temp.global_items_check")
+        # Rows whose count differs, in either direction (zero-count rows are equivalent to missing ones)
+        mismatches = cursor.execute(
+            "SELECT COUNT(*) FROM ("
+            "SELECT table_type, item_key FROM ("
+            "SELECT table_type, item_key, count FROM main.global_items WHERE count > 0 "
+            "EXCEPT SELECT table_type, item_key, count FROM temp.global_items_check) "
+            "UNION "
+            "SELECT table_type, item_key FROM ("
+            "SELECT table_type, item_key, count FROM temp.global_items_check "
+            "EXCEPT SELECT table_type, item_key, count FROM main.global_items WHERE count > 0));"
+        ).fetchone()[0]
+        if repair and mismatches:
+            cursor.execute("DELETE FROM main.global_items;")
+            cursor.execute("INSERT INTO main.global_items SELECT * FROM temp.global_items_check;")
+            log.info(f"Global aggregate repaired ({mismatches} mismatched rows).")
+        cursor.execute("DROP TABLE temp.global_items_check;")
+        conn.commit()
+        return mismatches
+    except sqlite3.Error as e:
+        log.error(f"Database error while checking global aggregate: {e}")
+        try:
+            conn.rollback()
+        except sqlite3.Error as rb_e:
+            log.error(f"Error during rollback: {rb_e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+
+def rebuild_global_aggregate(conn):
+    """Replace the global aggregate with a fresh sum of all guild tables. Returns mismatches fixed, or None on error."""
+    return check_global_aggregate(conn, repair=True)
+
+def get_global_top_items(conn, table_type, limit=10):
+    """Fetch the top N items across all guilds from the global aggregate."""
+    if isinstance(conn, ShardRouter):
+        # Every shard aggregates its own guilds, so an item's global count is the sum over shards
+        totals, names = {}, {}
+        for rows in conn.fan_out(get_global_top_items, table_type, None):
+            for row in rows:
+                totals[row["item_key"]] = totals.get(row["item_key"], 0) + row["count"]
+                names.setdefault(row["item_key"], row["name"])
+        ranked = sorted(totals.items(), key=lambda entry: entry[1], reverse=True)
+        if limit is not None and isinstance(limit, int) and limit > 0:
+            ranked = ranked[:limit]
+        return [{"name": names[key], "item_key": key, "count": count} for key, count in ranked]
+    limit_clause = f"LIMIT {int(limit)}" if limit is not None and isinstance(limit, int) and limit > 0 else ""
+    query = (
+        f"SELECT COALESCE(name, item_key) AS name, item_key, count FROM global_items "
+        f"WHERE table_type = ? AND count > 0 ORDER BY count DESC {limit_clause};"
+    )
+    executed, cursor = safe_db_execute(conn, query, (table_type,))
+    if executed and cursor:
+        try:
+            return cursor.fetchall()
+        except sqlite3.Error as fetch_err:
+            log.error(f"Error fetching global results: {fetch_err}")
+            return []
+        finally:
+            cursor.close()
+    return []
+
+def sum_guild_tables(conn, table_type, table_names):
+    """Sum the (estimated) counts of the given guild tables of one type: {item_key: [name, count]}.
+
+    A cross-check of the global aggregate that callers can split across connections and run in parallel.
+    """
+    key_column = "sticker_id" if table_type == "stickers" else "name"
+    name_column = "name" if table_type == "stickers" else "NULL"
+    bases = _count_bases(conn)
+    totals = {}
+    for table_name in table_names:
+        count_column = _count_expression(bases.get(guild_id_from_table(table_name, table_type)))
+        for key, name, count in conn.execute(f"SELECT {key_column}, {name_column}, {count_column} FROM {table_name} WHERE count > 0;"):
+            entry = totals.get(key)
+            if entry is None:
+                totals[key] = [name, count]
+            else:
+                entry[1] += count
+                entry[0] = entry[0] or name
+    return totals
+
+# --- Per-User Sketches ---
+@_fanned_out(all)
+def ensure_user_sketch_tables(conn):
+    """Create the table holding serialized per-guild user sketches (Count-Min / HyperLogLog)."""
+    query = (
+        "CREATE TABLE IF NOT EXISTS user_sketches ("
+        "guild_id TEXT NOT NULL, kind TEXT NOT NULL, sketch_key TEXT NOT NULL, "
+        "data BLOB NOT NULL, updated_at TIMESTAMP, "
+        "PRIMARY KEY (guild_id, kind, sketch_key));"
+    )
+    executed, cursor = safe_db_execute(conn, query)
+    if cursor:
+        cursor.close()
+    return executed
+
+@_guild_routed
+def load_user_sketch(conn, guild_id, kind, sketch_key):
+    """Return the serialized sketch bytes, or None if it doesn't exist."""
+    executed, cursor = safe_db_execute(
+        conn,
+        "SELECT data FROM user_sketches WHERE guild_id = ? AND kind = ? AND sketch_key = ?;",
+        (str(guild_id), kind, sketch_key)
+    )
+    if executed and cursor:
+        try:
+            row = cursor.fetchone()
+            return bytes(row[0]) if row else None
+        except sqlite3.Error as fetch_err:
+            log.error(f"Error fetching user sketch: {fetch_err}")
+            return None
+        finally:
+            cursor.close()
+    return None
+
+def save_user_sketches(conn, rows):
+    """Upsert serialized sketches given as (guild_id, kind, sketch_key, data) tuples, in one transaction (per shard)."""
+    if isinstance(conn, ShardRouter):
+        return all(conn.run_partitioned(conn.partition(rows, lambda row: row[0]), save_user_sketches))
+    now = datetime.utcnow()
+    query = (
+        "INSERT INTO user_sketches (guild_id, kind, sketch_key, data, updated_at) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(guild_id, kind, sketch_key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at;"
+    )
+    return execute_many_in_transaction(conn, query, [(g, k, sk, sqlite3.Binary(d), now) for g, k, sk, d in rows])
+
+# --- Emoji Co-occurrence Pairs ---
+@_fanned_out(all)
+def ensure_emoji_pair_tables(conn):
+    """Create the table holding each guild's top co-occurring emoji pairs."""
+    query = (
+        "CREATE TABLE IF NOT EXISTS emoji_pairs ("
+        "guild_id TEXT NOT NULL, item_a TEXT NOT NULL, item_b TEXT NOT NULL, "
+        "count INTEGER NOT NULL, error INTEGER DEFAULT 0 NOT NULL, "
+        "PRIMARY KEY (guild_id, item_a, item_b));"
+    )
+    executed, cursor = safe_db_execute(conn, query)
+    if cursor:
+        cursor.close()
+    return executed
+
+@_guild_routed
+def load_emoji_pairs(conn, guild_id):
+    """Fetch a guild's stored pairs (item_a, item_b, count, error), most frequent first."""
+    executed, cursor = safe_db_execute(
+        conn,
+        "SELECT item_a, item_b, count, error FROM emoji_pairs WHERE guild_id = ? ORDER BY count DESC;",
+        (str(guild_id),)
+    )
+    if executed and cursor:
+        try:
+            return cursor.fetchall()
+        except sqlite3.Error as fetch_err:
+            log.error(f"Error fetching emoji pairs: {fetch_err}")
+            return []
+        finally:
+            cursor.close()
+    return []
+
+@_guild_routed
+def replace_emoji_pairs(conn, guild_id, rows):
+    """Atomically replace a guild's stored pairs with (item_a, item_b, count, error) rows."""
+    guild_id = str(guild_id)
+    statements = [("DELETE FROM emoji_pairs WHERE guild_id = ?;", (guild_id,))]
+    statements.extend(
+        ("INSERT INTO emoji_pairs (guild_id, item_a, item_b, count, error) VALUES (?, ?, ?, ?, ?);", (guild_id, a, b, count, error))
+        for a, b, count, error in rows
+    )
+    return execute_in_transaction(conn, statements)
+
+# --- Per-Channel Usage ---
+@_fanned_out(all)
+def ensure_channel_usage_tables(conn):
+    """Create the table holding one usage summary row per channel (see utils/channel_stats.py)."""
+    statements = [
+        (
+            "CREATE TABLE IF NOT EXISTS channel_usage ("
+            "guild_id TEXT NOT NULL, channel_id INTEGER NOT NULL, "
+            "total INTEGER DEFAULT 0 NOT NULL, messages INTEGER DEFAULT 0 NOT NULL, "
+            "error INTEGER DEFAULT 0 NOT NULL, top_items TEXT NOT NULL, updated_at TIMESTAMP, "
+            "PRIMARY KEY (guild_id, channel_id));",
+            ()
+        ),
+        ("CREATE INDEX IF NOT EXISTS idx_channel_usage_total ON channel_usage (guild_id, total DESC);", ()),
+    ]
+    return execute_in_transaction(conn, statements)
+
+@_guild_routed
+def load_channel_usage(conn, guild_id, channel_id):
+    """Fetch one channel's stored summary row (total, messages, error, top_items), or None."""
+    executed, cursor = safe_db_execute(
+        conn,
+        "SELECT total, messages, error, top_items FROM channel_usage WHERE guild_id = ? AND channel_id = ?;",
+        (str(guild_id), int(channel_id))
+    )
+    if executed and cursor:
+        try:
+            return cursor.fetchone()
+        except sqlite3.Error as fetch_err:
+            log.error(f"Error fetching channel usage: {fetch_err}")
+            return None
+        finally:
+            cursor.close()
+    return None
+
+def save_channel_usage(conn, rows):
+    """Upsert channel summaries given as (guild_id, channel_id, total, messages, error, top_items) tuples, in one transaction (per shard)."""
+    if isinstance(conn, ShardRouter):
+        return all(conn.run_partitioned(conn.partition(rows, lambda row: row[0]), save_channel_usage))
+    now = datetime.utcnow()
+    query = (
+        "INSERT INTO channel_usage (guild_id, channel_id, total, messages, error, top_items, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(guild_id, channel_id) DO UPDATE SET total = excluded.total, messages = excluded.messages, "
+        "error = excluded.error, top_items = excluded.top_items, updated_at = excluded.updated_at;"
+    )
+    return execute_many_in_transaction(conn, query, [row + (now,) for row in rows])
+
+@_guild_routed
+def get_top_channels(conn, guild_id, limit=10):
+    """Fetch a guild's channels by emoji total, highest first (served by idx_channel_usage_total)."""
+    limit_clause = f"LIMIT {int(limit)}" if limit is not None and isinstance(limit, int) and limit > 0 else ""
+    executed, cursor = safe_db_execute(
+        conn,
+        f"SELECT channel_id, total, messages, error, top_items FROM channel_usage WHERE guild_id = ? ORDER BY total DESC {limit_clause};",
+        (str(guild_id),)
+    )
+    if executed and cursor:
+        try:
+            return cursor.fetchall()
+        except sqlite3.Error as fetch_err:
+            log.error(f"Error fetching channel usage: {fetch_err}")
+            return []
+        finally:
+            cursor.close()
+    return []
+
+# --- Hour-of-Week Heatmaps ---
+# One row per (guild, type, item): HEATMAP_SLOTS unsigned 32-bit counters (little-endian) packed in a blob,
+# slot = weekday * 24 + hour in UTC (Monday 00:00 is slot 0). See utils/heatmap.py.
+HEATMAP_SLOTS = 168
+
+@_fanned_out(all)
+def ensure_heatmap_tables(conn):
+    """Create the table holding one packed hour-of-week counter array per item."""
+    statements = [(
+        "CREATE TABLE IF NOT EXISTS usage_heatmaps ("
+        "guild_id TEXT NOT NULL, table_type TEXT NOT NULL, item_key TEXT NOT NULL, "
+        "slots BLOB NOT NULL, updated_at TIMESTAMP, "
+        "PRIMARY KEY (guild_id, table_type, item_key));",
+        ()
+    )]
+    return execute_in_transaction(conn, statements)
+
+def _unpack_heatmap(blob):
+    slots = array.array("I")
+    if blob and len(blob) == HEATMAP_SLOTS * slots.itemsize:
+        slots.frombytes(blob)
+        if sys.byteorder == "big":
+            slots.byteswap()
+        return slots
+    return array.array("I", [0]) * HEATMAP_SLOTS
+
+def _pack_heatmap(slots):
+    if sys.byteorder == "big":
+        slots = array.array("I", slots)
+        slots.byteswap()
+    return slots.tobytes()
+
+def add_heatmap_deltas(conn, rows):
+    """Add sparse slot deltas, given as (guild_id, table_type, item_key, {slot: delta}) tuples, to the stored
+    heatmaps in one transaction (per shard).
+
+    The rows are read, updated and written back under the write lock, so two flushes cannot lose increments.
+    """
+    if isinstance(conn, ShardRouter):
+        return all(conn.run_partitioned(conn.partition(rows, lambda row: row[0]), add_heatmap_deltas))
+    if not rows:
+        return True
+    keys_by_table = {}
+    for guild_id, table_type, item_key, _ in rows:
+        keys_by_table.setdefault((str(guild_id), table_type), []).append(item_key)
+    now = datetime.utcnow()
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE;")
+        stored = {}
+        for (guild_id, table_type), keys in keys_by_table.items():
+            cursor.execute(
+                "SELECT item_key, slots FROM usage_heatmaps WHERE guild_id = ? AND table_type = ? "
+                "AND item_key IN (SELECT value FROM json_each(?));",
+                (guild_id, table_type, json.dumps(keys))
+            )
+            for item_key, blob in cursor.fetchall():
+                stored[(guild_id, table_type, item_key)] = blob
+        updates = []
+        for guild_id, table_type, item_key, deltas in rows:
+            slots = _unpack_heatmap(stored.get((str(guild_id), table_type, item_key)))
+            for slot, delta in deltas.items():
+                slots[slot] = min(max(slots[slot] + delta, 0), 0xFFFFFFFF)
+            updates.append((str(guild_id), table_type, item_key, _pack_heatmap(slots), now))
+        cursor.executemany(
+            "INSERT INTO usage_heatmaps (guild_id, table_type, item_key, slots, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(guild_id, table_type, item_key) DO UPDATE SET slots = excluded.slots, updated_at = excluded.updated_at;",
+            updates
+        )
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        log.error(f"Database error saving usage heatmaps: {e}")
+        try:
+            conn.rollback()
+        except sqlite3.Error as rb_e:
+            log.error(f"Error during rollback: {rb_e}")
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+
+@_guild_routed
+def get_heatmap_blobs(conn, guild_id, table_type, item_key=None):
+    """Return the packed heatmaps of one item, or of every item of a guild table (see utils/heatmap.py)."""
+    query = "SELECT slots FROM usage_heatmaps WHERE guild_id = ? AND table_type = ?"
+    params = [str(guild_id), table_type]
+    if item_key is not None:
+        query += " AND item_key = ?"
+        params.append(item_key)
+    executed, cursor = safe_db_execute(conn, query + ";", params)
+    if executed and cursor:
+        try:
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    return []
+
+# --- Weekly Digests ---
+# Guilds opt in by setting "digest_channel". A digest compares the counts with a copy taken when the previous
+# one was sent (digest_baselines), so its movers are the items used most since then. "digest_period" is the
+# last period sent and "digest_pending" the one being sent, so a restart neither repeats nor skips a guild.
+# Scheduling lives in utils/digest.py and cogs/events/digest_tasks.py.
+DIGEST_CHANNEL_SETTING = "digest_channel"
+DIGEST_SENT_SETTING = "digest_period"
+DIGEST_PENDING_SETTING = "digest_pending"
+
+@_fanned_out(all)
+def ensure_digest_tables(conn):
+    """Create the table holding each guild's counts as of its last digest."""
+    query = (
+        "CREATE TABLE IF NOT EXISTS digest_baselines ("
+        "guild_id TEXT NOT NULL, table_type TEXT NOT NULL, item_key TEXT NOT NULL, count INTEGER NOT NULL, "
+        "PRIMARY KEY (guild_id, table_type, item_key)) WITHOUT ROWID;"
+    )
+    executed, _ = safe_db_execute(conn, query)
+    if not executed:
+        log.error("Failed to create digest baseline table.")
+    return executed
+
+def _digest_key_column(table_type):
+    return "sticker_id" if table_type == "stickers" else "name"
+
+@_guild_routed
+def get_digest_rows(conn, guild_id, unused_candidates=()):
+    """Read everything a digest needs in one query; returns (section, item_key, name, count, baseline) tuples.
+
+    Sections: each table type with its items used since the last digest (baseline None for items first used
+    since then), "unused" with the `unused_candidates` keys (the guild's custom emojis) never used in a message
+    or as a reaction, live or archived, and one "baseline" row whose count is the number of baseline rows
+    (0 before the first digest). None on error.
+    """
+    try:
+        sanitized_id = sanitize_table_name(guild_id)
+    except ValueError as e:
+        log.error(f"Invalid guild ID for get_digest_rows: {guild_id} - {e}")
+        return None
+    guild_id = str(guild_id)
+    base = get_count_base(conn, guild_id)
+    count = _count_expression(base, "item.count")
+    if unused_candidates:
+        # Archived items left the live tables but were used; the archive is compressed, so it is checked here
+        archived = set(get_archived_items(conn, guild_id, "emojis")) | set(get_archived_items(conn, guild_id, "reactions"))
+        unused_candidates = [key for key in unused_candidates if key not in archived]
+    parts, params = [], []
+    for table_type in GUILD_TABLE_TYPES:
+        key_column = _digest_key_column(table_type)
+        name_column = "item.name" if table_type == "stickers" else "NULL"
+        parts.append(
+            f"SELECT ?, item.{key_column}, {name_column}, {count}, baseline.count "
+            f"FROM guild_{sanitized_id}_{table_type} AS item LEFT JOIN digest_baselines AS baseline "
+            f"ON baseline.guild_id = ? AND baseline.table_type = ? AND baseline.item_key = item.{key_column} "
+            f"WHERE item.count > 0 AND (baseline.count IS NULL OR {count} > baseline.count)"
+        )
+        params += [table_type, guild_id, table_type]
+    parts.append(
+        f"SELECT 'unused', value, NULL, 0, NULL FROM json_each(?) "
+        f"WHERE value NOT IN (SELECT name FROM guild_{sanitized_id}_emojis WHERE count > 0) "
+        f"AND value NOT IN (SELECT name FROM guild_{sanitized_id}_reactions WHERE count > 0)"
+    )
+    params.append(json.dumps(list(unused_candidates)))
+    parts.append("SELECT 'baseline', NULL, NULL, COUNT(*), NULL FROM digest_baselines WHERE guild_id = ?")
+    params.append(guild_id)
+    executed, cursor = safe_db_execute(conn, " UNION ALL ".join(parts) + ";", params)
+    if executed and cursor:
+        try:
+            return [tuple(row) for row in cursor.fetchall()]
+        except sqlite3.Error as fetch_err:
+            log.error(f"Error fetching digest rows: {fetch_err}")
+            return None
+        finally:
+            cursor.close()
+    return None
+
+@_guild_routed
+def record_digest_sent(conn, guild_id, period):
+    """Mark digest `period` sent and copy the guild's current counts into its baseline, in one transaction."""
+    try:
+        sanitized_id = sanitize_table_name(guild_id)
+    except ValueError as e:
+        log.error(f"Invalid guild ID for record_digest_sent: {guild_id} - {e}")
+        return False
+    guild_id = str(guild_id)
+    count = _count_expression(get_count_base(conn, guild_id))
+    statements = [("DELETE FROM digest_baselines WHERE guild_id = ?;", (guild_id,))]
+    for table_type in GUILD_TABLE_TYPES:
+        key_column = _digest_key_column(table_type)
+        statements.append((
+            f"INSERT INTO digest_baselines (guild_id, table_type, item_key, count) "
+            f"SELECT ?, ?, {key_column}, {count} FROM guild_{sanitized_id}_{table_type} WHERE count > 0;",
+            (guild_id, table_type)
+        ))
+    statements.append((
+        "INSERT INTO guild_settings (guild_id, key, value) VALUES (?, ?, ?) "
+        "ON CONFLICT(guild_id, key) DO UPDATE SET value = excluded.value;",
+        (guild_id, DIGEST_SENT_SETTING, str(int(period)))
+    ))
+    statements.append(("DELETE FROM guild_settings WHERE guild_id = ? AND key = ?;", (guild_id, DIGEST_PENDING_SETTING)))
+    if not execute_in_transaction(conn, statements):
+        log.error(f"Failed to record digest {period} of guild {guild_id}")
+        return False
+    return True
+
+# --- Per-Guild Settings ---
+@_fanned_out(all)
+def ensure_guild_settings_tables(conn):
+    """Create the key/value table holding per-guild configuration overrides."""
+    query = (
+        "CREATE TABLE IF NOT EXISTS guild_settings ("
+        "guild_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT, "
+        "PRIMARY KEY (guild_id, key));"
+    )
+    executed, cursor = safe_db_execute(conn, query)
+    if cursor:
+        cursor.close()
+    return executed
+
+@_guild_routed
+def get_guild_settings(conn, guild_id):
+    """Return a guild's settings as {key: value string}."""
+    executed, cursor = safe_db_execute(conn, "SELECT key, value FROM guild_settings WHERE guild_id = ?;", (str(guild_id),))
+    if executed and cursor:
+        try:
+            return {row["key"]: row["value"] for row in cursor.fetchall()}
+        except sqlite3.Error as fetch_err:
+            log.error(f"Error fetching guild settings: {fetch_err}")
+            return {}
+        finally:
+            cursor.close()
+    return {}
+
+@_guild_routed
+def set_guild_settings(conn, guild_id, settings):
+    """Upsert several {key: value} settings for a guild in one transaction (a None value deletes the key)."""
+    guild_id = str(guild_id)
+    statements = []
+    for key, value in settings.items():
+        if value is None:
+            statements.append(("DELETE FROM guild_settings WHERE guild_id = ? AND key = ?;", (guild_id, key)))
+        else:
+            statements.append((
+                "INSERT INTO guild_settings (guild_id, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(guild_id, key) DO UPDATE SET value = excluded.value;",
+                (guild_id, key, str(value))
+            ))
+    return execute_in_transaction(conn, statements)
+
+def _merge_dicts(results):
+    merged = {}
+    for result in results:
+        merged.update(result)
+    return merged
+
+@_fanned_out(_merge_dicts)
+def get_guilds_with_setting(conn, key):
+    """Return {guild_id: value} for every guild that has `key` set."""
+    executed, cursor = safe_db_execute(conn, "SELECT guild_id, value FROM guild_settings WHERE key = ?;", (key,))
+    if executed and cursor:
+        try:
+            return {row["guild_id"]: row["value"] for row in cursor.fetchall()}
+        except sqlite3.Error as fetch_err:
+            log.error(f"Error fetching guild settings: {fetch_err}")
+            return {}
+        finally:
+            cursor.close()
+    return {}
+
+# --- Approximate Counting Mode ---
+# A guild_settings entry "count_base" switches a guild's tables to Morris registers (utils/approx_count.py).
+# Writes turn count deltas into register changes at commit time, reads scale registers back to estimates.
+COUNT_BASE_SETTING = "count_base"
+
+def _count_bases(cursor):
+    """Return {guild_id: register base} for every guild in approximate counting mode."""
+    try:
+        rows = cursor.execute("SELECT guild_id, value FROM guild_settings WHERE key = ?;", (COUNT_BASE_SETTING,)).fetchall()
+    except sqlite3.OperationalError:
+        return {} # Settings table not created yet: every guild counts exactly
+    return {row[0]: float(row[1]) for row in rows}
+
+def _count_expression(base, column="count"):
+    """SQL expression for the (estimated) count held in `column`."""
+    return f"morris_estimate({column}, {float(base)!r})" if base else column
+
+@_guild_routed
+def get_count_base(conn, guild_id):
+    """Return the Morris register base of a guild in approximate counting mode, or None if it counts exactly."""
+    value = get_guild_settings(conn, guild_id).get(COUNT_BASE_SETTING)
+    return float(value) if value else None
+
+def get_count_error(conn, guild_id):
+    """Relative standard error of a guild's counts: None when it counts exactly."""
+    base = get_count_base(conn, guild_id)
+    return approx_count.relative_error(base) if base else None
+
+@_guild_routed
+def set_count_base(conn, guild_id, base):
+    """Switch a guild between exact (base=None) and approximate counting, converting its stored counts.
+
+    Counts are converted in one transaction together with the guild's share of the global aggregate,
+    which always holds (estimated) counts. The current base is read inside that transaction, taken with
+    the write lock up front, so no count batch can commit deltas under the old base in between. Call it
+    from the thread that owns `conn`'s other writes (the event loop for bot.db_conn).
+    """
+    try:
+        sanitized_id = sanitize_table_name(guild_id)
+    except ValueError as e:
+        log.error(f"Invalid guild ID for set_count_base: {guild_id} - {e}")
+        return False
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE;")
+        old_base = _count_bases(cursor).get(str(guild_id))
+        if old_base == base:
+            conn.rollback()
+            return True
+        for query, params in _count_base_statements(sanitized_id, guild_id, old_base, base):
+            cursor.execute(query, params)
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        log.error(f"Failed to switch counting mode for guild {guild_id}: {e}")
+        try:
+            conn.rollback()
+        except sqlite3.Error as rb_e:
+            log.error(f"Error during rollback: {rb_e}")
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+
+def _count_base_statements(sanitized_id, guild_id, old_base, base):
+    """Statements converting a guild's stored counts from `old_base` to `base` (None: exact counts)."""
+    statements = []
+    for table_type in GUILD_TABLE_TYPES:
+        table_name = f"guild_{sanitized_id}_{table_type}"
+        if old_base and base:
+            conversion = f"morris_register(morris_estimate(count, {old_base!r}), {base!r})"
+        elif base:
+            conversion = f"morris_register(count, {base!r})"
+        else:
+            conversion = f"morris_estimate(count, {old_base!r})"
+        statements.append(_subtract_from_global_statement(table_name, table_type, old_base))
+        statements.append((f"UPDATE {table_name} SET count = {conversion} WHERE count > 0;", ()))
+        statements.append(_add_to_global_statement(table_name, table_type, base))
+        statements.append(_rebuild_summary_statement(table_name, guild_id, table_type, base))
+    if base:
+        statements.append((
+            "INSERT INTO guild_settings (guild_id, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT(guild_id, key) DO UPDATE SET value = excluded.value;",
+            (str(guild_id), COUNT_BASE_SETTING, repr(float(base)))
+        ))
+    else:
+        statements.append(("DELETE FROM guild_settings WHERE guild_id = ? AND key = ?;", (str(guild_id), COUNT_BASE_SETTING)))
+    return statements
+
+# --- Guild Summary ---
+# One row per (guild, table type) with totals maintained by every count write, in the same transaction:
+# first_seen (tracking start), last_activity, total_uses, distinct_items, and a write_generation that
+# increases with every committed change (a cheap cache key for anything derived from the counts).
+_GUILD_SUMMARY_UPSERT = (
+    "INSERT INTO guild_summary (guild_id, table_type, first_seen, last_activity, total_uses, distinct_items, write_generation) "
+    "VALUES (?, ?, ?, ?, MAX(?, 0), MAX(?, 0), 1) "
+    "ON CONFLICT(guild_id, table_type) DO UPDATE SET "
+    "first_seen = COALESCE(MIN(first_seen, excluded.first_seen), first_seen, excluded.first_seen), "
+    "last_activity = COALESCE(MAX(last_activity, excluded.last_activity), excluded.last_activity, last_activity), "
+    "total_uses = MAX(total_uses + ?, 0), distinct_items = MAX(distinct_items + ?, 0), "
+    "write_generation = write_generation + 1;"
+)
+
+@_fanned_out(all)
+def ensure_guild_summary_tables(conn):
+    """Create the per-guild summary table; populate it from existing guild tables on first creation."""
+    executed, cursor = safe_db_execute(conn, "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'guild_summary';")
+    if not executed:
+        return False
+    exists = cursor.fetchone() is not None
+    cursor.close()
+    if exists:
+        return True
+    query = (
+        "CREATE TABLE IF NOT EXISTS guild_summary ("
+        "guild_id TEXT NOT NULL, table_type TEXT NOT NULL, "
+        "first_seen TIMESTAMP, last_activity TIMESTAMP, "
+        "total_uses INTEGER DEFAULT 0 NOT NULL, distinct_items INTEGER DEFAULT 0 NOT NULL, "
+        "write_generation INTEGER DEFAULT 0 NOT NULL, "
+        "PRIMARY KEY (guild_id, table_type));"
+    )
+    if not execute_in_transaction(conn, [(query, ())]):
+        log.error("Failed to create guild summary table.")
+        return False
+    log.info("Created guild summary table; populating it from existing guild tables...")
+    bases = _count_bases(conn)
+    statements = []
+    for table_type in GUILD_TABLE_TYPES:
+        for table_name in list(list_guild_tables(conn, table_type)):
+            guild_id = guild_id_from_table(table_name, table_type)
+            statements.append(_rebuild_summary_statement(table_name, guild_id, table_type, bases.get(guild_id)))
+    return execute_in_transaction(conn, statements)
+
+def _rebuild_summary_statement(table_name, guild_id, table_type, base=None):
+    """Build the statement recomputing one summary row from its guild table (first_seen is kept if known)."""
+    query = (
+        f"INSERT INTO guild_summary (guild_id, table_type, first_seen, last_activity, total_uses, distinct_items, write_generation) "
+        f"SELECT ?, ?, MIN(last_used), MAX(last_used), COALESCE(SUM({_count_expression(base)}), 0), COUNT(*), 1 "
+        f"FROM {table_name} WHERE count > 0 "
+        f"ON CONFLICT(guild_id, table_type) DO UPDATE SET first_seen = COALESCE(first_seen, excluded.first_seen), "
+        f"last_activity = excluded.last_activity, total_uses = excluded.total_uses, "
+        f"distinct_items = excluded.distinct_items, write_generation = write_generation + 1;"
+    )
+    return query, (str(guild_id), table_type)
+
+def _clear_summary_statement(guild_id):
+    """Build the statement zeroing a guild's summary after a wipe/reset (tracking starts over)."""
+    return (
+        "UPDATE guild_summary SET first_seen = NULL, last_activity = NULL, total_uses = 0, distinct_items = 0, "
+        "write_generation = write_generation + 1 WHERE guild_id = ?;",
+        (str(guild_id),)
+    )
+
+def _update_guild_summary(cursor, guild_id, table_type, total_change, distinct_change, incremented, now, first_used=None):
+    """Fold one table write into the guild's summary row (same transaction as the counts).
+
+    `first_used` is the earliest use in the write when it is older than `now` (backfilled history).
+    """
+    if not total_change and not distinct_change and not incremented:
+        return
+    used = now if incremented else None
+    first = (first_used or now) if incremented else None
+    cursor.execute(_GUILD_SUMMARY_UPSERT, (
+        str(guild_id), table_type, first, used, total_change, distinct_change, total_change, distinct_change
+    ))
+
+@_guild_routed
+def get_guild_summary(conn, guild_id):
+    """Return {table_type: row} with first_seen, last_activity, total_uses, distinct_items and write_generation."""
+    executed, cursor = safe_db_execute(
+        conn,
+        "SELECT table_type, first_seen, last_activity, total_uses, distinct_items, write_generation "
+        "FROM guild_summary WHERE guild_id = ?;",
+        (str(guild_id),)
+    )
+    if executed and cursor:
+        try:
+            return {row["table_type"]: row for row in cursor.fetchall()}
+        except sqlite3.Error as fetch_err:
+            log.error(f"Error fetching guild summary: {fetch_err}")
+            return {}
+        finally:
+            cursor.close()
+    return {}
+
+@_guild_routed
+def get_write_generation(conn, guild_id):
+    """Return a number that increases with every committed change to the guild's counts (0 if none yet)."""
+    executed, cursor = safe_db_execute(
+        conn, "SELECT COALESCE(SUM(write_generation), 0) FROM guild_summary WHERE guild_id = ?;", (str(guild_id),)
+    )
+    if executed and cursor:
+        try:
+            return cursor.fetchone()[0]
+        except sqlite3.Error as fetch_err:
+            log.error(f"Error fetching write generation: {fetch_err}")
+            return None
+        finally:
+            cursor.close()
+    return None
+
+# --- Guild Overview Snapshot ---
+# The summary totals and the top items of all three types, read in one transaction on one connection so
+# they describe the same commit. A plain reader connection cannot nest transactions, so snapshots taken
+# through it from several threads are serialized (each is a handful of indexed reads).
+_snapshot_lock = threading.Lock()
+
+@_guild_routed
+def get_guild_overview(conn, guild_id, limit=5):
+    """Read a guild's summary and top `limit` items of every type as one consistent snapshot.
+
+    Returns {"summary": {table_type: row}, "top": {table_type: [row]}, "count_base": base or None,
+    "generation": write generation}, or None if the read failed. Top rows have name, sticker_id
+    (None except for stickers) and count (estimated in approximate counting mode).
+    """
+    try:
+        sanitized_id = sanitize_table_name(guild_id)
+    except ValueError as e:
+        log.error(f"Invalid guild ID for get_guild_overview: {guild_id} - {e}")
+        return None
+    guild_id = str(guild_id)
+    limit = max(1, int(limit))
+
+    with _snapshot_lock:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN;")
+            row = cursor.execute(
+                "SELECT value FROM guild_settings WHERE guild_id = ? AND key = ?;", (guild_id, COUNT_BASE_SETTING)
+            ).fetchone()
+            base = float(row[0]) if row and row[0] else None
+            summary = {
+                row["table_type"]: row for row in cursor.execute(
+                    "SELECT table_type, first_seen, last_activity, total_uses, distinct_items, write_generation "
+                    "FROM guild_summary WHERE guild_id = ?;", (guild_id,)
+                )
+            }
+            # All three leaderboards in a single statement
+            selects = []
+            for table_type in GUILD_TABLE_TYPES:
+                table_name = f"guild_{sanitized_id}_{table_type}"
+                sticker_column = "sticker_id" if table_type == "stickers" else "NULL"
+                selects.append(
+                    f"SELECT * FROM (SELECT '{table_type}' AS table_type, name, {sticker_column} AS sticker_id, "
+                    f"{_count_expression(base)} AS count FROM {table_name} WHERE count > 0 "
+                    f"ORDER BY {table_name}.count DESC LIMIT {limit})"
+                )
+            top = {table_type: [] for table_type in GUILD_TABLE_TYPES}
+            for row in cursor.execute(" UNION ALL ".join(selects) + ";"):
+                top[row["table_type"]].append(row)
+            cursor.execute("COMMIT;")
+        except sqlite3.Error as e:
+            log.error(f"Error reading overview snapshot for guild {guild_id}: {e}")
+            if conn.in_transaction:
+                conn.rollback()
+            return None
+        finally:
+            cursor.close()
+
+    for rows in top.values():
+        rows.sort(key=lambda row: row["count"], reverse=True) # Compound-select order is not guaranteed
+    return {
+        "summary": summary,
+        "top": top,
+        "count_base": base,
+        "generation": sum(row["write_generation"] for row in summary.values()),
+    }
+
 # --- Data Retrieval Functions ---
+@_guild_routed
 def get_items(conn, guild_id, table_type, order_by="count", ascending=False, limit=None):
     """Fetch items (emoji, reaction, sticker) from a guild's table."""
     try:
@@ -125,8 +1204,12 @@ def get_items(conn, guild_id, table_type, order_by="count", ascending=False, lim
         log.warning(f"Invalid order_by column specified: {order_by}. Defaulting to 'count'.")
         order_by = "count"
 
-    # Corrected query formatting
-    query = f"SELECT {column}, count FROM {table_name} WHERE count > 0 ORDER BY {order_by} {order_direction} {limit_clause};"
+    # Registers of approximate-mode guilds are scaled to estimates here; their order matches the estimates'
+    count_column = _count_expression(get_count_base(conn, guild_id))
+    query = (
+        f"SELECT {column}, {count_column} AS count FROM {table_name} "
+        f"WHERE count > 0 ORDER BY {table_name}.{order_by} {order_direction} {limit_clause};"
+    )
     executed, cursor = safe_db_execute(conn, query)
     if executed and cursor:
         try:
@@ -138,30 +1221,153 @@ def get_items(conn, guild_id, table_type, order_by="count", ascending=False, lim
             cursor.close()
     return [] # Return empty list on failure or no results
 
-def get_all_items(conn, guild_id, table_type):
-    """Fetch all items regardless of count for a guild's table, ordered by count descending."""
+def get_all_items(conn, guild_id, table_type, include_archived=False):
+    """Fetch all items regardless of count for a guild's table, ordered by count descending.
+
+    With `include_archived=True` items moved to the cold archive by the retention policy are merged in
+    (their counts added to any live row of the same item); rows are then plain dicts.
+    """
     # No limit needed
-    return get_items(conn, guild_id, table_type, order_by="count", ascending=False, limit=None)
+    items = get_items(conn, guild_id, table_type, order_by="count", ascending=False, limit=None)
+    if not include_archived:
+        return items
+    archived = get_archived_items(conn, guild_id, table_type)
+    if not archived:
+        return items
+    key_column = "sticker_id" if table_type == "stickers" else "name"
+    merged = {row[key_column]: dict(row) for row in items}
+    for key, item in archived.items():
+        current = merged.get(key)
+        if current is None:
+            merged[key] = {"name": item["name"], "sticker_id": key, "count": item["count"]} if table_type == "stickers" else {"name": key, "count": item["count"]}
+        else:
+            current["count"] += item["count"]
+    return sorted(merged.values(), key=lambda item: item["count"], reverse=True)
 
 def get_top_items(conn, guild_id, table_type, limit=10):
     """Fetch the top N most used items."""
     return get_items(conn, guild_id, table_type, order_by="count", ascending=False, limit=limit)
 
-def get_rare_items(conn, guild_id, table_type, limit=10):
-    """Fetch the N least used items (with count > 0)."""
-    return get_items(conn, guild_id, table_type, order_by="count", ascending=True, limit=limit)
+def get_rare_items(conn, guild_id, table_type, limit=10, inventory=None):
+    """Fetch the N least used items (with count > 0).
 
-def get_tracking_since(conn, guild_id, table_type):
-    """Get the earliest tracking date for a specific table type in a guild."""
+    `inventory` ({item_key: name} of the items the guild currently has, see utils/inventory.py) adds the
+    ones never used (count 0) in front; inventory items retired by the retention policy keep their archived count.
+    """
+    items = get_items(conn, guild_id, table_type, order_by="count", ascending=True, limit=limit)
+    if not inventory:
+        return items
+    unused = get_unused_items(conn, guild_id, table_type, inventory)
+    if not unused:
+        return items
+    archived = get_archived_items(conn, guild_id, table_type)
+    for item in unused:
+        entry = archived.get(item["sticker_id"] if table_type == "stickers" else item["name"])
+        if entry is not None:
+            item["count"] = entry["count"]
+    combined = unused + [dict(item) for item in items]
+    combined.sort(key=lambda item: item["count"]) # Stable: unused items stay in name order
+    return combined[:limit] if limit is not None and isinstance(limit, int) and limit > 0 else combined
+
+@_guild_routed
+def get_count_column(conn, guild_id, table_type):
+    """Return (counts, base): the stored count of every used item as one comma-separated string (None if
+    there are none) and the guild's Morris register base (None when it counts exactly).
+
+    One aggregate query instead of a row object per item; utils/distribution.py parses the string straight
+    into an array. In approximate mode the counts are registers, for the caller to convert in bulk.
+    """
     try:
-        sanitized_id = sanitize_table_name(guild_id)
-        table_name = f"guild_{sanitized_id}_{table_type}"
+        table_name = f"guild_{sanitize_table_name(guild_id)}_{table_type}"
+    except ValueError as e:
+        log.error(f"Invalid guild ID or table type for get_count_column: {guild_id}, {table_type} - {e}")
+        return None, None
+    executed, cursor = safe_db_execute(conn, f"SELECT group_concat(count) FROM {table_name} WHERE count > 0;")
+    if not executed or not cursor:
+        return None, None
+    try:
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    return (row[0] if row else None), get_count_base(conn, guild_id)
+
+@_guild_routed
+def get_unused_items(conn, guild_id, table_type, inventory):
+    """Return the inventory items ({item_key: name}) without a recorded use, as rows shaped like get_items'.
+
+    The inventory is passed as one JSON parameter and matched in a single query, however many items it has.
+    """
+    try:
+        table_name = f"guild_{sanitize_table_name(guild_id)}_{table_type}"
+    except ValueError as e:
+        log.error(f"Invalid guild ID or table type for get_unused_items: {guild_id}, {table_type} - {e}")
+        return []
+    key_column = "sticker_id" if table_type == "stickers" else "name"
+    executed, cursor = safe_db_execute(
+        conn,
+        f"SELECT {key_column} FROM {table_name} WHERE count > 0 AND {key_column} IN (SELECT value FROM json_each(?));",
+        (json.dumps(list(inventory)),)
+    )
+    if not executed or not cursor:
+        return []
+    try:
+        used = {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+    unused = [(key, name) for key, name in inventory.items() if key not in used]
+    if table_type == "stickers":
+        return [{"name": name or key, "sticker_id": key, "count": 0} for key, name in sorted(unused, key=lambda item: (item[1] or "").lower())]
+    return [{"name": key, "count": 0} for key, name in sorted(unused, key=lambda item: (item[1] or item[0]).lower())]
+
+@_guild_routed
+def get_item_keys(conn, guild_id, table_type):
+    """Return (item_key, name) for every stored item of a guild's table (for the autocomplete index)."""
+    try:
+        table_name = f"guild_{sanitize_table_name(guild_id)}_{table_type}"
+    except ValueError as e:
+        log.error(f"Invalid guild ID or table type for get_item_keys: {guild_id}, {table_type} - {e}")
+        return []
+    columns = "sticker_id, name" if table_type == "stickers" else "name, NULL"
+    executed, cursor = safe_db_execute(conn, f"SELECT {columns} FROM {table_name};")
+    if executed and cursor:
+        try:
+            return [tuple(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    return []
+
+@_guild_routed
+def get_item_info(conn, guild_id, table_type, item_key):
+    """Return one item's name, count, last_used and rank (1 = most used, ties share a rank) plus the number
+    of ranked items, or None if the guild never recorded it."""
+    try:
+        table_name = f"guild_{sanitize_table_name(guild_id)}_{table_type}"
     except ValueError as e:
-        log.error(f"Invalid guild ID or table type for get_tracking_since: {guild_id}, {table_type} - {e}")
+        log.error(f"Invalid guild ID or table type for get_item_info: {guild_id}, {table_type} - {e}")
         return None
+    key_column = "sticker_id" if table_type == "stickers" else "name"
+    name_column = "name" if table_type == "stickers" else "NULL"
+    # Registers order like their estimates, so the rank can compare stored counts directly
+    count_column = _count_expression(get_count_base(conn, guild_id), "item.count")
+    query = (
+        f"SELECT {key_column} AS item_key, {name_column} AS name, {count_column} AS count, last_used, "
+        f"(SELECT COUNT(*) FROM {table_name} AS other WHERE other.count > item.count) + 1 AS rank, "
+        f"(SELECT COUNT(*) FROM {table_name} WHERE count > 0) AS ranked "
+        f"FROM {table_name} AS item WHERE {key_column} = ?;"
+    )
+    executed, cursor = safe_db_execute(conn, query, (str(item_key),))
+    if executed and cursor:
+        try:
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+    return None
 
-    query = f"SELECT MIN(last_used) FROM {table_name};"
-    executed, cursor = safe_db_execute(conn, query)
+@_guild_routed
+def get_tracking_since(conn, guild_id, table_type):
+    """Get the earliest tracking date for a specific table type in a guild (from the guild summary)."""
+    query = "SELECT first_seen FROM guild_summary WHERE guild_id = ? AND table_type = ?;"
+    executed, cursor = safe_db_execute(conn, query, (str(guild_id), table_type))
     if executed and cursor:
         try:
             result = cursor.fetchone()
@@ -173,45 +1379,448 @@ def get_tracking_since(conn, guild_id, table_type):
             cursor.close()
     return None
 
-# --- Data Update Functions ---
-def update_count(conn, guild_id, table_type, item_name, item_id=None):
-    """Increment the count for an emoji, reaction, or sticker."""
+# --- Export Reads ---
+# Datasets a guild export streams (utils/export.py). Each chunk is one bounded keyset query on the rowid, so
+# exports never hold more than a chunk in memory and work the same through a ShardRouter.
+EXPORT_DATASETS = ("emojis", "reactions", "stickers", "channels", "archived")
+
+@_guild_routed
+def read_export_chunk(conn, guild_id, dataset, after_rowid=0, limit=5000):
+    """Return (columns, rows, last_rowid) for the next chunk of an export dataset; rows is empty at the end.
+
+    Archived items come one archive run (blob) per chunk.
+    """
+    sanitized_id = sanitize_table_name(guild_id)
+    guild_id = str(guild_id)
+    if dataset in GUILD_TABLE_TYPES:
+        table_name = f"guild_{sanitized_id}_{dataset}"
+        count_column = _count_expression(get_count_base(conn, guild_id))
+        item_columns = "sticker_id, name" if dataset == "stickers" else "name AS item"
+        query = (
+            f"SELECT rowid, {item_columns}, {count_column} AS count, last_used FROM {table_name} "
+            f"WHERE rowid > ? AND count > 0 ORDER BY rowid LIMIT ?;"
+        )
+        params = (after_rowid, limit)
+    elif dataset == "channels":
+        query = (
+            "SELECT rowid, channel_id, total, messages, error, top_items FROM channel_usage "
+            "WHERE guild_id = ? AND rowid > ? ORDER BY rowid LIMIT ?;"
+        )
+        params = (guild_id, after_rowid, limit)
+    elif dataset == "archived":
+        row = conn.execute(
+            "SELECT rowid, table_type, archived_at, payload FROM item_archive WHERE guild_id = ? AND rowid > ? ORDER BY rowid LIMIT 1;",
+            (guild_id, after_rowid)
+        ).fetchone()
+        columns = ["type", "item", "name", "count", "last_used", "archived_at"]
+        if row is None:
+            return columns, [], after_rowid
+        rows = [(row["table_type"], key, name, count, last_used, row["archived_at"]) for key, name, count, last_used in _unpack_archive(row["payload"])]
+        return columns, rows, row["rowid"]
+    else:
+        raise ValueError(f"Unknown export dataset: {dataset}")
+    cursor = conn.execute(query, params)
     try:
-        sanitized_id = sanitize_table_name(guild_id)
-        table_name = f"guild_{sanitized_id}_{table_type}"
-    except ValueError as e:
-        log.error(f"Invalid guild ID or table type for update_count: {guild_id}, {table_type} - {e}")
+        columns = [column[0] for column in cursor.description[1:]]
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    if not rows:
+        return columns, [], after_rowid
+    return columns, [tuple(row)[1:] for row in rows], rows[-1][0]
+
+# --- Bulk Import ---
+# Imports (utils/importer.py) write plain counts with large executemany upserts and leave the derived data
+# alone while they run: begin_bulk_import() drops the global aggregate's count index, finish_bulk_import()
+# rebuilds the aggregate and the touched guilds' summaries once and recreates the index. Run imports with
+# the bot stopped; live count writes would still maintain the aggregate in the meantime.
+
+@_fanned_out(all)
+def begin_bulk_import(conn):
+    """Defer secondary index maintenance for a bulk import."""
+    if not ensure_global_tables(conn): # Every shard gets rebuilt afterwards, even one without guilds yet
         return False
+    executed, _ = safe_db_execute(conn, "DROP INDEX IF EXISTS idx_global_items_count;")
+    return executed
 
-    now = datetime.utcnow()
+def _import_upsert(table_name, table_type, base, replace):
+    """Upsert statement for one guild table; parameters are (key, count, last_used) or (key, name, count, last_used) for stickers."""
+    if table_type == "stickers":
+        columns, values, count, last_used = "sticker_id, name, count, last_used", "?1, ?2, {count}, ?4", "?3", "?4"
+        extra = ", name = COALESCE(excluded.name, name)"
+        key_column = "sticker_id"
+    else:
+        columns, values, count, last_used = "name, count, last_used", "?1, {count}, ?3", "?2", "?3"
+        extra = ""
+        key_column = "name"
+    if base:
+        inserted = f"morris_register({count}, {base!r})"
+        updated = inserted if replace else f"morris_register(morris_estimate(count, {base!r}) + {count}, {base!r})"
+    else:
+        inserted = count
+        updated = count if replace else f"count + {count}"
+    if replace:
+        updated_last_used = f"COALESCE({last_used}, last_used)"
+    else:
+        updated_last_used = f"MAX(COALESCE(last_used, {last_used}), COALESCE({last_used}, last_used))"
+    return (
+        f"INSERT INTO {table_name} ({columns}) VALUES ({values.format(count=inserted)}) "
+        f"ON CONFLICT({key_column}) DO UPDATE SET count = {updated}, last_used = {updated_last_used}{extra};"
+    )
 
+def import_count_rows(conn, rows, replace=False):
+    """Merge (guild_id, table_type, key, name, count, last_used) rows into the guild tables, one transaction (per shard).
+
+    Counts are added to the stored ones, or with replace=True overwrite them. Guilds in approximate counting
+    mode get their registers updated accordingly. The global aggregate and summaries are not touched (see
+    finish_bulk_import). Returns the number of rows written, or None on error.
+    """
+    if isinstance(conn, ShardRouter):
+        results = conn.run_partitioned(conn.partition(rows, lambda row: row[0]), import_count_rows, replace)
+        return None if any(result is None for result in results) else sum(results)
+    groups = {}
+    for guild_id, table_type, key, name, count, last_used in rows:
+        if not count or count <= 0 or key is None:
+            continue
+        params = (str(key), name, int(count), last_used) if table_type == "stickers" else (str(key), int(count), last_used)
+        groups.setdefault((str(guild_id), table_type), []).append(params)
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        bases = _count_bases(cursor)
+        for (guild_id, table_type), params in groups.items():
+            table_name = f"guild_{sanitize_table_name(guild_id)}_{table_type}"
+            cursor.executemany(_import_upsert(table_name, table_type, bases.get(guild_id), replace), params)
+        conn.commit()
+        return sum(len(params) for params in groups.values())
+    except (sqlite3.Error, ValueError) as e:
+        log.error(f"Database error importing counts: {e}")
+        try:
+            conn.rollback()
+        except sqlite3.Error as rb_e:
+            log.error(f"Error during rollback: {rb_e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+
+@_guild_routed
+def rebuild_guild_summary(conn, guild_id):
+    """Recompute a guild's summary rows from its tables."""
+    sanitized_id = sanitize_table_name(guild_id)
+    base = get_count_base(conn, guild_id)
+    return execute_in_transaction(conn, [
+        _rebuild_summary_statement(f"guild_{sanitized_id}_{table_type}", guild_id, table_type, base) for table_type in GUILD_TABLE_TYPES
+    ])
+
+def finish_bulk_import(conn, guild_ids):
+    """Bring the derived data up to date after a bulk import and recreate the deferred index."""
+    success = all(rebuild_guild_summary(conn, guild_id) for guild_id in guild_ids)
+    if rebuild_global_aggregate(conn) is None:
+        success = False
+    return _recreate_import_indexes(conn) and success
+
+@_fanned_out(all)
+def _recreate_import_indexes(conn):
+    executed, _ = safe_db_execute(conn, "CREATE INDEX IF NOT EXISTS idx_global_items_count ON global_items (table_type, count DESC);")
+    return executed
+
+# --- Data Update Functions ---
+def update_count(conn, guild_id, table_type, item_name, item_id=None):
+    """Increment the count for an emoji, reaction, or sticker."""
     if table_type == "stickers":
         if not item_id:
             log.error("Sticker ID is required to update sticker count.")
             return False
-        # Upsert for stickers based on sticker_id
-        # Use standard Python string formatting for the query
-        # Ensure excluded.last_used and excluded.name are used correctly
-        query = (
-            f"INSERT INTO {table_name} (sticker_id, name, count, last_used) VALUES (?, ?, 1, ?) "
-            f"ON CONFLICT(sticker_id) DO UPDATE SET count = count + 1, last_used = excluded.last_used, name = excluded.name;"
+        # Stickers are keyed by sticker_id; the name is stored alongside
+        return apply_count_deltas(conn, guild_id, table_type, {str(item_id): 1}, names={str(item_id): item_name})
+    # Emojis/reactions are keyed by name
+    return apply_count_deltas(conn, guild_id, table_type, {item_name: 1})
+
+_SQL_VARIABLE_CHUNK = 500 # Keys per "IN (...)" lookup, well below SQLite's host parameter limit
+
+_GLOBAL_INCREMENT_QUERY = (
+    "INSERT INTO global_items (table_type, item_key, name, count, last_used) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(table_type, item_key) DO UPDATE SET count = count + excluded.count, "
+    "last_used = MAX(COALESCE(last_used, excluded.last_used), excluded.last_used), name = COALESCE(excluded.name, name);"
+)
+
+def _write_count_deltas(cursor, guild_id, table_type, deltas, names=None, now=None, base=None, use_times=None):
+    """Execute the upserts/decrements for one guild table on an open cursor (no commit).
+
+    With a Morris `base` (approximate counting mode) the deltas are applied to the stored registers instead.
+    `use_times` optionally maps item key -> (first use, latest use) for counts of past messages (backfill);
+    other items were used `now`. last_used and the summary times never move backwards.
+    Raises ValueError for an invalid guild ID and sqlite3.Error on database failures;
+    callers own the transaction.
+    """
+    sanitized_id = sanitize_table_name(guild_id)
+    table_name = f"guild_{sanitized_id}_{table_type}"
+    now = now or datetime.utcnow()
+    names = names or {}
+    used_at = {key: times[1] for key, times in (use_times or {}).items()}
+    key_column = "sticker_id" if table_type == "stickers" else "name"
+    times = [(use_times or {}).get(key, (now, now)) for key, delta in deltas.items() if delta > 0]
+    first_used, last_used = (min(first for first, _ in times), max(last for _, last in times)) if times else (now, now)
+    if base:
+        total_change, distinct_change, incremented = _write_register_deltas(
+            cursor, table_name, table_type, key_column, deltas, names, now, base, used_at
         )
-        params = (str(item_id), item_name, now)
-    else:
-        # Upsert for emojis/reactions based on name
-        # Ensure excluded.last_used is used correctly
-        query = (
-            f"INSERT INTO {table_name} (name, count, last_used) VALUES (?, 1, ?) "
-            f"ON CONFLICT(name) DO UPDATE SET count = count + 1, last_used = excluded.last_used;"
+        _update_guild_summary(cursor, guild_id, table_type, total_change, distinct_change, incremented, last_used, first_used)
+        return
+
+    total_change = distinct_change = 0
+    increments = []
+    decrements = []
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        if delta > 0:
+            if table_type == "stickers":
+                increments.append((str(key), names.get(key), delta, used_at.get(key, now)))
+            else:
+                increments.append((key, delta, used_at.get(key, now)))
+        else:
+            decrements.append((-delta, str(key) if table_type == "stickers" else key))
+
+    if increments:
+        # Items at zero (or without a row) before this write become distinct items
+        keys = [row[0] for row in increments]
+        positive = set()
+        for start in range(0, len(keys), _SQL_VARIABLE_CHUNK):
+            chunk = keys[start:start + _SQL_VARIABLE_CHUNK]
+            placeholders = ", ".join("?" * len(chunk))
+            positive.update(row[0] for row in cursor.execute(
+                f"SELECT {key_column} FROM {table_name} WHERE {key_column} IN ({placeholders}) AND count > 0;", chunk
+            ))
+        distinct_change += len(keys) - len(positive)
+        total_change += sum(row[-2] for row in increments)
+        if table_type == "stickers":
+            increment_query = (
+                f"INSERT INTO {table_name} (sticker_id, name, count, last_used) VALUES (?, ?, ?, ?) "
+                f"ON CONFLICT(sticker_id) DO UPDATE SET count = count + excluded.count, "
+                f"last_used = MAX(COALESCE(last_used, excluded.last_used), excluded.last_used), name = COALESCE(excluded.name, name);"
+            )
+        else:
+            increment_query = (
+                f"INSERT INTO {table_name} (name, count, last_used) VALUES (?, ?, ?) "
+                f"ON CONFLICT(name) DO UPDATE SET count = count + excluded.count, "
+                f"last_used = MAX(COALESCE(last_used, excluded.last_used), excluded.last_used);"
+            )
+        cursor.executemany(increment_query, increments)
+        # Keep the cross-guild aggregate in step, in the same transaction
+        if table_type == "stickers":
+            global_rows = [(table_type, key, name, delta, used) for key, name, delta, used in increments]
+        else:
+            global_rows = [(table_type, key, None, delta, used) for key, delta, used in increments]
+        cursor.executemany(_GLOBAL_INCREMENT_QUERY, global_rows)
+    if decrements:
+        # Clamp to the guild's current count so the global aggregate loses exactly what the guild loses
+        clamped = []
+        for amount, key in decrements:
+            row = cursor.execute(f"SELECT count FROM {table_name} WHERE {key_column} = ?;", (key,)).fetchone()
+            if row and row[0] > 0:
+                clamped.append((min(amount, row[0]), key))
+                total_change -= clamped[-1][0]
+                distinct_change -= amount >= row[0]
+        decrement_query = f"UPDATE {table_name} SET count = count - ? WHERE {key_column} = ?;"
+        cursor.executemany(decrement_query, clamped)
+        cursor.executemany(
+            "UPDATE global_items SET count = MAX(count - ?, 0) WHERE table_type = ? AND item_key = ?;",
+            [(amount, table_type, key) for amount, key in clamped]
         )
-        params = (item_name, now)
+    _update_guild_summary(cursor, guild_id, table_type, total_change, distinct_change, bool(increments), last_used, first_used)
+
+def _write_register_deltas(cursor, table_name, table_type, key_column, deltas, names, now, base, used_at=None):
+    """Apply deltas to Morris registers; only items whose register actually moves are written.
+
+    Returns (change in estimated total, change in distinct items, whether anything was incremented).
+    """
+    total_change = distinct_change = 0
+    incremented = False
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        used = (used_at or {}).get(key, now)
+        key = str(key) if table_type == "stickers" else key
+        row = cursor.execute(f"SELECT count FROM {table_name} WHERE {key_column} = ?;", (key,)).fetchone()
+        old_register = row[0] if row else 0
+        new_register = approx_count.apply_delta(old_register, delta, base)
+        if new_register == old_register:
+            continue # Absorbed: the estimate already accounts for it on average
+        distinct_change += (new_register > 0) - (old_register > 0)
+        incremented = incremented or delta > 0
+        if delta > 0:
+            if table_type == "stickers":
+                cursor.execute(
+                    f"INSERT INTO {table_name} (sticker_id, name, count, last_used) VALUES (?, ?, ?, ?) "
+                    f"ON CONFLICT(sticker_id) DO UPDATE SET count = excluded.count, "
+                    f"last_used = MAX(COALESCE(last_used, excluded.last_used), excluded.last_used), name = COALESCE(excluded.name, name);",
+                    (key, names.get(key), new_register, used)
+                )
+            else:
+                cursor.execute(
+                    f"INSERT INTO {table_name} (name, count, last_used) VALUES (?, ?, ?) "
+                    f"ON CONFLICT(name) DO UPDATE SET count = excluded.count, "
+                    f"last_used = MAX(COALESCE(last_used, excluded.last_used), excluded.last_used);",
+                    (key, new_register, used)
+                )
+        else:
+            cursor.execute(f"UPDATE {table_name} SET count = ? WHERE {key_column} = ?;", (new_register, key))
+        # The global aggregate holds estimates, so it moves by the change in this item's estimate
+        change = approx_count.estimate(new_register, base) - approx_count.estimate(old_register, base)
+        total_change += change
+        if change > 0:
+            cursor.execute(_GLOBAL_INCREMENT_QUERY, (table_type, key, names.get(key), change, used))
+        elif change < 0:
+            cursor.execute(
+                "UPDATE global_items SET count = MAX(count - ?, 0) WHERE table_type = ? AND item_key = ?;",
+                (-change, table_type, key)
+            )
+    return total_change, distinct_change, incremented
 
-    executed, cursor = safe_db_execute(conn, query, params)
+@_guild_routed
+def apply_count_deltas(conn, guild_id, table_type, deltas, names=None):
+    """Apply signed count changes for many items of one type in a single transaction.
+
+    `deltas` maps item key (emoji/reaction name, or sticker_id for stickers) to a signed delta.
+    Positive deltas upsert and refresh last_used; negative deltas decrement, never below zero.
+    `names` optionally maps sticker_id -> sticker name for inserted sticker rows.
+    """
+    if not any(deltas.values()):
+        return True # Nothing to do
+    return apply_count_batch(conn, [(guild_id, table_type, deltas, names)])
+
+def apply_count_batch(conn, batch, extra_statements=(), use_times=None):
+    """Apply count deltas for several guild tables in one transaction.
+
+    `batch` is an iterable of (guild_id, table_type, deltas, names) tuples (see apply_count_deltas).
+    `use_times` optionally maps (guild_id, table_type) -> {item key: (first use, latest use)}, for counts
+    of past messages (backfill); anything else counts as used now.
+    `extra_statements` are (query, params) pairs committed atomically with the counts,
+    e.g. progress checkpoints that must never get ahead of the data they describe.
+
+    With a ShardRouter each shard commits its part in parallel (atomic per shard, not across shards);
+    extra statements go to the shard of the guild ID in their first parameter.
+    """
+    if not conn:
+        log.error("Cannot apply count batch: No database connection.")
+        return False
+    if isinstance(conn, ShardRouter):
+        parts = conn.partition(batch, lambda entry: entry[0])
+        statements = conn.partition(extra_statements, lambda statement: statement[1][0])
+        for index in statements:
+            parts.setdefault(index, [])
+        return all(conn.run_partitioned(
+            {index: (part, statements.get(index, ())) for index, part in parts.items()},
+            lambda shard_conn, part: apply_count_batch(shard_conn, part[0], part[1], use_times)
+        ))
+
+    now = datetime.utcnow()
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        if not conn.in_transaction:
+            # Read the bases under the write lock: a counting mode switch cannot commit between the read and our writes
+            cursor.execute("BEGIN IMMEDIATE;")
+        bases = _count_bases(cursor)
+        for guild_id, table_type, deltas, names in batch:
+            _write_count_deltas(
+                cursor, guild_id, table_type, deltas, names, now, bases.get(str(guild_id)),
+                (use_times or {}).get((str(guild_id), table_type))
+            )
+        for query, params in extra_statements:
+            cursor.execute(query, params)
+        conn.commit()
+        return True
+    except (sqlite3.Error, ValueError) as e:
+        log.error(f"Database error applying count batch: {e}")
+        try:
+            conn.rollback()
+        except sqlite3.Error as rb_e:
+            log.error(f"Error during rollback: {rb_e}")
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+
+# --- Backfill Checkpoints ---
+@_fanned_out(all)
+def ensure_backfill_tables(conn):
+    """Create the table tracking history backfill progress per channel."""
+    query = (
+        "CREATE TABLE IF NOT EXISTS backfill_checkpoints ("
+        "guild_id TEXT NOT NULL, channel_id TEXT NOT NULL, "
+        "last_message_id INTEGER, until_message_id INTEGER NOT NULL, "
+        "done INTEGER DEFAULT 0 NOT NULL, updated_at TIMESTAMP, "
+        "PRIMARY KEY (guild_id, channel_id));"
+    )
+    executed, cursor = safe_db_execute(conn, query)
+    if cursor:
+        cursor.close()
+    return executed
+
+@_guild_routed
+def get_backfill_checkpoints(conn, guild_id):
+    """Return {channel_id: row} with last_message_id, until_message_id and done for a guild."""
+    executed, cursor = safe_db_execute(
+        conn,
+        "SELECT channel_id, last_message_id, until_message_id, done FROM backfill_checkpoints WHERE guild_id = ?;",
+        (str(guild_id),)
+    )
+    if executed and cursor:
+        try:
+            return {row["channel_id"]: row for row in cursor.fetchall()}
+        except sqlite3.Error as fetch_err:
+            log.error(f"Error fetching backfill checkpoints: {fetch_err}")
+            return {}
+        finally:
+            cursor.close()
+    return {}
+
+def backfill_checkpoint_statement(guild_id, channel_id, last_message_id, until_message_id, done=False):
+    """Build the (query, params) upsert for a channel checkpoint, for use with apply_count_batch."""
+    query = (
+        "INSERT INTO backfill_checkpoints (guild_id, channel_id, last_message_id, until_message_id, done, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(guild_id, channel_id) DO UPDATE SET last_message_id = excluded.last_message_id, "
+        "until_message_id = excluded.until_message_id, done = excluded.done, updated_at = excluded.updated_at;"
+    )
+    return query, (str(guild_id), str(channel_id), last_message_id, until_message_id, int(done), datetime.utcnow())
+
+@_guild_routed
+def reset_backfill_checkpoints(conn, guild_id):
+    """Forget backfill progress for a guild so the next run starts from the beginning."""
+    executed, cursor = safe_db_execute(conn, "DELETE FROM backfill_checkpoints WHERE guild_id = ?;", (str(guild_id),))
     if cursor:
-        cursor.close() # Close cursor after execution
+        cursor.close()
     return executed
 
 # --- Data Deletion/Reset Functions ---
+def _subtract_from_global_statement(table_name, table_type, base=None):
+    """Build the statement removing one guild table's counts from the global aggregate."""
+    key_column = "sticker_id" if table_type == "stickers" else "name"
+    query = (
+        f"UPDATE global_items SET count = MAX(count - "
+        f"(SELECT {_count_expression(base, 'g.count')} FROM {table_name} AS g WHERE g.{key_column} = global_items.item_key), 0) "
+        f"WHERE table_type = ? AND item_key IN (SELECT {key_column} FROM {table_name} WHERE count > 0);"
+    )
+    return query, (table_type,)
+
+def _add_to_global_statement(table_name, table_type, base=None):
+    """Build the statement adding one guild table's counts to the global aggregate."""
+    key_column = "sticker_id" if table_type == "stickers" else "name"
+    name_column = "name" if table_type == "stickers" else "NULL"
+    query = (
+        f"INSERT INTO global_items (table_type, item_key, name, count, last_used) "
+        f"SELECT ?, {key_column}, {name_column}, {_count_expression(base)}, last_used FROM {table_name} WHERE count > 0 "
+        f"ON CONFLICT(table_type, item_key) DO UPDATE SET count = count + excluded.count, "
+        f"last_used = MAX(COALESCE(last_used, excluded.last_used), COALESCE(excluded.last_used, last_used)), "
+        f"name = COALESCE(excluded.name, name);"
+    )
+    return query, (table_type,)
+
+@_guild_routed
 def wipe_guild_data(conn, guild_id):
     """Delete all rows from all tracking tables for a specific guild."""
     try:
@@ -220,18 +1829,24 @@ def wipe_guild_data(conn, guild_id):
         log.error(f"Invalid guild ID for wipe_guild_data: {guild_id} - {e}")
         return False
 
+    base = get_count_base(conn, guild_id)
     success = True
     for table_type in ["emojis", "reactions", "stickers"]:
         table_name = f"guild_{sanitized_id}_{table_type}"
-        query = f"DELETE FROM {table_name};"
-        executed, cursor = safe_db_execute(conn, query)
-        if cursor:
-            cursor.close()
-        if not executed:
+        statements = [
+            _subtract_from_global_statement(table_name, table_type, base),
+            (f"DELETE FROM {table_name};", ()),
+        ]
+        if not execute_in_transaction(conn, statements):
             log.error(f"Failed to wipe data from {table_name}")
             success = False
+    if not execute_in_transaction(conn, [_clear_summary_statement(guild_id)]):
+        success = False
+    if not clear_guild_aux_data(conn, guild_id):
+        success = False
     return success
 
+@_guild_routed
 def reset_guild_counts(conn, guild_id):
     """Reset all counts to zero in tracking tables for a specific guild."""
     try:
@@ -240,21 +1855,360 @@ def reset_guild_counts(conn, guild_id):
         log.error(f"Invalid guild ID for reset_guild_counts: {guild_id} - {e}")
         return False
 
+    base = get_count_base(conn, guild_id)
     success = True
     for table_type in ["emojis", "reactions", "stickers"]:
         table_name = f"guild_{sanitized_id}_{table_type}"
-        query = f"UPDATE {table_name} SET count = 0;"
-        executed, cursor = safe_db_execute(conn, query)
-        if cursor:
-            cursor.close()
-        if not executed:
+        statements = [
+            _subtract_from_global_statement(table_name, table_type, base),
+            (f"UPDATE {table_name} SET count = 0;", ()),
+        ]
+        if not execute_in_transaction(conn, statements):
             log.error(f"Failed to reset counts in {table_name}")
             success = False
+    if not execute_in_transaction(conn, [_clear_summary_statement(guild_id)]):
+        success = False
+    if not clear_guild_aux_data(conn, guild_id):
+        success = False
     return success
 
+# --- Retention / Cold Archive ---
+# A guild can opt into a retention policy (guild_settings "retention_days" and "retention_max_uses"): items
+# unused for that many days with at most that many uses are moved out of the live guild table into
+# item_archive, as one zlib-compressed JSON blob per table and run. Leaderboards and table scans only see
+# live rows; full-history reads merge the archive back in (get_all_items(..., include_archived=True)).
+# Like deleted rows, archived counts leave the global aggregate and the guild summary.
+RETENTION_DAYS_SETTING = "retention_days"
+RETENTION_MAX_USES_SETTING = "retention_max_uses"
+
+@_fanned_out(all)
+def ensure_item_archive_tables(conn):
+    """Create the cold archive table for retired items."""
+    query = (
+        "CREATE TABLE IF NOT EXISTS item_archive ("
+        "guild_id TEXT NOT NULL, table_type TEXT NOT NULL, archived_at TIMESTAMP NOT NULL, "
+        "items INTEGER NOT NULL, total_uses INTEGER NOT NULL, payload BLOB NOT NULL, "
+        "PRIMARY KEY (guild_id, table_type, archived_at));"
+    )
+    executed, _ = safe_db_execute(conn, query)
+    if not executed:
+        log.error("Failed to create item archive table.")
+    return executed
+
+def _pack_archive(rows):
+    return zlib.compress(json.dumps(rows, separators=(",", ":"), ensure_ascii=False).encode("utf-8"), 9)
+
+def _unpack_archive(payload):
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+@_guild_routed
+def archive_stale_items(conn, guild_id, max_idle_days, max_uses=None, now=None):
+    """Move a guild's items unused for `max_idle_days` days with at most `max_uses` uses (any, if None) to the archive.
+
+    One transaction, taken with the write lock up front so no increment lands between reading and
+    deleting a row; pass a connection of its own rather than one shared with a writer on another thread.
+    Rows already at zero are dropped without being archived. Returns {table_type: items archived}, or None.
+    """
+    try:
+        sanitized_id = sanitize_table_name(guild_id)
+    except ValueError as e:
+        log.error(f"Invalid guild ID for archive_stale_items: {guild_id} - {e}")
+        return None
+    guild_id = str(guild_id)
+    now = now or datetime.utcnow()
+    cutoff = str(now - timedelta(days=max_idle_days))
+    archived = {}
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE;")
+        base = _count_bases(cursor).get(guild_id)
+        count_column = _count_expression(base)
+        for table_type in GUILD_TABLE_TYPES:
+            table_name = f"guild_{sanitized_id}_{table_type}"
+            key_column = "sticker_id" if table_type == "stickers" else "name"
+            name_column = "name" if table_type == "stickers" else "NULL"
+            query = f"SELECT {key_column}, {name_column}, {count_column}, last_used FROM {table_name} WHERE last_used < ?"
+            params = [cutoff]
+            if max_uses is not None:
+                query += f" AND {count_column} <= ?"
+                params.append(max_uses)
+            stale = cursor.execute(query + ";", params).fetchall()
+            retired = [row for row in stale if row[2] > 0]
+            archived[table_type] = len(retired)
+            if not stale:
+                continue
+            cursor.executemany(f"DELETE FROM {table_name} WHERE {key_column} = ?;", [(row[0],) for row in stale])
+            if not retired:
+                continue
+            total = sum(row[2] for row in retired)
+            cursor.executemany(
+                "UPDATE global_items SET count = MAX(count - ?, 0) WHERE table_type = ? AND item_key = ?;",
+                [(row[2], table_type, row[0]) for row in retired]
+            )
+            cursor.execute(
+                "INSERT INTO item_archive (guild_id, table_type, archived_at, items, total_uses, payload) VALUES (?, ?, ?, ?, ?, ?);",
+                (guild_id, table_type, str(now), len(retired), total,
+                 _pack_archive([[row[0], row[1], row[2], str(row[3])] for row in retired]))
+            )
+            _update_guild_summary(cursor, guild_id, table_type, -total, -len(retired), False, now)
+        conn.commit()
+        return archived
+    except sqlite3.Error as e:
+        log.error(f"Database error archiving stale items of guild {guild_id}: {e}")
+        try:
+            conn.rollback()
+        except sqlite3.Error as rb_e:
+            log.error(f"Error during rollback: {rb_e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+
+@_guild_routed
+def get_archived_items(conn, guild_id, table_type):
+    """Return a guild's archived items of one type, merged over all runs: {key: {"name", "count", "last_used"}}."""
+    executed, cursor = safe_db_execute(
+        conn, "SELECT payload FROM item_archive WHERE guild_id = ? AND table_type = ? ORDER BY archived_at;",
+        (str(guild_id), table_type)
+    )
+    if not executed or not cursor:
+        return {}
+    items = {}
+    try:
+        for row in cursor.fetchall():
+            for key, name, count, last_used in _unpack_archive(row["payload"]):
+                item = items.get(key)
+                if item is None:
+                    items[key] = {"name": name, "count": count, "last_used": last_used}
+                else:
+                    item["count"] += count
+                    item["last_used"] = max(item["last_used"], last_used)
+                    item["name"] = name or item["name"]
+    except (sqlite3.Error, ValueError, zlib.error) as e:
+        log.error(f"Error reading archived items of guild {guild_id}: {e}")
+        return {}
+    finally:
+        cursor.close()
+    return items
+
+@_guild_routed
+def get_archive_stats(conn, guild_id):
+    """Return {table_type: (archived items, archived uses, compressed bytes)} for a guild."""
+    executed, cursor = safe_db_execute(
+        conn,
+        "SELECT table_type, SUM(items), SUM(total_uses), SUM(LENGTH(payload)) FROM item_archive WHERE guild_id = ? GROUP BY table_type;",
+        (str(guild_id),)
+    )
+    if executed and cursor:
+        try:
+            return {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+        except sqlite3.Error as fetch_err:
+            log.error(f"Error fetching archive stats: {fetch_err}")
+            return {}
+        finally:
+            cursor.close()
+    return {}
+
+# --- Departed Guilds ---
+# When the bot leaves a guild, guild_settings "departed_at" records when. After a grace period the guild's
+# tables and guild-keyed rows are exported (utils/guild_archive.py stores them as one compressed blob in a
+# separate archive file) and removed from the live database, leaving only an "archived_at" marker that
+# identifies the blob. Rejoining imports the blob back in one transaction.
+GUILD_DEPARTED_SETTING = "departed_at"
+GUILD_ARCHIVED_SETTING = "archived_at"
+_GUILD_STATE_SETTINGS = (GUILD_DEPARTED_SETTING, GUILD_ARCHIVED_SETTING)
+
+def _existing_guild_tables(cursor, sanitized_id):
+    """Return {table_type: table_name} for the guild tables that exist."""
+    names = {f"guild_{sanitized_id}_{table_type}": table_type for table_type in GUILD_TABLE_TYPES}
+    placeholders = ", ".join("?" * len(names))
+    rows = cursor.execute(f"SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders});", list(names)).fetchall()
+    return {names[row[0]]: row[0] for row in rows}
+
+@_guild_routed
+def export_guild_rows(conn, guild_id):
+    """Read everything stored for a guild as one snapshot.
+
+    Returns {"tables": {table_type: {"columns", "rows"}}, "keyed": {table: {"columns", "rows"}}, "live_bytes"},
+    or None on error. live_bytes is the size of the guild's tables and their indexes (None without dbstat).
+    """
+    try:
+        sanitized_id = sanitize_table_name(guild_id)
+    except ValueError as e:
+        log.error(f"Invalid guild ID for export_guild_rows: {guild_id} - {e}")
+        return None
+    guild_id = str(guild_id)
+    data = {"tables": {}, "keyed": {}, "live_bytes": None}
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN;")
+        tables = _existing_guild_tables(cursor, sanitized_id)
+        for table_type, table_name in tables.items():
+            cursor.execute(f"SELECT * FROM {table_name};")
+            data["tables"][table_type] = {"columns": [column[0] for column in cursor.description], "rows": [list(row) for row in cursor]}
+        for table in GUILD_KEYED_TABLES:
+            try:
+                cursor.execute(f"SELECT * FROM {table} WHERE guild_id = ?;", (guild_id,))
+            except sqlite3.OperationalError:
+                continue # Table not created in this database
+            columns = [column[0] for column in cursor.description]
+            rows = [list(row) for row in cursor if not (table == "guild_settings" and row["key"] in _GUILD_STATE_SETTINGS)]
+            if rows:
+                data["keyed"][table] = {"columns": columns, "rows": rows}
+        if tables:
+            placeholders = ", ".join("?" * len(tables))
+            try:
+                data["live_bytes"] = cursor.execute(
+                    f"SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN "
+                    f"(SELECT name FROM sqlite_master WHERE tbl_name IN ({placeholders}));", list(tables.values())
+                ).fetchone()[0]
+            except sqlite3.OperationalError:
+                pass # SQLite built without the dbstat table
+        conn.commit()
+        return data
+    except sqlite3.Error as e:
+        log.error(f"Database error exporting guild {guild_id}: {e}")
+        try:
+            conn.rollback()
+        except sqlite3.Error as rb_e:
+            log.error(f"Error during rollback: {rb_e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+
+@_guild_routed
+def drop_guild_data(conn, guild_id, archived_at):
+    """Remove a guild's tables and guild-keyed rows in one transaction, leaving the "archived_at" marker.
+
+    The guild's counts are taken out of the global aggregate first.
+    """
+    try:
+        sanitized_id = sanitize_table_name(guild_id)
+    except ValueError as e:
+        log.error(f"Invalid guild ID for drop_guild_data: {guild_id} - {e}")
+        return False
+    guild_id = str(guild_id)
+    base = get_count_base(conn, guild_id)
+    cursor = conn.cursor()
+    try:
+        tables = _existing_guild_tables(cursor, sanitized_id)
+    finally:
+        cursor.close()
+    statements = []
+    for table_type, table_name in tables.items():
+        statements.append(_subtract_from_global_statement(table_name, table_type, base))
+        statements.append((f"DROP TABLE {table_name};", ()))
+    for table in GUILD_KEYED_TABLES:
+        if _table_exists(conn, table):
+            statements.append((f"DELETE FROM {table} WHERE guild_id = ?;", (guild_id,)))
+    statements.append((
+        "INSERT INTO guild_settings (guild_id, key, value) VALUES (?, ?, ?);", (guild_id, GUILD_ARCHIVED_SETTING, str(archived_at))
+    ))
+    if not execute_in_transaction(conn, statements):
+        log.error(f"Failed to drop the live data of guild {guild_id}")
+        return False
+    return True
+
+@_guild_routed
+def import_guild_rows(conn, guild_id, data, archived_at):
+    """Bulk-insert an export_guild_rows() snapshot back, in one transaction; returns the rows restored or None.
+
+    Only imports if the guild still carries the "archived_at" marker of this snapshot (otherwise the snapshot
+    predates live data, e.g. the drop never committed, and 0 is returned so the caller discards it). Rows that
+    already exist again are kept; the global aggregate and the guild summary are recomputed for the guild.
+    """
+    try:
+        sanitized_id = sanitize_table_name(guild_id)
+    except ValueError as e:
+        log.error(f"Invalid guild ID for import_guild_rows: {guild_id} - {e}")
+        return None
+    guild_id = str(guild_id)
+    settings = get_guild_settings(conn, guild_id)
+    if settings.get(GUILD_ARCHIVED_SETTING) != str(archived_at):
+        log.warning(f"Archive of guild {guild_id} ({archived_at}) does not match its live data; not restoring it.")
+        return 0
+    if not ensure_guild_tables(conn, guild_id):
+        return None
+    live_base = get_count_base(conn, guild_id)
+    restored_base = live_base
+    for key, value in zip(*_settings_columns(data)):
+        if key == COUNT_BASE_SETTING:
+            restored_base = float(value) if value else None
+
+    rows_restored = 0
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE;")
+        for table_type in GUILD_TABLE_TYPES:
+            table_name = f"guild_{sanitized_id}_{table_type}"
+            cursor.execute(*_subtract_from_global_statement(table_name, table_type, live_base))
+        for table, snapshot in data.get("keyed", {}).items():
+            if not _table_exists(conn, table):
+                continue
+            columns = ", ".join(snapshot["columns"])
+            placeholders = ", ".join("?" * len(snapshot["columns"]))
+            cursor.executemany(f"INSERT OR IGNORE INTO {table} ({columns}) VALUES ({placeholders});", snapshot["rows"])
+            rows_restored += len(snapshot["rows"])
+        for table_type, snapshot in data.get("tables", {}).items():
+            table_name = f"guild_{sanitized_id}_{table_type}"
+            columns = ", ".join(snapshot["columns"])
+            placeholders = ", ".join("?" * len(snapshot["columns"]))
+            cursor.executemany(f"INSERT OR IGNORE INTO {table_name} ({columns}) VALUES ({placeholders});", snapshot["rows"])
+            rows_restored += len(snapshot["rows"])
+        for table_type in GUILD_TABLE_TYPES:
+            table_name = f"guild_{sanitized_id}_{table_type}"
+            cursor.execute(*_add_to_global_statement(table_name, table_type, restored_base))
+            cursor.execute(*_rebuild_summary_statement(table_name, guild_id, table_type, restored_base))
+        cursor.execute("DELETE FROM guild_settings WHERE guild_id = ? AND key IN (?, ?);", (guild_id, *_GUILD_STATE_SETTINGS))
+        conn.commit()
+        return rows_restored
+    except sqlite3.Error as e:
+        log.error(f"Database error restoring guild {guild_id}: {e}")
+        try:
+            conn.rollback()
+        except sqlite3.Error as rb_e:
+            log.error(f"Error during rollback: {rb_e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+
+def _settings_columns(data):
+    """(keys, values) of the guild_settings rows in an export, or two empty tuples."""
+    snapshot = data.get("keyed", {}).get("guild_settings")
+    if not snapshot:
+        return (), ()
+    key_index, value_index = snapshot["columns"].index("key"), snapshot["columns"].index("value")
+    return [row[key_index] for row in snapshot["rows"]], [row[value_index] for row in snapshot["rows"]]
+
+def _table_exists(conn, table_name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;", (table_name,)).fetchone() is not None
+
+# Guild-keyed tables that must be cleared along with the counters (derived stats, archived counts)
+GUILD_AUX_TABLES = ("user_sketches", "emoji_pairs", "channel_usage", "item_archive", "usage_heatmaps", "digest_baselines")
+# Every table with a guild_id column; in a sharded database their rows live in the guild's shard
+GUILD_KEYED_TABLES = GUILD_AUX_TABLES + ("backfill_checkpoints", "guild_settings", "guild_summary")
+
+@_guild_routed
+def clear_guild_aux_data(conn, guild_id):
+    """Delete a guild's derived stats (per-user sketches, co-occurring pairs, ...)."""
+    statements = [(f"DELETE FROM {table} WHERE guild_id = ?;", (str(guild_id),)) for table in GUILD_AUX_TABLES]
+    if not execute_in_transaction(conn, statements):
+        log.error(f"Failed to clear derived stats for guild {guild_id}")
+        return False
+    return True
+
 # --- Utility to close connection ---
 def close_db_connection(conn):
-    """Close the database connection if it's open."""
+    """Close the database connection (or every shard of a ShardRouter) if it's open."""
+    if isinstance(conn, ShardRouter):
+        conn.close()
+        log.info("Database shard connections closed.")
+        return
     if conn:
         try:
             conn.close()
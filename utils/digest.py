@@ -0,0 +1,54 @@
+import zlib
+import logging
+
+log = logging.getLogger(__name__)
+
+# --- Staggered Digest Schedule ---
+# Every opted-in guild gets one digest per period, at a fixed offset into the period derived from a crc32 of
+# its id. Generation and sends are therefore spread evenly over the whole period instead of all firing at
+# once. Periods are numbered from the UNIX epoch per guild: period n of a guild starts at n * period + offset,
+# and a guild is due whenever its current period is newer than the last one recorded as sent.
+
+def slot_offset(guild_id, period_seconds):
+    """Seconds into each period at which a guild's digest is due (crc32, like db_utils.shard_index, so it is stable)."""
+    return zlib.crc32(str(guild_id).encode("utf-8")) % max(1, int(period_seconds))
+
+def due_period(guild_id, now, period_seconds):
+    """Number of the guild's latest period whose slot has passed at UNIX time `now`."""
+    return int((now - slot_offset(guild_id, period_seconds)) // period_seconds)
+
+def next_run(guild_id, now, period_seconds):
+    """UNIX time of the guild's next slot after `now`."""
+    return (due_period(guild_id, now, period_seconds) + 1) * period_seconds + slot_offset(guild_id, period_seconds)
+
+def marker(period):
+    """Footer text identifying a posted digest, used to recognise it in the channel after a restart."""
+    return f"EmojiStats digest #{int(period)}"
+
+def build_digest(rows, limit=5):
+    """Summarize db_utils.get_digest_rows() output.
+
+    Returns {"first": no baseline yet, "movers": {table_type: [(item_key, name, count, gained)]},
+    "new": {table_type: [(item_key, name, count)]}, "unused": [item_key], "unused_total": int}. Movers are the
+    items with the most uses since the last digest; before the first one, every use counts.
+    """
+    baseline_rows = 0
+    changed = {}
+    unused = []
+    for section, item_key, name, count, baseline in rows:
+        if section == "baseline":
+            baseline_rows = count
+        elif section == "unused":
+            unused.append(item_key)
+        else:
+            changed.setdefault(section, []).append((item_key, name, count, baseline))
+    first = baseline_rows == 0
+    movers, new = {}, {}
+    for table_type, items in changed.items():
+        ranked = sorted(items, key=lambda item: item[2] - (item[3] or 0), reverse=True)
+        movers[table_type] = [(key, name, count, count - (baseline or 0)) for key, name, count, baseline in ranked[:limit]]
+        if not first:
+            fresh = sorted((item for item in items if item[3] is None), key=lambda item: item[2], reverse=True)
+            new[table_type] = [(key, name, count) for key, name, count, _ in fresh[:limit]]
+    unused.sort(key=str.lower)
+    return {"first": first, "movers": movers, "new": new, "unused": unused[:limit * 2], "unused_total": len(unused)}
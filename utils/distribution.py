@@ -0,0 +1,63 @@
+import logging
+import numpy as np
+# Import from project
+from utils import db_utils
+
+log = logging.getLogger(__name__)
+
+# --- Usage Distribution ---
+# How concentrated a guild's usage is: a few favourites, or spread over the whole catalogue. The count
+# column is read in one aggregate query (db_utils.get_count_column) and parsed straight into a NumPy array;
+# Morris registers are converted to estimates in bulk, and every statistic is computed on the sorted array.
+
+PERCENTILES = (50, 90, 99)
+TOP_FRACTION = 0.01 # "Top 1%" share
+HEAD_FRACTION = 0.2 # Items outside the top 20% form the long tail
+
+def load_counts(conn, guild_id, table_type):
+    """Return the (estimated) count of every used item of a guild table as an int64 array."""
+    text, base = db_utils.get_count_column(conn, guild_id, table_type)
+    if not text:
+        return np.zeros(0, dtype=np.int64)
+    counts = np.fromstring(text, dtype=np.int64, sep=",")
+    if base:
+        # Vectorized approx_count.estimate
+        counts = np.rint((np.power(base, counts.astype(np.float64)) - 1.0) / (base - 1.0)).astype(np.int64)
+    return counts
+
+def describe(counts):
+    """Concentration statistics of a count array, or None if it is empty.
+
+    Returns {"items", "total", "mean", "gini", "percentiles": {p: count}, "top_share", "long_tail_share",
+    "items_for_half"}: the top share is the fraction of uses by the top 1% of items (at least one item), the
+    long-tail share the fraction by items outside the top 20%, and items_for_half how many of the most used
+    items make up half of all uses.
+    """
+    counts = np.asarray(counts)
+    items = int(counts.size)
+    if items == 0:
+        return None
+    ordered = np.sort(counts).astype(np.float64) # Ascending
+    total = float(ordered.sum())
+    if total <= 0:
+        return None
+    # Gini coefficient of the sorted counts: 2 * sum(i * x_i) / (n * sum(x)) - (n + 1) / n
+    ranks = np.arange(1, items + 1, dtype=np.float64)
+    gini = 2.0 * float(np.dot(ranks, ordered)) / (items * total) - (items + 1.0) / items
+    top_items = max(1, int(np.ceil(items * TOP_FRACTION)))
+    head_items = max(1, int(np.ceil(items * HEAD_FRACTION)))
+    descending_cumulative = np.cumsum(ordered[::-1])
+    return {
+        "items": items,
+        "total": int(total),
+        "mean": total / items,
+        "gini": max(0.0, gini),
+        "percentiles": dict(zip(PERCENTILES, (float(value) for value in np.percentile(ordered, PERCENTILES)))),
+        "top_share": float(descending_cumulative[top_items - 1]) / total,
+        "long_tail_share": 1.0 - float(descending_cumulative[head_items - 1]) / total,
+        "items_for_half": int(np.searchsorted(descending_cumulative, total * 0.5)) + 1,
+    }
+
+def usage_distribution(conn, guild_id, table_type):
+    """describe() of a guild table's counts, or None if nothing has been used."""
+    return describe(load_counts(conn, guild_id, table_type))
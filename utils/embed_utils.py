@@ -1,10 +1,21 @@
 import discord
 #import stuff from this project
 from config import config
+from utils import db_utils
 from utils.ui_components import PaginatorView
 
 # --- Embed Creation Utilities ---
 
+def format_time(value):
+    """Render a stored timestamp as a Discord relative time, or a dash if unknown."""
+    if not value:
+        return "-"
+    try:
+        timestamp = db_utils.parse_timestamp(value)
+    except ValueError:
+        return str(value)
+    return discord.utils.format_dt(timestamp, style="R")
+
 def create_error_embed(message: str) -> discord.Embed:
     """Creates a standard error embed."""
     embed = discord.Embed(
@@ -32,8 +43,12 @@ def create_info_embed(message: str, title: str = "Information") -> discord.Embed
     )
     return embed
 
-def create_stats_embed(interaction: discord.Interaction, title: str, data: list, item_type: str, page_num: int, total_pages: int) -> discord.Embed:
-    """Creates a standardized embed for displaying stats (emojis, reactions, stickers)."""
+def create_stats_embed(interaction: discord.Interaction, title: str, data: list, item_type: str, page_num: int, total_pages: int,
+                       count_error: float = None) -> discord.Embed:
+    """Creates a standardized embed for displaying stats (emojis, reactions, stickers).
+
+    `count_error` is the relative standard error of approximate counts (see utils/approx_count.py), if any.
+    """
     embed = discord.Embed(
         title=title,
         color=discord.Color.blurple() # Or another suitable color
@@ -51,14 +66,23 @@ def create_stats_embed(interaction: discord.Interaction, title: str, data: list,
             rank = start_rank + i
             name = item["name"] # Assumes name is always present
             count = item["count"]
-            lines.append(f"`{rank}.` {name} - **{count}** uses")
+            if count_error:
+                lines.append(f"`{rank}.` {name} - **~{count:,}** uses (±{count * count_error:,.0f})")
+            else:
+                lines.append(f"`{rank}.` {name} - **{count}** uses")
 
         embed.description = "\n".join(lines)
 
-    embed.set_footer(text=f"Page {page_num}/{total_pages}")
+    if count_error:
+        embed.set_footer(text=(
+            f"Page {page_num}/{total_pages} • Approximate counts (±{count_error:.0%} typical error); "
+            f"items within each other's margin may swap places"
+        ))
+    else:
+        embed.set_footer(text=f"Page {page_num}/{total_pages}")
     return embed
 
-async def paginate_and_send(interaction: discord.Interaction, title: str, all_data: list, item_type: str):
+async def paginate_and_send(interaction: discord.Interaction, title: str, all_data: list, item_type: str, count_error: float = None):
     """Handles pagination for a list of data and sends embeds with navigation."""
     items_per_page = config.PAGINATION_DEFAULT_LIMIT
     if not all_data:
@@ -75,7 +99,7 @@ async def paginate_and_send(interaction: discord.Interaction, title: str, all_da
 
     def get_page_embed(page_num):
         if 1 <= page_num <= total_pages:
-            return create_stats_embed(interaction, title, chunks[page_num-1], item_type, page_num, total_pages)
+            return create_stats_embed(interaction, title, chunks[page_num-1], item_type, page_num, total_pages, count_error)
         else:
             return create_error_embed("Invalid page number requested.")
 
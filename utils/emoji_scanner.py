@@ -0,0 +1,44 @@
+import re
+
+# Regex to find custom emojis (both static and animated)
+# <:name:id> or <a:name:id>
+CUSTOM_EMOJI_REGEX = re.compile(r"<a?:([a-zA-Z0-9_]+):([0-9]+)>")
+
+# Function to check if a character is likely a Unicode emoji
+def is_unicode_emoji(char):
+    # Basic check covering common emoji ranges
+    code = ord(char)
+    return (
+        0x1F300 <= code <= 0x1F5FF or  # Misc Symbols and Pictographs
+        0x1F600 <= code <= 0x1F64F or  # Emoticons
+        0x1F680 <= code <= 0x1F6FF or  # Transport and Map Symbols
+        0x2600 <= code <= 0x26FF or   # Misc Symbols
+        0x2700 <= code <= 0x27BF or   # Dingbats
+        0xFE00 <= code <= 0xFE0F or   # Variation Selectors
+        0x1FA70 <= code <= 0x1FAFF    # Symbols and Pictographs Extended-A
+    )
+
+def scan_emojis(content):
+    """Return the unique emojis (custom first, then Unicode) found in a message's content.
+
+    Each emoji is reported once per message, in order of first appearance.
+    Custom emojis are returned in their full `<:name:id>` / `<a:name:id>` form.
+    """
+    if not content:
+        return []
+
+    found = []
+    seen = set()
+    # --- Custom Emojis ---
+    for match in CUSTOM_EMOJI_REGEX.finditer(content):
+        full_emoji_str = match.group(0)
+        if full_emoji_str not in seen:
+            seen.add(full_emoji_str)
+            found.append(full_emoji_str)
+
+    # --- Unicode Emojis ---
+    for char in content:
+        if char not in seen and is_unicode_emoji(char):
+            seen.add(char)
+            found.append(char)
+    return found
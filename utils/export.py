@@ -0,0 +1,137 @@
+import io
+import os
+import csv
+import gzip
+import json
+import zlib
+import sqlite3
+import logging
+# Import from project (no discord import: used by the CLI as well)
+from utils import db_utils
+
+log = logging.getLogger(__name__)
+
+# --- Guild Statistics Export ---
+# Streams a guild's datasets (db_utils.EXPORT_DATASETS) chunk by chunk into CSV, JSON Lines or Parquet files.
+# CSV and JSON Lines are gzip-compressed on the fly (Parquet compresses its column chunks itself). With
+# `max_part_bytes` a dataset is split into several standalone files, each under the limit: after every chunk
+# the compressor is sync-flushed so the bytes on disk are exact, and a new part is started when the next
+# chunk (estimated by the last one) would not fit. Parquet needs the optional pyarrow package.
+
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+EXPORT_COMPRESSIONS = ("gzip", "none")
+
+_INTEGER_COLUMNS = {"count", "channel_id", "total", "messages", "error"}
+
+class _TextPart:
+    """One CSV or JSON Lines output file, optionally gzip-compressed."""
+    def __init__(self, path, fmt, compression, columns):
+        self.raw = open(path, "wb")
+        self.gzip = gzip.GzipFile(fileobj=self.raw, mode="wb", mtime=0) if compression == "gzip" else None
+        self.text = io.TextIOWrapper(self.gzip or self.raw, encoding="utf-8", newline="")
+        self.fmt = fmt
+        self.columns = columns
+        if fmt == "csv":
+            self.csv = csv.writer(self.text)
+            self.csv.writerow(columns)
+
+    def write(self, rows):
+        if self.fmt == "csv":
+            self.csv.writerows(rows)
+        else:
+            self.text.writelines(
+                json.dumps(dict(zip(self.columns, row)), ensure_ascii=False, separators=(",", ":")) + "\n" for row in rows
+            )
+        self.text.flush()
+        if self.gzip is not None:
+            self.gzip.flush(zlib.Z_SYNC_FLUSH) # Make the compressed size on disk exact
+
+    def size(self):
+        return self.raw.tell()
+
+    def close(self):
+        self.text.close() # Closes the gzip stream and the file
+
+class _ParquetPart:
+    """One Parquet output file; every chunk becomes a row group."""
+    def __init__(self, path, compression, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet export needs the pyarrow package (pip install pyarrow).") from None
+        self.pyarrow = pyarrow
+        self.columns = columns
+        self.schema = pyarrow.schema([
+            (column, pyarrow.int64() if column in _INTEGER_COLUMNS else pyarrow.string()) for column in columns
+        ])
+        self.raw = open(path, "wb")
+        self.writer = pyarrow.parquet.ParquetWriter(self.raw, self.schema, compression="snappy" if compression == "none" else "gzip")
+
+    def write(self, rows):
+        arrays = [
+            [None if value is None else (value if column in _INTEGER_COLUMNS else str(value)) for value in values]
+            for column, values in zip(self.columns, zip(*rows))
+        ]
+        self.writer.write_table(self.pyarrow.Table.from_arrays(
+            [self.pyarrow.array(values, type=field.type) for values, field in zip(arrays, self.schema)], schema=self.schema
+        ))
+
+    def size(self):
+        return self.raw.tell()
+
+    def close(self):
+        self.writer.close()
+        self.raw.close()
+
+def _extension(fmt, compression):
+    if fmt == "parquet":
+        return "parquet"
+    return f"{fmt}.gz" if compression == "gzip" else fmt
+
+def _open_part(path, fmt, compression, columns):
+    if fmt == "parquet":
+        return _ParquetPart(path, compression, columns)
+    return _TextPart(path, fmt, compression, columns)
+
+def export_dataset(conn, guild_id, dataset, directory, fmt="csv", compression="gzip", chunk_rows=5000, max_part_bytes=None):
+    """Stream one dataset of a guild into `directory`; returns (paths written, rows exported)."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    stem = os.path.join(directory, f"guild_{guild_id}_{dataset}")
+    extension = _extension(fmt, compression)
+    paths, part, rows_exported = [], None, 0
+    after_rowid, last_chunk_bytes = 0, 0
+    try:
+        while True:
+            try:
+                columns, rows, after_rowid = db_utils.read_export_chunk(conn, guild_id, dataset, after_rowid, chunk_rows)
+            except sqlite3.OperationalError as e:
+                log.warning(f"Skipping export dataset {dataset} of guild {guild_id}: {e}")
+                break
+            if not rows:
+                break
+            if part is not None and max_part_bytes and part.size() + last_chunk_bytes > max_part_bytes:
+                part.close()
+                part = None
+            if part is None:
+                paths.append(f"{stem}.{extension}" if not paths else f"{stem}.part{len(paths) + 1}.{extension}")
+                part = _open_part(paths[-1], fmt, compression, columns)
+            before = part.size()
+            part.write(rows)
+            last_chunk_bytes = part.size() - before
+            rows_exported += len(rows)
+    finally:
+        if part is not None:
+            part.close()
+    return paths, rows_exported
+
+def export_guild(conn, guild_id, directory, fmt="csv", compression="gzip", datasets=None, chunk_rows=5000, max_part_bytes=None):
+    """Export every dataset of a guild (or the given ones); returns ([paths], {dataset: rows}). Empty datasets write no file."""
+    os.makedirs(directory, exist_ok=True)
+    all_paths, counts = [], {}
+    for dataset in datasets or db_utils.EXPORT_DATASETS:
+        paths, rows = export_dataset(conn, str(guild_id), dataset, directory, fmt, compression, chunk_rows, max_part_bytes)
+        all_paths.extend(paths)
+        counts[dataset] = rows
+    return all_paths, counts
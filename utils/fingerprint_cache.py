@@ -0,0 +1,114 @@
+import sys
+import logging
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+# Shared fingerprint for messages that contained nothing we track.
+# Reusing one object keeps those (very common) entries down to the key + slot cost.
+EMPTY_FINGERPRINT = ((), (), ())
+
+def make_fingerprint(emojis, sticker_ids=(), uncounted=()):
+    """Build a compact, hashable fingerprint of the items counted for one message.
+
+    The fingerprint is `(sorted emoji names, sorted sticker ids, sorted uncounted emoji names)`.
+    Uncounted emojis are in the message but were never credited (absorbed by the flood dampener),
+    so an edit keeping them must not count them either. Strings are interned so the same emoji
+    seen in many messages is only stored once.
+    """
+    emoji_part = tuple(sorted(sys.intern(str(e)) for e in emojis))
+    sticker_part = tuple(sorted(sys.intern(str(s)) for s in sticker_ids))
+    uncounted_part = tuple(sorted(sys.intern(str(e)) for e in uncounted))
+    if not emoji_part and not sticker_part and not uncounted_part:
+        return EMPTY_FINGERPRINT
+    return (emoji_part, sticker_part, uncounted_part)
+
+def _fingerprint_size(message_id, fingerprint):
+    """Approximate memory cost (bytes) of one cache entry."""
+    size = sys.getsizeof(message_id) + 100 # OrderedDict slot + link overhead (approx.)
+    if fingerprint is EMPTY_FINGERPRINT:
+        return size
+    size += sys.getsizeof(fingerprint)
+    for part in fingerprint:
+        if not part:
+            continue # The empty tuple is a shared singleton
+        size += sys.getsizeof(part)
+        # Interned strings are shared, but count them anyway so the budget stays conservative.
+        size += sum(sys.getsizeof(s) for s in part)
+    return size
+
+class FingerprintCache:
+    """A bounded LRU of message_id -> fingerprint, capped by entry count and approximate bytes.
+
+    Used to reconcile counts when messages are edited or deleted. Memory stays flat no
+    matter the traffic: the least recently used fingerprints are evicted once either
+    limit is exceeded.
+    """
+    def __init__(self, max_entries=50000, max_bytes=8 * 1024 * 1024):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self._entries = OrderedDict() # message_id -> (fingerprint, size)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, message_id):
+        return message_id in self._entries
+
+    def put(self, message_id, fingerprint):
+        """Store (or replace) the fingerprint for a message, evicting old entries if needed."""
+        old = self._entries.pop(message_id, None)
+        if old is not None:
+            self._bytes -= old[1]
+        size = _fingerprint_size(message_id, fingerprint)
+        self._entries[message_id] = (fingerprint, size)
+        self._bytes += size
+        self._evict()
+
+    def get(self, message_id):
+        """Return the cached fingerprint for a message, or None on a miss."""
+        entry = self._entries.get(message_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(message_id)
+        return entry[0]
+
+    def pop(self, message_id):
+        """Remove and return the cached fingerprint for a message, or None on a miss."""
+        entry = self._entries.pop(message_id, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._bytes -= entry[1]
+        return entry[0]
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def hit_rate(self):
+        """Fraction of lookups that found a fingerprint (0.0 when there were none)."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """Return a snapshot of cache size and effectiveness."""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate(),
+        }
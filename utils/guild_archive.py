@@ -0,0 +1,110 @@
+import json
+import zlib
+import base64
+import sqlite3
+import logging
+from datetime import datetime
+# Import from project
+from utils import db_utils
+
+log = logging.getLogger(__name__)
+
+# --- Departed Guild Archive ---
+# A separate SQLite file holds one row per archived guild: the guild's export (db_utils.export_guild_rows)
+# as zlib-compressed JSON, plus what it cost in the live database. The blob is written and committed
+# before the live data is dropped, and deleted only after the restore committed, so a crash in between
+# leaves a stale blob at worst (db_utils.import_guild_rows recognises and skips those).
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS guild_archives ("
+    "guild_id TEXT PRIMARY KEY, archived_at TEXT NOT NULL, tables INTEGER NOT NULL, rows INTEGER NOT NULL, "
+    "live_bytes INTEGER, raw_bytes INTEGER NOT NULL, payload BLOB NOT NULL);"
+)
+
+def open_archive(path):
+    """Open (and create, if needed) the guild archive file."""
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute(_SCHEMA)
+    conn.commit()
+    return conn
+
+def _encode_value(value):
+    if isinstance(value, bytes):
+        return {"$b": base64.b64encode(value).decode("ascii")} # Sketch registers, archived item blobs
+    raise TypeError(f"Cannot archive value of type {type(value).__name__}")
+
+def _decode_object(obj):
+    if len(obj) == 1 and "$b" in obj:
+        return base64.b64decode(obj["$b"])
+    return obj
+
+def pack(data):
+    """Serialize an export to (compressed blob, uncompressed size)."""
+    raw = json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=_encode_value).encode("utf-8")
+    return zlib.compress(raw, 9), len(raw)
+
+def unpack(payload):
+    return json.loads(zlib.decompress(payload).decode("utf-8"), object_hook=_decode_object)
+
+def archive_guild(conn, archive_conn, guild_id, now=None):
+    """Move a guild's data from the live database into the archive; returns its archive row as a dict, or None."""
+    guild_id = str(guild_id)
+    data = db_utils.export_guild_rows(conn, guild_id)
+    if data is None:
+        return None
+    live_bytes = data.pop("live_bytes")
+    payload, raw_bytes = pack(data)
+    archived_at = str(now or datetime.utcnow())
+    entry = {
+        "guild_id": guild_id, "archived_at": archived_at, "tables": len(data["tables"]),
+        "rows": sum(len(snapshot["rows"]) for group in ("tables", "keyed") for snapshot in data[group].values()),
+        "live_bytes": live_bytes, "raw_bytes": raw_bytes, "payload_bytes": len(payload),
+    }
+    try:
+        archive_conn.execute(
+            "INSERT OR REPLACE INTO guild_archives (guild_id, archived_at, tables, rows, live_bytes, raw_bytes, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?);",
+            (guild_id, archived_at, entry["tables"], entry["rows"], live_bytes, raw_bytes, payload)
+        )
+        archive_conn.commit()
+    except sqlite3.Error as e:
+        log.error(f"Failed to write the archive of guild {guild_id}: {e}")
+        archive_conn.rollback()
+        return None
+    if not db_utils.drop_guild_data(conn, guild_id, archived_at):
+        return None
+    log.info(f"Archived guild {guild_id}: {entry['rows']:,} rows, {len(payload):,} bytes compressed.")
+    return entry
+
+def restore_guild(conn, archive_conn, guild_id):
+    """Bring an archived guild back into the live database.
+
+    Returns the number of rows restored (0 if there was no usable archive), or None if the restore failed.
+    """
+    guild_id = str(guild_id)
+    row = archive_conn.execute("SELECT archived_at, payload FROM guild_archives WHERE guild_id = ?;", (guild_id,)).fetchone()
+    if row is None:
+        return 0
+    try:
+        data = unpack(row["payload"])
+    except (ValueError, zlib.error) as e:
+        log.error(f"Unreadable archive for guild {guild_id}, keeping it: {e}")
+        return None
+    restored = db_utils.import_guild_rows(conn, guild_id, data, row["archived_at"])
+    if restored is None:
+        return None
+    archive_conn.execute("DELETE FROM guild_archives WHERE guild_id = ?;", (guild_id,))
+    archive_conn.commit()
+    if restored:
+        log.info(f"Restored guild {guild_id} from its archive ({restored:,} rows).")
+    return restored
+
+def archive_report(archive_conn):
+    """Return one dict per archived guild (without the payload), oldest first."""
+    rows = archive_conn.execute(
+        "SELECT guild_id, archived_at, tables, rows, live_bytes, raw_bytes, LENGTH(payload) AS payload_bytes "
+        "FROM guild_archives ORDER BY archived_at;"
+    ).fetchall()
+    return [dict(row) for row in rows]
@@ -0,0 +1,105 @@
+import time
+import logging
+import numpy as np
+# Import from project
+from utils import db_utils
+
+log = logging.getLogger(__name__)
+
+# --- Hour-of-Week Heatmaps ---
+# When items get used: every item keeps db_utils.HEATMAP_SLOTS (168) counters, one per hour of the week,
+# stored as a packed blob instead of one row per use. Recording only bumps a sparse in-memory delta;
+# flush() adds all of them to the stored arrays in one transaction. Reads decode the blobs of every
+# requested item into one matrix and sum it with NumPy.
+
+def hour_of_week(timestamp=None):
+    """Heatmap slot of a UNIX timestamp: weekday * 24 + hour, in UTC (Monday 00:00 is slot 0)."""
+    moment = time.gmtime(timestamp)
+    return moment.tm_wday * 24 + moment.tm_hour
+
+def aggregate(blobs):
+    """Sum packed heatmaps into one int64 array of HEATMAP_SLOTS counts (blobs of the wrong size are skipped)."""
+    size = db_utils.HEATMAP_SLOTS * 4
+    valid = [blob for blob in blobs if blob and len(blob) == size]
+    if not valid:
+        return np.zeros(db_utils.HEATMAP_SLOTS, dtype=np.int64)
+    matrix = np.frombuffer(b"".join(valid), dtype="<u4").reshape(-1, db_utils.HEATMAP_SLOTS)
+    return matrix.sum(axis=0, dtype=np.int64)
+
+def by_day(slots, utc_offset=0):
+    """Reshape heatmap counts into a 7 x 24 (weekday x hour) array, shifted to another UTC offset in hours."""
+    return np.roll(np.asarray(slots), int(utc_offset)).reshape(7, 24)
+
+class HeatmapTracker:
+    """Buffers hour-of-week increments per (guild, type, item) and adds them to the stored heatmaps on flush().
+
+    Pending deltas are sparse ({slot: delta}); once more than `max_pending` items are pending they are
+    flushed on the next record. Edits and deletes do not adjust heatmaps.
+
+    With `read_through=True` nothing is buffered and queries read the stored rows; used by a process that
+    only reads what an ingest worker maintains.
+    """
+    def __init__(self, max_pending=50000, read_through=False):
+        self.max_pending = max(1, int(max_pending))
+        self.read_through = read_through
+        self._pending = {} # (guild_id, table_type, item_key) -> {slot: delta}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def record(self, conn, guild_id, table_type, items, timestamp=None):
+        """Count one use of each item in the hour-of-week slot of `timestamp` (default: now)."""
+        if not items:
+            return
+        slot = hour_of_week(timestamp)
+        guild_id = str(guild_id)
+        for item_key in items:
+            deltas = self._pending.setdefault((guild_id, table_type, item_key), {})
+            deltas[slot] = deltas.get(slot, 0) + 1
+        if len(self._pending) > self.max_pending:
+            self.flush(conn)
+
+    def heatmap(self, conn, guild_id, table_type, item_key=None):
+        """Return the guild's hour-of-week counts (int64 array of HEATMAP_SLOTS) for one item or all items of a type."""
+        guild_id = str(guild_id)
+        if not self.read_through:
+            self._save(conn, [key for key in self._pending if key[0] == guild_id and key[1] == table_type])
+        return aggregate(db_utils.get_heatmap_blobs(conn, guild_id, table_type, item_key))
+
+    @staticmethod
+    def stored(conn, guild_id, table_type, item_key=None):
+        """Like heatmap(), but only the flushed counts. It only reads, so it can run in a thread on a read-only connection."""
+        return aggregate(db_utils.get_heatmap_blobs(conn, str(guild_id), table_type, item_key))
+
+    def pending(self, guild_id, table_type, item_key=None):
+        """The counts not flushed yet, as an int64 array of HEATMAP_SLOTS; add it to stored() for the full heatmap."""
+        slots = np.zeros(db_utils.HEATMAP_SLOTS, dtype=np.int64)
+        guild_id = str(guild_id)
+        if item_key is not None:
+            found = self._pending.get((guild_id, table_type, item_key))
+            pending = [found] if found else []
+        else:
+            pending = [deltas for key, deltas in self._pending.items() if key[0] == guild_id and key[1] == table_type]
+        for deltas in pending:
+            for slot, delta in deltas.items():
+                slots[slot] += delta
+        return slots
+
+    def forget_guild(self, guild_id):
+        guild_id = str(guild_id)
+        for key in [key for key in self._pending if key[0] == guild_id]:
+            del self._pending[key]
+
+    def _save(self, conn, keys):
+        rows = [key + (self._pending[key],) for key in keys if key in self._pending]
+        if not rows:
+            return True
+        if db_utils.add_heatmap_deltas(conn, rows):
+            for key in keys:
+                self._pending.pop(key, None)
+            return True
+        return False # Kept for the next flush
+
+    def flush(self, conn):
+        """Add every pending delta to the stored heatmaps."""
+        return self._save(conn, list(self._pending))
@@ -0,0 +1,125 @@
+import heapq
+import logging
+from itertools import combinations
+# Import from project
+from utils import db_utils
+
+log = logging.getLogger(__name__)
+
+class SpaceSaving:
+    """Space-Saving heavy hitters: tracks the approximate top-K keys of a stream in O(capacity) memory.
+
+    Each tracked key has a count that overestimates its true frequency by at most its recorded error.
+    Any key with true frequency above total / capacity is guaranteed to be tracked.
+    """
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.counts = {} # key -> [count, error]
+        self.total = 0
+        self._heap = [] # (count, key) entries; stale entries are skipped lazily
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, key, increment=1):
+        self.total += increment
+        entry = self.counts.get(key)
+        if entry is not None:
+            entry[0] += increment
+        elif len(self.counts) < self.capacity:
+            entry = self.counts[key] = [increment, 0]
+        else:
+            # Replace the current minimum; the newcomer inherits its count as error
+            min_count, min_key = self._pop_min()
+            del self.counts[min_key]
+            entry = self.counts[key] = [min_count + increment, min_count]
+        heapq.heappush(self._heap, (entry[0], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild_heap()
+
+    def _pop_min(self):
+        while True:
+            count, key = heapq.heappop(self._heap)
+            entry = self.counts.get(key)
+            if entry is not None and entry[0] == count:
+                return count, key
+
+    def _rebuild_heap(self):
+        self._heap = [(entry[0], key) for key, entry in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, limit=10):
+        """Return [(key, count, error)] for the `limit` highest counts."""
+        ranked = sorted(self.counts.items(), key=lambda item: item[1][0], reverse=True)
+        return [(key, count, error) for key, (count, error) in ranked[:limit]]
+
+    def load(self, rows, total=0):
+        """Restore state from (key, count, error) rows."""
+        self.counts = {key: [count, error] for key, count, error in rows}
+        self.total = total or sum(count for _, count, _ in rows)
+        self._rebuild_heap()
+
+class PairTracker:
+    """Per-guild Space-Saving summaries of co-occurring emoji pairs.
+
+    Only the top `capacity` pairs per guild are kept in memory; state is restored lazily from the
+    database and written back by `flush()`.
+
+    With `read_through=True` queries always load the stored summary instead of caching it; used by a
+    process that only reads pairs another process (an ingest worker) maintains.
+    """
+    def __init__(self, capacity=500, max_emojis_per_message=10, read_through=False):
+        self.capacity = capacity
+        self.max_emojis_per_message = max_emojis_per_message
+        self.read_through = read_through
+        self._guilds = {} # guild_id -> SpaceSaving
+        self._dirty = set()
+
+    def _get(self, conn, guild_id):
+        guild_id = str(guild_id)
+        summary = self._guilds.get(guild_id)
+        if summary is None:
+            summary = SpaceSaving(self.capacity)
+            rows = db_utils.load_emoji_pairs(conn, guild_id)
+            if rows:
+                summary.load([((row["item_a"], row["item_b"]), row["count"], row["error"]) for row in rows])
+            self._guilds[guild_id] = summary
+        return summary
+
+    def record(self, conn, guild_id, emojis):
+        """Count every unordered pair among one message's (unique) emojis."""
+        if len(emojis) < 2:
+            return
+        # Bound the quadratic blow-up for emoji-spam messages: keep the first unique emojis in message order
+        emojis = list(dict.fromkeys(emojis))[:self.max_emojis_per_message]
+        if len(emojis) < 2:
+            return
+        summary = self._get(conn, guild_id)
+        for pair in combinations(emojis, 2):
+            summary.add(tuple(sorted(pair))) # Canonical order, so (a, b) and (b, a) are one pair
+        self._dirty.add(str(guild_id))
+
+    def top_pairs(self, conn, guild_id, limit=10):
+        """Return [((emoji_a, emoji_b), count, error)] for a guild's most frequent pairs."""
+        if self.read_through:
+            self.forget_guild(guild_id) # Always serve the latest flushed state
+        return self._get(conn, guild_id).top(limit)
+
+    def forget_guild(self, guild_id):
+        self._guilds.pop(str(guild_id), None)
+        self._dirty.discard(str(guild_id))
+
+    def flush(self, conn):
+        """Replace the stored pairs of every modified guild with its current summary."""
+        success = True
+        for guild_id in list(self._dirty):
+            summary = self._guilds.get(guild_id)
+            if summary is None:
+                self._dirty.discard(guild_id)
+                continue
+            rows = [(a, b, count, error) for (a, b), count, error in summary.top(self.capacity)]
+            if db_utils.replace_emoji_pairs(conn, guild_id, rows):
+                self._dirty.discard(guild_id)
+            else:
+                success = False
+        return success
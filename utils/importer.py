@@ -0,0 +1,141 @@
+import os
+import re
+import csv
+import gzip
+import json
+import time
+import sqlite3
+import logging
+# Import from project (no discord import: used by the CLI)
+from utils import db_utils
+
+log = logging.getLogger(__name__)
+
+# --- Bulk Import ---
+# Reads count rows from export files (utils/export.py: CSV / JSON Lines, optionally gzip, or Parquet) and from
+# the legacy unified `emoji_stats` table, and merges them into the current schema in chunks. Every source
+# yields lists of (guild_id, table_type, key, name, count, last_used) tuples; run_import() writes each chunk
+# with db_utils.import_count_rows (one executemany per guild table, one transaction per chunk) between
+# db_utils.begin_bulk_import() and finish_bulk_import().
+
+_EXPORT_NAME = re.compile(r"guild_(?P<guild>\w+?)_(?P<dataset>emojis|reactions|stickers|archived)(?:\.part\d+)?\.(?P<format>csv|jsonl|parquet)(?:\.gz)?$")
+_TYPE_NAMES = {
+    "emoji": "emojis", "emojis": "emojis", "reaction": "reactions", "reactions": "reactions",
+    "sticker": "stickers", "stickers": "stickers",
+}
+
+def _export_rows(records, guild_id, dataset):
+    """Turn export records (dicts) into import rows."""
+    rows = []
+    for record in records:
+        table_type = _TYPE_NAMES.get(record.get("type"), dataset) if dataset == "archived" else dataset
+        if table_type not in db_utils.GUILD_TABLE_TYPES:
+            continue
+        key = record.get("sticker_id") if table_type == "stickers" and "sticker_id" in record else record.get("item")
+        count = record.get("count")
+        rows.append((
+            guild_id, table_type, key, record.get("name") if table_type == "stickers" else None,
+            int(count) if count not in (None, "") else 0, record.get("last_used") or None,
+        ))
+    return rows
+
+def _chunks(records, chunk_rows):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def read_export_file(path, chunk_rows=50000, guild_id=None):
+    """Yield import row chunks from one export file; the guild and dataset come from its name (guild_<id>_<dataset>...).
+
+    `guild_id` imports the file into a different guild.
+    """
+    match = _EXPORT_NAME.search(os.path.basename(path))
+    if match is None:
+        raise ValueError(f"Not an export file name (guild_<id>_<dataset>.<format>[.gz]): {path}")
+    guild_id = str(guild_id or match.group("guild")).lstrip("_")
+    dataset, fmt = match.group("dataset"), match.group("format")
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet import needs the pyarrow package (pip install pyarrow).") from None
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield _export_rows(batch.to_pylist(), guild_id, dataset)
+        return
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", newline="") as handle:
+        records = csv.DictReader(handle) if fmt == "csv" else (json.loads(line) for line in handle if line.strip())
+        for chunk in _chunks(records, chunk_rows):
+            yield _export_rows(chunk, guild_id, dataset)
+
+def _pick(columns, *candidates):
+    for candidate in candidates:
+        if candidate in columns:
+            return candidate
+    return None
+
+def read_legacy_table(path, chunk_rows=50000):
+    """Yield import row chunks from the unified `emoji_stats` table of an old database (see test_setup.check_database).
+
+    Column names vary between old versions; the guild, item and count columns are required, an item type
+    column is optional (rows without one are emojis).
+    """
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(emoji_stats);")]
+        if not columns:
+            raise ValueError(f"No emoji_stats table in {path}")
+        guild_column = _pick(columns, "guild_id", "guild", "server_id")
+        key_column = _pick(columns, "emoji", "item", "name", "emoji_name", "emoji_id", "sticker_id")
+        count_column = _pick(columns, "count", "usage_count", "uses", "times_used")
+        type_column = _pick(columns, "type", "table_type", "item_type", "kind")
+        name_column = _pick(columns, "sticker_name", "name") if key_column != "name" else None
+        used_column = _pick(columns, "last_used", "updated_at", "last_seen")
+        if not (guild_column and key_column and count_column):
+            raise ValueError(f"Cannot map the legacy emoji_stats columns {columns} (need guild, item and count columns)")
+        selected = [guild_column, key_column, count_column, type_column or "NULL", name_column or "NULL", used_column or "NULL"]
+        cursor = conn.execute(f"SELECT {', '.join(selected)} FROM emoji_stats;")
+        while True:
+            records = cursor.fetchmany(chunk_rows)
+            if not records:
+                break
+            rows = []
+            for guild_id, key, count, item_type, name, last_used in records:
+                table_type = _TYPE_NAMES.get(str(item_type).lower(), "emojis") if item_type is not None else "emojis"
+                rows.append((str(guild_id), table_type, key, name if table_type == "stickers" else None, count, last_used))
+            yield rows
+    finally:
+        conn.close()
+
+def run_import(conn, chunks, replace=False, progress=None):
+    """Merge every chunk into the database; returns {"rows", "guilds", "seconds", "rows_per_second", "failed_chunks"}.
+
+    `progress(rows_so_far)` is called after every chunk.
+    """
+    started = time.perf_counter()
+    ensured, rows, failed = set(), 0, 0
+    db_utils.begin_bulk_import(conn)
+    try:
+        for chunk in chunks:
+            for guild_id in {row[0] for row in chunk} - ensured:
+                db_utils.ensure_guild_tables(conn, guild_id)
+                ensured.add(guild_id)
+            written = db_utils.import_count_rows(conn, chunk, replace=replace)
+            if written is None:
+                failed += 1
+                continue
+            rows += written
+            if progress is not None:
+                progress(rows)
+    finally:
+        db_utils.finish_bulk_import(conn, ensured)
+    seconds = time.perf_counter() - started
+    return {
+        "rows": rows, "guilds": len(ensured), "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds > 0 else 0.0, "failed_chunks": failed,
+    }
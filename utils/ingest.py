@@ -0,0 +1,199 @@
+import time
+import logging
+# Import from project
+from utils import db_utils
+from utils.emoji_scanner import scan_emojis
+from utils.fingerprint_cache import make_fingerprint
+
+log = logging.getLogger(__name__)
+
+# --- Message Ingest ---
+# These helpers work on plain values (ids, content, sticker tuples) rather than discord objects,
+# so the same logic serves live events, edits/deletes, ingest worker processes and offline tooling.
+# When a CountBatch is passed, deltas are queued in it instead of being written immediately.
+
+def _apply(conn, batch, guild_id, table_type, deltas, names=None):
+    """Write deltas now, or queue them in `batch` if one is given."""
+    if not deltas:
+        return
+    if batch is None:
+        db_utils.apply_count_deltas(conn, guild_id, table_type, deltas, names=names)
+        return
+    names = names or {}
+    for key, delta in deltas.items():
+        batch.add(guild_id, table_type, key, delta, names.get(key))
+
+def record_message(conn, cache, guild_id, message_id, content, stickers=(), batch=None, dampener=None, user_id=None):
+    """Count the emojis and stickers of a new message and remember its fingerprint.
+
+    `stickers` is an iterable of (sticker_id, sticker_name) tuples.
+    With a FloodDampener, items `user_id` is spamming are left out of the counts and recorded as
+    uncounted in the fingerprint, so a later delete does not subtract them and an edit does not
+    credit them. Returns the fingerprint that was recorded.
+    """
+    scanned = scan_emojis(content)
+    emojis, sticker_names = _dampen(conn, dampener, guild_id, user_id, scanned, stickers)
+
+    _apply(conn, batch, guild_id, "emojis", {emoji: 1 for emoji in emojis})
+    _apply(conn, batch, guild_id, "stickers", {sticker_id: 1 for sticker_id in sticker_names}, names=sticker_names)
+
+    fingerprint = make_fingerprint(emojis, sticker_names, set(scanned) - set(emojis))
+    if cache is not None:
+        cache.put(message_id, fingerprint)
+    return fingerprint
+
+def _dampen(conn, dampener, guild_id, user_id, emojis, stickers):
+    """Return (emojis, {sticker_id: name}) of a message, without the items `user_id` is spamming."""
+    sticker_names = {str(sticker_id): name for sticker_id, name in stickers}
+    if dampener is not None:
+        emojis = dampener.filter(conn, guild_id, user_id, "emojis", emojis)
+        allowed = set(dampener.filter(conn, guild_id, user_id, "stickers", list(sticker_names)))
+        sticker_names = {sticker_id: name for sticker_id, name in sticker_names.items() if sticker_id in allowed}
+    return emojis, sticker_names
+
+def _diff(old_items, new_items):
+    """Return {item: +1/-1} for items added to / removed from a message."""
+    old_set, new_set = set(old_items), set(new_items)
+    deltas = {item: 1 for item in new_set - old_set}
+    deltas.update({item: -1 for item in old_set - new_set})
+    return deltas
+
+def reconcile_edit(conn, cache, guild_id, message_id, new_content, old_content=None, sticker_ids=(), batch=None):
+    """Adjust counts after a message edit by diffing against its previous fingerprint.
+
+    Falls back to `old_content` (e.g. from discord's own message cache) and the message's
+    `sticker_ids` when the fingerprint is not cached. Returns False if the previous state is
+    unknown and nothing was changed.
+    """
+    old_fingerprint = cache.get(message_id) if cache is not None else None
+    if old_fingerprint is None:
+        if old_content is None:
+            log.debug(f"No fingerprint for edited message {message_id} in guild {guild_id}; skipping reconciliation.")
+            return False
+        old_fingerprint = make_fingerprint(scan_emojis(old_content), sticker_ids)
+
+    old_emojis, sticker_ids, old_uncounted = old_fingerprint
+    scanned = set(scan_emojis(new_content))
+    # Emojis the message had but that were never counted stay uncounted; only really new ones are credited
+    uncounted = scanned.intersection(old_uncounted)
+    new_emojis = scanned - uncounted
+    deltas = _diff(old_emojis, new_emojis)
+    if deltas:
+        log.debug(f"Reconciling edit of message {message_id} in guild {guild_id}: {deltas}")
+        _apply(conn, batch, guild_id, "emojis", deltas)
+
+    # Stickers cannot be edited, so the sticker part of the fingerprint carries over
+    if cache is not None:
+        cache.put(message_id, make_fingerprint(new_emojis, sticker_ids, uncounted))
+    return True
+
+def reconcile_delete(conn, cache, guild_id, message_id, old_content=None, old_sticker_ids=(), batch=None):
+    """Remove a deleted message's contribution from the counts.
+
+    Falls back to `old_content` / `old_sticker_ids` when the fingerprint is not cached.
+    Returns False if the previous state is unknown and nothing was changed.
+    """
+    fingerprint = cache.pop(message_id) if cache is not None else None
+    if fingerprint is None:
+        if old_content is None and not old_sticker_ids:
+            log.debug(f"No fingerprint for deleted message {message_id} in guild {guild_id}; skipping reconciliation.")
+            return False
+        fingerprint = make_fingerprint(scan_emojis(old_content), old_sticker_ids)
+
+    emojis, sticker_ids, _ = fingerprint
+    _apply(conn, batch, guild_id, "emojis", {emoji: -1 for emoji in emojis})
+    _apply(conn, batch, guild_id, "stickers", {sticker_id: -1 for sticker_id in sticker_ids})
+    return True
+
+# --- Queued Ingest Events ---
+# Event tuples shared by the in-process ingest queue (utils/ingest_queue.py) and the worker processes
+# (utils/ingest_workers.py): (kind, enqueued_at, guild_id, *fields)
+#   ("message",  t, guild_id, channel_id, message_id, user_id, content, stickers)
+#   ("edit",     t, guild_id, message_id, new_content, old_content, sticker_ids)
+#   ("delete",   t, guild_id, message_id, old_content, old_sticker_ids)
+#   ("reaction", t, guild_id, user_id, emoji)
+#   ("forget",   t, guild_id)  -> drop in-memory state after a wipe/reset
+#   ("settings", t, guild_id)  -> re-read the guild's settings (e.g. dampener limits)
+
+def message_event(guild_id, channel_id, message_id, user_id, content, stickers=()):
+    return ("message", time.time(), str(guild_id), channel_id, message_id, user_id, content, tuple(stickers))
+
+def edit_event(guild_id, message_id, new_content, old_content=None, sticker_ids=()):
+    return ("edit", time.time(), str(guild_id), message_id, new_content, old_content, tuple(sticker_ids))
+
+def delete_event(guild_id, message_id, old_content=None, old_sticker_ids=()):
+    return ("delete", time.time(), str(guild_id), message_id, old_content, tuple(old_sticker_ids))
+
+def reaction_event(guild_id, user_id, emoji):
+    return ("reaction", time.time(), str(guild_id), user_id, emoji)
+
+def forget_event(guild_id):
+    return ("forget", time.time(), str(guild_id))
+
+def settings_event(guild_id):
+    return ("settings", time.time(), str(guild_id))
+
+def event_increments(event, conn=None, dampener=None):
+    """Return the (table_type, key, name) increments an event would add, for merging it without a full apply.
+
+    With a FloodDampener, spammed items are left out as apply_event would. Edits, deletes, forgets and
+    settings reloads have none: they depend on per-message state and cannot be merged.
+    """
+    kind = event[0]
+    if kind == "message":
+        _, _, guild_id, _, _, user_id, content, stickers = event
+        emojis, sticker_names = _dampen(conn, dampener, guild_id, user_id, scan_emojis(content), stickers)
+        increments = [("emojis", emoji, None) for emoji in emojis]
+        increments.extend(("stickers", sticker_id, name) for sticker_id, name in sticker_names.items())
+        return increments
+    if kind == "reaction":
+        _, _, guild_id, user_id, emoji = event
+        if dampener is not None and not dampener.filter(conn, guild_id, user_id, "reactions", [emoji]):
+            return []
+        return [("reactions", emoji, None)]
+    return []
+
+def apply_event(conn, event, batch=None, cache=None, user_sketches=None, pair_tracker=None, dampener=None, channel_tracker=None,
+                heatmap_tracker=None):
+    """Apply one ingest event: counts go to `batch` (or straight to the database), derived stats to the stores."""
+    kind, guild_id = event[0], event[2]
+    if kind == "message":
+        _, _, _, channel_id, message_id, user_id, content, stickers = event
+        emojis, sticker_ids, _ = record_message(conn, cache, guild_id, message_id, content, stickers, batch=batch, dampener=dampener, user_id=user_id)
+        if user_sketches is not None:
+            user_sketches.record(conn, guild_id, "emojis", user_id, emojis)
+            user_sketches.record(conn, guild_id, "stickers", user_id, sticker_ids)
+        if pair_tracker is not None:
+            pair_tracker.record(conn, guild_id, emojis)
+        if channel_tracker is not None:
+            channel_tracker.record(conn, guild_id, channel_id, emojis)
+        if heatmap_tracker is not None:
+            heatmap_tracker.record(conn, guild_id, "emojis", emojis, event[1])
+            heatmap_tracker.record(conn, guild_id, "stickers", sticker_ids, event[1])
+    elif kind == "edit":
+        _, _, _, message_id, new_content, old_content, sticker_ids = event
+        reconcile_edit(conn, cache, guild_id, message_id, new_content, old_content=old_content, sticker_ids=sticker_ids, batch=batch)
+    elif kind == "delete":
+        _, _, _, message_id, old_content, old_sticker_ids = event
+        reconcile_delete(conn, cache, guild_id, message_id, old_content=old_content, old_sticker_ids=old_sticker_ids, batch=batch)
+    elif kind == "reaction":
+        _, _, _, user_id, emoji = event
+        if dampener is not None and not dampener.filter(conn, guild_id, user_id, "reactions", [emoji]):
+            return
+        _apply(conn, batch, guild_id, "reactions", {emoji: 1})
+        if user_sketches is not None:
+            user_sketches.record(conn, guild_id, "reactions", user_id, [emoji])
+        if heatmap_tracker is not None:
+            heatmap_tracker.record(conn, guild_id, "reactions", [emoji], event[1])
+    elif kind == "forget":
+        # Everything still pending for the guild predates the wipe/reset; drop it
+        if batch is not None:
+            batch.discard_guild(guild_id)
+        for store in (user_sketches, pair_tracker, channel_tracker, heatmap_tracker):
+            if store is not None:
+                store.forget_guild(guild_id)
+    elif kind == "settings":
+        if dampener is not None:
+            dampener.forget_settings(guild_id)
+    else:
+        log.warning(f"Unknown ingest event kind: {kind}")
@@ -0,0 +1,165 @@
+import time
+import asyncio
+import logging
+from collections import deque, Counter
+# Import from project
+from utils import ingest
+from utils.count_batch import CountBatch
+from utils.emoji_scanner import scan_emojis
+from utils.fingerprint_cache import make_fingerprint
+
+log = logging.getLogger(__name__)
+
+# --- Bounded In-Process Ingest Queue ---
+# Event handlers offer event tuples (see utils/ingest.py) and return immediately; a consumer task applies
+# them in chunks, one write transaction per chunk, yielding to the event loop in between. Once the queue
+# holds `max_events`, the overload policy decides what happens to further events:
+#   "merge"  - count-only events (messages, reactions) are scanned and their increments merged into one
+#              pending batch; per-message state (edit/delete reconciliation, user stats, pairs) is skipped
+#   "sample" - one in `sample_every` overflowing count-only events is merged with weight `sample_every`
+#              (an unbiased estimate of the flood), the rest are dropped
+#   "drop"   - overflowing events are dropped
+# Merged and sampled events still pass through the flood dampener, if one is given. Every overflowing
+# message gets a fingerprint of what was really counted for it (its merged increments, nothing if it was
+# sampled or dropped), so a later edit or delete reconciles against that instead of the message content.
+# Control events (edits, deletes, forgets, settings reloads) cannot be merged and losing one would leave
+# counts or settings wrong, so they are always queued, even past the bound; they are rare next to messages
+# and reactions. Everything is accounted for.
+
+OVERLOAD_POLICIES = ("merge", "sample", "drop")
+CONTROL_EVENTS = frozenset(("edit", "delete", "forget", "settings"))
+
+class IngestQueue:
+    """Bounded queue of ingest events with an overload policy and depth/drop/lag accounting."""
+    def __init__(self, max_events=10000, policy="merge", sample_every=10, dampener=None, cache=None):
+        if policy not in OVERLOAD_POLICIES:
+            raise ValueError(f"Unknown overload policy {policy!r}; expected one of {', '.join(OVERLOAD_POLICIES)}.")
+        self.max_events = max(1, int(max_events))
+        self.policy = policy
+        self.sample_every = max(1, int(sample_every))
+        self.dampener = dampener
+        self.cache = cache # FingerprintCache shared with the consumer
+        self.pending = CountBatch() # Increments waiting for the next commit (merged overflow + applied chunks)
+        self._events = deque()
+        self._wakeup = asyncio.Event()
+        self._overflow_oldest = None # enqueued_at of the oldest merged-but-uncommitted event
+        self._overflow_seen = 0
+        self.offered = 0
+        self.processed = 0
+        self.merged = 0
+        self.sampled = 0
+        self.dropped = Counter() # kind -> events dropped
+        self.uncounted = 0 # Overflowing messages fingerprinted with emojis that were not counted
+        self.max_depth = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def __len__(self):
+        return len(self._events)
+
+    def offer(self, event, conn=None):
+        """Queue an event, or apply the overload policy if the queue is full. Returns True if it was queued.
+
+        `conn` is only used to read guild dampener settings for overflowing events.
+        """
+        self.offered += 1
+        if len(self._events) < self.max_events or event[0] in CONTROL_EVENTS:
+            self._events.append(event)
+            self.max_depth = max(self.max_depth, len(self._events))
+            self._wakeup.set()
+            return True
+
+        increments = ingest.event_increments(event, conn, self.dampener) if self.policy != "drop" else []
+        counted = ()
+        if increments and self.policy == "merge":
+            self._merge(event, increments, 1)
+            self.merged += 1
+            counted = increments
+        elif increments and self.policy == "sample":
+            self._overflow_seen += 1
+            if self._overflow_seen % self.sample_every == 0:
+                self._merge(event, increments, self.sample_every)
+                self.sampled += 1
+            else:
+                self.dropped[f"{event[0]} (sampled out)"] += 1
+        else:
+            self.dropped[event[0]] += 1
+        if event[0] == "message":
+            self._remember(event, counted)
+        return False
+
+    def _remember(self, event, counted):
+        """Fingerprint an overflowing message with the increments `counted` for it; its other emojis are uncounted."""
+        if self.cache is None:
+            return
+        _, _, _, _, message_id, _, content, _ = event
+        emojis = [key for table_type, key, _ in counted if table_type == "emojis"]
+        sticker_ids = [key for table_type, key, _ in counted if table_type == "stickers"]
+        uncounted = set(scan_emojis(content)).difference(emojis)
+        self.cache.put(message_id, make_fingerprint(emojis, sticker_ids, uncounted))
+        if uncounted:
+            self.uncounted += 1
+
+    def _merge(self, event, increments, weight):
+        guild_id = event[2]
+        for table_type, key, name in increments:
+            self.pending.add(guild_id, table_type, key, weight, name)
+        if self._overflow_oldest is None:
+            self._overflow_oldest = event[1]
+        self._wakeup.set()
+
+    async def next_chunk(self, max_events, timeout=1.0):
+        """Wait for events (or merged overflow) and return up to `max_events` of them."""
+        if not self._events and not self.pending:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.pop_chunk(max_events)
+
+    def pop_chunk(self, max_events):
+        """Remove and return up to `max_events` queued events, oldest first."""
+        chunk = []
+        while self._events and len(chunk) < max_events:
+            chunk.append(self._events.popleft())
+        return chunk
+
+    def take_overflow_oldest(self):
+        """Return (and reset) the enqueue time of the oldest merged event not yet committed."""
+        oldest, self._overflow_oldest = self._overflow_oldest, None
+        return oldest
+
+    def record_commit(self, events, oldest_enqueued):
+        """Account for `events` applied and committed; `oldest_enqueued` is the earliest enqueue time involved."""
+        self.processed += events
+        if oldest_enqueued is not None:
+            self.last_lag = time.time() - oldest_enqueued
+            self.max_lag = max(self.max_lag, self.last_lag)
+
+    def discard_guild(self, guild_id):
+        """Drop a guild's queued events and pending increments (after its stored data was wiped or reset).
+
+        Queued settings reloads are kept. Call it on the event loop, which owns the queue.
+        """
+        guild_id = str(guild_id)
+        self._events = deque(event for event in self._events if event[2] != guild_id or event[0] == "settings")
+        self.pending.discard_guild(guild_id)
+
+    def stats(self):
+        return {
+            "depth": len(self._events),
+            "max_depth": self.max_depth,
+            "max_events": self.max_events,
+            "policy": self.policy,
+            "offered": self.offered,
+            "processed": self.processed,
+            "merged": self.merged,
+            "sampled": self.sampled,
+            "dropped": sum(self.dropped.values()),
+            "dropped_by_kind": dict(self.dropped),
+            "uncounted": self.uncounted,
+            "pending_increments": len(self.pending),
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+        }
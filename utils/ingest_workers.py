@@ -0,0 +1,237 @@
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+# Import from project (worker processes must not import discord or config; settings are passed in)
+from utils import db_utils
+from utils import ingest
+from utils.count_batch import CountBatch
+from utils.dampener import FloodDampener
+from utils.fingerprint_cache import FingerprintCache
+from utils.heavy_hitters import PairTracker
+from utils.channel_stats import ChannelTracker
+from utils.heatmap import HeatmapTracker
+from utils.user_stats import UserSketchStore
+
+log = logging.getLogger(__name__)
+
+# --- Multi-process Ingest ---
+# The gateway process only pushes small tuples onto a multiprocessing queue; worker processes do the
+# scanning, keep the per-message/per-guild state (fingerprints, sketches, pairs) and batch the writes.
+# Events are routed by guild so each guild's in-memory state lives in exactly one worker.
+#
+# Queue items are the event tuples built by utils/ingest.py (message_event, edit_event, ...).
+# A None item asks the worker to flush and exit.
+#
+# Wipes and resets also go through the owning worker, as ("rewrite", t, guild_id, mode, request_id): it
+# drops the guild's pending counts and aggregates and rewrites the stored data in one step, then reports
+# (request_id, success) on the pool's result queue. Nothing it buffered before can be written back after.
+
+_REWRITES = {"wipe": db_utils.wipe_guild_data, "reset": db_utils.reset_guild_counts}
+
+# Per-worker slots in the shared stats array
+_STAT_PROCESSED = 0 # Events handled
+_STAT_LAST_LAG = 1 # Seconds from enqueue to commit, for the last flushed batch
+_STAT_MAX_LAG = 2 # Worst lag seen
+_STAT_FLUSHES = 3 # Count batches committed
+_STAT_HEARTBEAT = 4 # time.time() of the last loop iteration
+_STAT_ABSORBED = 5 # Increments absorbed by the flood dampener
+_STATS_PER_WORKER = 6
+
+def _worker_main(index, work_queue, stats, db_path, settings, results=None):
+    """Entry point of one ingest worker process."""
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s - [%(levelname)s] - ingest-worker-{index}: %(message)s")
+    conn = db_utils.open_database(db_path, settings.get("database_shards", 1))
+    cache = FingerprintCache(max_entries=settings["fingerprint_max_entries"], max_bytes=settings["fingerprint_max_bytes"])
+    user_sketches = UserSketchStore(
+        epsilon=settings["sketch_epsilon"],
+        delta=settings["sketch_delta"],
+        hll_precision=settings["sketch_hll_precision"],
+        max_bytes=settings["sketch_max_bytes"],
+    )
+    pair_tracker = PairTracker(capacity=settings["pair_capacity"], max_emojis_per_message=settings["pair_max_emojis"])
+    channel_tracker = ChannelTracker(capacity=settings.get("channel_top_items", 20), max_channels=settings.get("channel_max_cached", 20000))
+    heatmap_tracker = HeatmapTracker(max_pending=settings.get("heatmap_max_pending", 50000))
+    dampener = FloodDampener(
+        enabled=settings.get("dampener_enabled", False),
+        burst=settings.get("dampener_burst", 5),
+        per_minute=settings.get("dampener_per_minute", 10),
+        max_entries=settings.get("dampener_max_entries", 200000),
+    )
+    batch = CountBatch()
+    batch_max_messages = settings["batch_max_messages"]
+    batch_max_seconds = settings["batch_max_seconds"]
+    aggregate_flush_seconds = settings["aggregate_flush_seconds"]
+    base = index * _STATS_PER_WORKER
+
+    pending = 0
+    oldest_enqueued = None
+    last_aggregate_flush = time.monotonic()
+    known_guilds = set()
+    running = True
+
+    def flush_counts():
+        nonlocal pending, oldest_enqueued
+        if batch.flush(conn) and oldest_enqueued is not None:
+            lag = time.time() - oldest_enqueued
+            stats[base + _STAT_LAST_LAG] = lag
+            stats[base + _STAT_MAX_LAG] = max(stats[base + _STAT_MAX_LAG], lag)
+            stats[base + _STAT_FLUSHES] += 1
+            pending = 0
+            oldest_enqueued = None
+
+    while running:
+        stats[base + _STAT_HEARTBEAT] = time.time()
+        try:
+            item = work_queue.get(timeout=batch_max_seconds)
+        except queue.Empty:
+            item = False # Timed out: just flush below
+
+        if item is None:
+            running = False
+        elif item:
+            kind, enqueued_at, guild_id = item[0], item[1], item[2]
+            if guild_id not in known_guilds:
+                db_utils.ensure_guild_tables(conn, guild_id)
+                known_guilds.add(guild_id)
+            if kind == "rewrite":
+                _, _, _, mode, request_id = item
+                success = False
+                try:
+                    ingest.apply_event(conn, ingest.forget_event(guild_id), batch, cache, user_sketches, pair_tracker, dampener, channel_tracker, heatmap_tracker)
+                    success = _REWRITES[mode](conn, guild_id)
+                except Exception as e:
+                    log.error(f"Failed to {mode} data of guild {guild_id}: {e}", exc_info=True)
+                if results is not None:
+                    results.put((request_id, success))
+                stats[base + _STAT_PROCESSED] += 1
+                continue
+            try:
+                ingest.apply_event(conn, item, batch, cache, user_sketches, pair_tracker, dampener, channel_tracker, heatmap_tracker)
+            except Exception as e:
+                log.error(f"Failed to ingest {kind} event for guild {guild_id}: {e}", exc_info=True)
+            stats[base + _STAT_PROCESSED] += 1
+            stats[base + _STAT_ABSORBED] = dampener.stats()["absorbed"]
+            pending += 1
+            if oldest_enqueued is None:
+                oldest_enqueued = enqueued_at
+
+        if pending and (pending >= batch_max_messages or item is False or not running or
+                        time.time() - oldest_enqueued >= batch_max_seconds):
+            flush_counts()
+        if not running or time.monotonic() - last_aggregate_flush >= aggregate_flush_seconds:
+            user_sketches.flush(conn)
+            pair_tracker.flush(conn)
+            channel_tracker.flush(conn)
+            heatmap_tracker.flush(conn)
+            last_aggregate_flush = time.monotonic()
+
+    db_utils.close_db_connection(conn)
+
+class IngestWorkerPool:
+    """Runs N ingest worker processes and routes events to them by guild.
+
+    `submit()` is constant-cost: it only enqueues a small tuple.
+    """
+    def __init__(self, db_path, workers=2, settings=None):
+        self.db_path = db_path
+        self.workers = max(1, int(workers))
+        self.settings = settings or {}
+        self._ctx = multiprocessing.get_context("spawn") # No inherited sockets/event loop from the bot
+        self._queues = [self._ctx.Queue() for _ in range(self.workers)]
+        self._stats = self._ctx.Array("d", self.workers * _STATS_PER_WORKER, lock=False)
+        self._processes = []
+        self._submitted = [0] * self.workers
+        self._results = self._ctx.Queue() # (request_id, success) of rewrites
+        self._rewrite_lock = threading.Lock() # One rewrite waits on the result queue at a time
+        self._rewrite_id = 0
+
+    def start(self):
+        for index, work_queue in enumerate(self._queues):
+            process = self._ctx.Process(
+                target=_worker_main,
+                args=(index, work_queue, self._stats, self.db_path, self.settings, self._results),
+                name=f"ingest-worker-{index}",
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+        log.info(f"Started {self.workers} ingest worker process(es).")
+
+    def _route(self, guild_id):
+        # Guild IDs are snowflakes, so modulo spreads them evenly and stays stable across restarts
+        index = int(guild_id) % self.workers
+        self._submitted[index] += 1
+        return self._queues[index]
+
+    def submit(self, event):
+        """Queue an event tuple from utils/ingest.py on the worker owning its guild."""
+        self._route(event[2]).put_nowait(event)
+
+    def forget_guild(self, guild_id):
+        self.submit(ingest.forget_event(guild_id))
+
+    def rewrite_guild(self, guild_id, mode, timeout=60.0):
+        """Wipe ("wipe") or zero ("reset") a guild's stored data inside the worker owning it.
+
+        Blocking; run it in a thread. Returns the db_utils result, or False if the worker did not answer in time.
+        """
+        if mode not in _REWRITES:
+            raise ValueError(f"Unknown rewrite mode: {mode}")
+        with self._rewrite_lock:
+            self._rewrite_id += 1
+            request_id = self._rewrite_id
+            self.submit(("rewrite", time.time(), str(guild_id), mode, request_id))
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    log.error(f"Ingest worker did not {mode} guild {guild_id} within {timeout:g}s.")
+                    return False
+                try:
+                    answered_id, success = self._results.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                if answered_id == request_id:
+                    return success
+                # Otherwise a late answer to a rewrite that already timed out
+
+    def stats(self):
+        """Return one dict per worker with queue depth, lag and liveness."""
+        result = []
+        for index, work_queue in enumerate(self._queues):
+            base = index * _STATS_PER_WORKER
+            try:
+                depth = work_queue.qsize()
+            except NotImplementedError: # macOS
+                depth = max(0, self._submitted[index] - int(self._stats[base + _STAT_PROCESSED]))
+            heartbeat = self._stats[base + _STAT_HEARTBEAT]
+            process = self._processes[index] if index < len(self._processes) else None
+            result.append({
+                "worker": index,
+                "alive": bool(process and process.is_alive()),
+                "queue_depth": depth,
+                "processed": int(self._stats[base + _STAT_PROCESSED]),
+                "flushes": int(self._stats[base + _STAT_FLUSHES]),
+                "absorbed": int(self._stats[base + _STAT_ABSORBED]),
+                "last_lag": self._stats[base + _STAT_LAST_LAG],
+                "max_lag": self._stats[base + _STAT_MAX_LAG],
+                "heartbeat_age": time.time() - heartbeat if heartbeat else None,
+            })
+        return result
+
+    def stop(self, timeout=10.0):
+        """Ask every worker to flush and exit, waiting up to `timeout` seconds for each."""
+        for work_queue in self._queues:
+            try:
+                work_queue.put_nowait(None)
+            except (ValueError, OSError):
+                pass # Queue already closed
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                log.warning(f"Ingest worker {process.name} did not exit in time; terminating.")
+                process.terminate()
+        self._processes = []
+        log.info("Ingest workers stopped.")
@@ -0,0 +1,39 @@
+import logging
+
+log = logging.getLogger(__name__)
+
+# --- Guild Item Inventory ---
+# The custom emojis and stickers each guild currently has, so rare leaderboards can list the ones nobody
+# has used (they have no row in the counter tables). Filled from the guild objects at startup and replaced
+# whenever discord reports an emoji or sticker update; plain values only, so database threads can read it.
+
+def emoji_key(emoji_id, name, animated=False):
+    """The stored key of a custom emoji, as scanned from messages and reactions (<:name:id> / <a:name:id>)."""
+    return f"<{'a' if animated else ''}:{name}:{emoji_id}>"
+
+class GuildInventory:
+    """guild_id -> current custom emojis ({key: name}) and stickers ({sticker_id: name})."""
+    def __init__(self):
+        self._emojis = {}
+        self._stickers = {}
+
+    def __len__(self):
+        return len(self._emojis.keys() | self._stickers.keys())
+
+    def set_emojis(self, guild_id, emojis):
+        """Replace a guild's emojis from (emoji_id, name, animated) tuples."""
+        self._emojis[str(guild_id)] = {emoji_key(emoji_id, name, animated): name for emoji_id, name, animated in emojis}
+
+    def set_stickers(self, guild_id, stickers):
+        """Replace a guild's stickers from (sticker_id, name) tuples."""
+        self._stickers[str(guild_id)] = {str(sticker_id): name for sticker_id, name in stickers}
+
+    def get(self, guild_id, table_type):
+        """{item_key: name} of a guild's current items for one table (custom emojis serve reactions too), or None if unknown."""
+        if table_type == "stickers":
+            return self._stickers.get(str(guild_id))
+        return self._emojis.get(str(guild_id))
+
+    def forget_guild(self, guild_id):
+        self._emojis.pop(str(guild_id), None)
+        self._stickers.pop(str(guild_id), None)
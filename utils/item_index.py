@@ -0,0 +1,178 @@
+import bisect
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+# Import from project
+from utils import ingest
+from utils.emoji_scanner import CUSTOM_EMOJI_REGEX
+
+log = logging.getLogger(__name__)
+
+# --- Item Name Index (autocomplete) ---
+# /emoji info and friends autocomplete item names on every keystroke. Instead of a LIKE scan of the guild
+# table per keystroke, each (guild, type) gets a sorted array of (search term, item key) pairs, searched with
+# bisect. An index is built from the database the first time a guild asks, then kept current from the ingest
+# path (dispatch notes every new item), and the least recently used indexes are evicted.
+
+def search_terms(table_type, key, name=None):
+    """Lower-cased terms an item is found by: custom emoji names, Unicode names, sticker names."""
+    if table_type == "stickers":
+        return [(name or key).lower()]
+    match = CUSTOM_EMOJI_REGEX.fullmatch(key)
+    if match:
+        return [match.group(1).lower()]
+    terms = [key]
+    for char in key:
+        character_name = unicodedata.name(char, "")
+        if character_name and not character_name.startswith("VARIATION SELECTOR"):
+            terms.append(character_name.lower())
+            break
+    return terms
+
+def display_label(table_type, key, name=None):
+    """Human-readable choice label for an item (Discord cannot render custom emojis in choices)."""
+    if table_type == "stickers":
+        return name or key
+    match = CUSTOM_EMOJI_REGEX.fullmatch(key)
+    if match:
+        return f":{match.group(1)}:"
+    terms = search_terms(table_type, key)
+    return f"{key} {terms[1]}" if len(terms) > 1 else key
+
+class _TableIndex:
+    """Sorted (term, item_key) pairs of one guild table plus the item names."""
+    __slots__ = ("entries", "names")
+
+    def __init__(self, table_type, items):
+        self.names = {} # item_key -> name (stickers) or None
+        entries = []
+        for key, name in items:
+            if key is None or key in self.names:
+                continue
+            self.names[key] = name
+            entries.extend((term, key) for term in search_terms(table_type, key, name))
+        entries.sort()
+        self.entries = entries
+
+    def add(self, table_type, key, name):
+        if key in self.names:
+            if name and not self.names[key]:
+                self.names[key] = name
+            return
+        self.names[key] = name
+        for term in search_terms(table_type, key, name):
+            bisect.insort(self.entries, (term, key))
+
+class ItemIndex:
+    """In-memory per-guild prefix index over item names, bounded to `max_tables` (guild, type) tables.
+
+    Thread-safe: indexes are built in worker threads while the event loop notes new items.
+    """
+    def __init__(self, max_tables=2000):
+        self.max_tables = max(1, int(max_tables))
+        self._tables = OrderedDict() # (guild_id, table_type) -> _TableIndex
+        self._building = {} # (guild_id, table_type) -> {key: name} noted while the table was being read
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._tables)
+
+    def is_loaded(self, guild_id, table_type):
+        return (str(guild_id), table_type) in self._tables
+
+    def ensure(self, guild_id, table_type, fetch):
+        """Build a table's index from `fetch()` -> [(item_key, name)] unless it is loaded (run in a thread)."""
+        table_key = (str(guild_id), table_type)
+        with self._lock:
+            if table_key in self._tables:
+                self._tables.move_to_end(table_key)
+                return
+            self._building.setdefault(table_key, {})
+        try:
+            items = fetch()
+        except Exception:
+            with self._lock:
+                self._building.pop(table_key, None)
+            raise
+        table = _TableIndex(table_type, items)
+        with self._lock:
+            if table_key not in self._building:
+                return # The guild was forgotten while its table was read; the rows may predate a wipe
+            for key, name in self._building.pop(table_key).items():
+                table.add(table_type, key, name)
+            self._tables[table_key] = table
+            self._tables.move_to_end(table_key)
+            self.builds += 1
+            while len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+                self.evictions += 1
+
+    def note(self, guild_id, table_type, key, name=None):
+        """Record an item written for a guild; ignored unless its index is loaded or being built."""
+        table_key = (str(guild_id), table_type)
+        with self._lock:
+            table = self._tables.get(table_key)
+            if table is not None:
+                table.add(table_type, key, name)
+                return
+            building = self._building.get(table_key)
+            if building is not None:
+                building.setdefault(key, name)
+
+    def note_event(self, event):
+        """Feed one ingest event (utils/ingest.py) through the index."""
+        guild_id = event[2]
+        if event[0] == "forget":
+            self.forget_guild(guild_id)
+            return
+        if not any((guild_id, table_type) in self._tables or (guild_id, table_type) in self._building
+                   for table_type in ("emojis", "reactions", "stickers")):
+            return # Nothing loaded for this guild: skip scanning the message
+        for table_type, key, name in ingest.event_increments(event):
+            self.note(guild_id, table_type, key, name)
+
+    def search(self, guild_id, table_type, text, limit=25):
+        """Return up to `limit` (item_key, label) pairs whose terms start with `text`, or None if not loaded."""
+        text = text.strip().lower()
+        with self._lock:
+            table = self._tables.get((str(guild_id), table_type))
+            if table is None:
+                return None
+            self._tables.move_to_end((str(guild_id), table_type))
+            entries = table.entries
+            results, seen = [], set()
+            position = bisect.bisect_left(entries, (text,))
+            while position < len(entries) and len(results) < limit:
+                term, key = entries[position]
+                if not term.startswith(text):
+                    break
+                if key not in seen:
+                    seen.add(key)
+                    results.append((key, display_label(table_type, key, table.names.get(key))))
+                position += 1
+            return results
+
+    def resolve(self, guild_id, table_type, text):
+        """Map typed text to an item key: the key itself, or the item whose term matches it exactly."""
+        text = text.strip()
+        with self._lock:
+            table = self._tables.get((str(guild_id), table_type))
+            if table is None or text in table.names:
+                return text
+            lowered = text.strip(":").lower()
+            position = bisect.bisect_left(table.entries, (lowered,))
+            if position < len(table.entries) and table.entries[position][0] == lowered:
+                return table.entries[position][1]
+            return text
+
+    def forget_guild(self, guild_id):
+        """Drop a guild's indexes (after a wipe, reset or archive)."""
+        guild_id = str(guild_id)
+        with self._lock:
+            for table_key in [table_key for table_key in self._tables if table_key[0] == guild_id]:
+                del self._tables[table_key]
+            for table_key in [table_key for table_key in self._building if table_key[0] == guild_id]:
+                del self._building[table_key]
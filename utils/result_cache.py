@@ -0,0 +1,49 @@
+import time
+from collections import OrderedDict
+
+class GenerationCache:
+    """Bounded LRU of derived results, each tagged with the guild write generation it was computed from.
+
+    An entry younger than `max_age` seconds is served as is. An older one is still served if the caller's
+    `generation_of()` (e.g. db_utils.get_write_generation) reports that nothing was committed since; then
+    its age starts over. Guilds that keep writing therefore see results at most `max_age` seconds stale,
+    and idle guilds never recompute.
+    """
+    def __init__(self, max_entries=1000, max_age=30.0):
+        self.max_entries = max(1, int(max_entries))
+        self.max_age = max_age
+        self._entries = OrderedDict() # key -> [generation, stored_at, value]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, generation_of=None, now=None):
+        """Return the cached value for `key`, or None if there is none or it is out of date."""
+        now = time.monotonic() if now is None else now
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now - entry[1] > self.max_age:
+                if generation_of is None or generation_of() != entry[0]:
+                    del self._entries[key]
+                    entry = None
+                else:
+                    entry[1] = now
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, key, generation, value, now=None):
+        self._entries[key] = [generation, time.monotonic() if now is None else now, value]
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def forget(self, match):
+        """Drop every entry whose key satisfies `match(key)`."""
+        for key in [key for key in self._entries if match(key)]:
+            del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
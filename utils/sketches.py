@@ -0,0 +1,120 @@
+import math
+import zlib
+import struct
+import hashlib
+from array import array
+
+# --- Probabilistic Sketches ---
+# Pure-Python, fixed-size structures that answer approximate questions in bounded memory.
+# Hashing uses blake2b (stable across processes/restarts, unlike the built-in hash()).
+
+def _hash64(value, salt=b""):
+    """Return a stable 64-bit hash of a string/bytes value."""
+    if not isinstance(value, bytes):
+        value = str(value).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8, salt=salt).digest(), "little")
+
+class CountMinSketch:
+    """Count-Min Sketch: frequency estimates that never undercount.
+
+    With width = ceil(e / epsilon) and depth = ceil(ln(1 / delta)), an estimate exceeds the true count
+    by more than epsilon * total with probability at most delta.
+    """
+    _HEADER = struct.Struct("<BHI Q") # version, depth, width, total
+    _VERSION = 1
+
+    def __init__(self, width, depth, counters=None, total=0):
+        self.width = int(width)
+        self.depth = int(depth)
+        self.counters = counters if counters is not None else array("I", bytes(4 * self.width * self.depth))
+        self.total = total
+
+    @classmethod
+    def from_error_bounds(cls, epsilon, delta):
+        """Size a sketch for additive error `epsilon * total` with failure probability `delta`."""
+        width = math.ceil(math.e / epsilon)
+        depth = math.ceil(math.log(1 / delta))
+        return cls(width, depth)
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    def _indexes(self, key):
+        # Kirsch-Mitzenmacher: derive all row hashes from two base hashes
+        h1 = _hash64(key)
+        h2 = _hash64(key, salt=b"cms") | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def add(self, key, count=1):
+        counters = self.counters
+        for index in self._indexes(key):
+            counters[index] = min(counters[index] + count, 0xFFFFFFFF)
+        self.total += count
+
+    def estimate(self, key):
+        counters = self.counters
+        return min(counters[index] for index in self._indexes(key))
+
+    def error_bound(self):
+        """Additive error (epsilon * total) that holds with probability 1 - delta."""
+        return math.ceil(self.epsilon * self.total)
+
+    def to_bytes(self):
+        return self._HEADER.pack(self._VERSION, self.depth, self.width, self.total) + zlib.compress(self.counters.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data):
+        version, depth, width, total = cls._HEADER.unpack_from(data)
+        if version != cls._VERSION:
+            raise ValueError(f"Unsupported Count-Min Sketch version: {version}")
+        counters = array("I")
+        counters.frombytes(zlib.decompress(data[cls._HEADER.size:]))
+        return cls(width, depth, counters=counters, total=total)
+
+class HyperLogLog:
+    """HyperLogLog: distinct-count estimates with relative standard error ~1.04 / sqrt(2 ** precision)."""
+    _HEADER = struct.Struct("<BB") # version, precision
+    _VERSION = 1
+
+    def __init__(self, precision=10, registers=None):
+        if not 4 <= precision <= 16:
+            raise ValueError("HyperLogLog precision must be between 4 and 16.")
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.m)
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def add(self, value):
+        """Add a value; returns True if the sketch changed."""
+        h = _hash64(value)
+        index = h >> (64 - self.precision)
+        remaining = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def count(self):
+        m = self.m
+        alpha = 0.673 if m == 16 else 0.697 if m == 32 else 0.709 if m == 64 else 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros) # Linear counting for small cardinalities
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return self._HEADER.pack(self._VERSION, self.precision) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        version, precision = cls._HEADER.unpack_from(data)
+        if version != cls._VERSION:
+            raise ValueError(f"Unsupported HyperLogLog version: {version}")
+        return cls(precision, registers=bytearray(zlib.decompress(data[cls._HEADER.size:])))
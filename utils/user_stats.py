@@ -0,0 +1,144 @@
+import logging
+from collections import OrderedDict
+# Import from project
+from utils import db_utils
+from utils.sketches import CountMinSketch, HyperLogLog
+
+log = logging.getLogger(__name__)
+
+class UserSketchStore:
+    """Approximate per-user usage stats per guild, in bounded memory.
+
+    Each guild has one Count-Min Sketch keyed by (user, type, item) for "how often does this user use
+    this item", and one HyperLogLog per (type, item) for "how many distinct users used this item".
+    Sketches are loaded lazily from SQLite, kept in an LRU capped at `max_bytes`, and written back by
+    `flush()` (or when a modified sketch is evicted).
+
+    With `read_through=True` lookups always read the stored sketch and nothing is cached; used by a
+    process that only queries sketches another process (an ingest worker) maintains.
+    """
+    def __init__(self, epsilon=0.001, delta=0.01, hll_precision=10, max_bytes=32 * 1024 * 1024, read_through=False):
+        self.epsilon = epsilon
+        self.delta = delta
+        self.hll_precision = hll_precision
+        self.max_bytes = max_bytes
+        self.read_through = read_through
+        self._loaded = OrderedDict() # (guild_id, kind, sketch_key) -> sketch
+        self._dirty = set()
+        self._bytes = 0
+
+    @staticmethod
+    def _size(sketch):
+        if isinstance(sketch, CountMinSketch):
+            return sketch.width * sketch.depth * 4
+        return sketch.m
+
+    def _new(self, kind):
+        if kind == "cms":
+            return CountMinSketch.from_error_bounds(self.epsilon, self.delta)
+        return HyperLogLog(self.hll_precision)
+
+    def _get(self, conn, guild_id, kind, sketch_key, create=True, pinned=()):
+        """Return a sketch, loading it if needed; `pinned` keys are never evicted to make room for it."""
+        key = (str(guild_id), kind, sketch_key)
+        sketch = self._loaded.get(key)
+        if sketch is not None:
+            self._loaded.move_to_end(key)
+            return sketch
+
+        data = db_utils.load_user_sketch(conn, key[0], kind, sketch_key)
+        if data is not None:
+            try:
+                sketch = CountMinSketch.from_bytes(data) if kind == "cms" else HyperLogLog.from_bytes(data)
+            except (ValueError, TypeError) as e:
+                log.error(f"Discarding unreadable {kind} sketch {sketch_key!r} for guild {guild_id}: {e}")
+                sketch = None
+        if sketch is None:
+            if not create:
+                return None
+            sketch = self._new(kind)
+        if self.read_through and not create:
+            return sketch
+
+        self._loaded[key] = sketch
+        self._bytes += self._size(sketch)
+        self._evict(conn, keep={key, *pinned})
+        return sketch
+
+    def _evict(self, conn, keep):
+        """Drop least recently used sketches beyond max_bytes; modified ones are saved first and kept if that fails."""
+        for key in list(self._loaded):
+            if self._bytes <= self.max_bytes:
+                break
+            if key in keep:
+                continue
+            sketch = self._loaded[key]
+            if key in self._dirty:
+                if not db_utils.save_user_sketches(conn, [(key[0], key[1], key[2], sketch.to_bytes())]):
+                    log.warning(f"Could not save evicted sketch {key!r}; keeping it in memory until the next flush.")
+                    break
+                self._dirty.discard(key)
+            del self._loaded[key]
+            self._bytes -= self._size(sketch)
+
+    def record(self, conn, guild_id, table_type, user_id, items):
+        """Record that `user_id` used each of `items` once."""
+        if not items:
+            return
+        guild_id = str(guild_id)
+        cms_key = (guild_id, "cms", "")
+        cms = self._get(conn, guild_id, "cms", "")
+        for item in items:
+            cms.add(f"{user_id}:{table_type}:{item}")
+            self._dirty.add(cms_key)
+            hll_key = f"{table_type}:{item}"
+            # Loading the HLL may evict other sketches, but never the CMS this call keeps adding to
+            hll = self._get(conn, guild_id, "hll", hll_key, pinned=(cms_key,))
+            if hll.add(str(user_id)):
+                self._dirty.add((guild_id, "hll", hll_key))
+
+    def user_count(self, conn, guild_id, table_type, user_id, item):
+        """Return (estimated uses, additive error bound) of `item` by `user_id`. Never undercounts."""
+        cms = self._get(conn, guild_id, "cms", "", create=False)
+        if cms is None:
+            return 0, 0
+        return cms.estimate(f"{user_id}:{table_type}:{item}"), cms.error_bound()
+
+    def top_users(self, conn, guild_id, table_type, item, user_ids, limit=10):
+        """Rank candidate `user_ids` by estimated uses of `item`; returns [(user_id, estimate)], plus the error bound."""
+        cms = self._get(conn, guild_id, "cms", "", create=False)
+        if cms is None:
+            return [], 0
+        estimates = ((user_id, cms.estimate(f"{user_id}:{table_type}:{item}")) for user_id in user_ids)
+        ranked = sorted((entry for entry in estimates if entry[1] > 0), key=lambda entry: entry[1], reverse=True)
+        return ranked[:limit], cms.error_bound()
+
+    def distinct_users(self, conn, guild_id, table_type, item):
+        """Return (estimated distinct users of `item`, relative standard error)."""
+        hll = self._get(conn, guild_id, "hll", f"{table_type}:{item}", create=False)
+        if hll is None:
+            return 0, 0.0
+        return hll.count(), hll.relative_error
+
+    def forget_guild(self, guild_id):
+        """Drop a guild's in-memory sketches without saving them (after its data was wiped)."""
+        guild_id = str(guild_id)
+        for key in [key for key in self._loaded if key[0] == guild_id]:
+            self._bytes -= self._size(self._loaded.pop(key))
+            self._dirty.discard(key)
+
+    def flush(self, conn):
+        """Write every modified sketch to the database in one transaction."""
+        if not self._dirty:
+            return True
+        keys = [key for key in self._dirty if key in self._loaded] # Evicted sketches were saved on eviction
+        rows = [(key[0], key[1], key[2], self._loaded[key].to_bytes()) for key in keys]
+        if db_utils.save_user_sketches(conn, rows):
+            self._dirty.difference_update(keys)
+            self._dirty.intersection_update(self._loaded)
+            log.debug(f"Flushed {len(rows)} user sketches.")
+            return True
+        return False
+
+    def stats(self):
+        return {"loaded": len(self._loaded), "bytes": self._bytes, "max_bytes": self.max_bytes, "dirty": len(self._dirty)}